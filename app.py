@@ -1,11 +1,14 @@
 from flask import Flask, request, render_template, redirect, url_for, jsonify, session
 import io
 from contextlib import redirect_stdout
-from threading import Thread, Lock
+from threading import Thread, Lock, Timer
 import time
 from urllib.parse import parse_qsl
 import csv
 import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import uuid
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
@@ -18,7 +21,7 @@ import buscar_precios_web as precios
 import leer_factura as facturas
 import presupuestos_db as presupuestos
 import presupuestos_db
-from flask import make_response
+from flask import make_response, Response, send_file
 from datetime import datetime
 from collections import OrderedDict
 import procesar_presupuesto_ocr as ocr_processor
@@ -27,6 +30,9 @@ import psycopg2
 import facturacion
 import reportes_clientes
 import financiero
+import exportar_reportes
+import cache_pdf
+import pool_pdf
 
 # Importación opcional de OCR con OpenCV (solo si está disponible)
 try:
@@ -820,6 +826,56 @@ def historial_data():
     return jsonify({"labels": labels, "data": data, "producto": producto, "proveedor": proveedor})
 
 
+def _config_ocr_desde_formulario():
+    """Configuración de preprocesamiento y OCR enviada en el formulario"""
+    config = {
+        'enable_preprocessing': request.form.get('enable_preprocessing', 'true').lower() == 'true',
+        'threshold': int(request.form.get('threshold', 128)),
+        'contrast': int(request.form.get('contrast', 0)),
+        'brightness': int(request.form.get('brightness', 0)),
+        'enable_smoothing': request.form.get('enable_smoothing', 'true').lower() == 'true',
+        'enable_grayscale': request.form.get('enable_grayscale', 'true').lower() == 'true',
+        'psm_mode': request.form.get('psm_mode', '6'),
+        'lang': request.form.get('lang', 'spa+por+eng'),
+        'tiled': request.form.get('tiled', 'false').lower() == 'true'
+    }
+    
+    # Obtener región de recorte si existe
+    crop_region_str = request.form.get('crop_region')
+    if crop_region_str:
+        try:
+            import json
+            config['crop_region'] = json.loads(crop_region_str)
+        except:
+            pass
+    return config
+
+
+def _respuesta_ocr(result):
+    """Resultado de OCR con las palabras en el formato [[coords], texto, confianza]"""
+    palabras_formato = []
+    for word in result['words']:
+        bbox = word['bbox']
+        palabras_formato.append([
+            [[bbox['x0'], bbox['y0']], [bbox['x1'], bbox['y0']], 
+             [bbox['x1'], bbox['y1']], [bbox['x0'], bbox['y1']]],
+            word['text'],
+            word['confidence'] / 100.0
+        ])
+    
+    return {
+        'text': result['text'],
+        'words': palabras_formato,
+        'word_count': len(palabras_formato)
+    }
+
+
+def _ocr_cola_llena(e):
+    response = jsonify({'error': str(e)})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+
 @app.route("/api/ocr/process", methods=["POST"])
 def api_ocr_process():
     """API endpoint para procesar OCR con OpenCV y Tesseract"""
@@ -835,25 +891,7 @@ def api_ocr_process():
         image_bytes = file.read()
         
         # Obtener configuración de preprocesamiento
-        config = {
-            'enable_preprocessing': request.form.get('enable_preprocessing', 'true').lower() == 'true',
-            'threshold': int(request.form.get('threshold', 128)),
-            'contrast': int(request.form.get('contrast', 0)),
-            'brightness': int(request.form.get('brightness', 0)),
-            'enable_smoothing': request.form.get('enable_smoothing', 'true').lower() == 'true',
-            'enable_grayscale': request.form.get('enable_grayscale', 'true').lower() == 'true',
-            'psm_mode': request.form.get('psm_mode', '6'),
-            'lang': request.form.get('lang', 'spa+por+eng')
-        }
-        
-        # Obtener región de recorte si existe
-        crop_region_str = request.form.get('crop_region')
-        if crop_region_str:
-            try:
-                import json
-                config['crop_region'] = json.loads(crop_region_str)
-            except:
-                pass
+        config = _config_ocr_desde_formulario()
         
         # Procesar OCR (local o remoto según configuración)
         if not OCR_OPENCV_AVAILABLE:
@@ -861,32 +899,64 @@ def api_ocr_process():
                 'error': 'OCR con OpenCV no está disponible. Por favor, instala las dependencias necesarias o configura un servidor OCR remoto.'
             }), 503
         
-        result = ocr_opencv.process_ocr(image_bytes, config)
+        try:
+            result = ocr_opencv.process_ocr(image_bytes, config)
+        except ocr_opencv.OCRQueueFull as e:
+            return _ocr_cola_llena(e)
         
-        # Convertir palabras al formato esperado
-        palabras_formato = []
-        for word in result['words']:
-            bbox = word['bbox']
-            palabras_formato.append([
-                [[bbox['x0'], bbox['y0']], [bbox['x1'], bbox['y0']], 
-                 [bbox['x1'], bbox['y1']], [bbox['x0'], bbox['y1']]],
-                word['text'],
-                word['confidence'] / 100.0
-            ])
+        return jsonify(_respuesta_ocr(result))
+    
+    except Exception as e:
+        import traceback
+        error_trace = traceback.format_exc()
+        print(f"Error en API OCR: {e}")
+        print(error_trace)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route("/api/ocr/process-batch", methods=["POST"])
+def api_ocr_process_batch():
+    """API endpoint para procesar varias imágenes (campo 'imagenes') con la misma configuración"""
+    try:
+        archivos = [f for f in request.files.getlist('imagenes') if f.filename != '']
+        if not archivos:
+            return jsonify({'error': 'No se proporcionaron imágenes'}), 400
+        
+        if not OCR_OPENCV_AVAILABLE:
+            return jsonify({
+                'error': 'OCR con OpenCV no está disponible. Por favor, instala las dependencias necesarias o configura un servidor OCR remoto.'
+            }), 503
+        
+        config = _config_ocr_desde_formulario()
+        try:
+            resultados = ocr_opencv.process_ocr_batch([f.read() for f in archivos], config)
+        except ocr_opencv.OCRQueueFull as e:
+            return _ocr_cola_llena(e)
         
         return jsonify({
-            'text': result['text'],
-            'words': palabras_formato,
-            'word_count': len(palabras_formato)
+            'results': [
+                resultado if 'error' in resultado else _respuesta_ocr(resultado)
+                for resultado in resultados
+            ]
         })
     
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
-        print(f"Error en API OCR: {e}")
+        print(f"Error en API OCR (lote): {e}")
         print(error_trace)
         return jsonify({'error': str(e)}), 500
 
+
+@app.route("/api/ocr/estadisticas", methods=["GET"])
+@auth.login_required
+def api_ocr_estadisticas():
+    """Cola, errores y rendimiento del pool de OCR local"""
+    if not OCR_OPENCV_AVAILABLE:
+        return jsonify({'error': 'OCR con OpenCV no está disponible'}), 503
+    return jsonify(ocr_opencv.ocr_pool_stats())
+
+
 @app.route("/precios/cargar-presupuesto", methods=["GET", "POST"])
 def precios_cargar_presupuesto():
     """Cargar presupuesto desde imagen usando OCR"""
@@ -1710,45 +1780,233 @@ def listas_materiales_eliminar_subgrupo(subgrupo_id):
     return "Error al eliminar subgrupo", 400
 
 
-@app.route("/listas-materiales/<int:id>/pdf", methods=["GET"], endpoint="listas_materiales_pdf")
-@app.route("/listas-materiales/<int:id>/pdf", methods=["GET"], endpoint="listas_materiales_pdf")
-def listas_materiales_pdf(id):
-    """Generar/visualizar PDF del presupuesto"""
+# ==================== PDF DE PRESUPUESTOS Y FACTURAS ====================
+
+# Segundos que se espera tras la última edición antes de regenerar el PDF en segundo plano
+PDF_REGENERACION_DEMORA = float(os.getenv("PDF_REGENERACION_DEMORA", "30"))
+
+# (tipo, documento_id) -> Timer pendiente de regeneración
+_regeneraciones_pdf = {}
+_regeneraciones_pdf_lock = Lock()
+
+# Los procesos de PDF arrancan con el worker para que el primer PDF no espere la carga de WeasyPrint
+pool_pdf.iniciar_pool()
+
+# Endpoints que modifican un presupuesto; al terminar bien se regenera su PDF
+_ENDPOINTS_EDICION_LISTAS = {
+    'listas_materiales_editar',
+    'listas_materiales_agregar_item',
+    'listas_materiales_eliminar_item',
+    'listas_materiales_actualizar_item',
+    'listas_materiales_agregar_subgrupo',
+    'listas_materiales_actualizar_subgrupo',
+    'listas_materiales_duplicar_subgrupo',
+    'listas_materiales_insertar_plantilla',
+    'listas_materiales_eliminar_subgrupo',
+    'listas_materiales_aplicar_template',
+}
+
+
+def _datos_pdf_lista(id):
+    """Variables de la plantilla del PDF de un presupuesto, o None si no existe"""
     presupuesto = presupuestos.obtener_lista_material_por_id(id)
     if not presupuesto:
-        return "Presupuesto no encontrado", 404
+        return None
+    return {
+        'presupuesto': presupuesto,
+        'items_disponibles': presupuestos.obtener_items_activos(),
+        'tipos_items': presupuestos.obtener_tipos_items(),
+    }
 
-    items_disponibles = presupuestos.obtener_items_activos()
-    tipos_items = presupuestos.obtener_tipos_items()
 
-    html = render_template(
-        'listas_materiales/pdf.html',
-        presupuesto=presupuesto,
-        items_disponibles=items_disponibles,
-        tipos_items=tipos_items,
-        request=request,
-        datetime=datetime,
-    )
+def _datos_pdf_factura(id):
+    """Variables de la plantilla del PDF de una factura, o None si no existe"""
+    datos = facturacion.obtener_factura_por_id(id)
+    if not datos:
+        return None
+    return _preparar_datos_pdf_factura(datos)
+
+
+def _preparar_datos_pdf_factura(datos):
+    """Variables de la plantilla a partir de una factura con sus items"""
+    factura = datos['factura']
+    items = datos['items']
+
+    # Calcular totales
+    items_dict = [{
+        'cantidad': item['cantidad'],
+        'descripcion': item['descripcion'],
+        'precio_unitario': float(item['precio_unitario']),
+        'impuesto': item['impuesto']
+    } for item in items]
+
+    totales = facturacion.calcular_totales(items_dict)
+    totales['enLetras'] = facturacion.numero_a_letras(totales['total'], True, factura['moneda'])
+
+    # Formatear fecha
+    fecha_obj = factura['fecha']
+    if isinstance(fecha_obj, str):
+        fecha_obj = datetime.strptime(fecha_obj, "%Y-%m-%d").date()
+    factura['fecha_formateada'] = f"{fecha_obj.day:02d}-{fecha_obj.month:02d}-{fecha_obj.year}"
+
+    return {'factura': factura, 'items': items, 'totales': totales}
+
+
+# tipo -> (función que obtiene los datos, plantilla)
+_DOCUMENTOS_PDF = {
+    'lista': (_datos_pdf_lista, 'listas_materiales/pdf.html'),
+    'factura': (_datos_pdf_factura, 'facturacion/pdf.html'),
+}
+
+
+def _clave_documento_pdf(tipo, documento_id, datos):
+    plantilla = _DOCUMENTOS_PDF[tipo][1]
+    ruta_plantilla = os.path.join(app.root_path, app.template_folder, plantilla)
+    return cache_pdf.clave_pdf(tipo, documento_id, datos, ruta_plantilla)
+
 
+def _html_documento_pdf(tipo, datos):
+    plantilla = _DOCUMENTOS_PDF[tipo][1]
+    if tipo == 'lista':
+        return render_template(plantilla, request=request, **datos)
+    return render_template(plantilla, **datos)
+
+
+def _respuesta_pdf(pdf, clave, nombre_archivo):
+    response = make_response(pdf)
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f'inline; filename={nombre_archivo}'
+    response.set_etag(clave)
+    # El navegador debe revalidar siempre: el ETag cambia en cuanto se edita el documento
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _pdf_documento(tipo, documento_id, nombre_archivo):
+    """Respuesta con el PDF de un documento usando la caché en disco
+
+    Devuelve (response, datos, html, error). Si no se pudo generar el PDF
+    response es None, html contiene la vista imprimible y error el motivo; si
+    el documento no existe datos es None.
+    """
+    datos = _DOCUMENTOS_PDF[tipo][0](documento_id)
+    if datos is None:
+        return None, None, None, None
+
+    clave = _clave_documento_pdf(tipo, documento_id, datos)
+    if clave in request.if_none_match:
+        response = make_response('', 304)
+        response.set_etag(clave)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, datos, None, None
+
+    pdf = cache_pdf.obtener_pdf(clave)
+    if pdf is not None:
+        return _respuesta_pdf(pdf, clave, nombre_archivo(datos)), datos, None, None
+
+    html = _html_documento_pdf(tipo, datos)
     try:
-        from weasyprint import HTML
+        pdf = exportar_reportes.html_a_pdf(html, base_url=request.host_url)
+    except pool_pdf.ColaPDFLlena:
+        raise
+    except Exception as e:
+        print(f"[WARN] No se pudo generar el PDF de {tipo} {documento_id}: {e}")
+        return None, datos, html, str(e)
+    cache_pdf.guardar_pdf(clave, pdf)
+    return _respuesta_pdf(pdf, clave, nombre_archivo(datos)), datos, None, None
 
-        pdf = HTML(string=html, base_url=request.host_url).write_pdf()
-        response = make_response(pdf)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'inline; filename=presupuesto_{id}.pdf'
-        return response
+
+def _regenerar_pdf(tipo, documento_id, base_url):
+    """Genera y guarda el PDF de un documento si todavía no está en la caché"""
+    with _regeneraciones_pdf_lock:
+        _regeneraciones_pdf.pop((tipo, documento_id), None)
+    try:
+        with app.test_request_context(base_url=base_url):
+            datos = _DOCUMENTOS_PDF[tipo][0](documento_id)
+            if datos is None:
+                return
+            clave = _clave_documento_pdf(tipo, documento_id, datos)
+            if cache_pdf.pdf_en_cache(clave):
+                return
+            html = _html_documento_pdf(tipo, datos)
+            cache_pdf.guardar_pdf(clave, exportar_reportes.html_a_pdf(html, base_url=base_url))
     except Exception as e:
-        mensaje = (
-            "<p style='padding:10px; background:#fff3cd;'>"
-            "⚠️ No se pudo generar el PDF automáticamente."
-            "<br>• Si deseas exportar a PDF desde la aplicación instala la dependencia opcional "
-            "<code>weasyprint</code> y sus librerías del sistema (GTK/GObject)."
-            "<br>• Error reportado: <code>{error}</code>"
-            "<br>Mostrando vista previa imprimible."
-            "</p>"
-        ).format(error=str(e))
-        return mensaje + html
+        print(f"[WARN] No se pudo regenerar el PDF de {tipo} {documento_id}: {e}")
+
+
+def _programar_regeneracion_pdf(tipo, documento_id):
+    """Regenera el PDF de un documento en segundo plano tras una edición
+
+    Las ediciones seguidas del mismo documento reinician la espera, así el PDF
+    se genera una sola vez cuando el usuario termina de editar.
+    """
+    clave = (tipo, documento_id)
+    timer = Timer(PDF_REGENERACION_DEMORA, _regenerar_pdf,
+                  args=(tipo, documento_id, request.host_url))
+    timer.daemon = True
+    with _regeneraciones_pdf_lock:
+        anterior = _regeneraciones_pdf.get(clave)
+        if anterior:
+            anterior.cancel()
+        _regeneraciones_pdf[clave] = timer
+    timer.start()
+
+
+@app.errorhandler(pool_pdf.ColaPDFLlena)
+def _cola_pdf_llena(e):
+    response = make_response(str(e), 503)
+    response.headers['Retry-After'] = '5'
+    return response
+
+
+@app.after_request
+def _regenerar_pdf_tras_edicion(response):
+    if request.method != 'POST' or response.status_code >= 400:
+        return response
+    view_args = request.view_args or {}
+    if request.endpoint in _ENDPOINTS_EDICION_LISTAS:
+        lista_id = (view_args.get('lista_id') or view_args.get('id')
+                    or request.form.get('lista_id') or request.form.get('presupuesto_id'))
+        try:
+            lista_id = int(lista_id) if lista_id else None
+        except ValueError:
+            lista_id = None
+        if lista_id:
+            _programar_regeneracion_pdf('lista', lista_id)
+    elif request.endpoint == 'api_actualizar_factura':
+        _programar_regeneracion_pdf('factura', view_args['factura_id'])
+    return response
+
+
+@app.after_request
+def _olvidar_version_datos_tras_escritura(response):
+    # La versión de datos se reutiliza unos segundos por proceso: tras una
+    # escritura, este worker la vuelve a leer para que sus reportes la reflejen
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        financiero.olvidar_version_datos_financieros()
+    return response
+
+
+@app.route("/listas-materiales/<int:id>/pdf", methods=["GET"], endpoint="listas_materiales_pdf")
+@app.route("/listas-materiales/<int:id>/pdf", methods=["GET"], endpoint="listas_materiales_pdf")
+def listas_materiales_pdf(id):
+    """Generar/visualizar PDF del presupuesto"""
+    response, datos, html, error = _pdf_documento('lista', id, lambda datos: f'presupuesto_{id}.pdf')
+    if datos is None:
+        return "Presupuesto no encontrado", 404
+    if response is not None:
+        return response
+
+    mensaje = (
+        "<p style='padding:10px; background:#fff3cd;'>"
+        "⚠️ No se pudo generar el PDF automáticamente."
+        "<br>• Si deseas exportar a PDF desde la aplicación instala la dependencia opcional "
+        "<code>weasyprint</code> y sus librerías del sistema (GTK/GObject)."
+        "<br>• Error reportado: <code>{error}</code>"
+        "<br>Mostrando vista previa imprimible."
+        "</p>"
+    ).format(error=error)
+    return mensaje + html
 
 # ==================== RUTAS DE ITEMS MANO DE OBRA ====================
 
@@ -3254,81 +3512,101 @@ def facturacion_generar():
                              error=f'Error al generar factura: {str(e)}')
 
 
+def _impuesto_item(valor):
+    """Impuesto de un item recibido por la API: 'exc', '5' o '10'
+
+    En JSON suele llegar como número (10); calcular_totales compara contra los
+    textos, así que un valor fuera de esos tres dejaría el item fuera de los totales.
+    """
+    if valor is None or valor == '':
+        return 'exc'
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    impuesto = str(valor).strip().lower()
+    if isinstance(valor, bool) or impuesto not in ('exc', '5', '10'):
+        raise ValueError(f"Impuesto inválido: {valor!r} (use 'exc', '5' o '10')")
+    return impuesto
+
+
+@app.route("/api/facturacion/crear-facturas", methods=["POST"])
+@auth.login_required
+@auth.permission_required('/facturacion')
+def api_crear_facturas():
+    """API para crear varias facturas en una sola transacción (facturación recurrente)
+    
+    Recibe {"facturas": [{fecha, cliente, ruc, direccion, remision, moneda,
+    tipo_venta, plazo_dias, items: [{cantidad, descripcion, precio_unitario,
+    impuesto}]}]}. Si alguna factura es inválida no se crea ninguna.
+    """
+    data = request.get_json(silent=True) or {}
+    facturas_data = data.get('facturas')
+    if not isinstance(facturas_data, list) or not facturas_data:
+        return jsonify({'error': 'Debe enviar una lista de facturas'}), 400
+    if len(facturas_data) > FACTURAS_LOTE_MAX:
+        return jsonify({'error': f'Máximo {FACTURAS_LOTE_MAX} facturas por solicitud'}), 400
+
+    facturas_a_crear = []
+    for i, factura in enumerate(facturas_data):
+        try:
+            fecha = datetime.strptime(str(factura.get('fecha', '')).strip(), "%Y-%m-%d").date()
+            cliente = _to_upper(str(factura.get('cliente') or '').strip())
+            if not cliente:
+                raise ValueError('El cliente es obligatorio')
+            moneda = factura.get('moneda') or 'Gs'
+            tipo_venta = factura.get('tipo_venta') or 'Contado'
+            if moneda not in ('Gs', 'USD') or tipo_venta not in ('Contado', 'Crédito'):
+                raise ValueError('Moneda o tipo de venta inválido')
+            plazo_dias = int(factura['plazo_dias']) if tipo_venta == 'Crédito' and factura.get('plazo_dias') else None
+            items = [{
+                'cantidad': float(item['cantidad']),
+                'descripcion': _to_upper(str(item['descripcion']).strip()),
+                'precio_unitario': float(item['precio_unitario']),
+                'impuesto': _impuesto_item(item.get('impuesto')),
+            } for item in factura.get('items') or []]
+            if not items:
+                raise ValueError('Debe tener al menos un item')
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({'error': f'Factura {i + 1}: {e}'}), 400
+
+        facturas_a_crear.append({
+            'fecha': fecha,
+            'cliente': cliente,
+            'ruc': str(factura.get('ruc') or '').strip() or None,
+            'direccion': str(factura.get('direccion') or '').strip() or None,
+            'nota_remision': str(factura.get('remision') or '').strip() or None,
+            'moneda': moneda,
+            'tipo_venta': tipo_venta,
+            'plazo_dias': plazo_dias,
+            'items': items,
+        })
+
+    try:
+        ids = facturacion.crear_facturas(facturas_a_crear)
+        return jsonify({'success': True, 'ids': ids}), 201
+    except Exception as e:
+        return jsonify({'error': f'Error al crear facturas: {str(e)}'}), 500
+
+
 @app.route("/facturacion/<int:id>/pdf", methods=["GET"])
 @auth.login_required
 @auth.permission_required('/facturacion')
 def facturacion_pdf(id):
     """Genera el PDF de una factura"""
     try:
-        datos = facturacion.obtener_factura_por_id(id)
-        if not datos:
+        response, datos, html, error = _pdf_documento(
+            'factura', id,
+            lambda datos: f'factura_{datos["factura"]["numero_factura"]}.pdf',
+        )
+        if datos is None:
             return "Factura no encontrada", 404
-        
-        factura = datos['factura']
-        items = datos['items']
-        
-        # Calcular totales
-        items_dict = [{
-            'cantidad': item['cantidad'],
-            'descripcion': item['descripcion'],
-            'precio_unitario': float(item['precio_unitario']),
-            'impuesto': item['impuesto']
-        } for item in items]
-        
-        totales = facturacion.calcular_totales(items_dict)
-        totales['enLetras'] = facturacion.numero_a_letras(totales['total'], True, factura['moneda'])
-        
-        # Formatear fecha
-        fecha_obj = factura['fecha']
-        if isinstance(fecha_obj, str):
-            fecha_obj = datetime.strptime(fecha_obj, "%Y-%m-%d").date()
-        
-        dia = fecha_obj.day
-        mes = fecha_obj.month
-        año = fecha_obj.year
-        fecha_formateada = f"{dia:02d}-{mes:02d}-{año}"
-        
-        factura['fecha_formateada'] = fecha_formateada
-        
-        # Renderizar HTML
-        html = render_template('facturacion/pdf.html',
-                             factura=factura,
-                             items=items,
-                             totales=totales)
-        
-        # Generar PDF - intentar WeasyPrint primero, luego xhtml2pdf como alternativa
-        try:
-            from weasyprint import HTML
-            pdf = HTML(string=html, base_url=request.host_url).write_pdf()
-            response = make_response(pdf)
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'inline; filename=factura_{factura["numero_factura"]}.pdf'
+        if response is not None:
             return response
-        except (ImportError, OSError, Exception) as e:
-            # Si WeasyPrint falla, intentar con xhtml2pdf
-            try:
-                from xhtml2pdf import pisa
-                from io import BytesIO
-                
-                pdf_buffer = BytesIO()
-                pisa_status = pisa.CreatePDF(html, dest=pdf_buffer)
-                
-                if pisa_status.err:
-                    # Si xhtml2pdf falla, mostrar HTML
-                    return html
-                
-                pdf_buffer.seek(0)
-                response = make_response(pdf_buffer.getvalue())
-                response.headers['Content-Type'] = 'application/pdf'
-                response.headers['Content-Disposition'] = f'inline; filename=factura_{factura["numero_factura"]}.pdf'
-                return response
-            except ImportError:
-                # Si ninguna librería está disponible, mostrar HTML
-                return html
-            except Exception as e2:
-                # Si hay otro error, mostrar HTML con mensaje
-                return html + f"<br><br><p style='color:red;'>Nota: No se pudo generar PDF automáticamente. Error: {str(e2)}</p>"
-            
+
+        # Si ninguna librería pudo generar el PDF, mostrar HTML con mensaje
+        return html + f"<br><br><p style='color:red;'>Nota: No se pudo generar PDF automáticamente. Error: {error}</p>"
+
+    except pool_pdf.ColaPDFLlena:
+        raise
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
@@ -3337,6 +3615,197 @@ def facturacion_pdf(id):
         return f"Error: {str(e)}", 500
 
 
+# ==================== PDF DE FACTURAS EN LOTE ====================
+
+# Máximo de facturas que se aceptan en un lote
+FACTURAS_LOTE_MAX = int(os.getenv("FACTURAS_LOTE_MAX", "500"))
+# Directorio de los ZIP/PDF de lotes. Es propio: la caché de exportaciones
+# conserva solo los EXPORTACIONES_CACHE_MAX archivos más nuevos y podría
+# borrar un lote antes de que se descargue. Se eliminan pasado EXPORTACION_PDF_TTL.
+LOTES_FACTURAS_DIR = os.getenv(
+    "LOTES_FACTURAS_DIR", os.path.join(tempfile.gettempdir(), "lotes_facturas")
+)
+
+
+def _podar_lotes_pdf():
+    """Elimina los archivos de lotes generados hace más de EXPORTACION_PDF_TTL"""
+    limite = time.time() - EXPORTACION_PDF_TTL
+    try:
+        for nombre in os.listdir(LOTES_FACTURAS_DIR):
+            ruta = os.path.join(LOTES_FACTURAS_DIR, nombre)
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"[WARN] No se pudieron podar los lotes de facturas: {e}")
+
+
+def _pdf_factura_lote(factura_id, datos, base_url):
+    """PDF de una factura del lote, desde la caché o generándolo en el pool"""
+    clave = _clave_documento_pdf('factura', factura_id, datos)
+    pdf = cache_pdf.obtener_pdf(clave)
+    if pdf is not None:
+        return pdf
+    with app.test_request_context(base_url=base_url):
+        html = _html_documento_pdf('factura', datos)
+    while True:
+        try:
+            pdf = pool_pdf.renderizar_pdf(html, base_url=base_url)
+            break
+        except pool_pdf.ColaPDFLlena:
+            # El lote cede el lugar a los PDF pedidos desde la web
+            time.sleep(1)
+    cache_pdf.guardar_pdf(clave, pdf)
+    return pdf
+
+
+def _run_lote_pdf_job(lote_id, estado, ids, fecha_desde, fecha_hasta, base_url):
+    formato = estado['formato']
+    try:
+        facturas_lote = facturacion.obtener_facturas_con_items(
+            ids=ids, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta, limite=FACTURAS_LOTE_MAX
+        )
+        if not facturas_lote:
+            raise ValueError('No hay facturas para los filtros indicados')
+
+        documentos = [(d['factura']['id'], _preparar_datos_pdf_factura(d)) for d in facturas_lote]
+        estado['estado'] = 'renderizando'
+        estado['total'] = len(documentos)
+        exportar_reportes.guardar_estado_exportacion(lote_id, estado)
+
+        if formato == 'pdf':
+            with app.test_request_context(base_url=base_url):
+                htmls = [_html_documento_pdf('factura', datos) for _, datos in documentos]
+            # Un PDF unido se arma en un solo proceso del pool, su tiempo crece con el lote
+            timeout = pool_pdf.PDF_POOL_TIMEOUT * max(1, len(htmls) // 10)
+            contenido = pool_pdf.renderizar_pdf_unido(htmls, base_url=base_url, timeout=timeout)
+            estado['generados'] = len(documentos)
+        else:
+            buffer = io.BytesIO()
+            # Los PDF ya vienen comprimidos: el ZIP solo los agrupa
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archivo_zip, \
+                    ThreadPoolExecutor(max_workers=max(1, pool_pdf.PDF_POOL_PROCESOS)) as ejecutor:
+                futuros = {
+                    ejecutor.submit(_pdf_factura_lote, factura_id, datos, base_url): datos
+                    for factura_id, datos in documentos
+                }
+                for futuro in as_completed(futuros):
+                    numero = futuros[futuro]['factura']['numero_factura']
+                    archivo_zip.writestr(f"factura_{numero}.pdf", futuro.result())
+                    estado['generados'] += 1
+                    exportar_reportes.guardar_estado_exportacion(lote_id, estado)
+            contenido = buffer.getvalue()
+
+        os.makedirs(LOTES_FACTURAS_DIR, exist_ok=True)
+        temporal = f"{estado['ruta']}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, estado['ruta'])
+        estado['estado'] = 'terminado'
+    except Exception as e:
+        print(f"❌ Error al generar lote de facturas: {e}")
+        estado['estado'] = 'error'
+        estado['error'] = str(e)
+    exportar_reportes.guardar_estado_exportacion(lote_id, estado)
+
+
+@app.route("/facturacion/lote/pdf", methods=["GET"], endpoint="facturacion_lote_pdf")
+@auth.login_required
+@auth.permission_required('/facturacion')
+def facturacion_lote_pdf():
+    """Genera en segundo plano un ZIP o un PDF unido con varias facturas
+    
+    Las facturas se eligen por IDs (ids=1,2,3) y/o por rango de fechas
+    (desde/hasta en formato YYYY-MM-DD). formato=zip (por defecto) o pdf.
+    """
+    formato = request.args.get('formato', 'zip')
+    if formato not in ('zip', 'pdf'):
+        return "Formato no válido", 400
+
+    try:
+        ids = [int(i) for valor in request.args.getlist('ids') for i in valor.split(',') if i.strip()]
+        fecha_desde = request.args.get('desde') or None
+        fecha_hasta = request.args.get('hasta') or None
+        if fecha_desde:
+            fecha_desde = datetime.strptime(fecha_desde, "%Y-%m-%d").date()
+        if fecha_hasta:
+            fecha_hasta = datetime.strptime(fecha_hasta, "%Y-%m-%d").date()
+    except ValueError:
+        return "IDs o fechas inválidos", 400
+    if not ids and not (fecha_desde or fecha_hasta):
+        return "Indique IDs de facturas o un rango de fechas", 400
+
+    # Se cuenta hasta FACTURAS_LOTE_MAX + 1: alcanza para rechazar el lote sin recorrer todo el rango
+    cantidad = facturacion.contar_facturas(ids=ids, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+                                           limite=FACTURAS_LOTE_MAX + 1)
+    if cantidad == 0:
+        return "No hay facturas para los filtros indicados", 404
+    if cantidad > FACTURAS_LOTE_MAX:
+        return f"El lote supera el máximo de {FACTURAS_LOTE_MAX} facturas; acote el rango de fechas", 400
+
+    _podar_lotes_pdf()
+    exportar_reportes.podar_estados_exportacion(EXPORTACION_PDF_TTL)
+    lote_id = uuid.uuid4().hex
+    # El estado se guarda en disco para que cualquier worker responda por el lote
+    estado = {
+        'tipo': 'lote_facturas',
+        'estado': 'procesando',
+        'formato': formato,
+        'ruta': os.path.join(LOTES_FACTURAS_DIR, f"facturas_{lote_id}.{formato}"),
+        'total': cantidad,
+        'generados': 0,
+        'iniciado_en': time.time(),
+    }
+    exportar_reportes.guardar_estado_exportacion(lote_id, estado)
+    t = Thread(target=_run_lote_pdf_job,
+               args=(lote_id, estado, ids, fecha_desde, fecha_hasta, request.host_url),
+               daemon=True)
+    t.start()
+
+    estado_url = url_for('facturacion_lote_pdf_estado', lote_id=lote_id)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'lote_id': lote_id, 'estado_url': estado_url}), 202
+    return render_template('reportes/exportacion_pdf.html', estado_url=estado_url)
+
+
+@app.route("/facturacion/lote/<lote_id>/estado", methods=["GET"], endpoint="facturacion_lote_pdf_estado")
+@auth.login_required
+@auth.permission_required('/facturacion')
+def facturacion_lote_pdf_estado(lote_id):
+    """Estado y progreso de un lote de facturas"""
+    estado = exportar_reportes.leer_estado_exportacion(lote_id) or {}
+    if estado.get('tipo') != 'lote_facturas':
+        return jsonify({'error': 'Lote no encontrado'}), 404
+
+    respuesta = {
+        'estado': estado['estado'],
+        'error': estado.get('error'),
+        'total': estado['total'],
+        'generados': estado['generados'],
+    }
+    if estado['estado'] == 'terminado':
+        respuesta['descargar_url'] = url_for('facturacion_lote_pdf_descargar', lote_id=lote_id)
+    return jsonify(respuesta)
+
+
+@app.route("/facturacion/lote/<lote_id>/descargar", methods=["GET"], endpoint="facturacion_lote_pdf_descargar")
+@auth.login_required
+@auth.permission_required('/facturacion')
+def facturacion_lote_pdf_descargar(lote_id):
+    """Descarga el ZIP o PDF de un lote de facturas"""
+    estado = exportar_reportes.leer_estado_exportacion(lote_id) or {}
+    if estado.get('tipo') != 'lote_facturas':
+        return "Lote no encontrado", 404
+    if estado['estado'] != 'terminado' or not os.path.exists(estado['ruta']):
+        return "El lote no está disponible", 409
+    formato = estado['formato']
+    return send_file(estado['ruta'],
+                     mimetype='application/zip' if formato == 'zip' else 'application/pdf',
+                     as_attachment=True,
+                     download_name=f"facturas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}")
+
+
 @app.route("/reportes/cuentas-a-pagar", methods=["GET"], endpoint="reportes_cuentas_a_pagar_index")
 @auth.login_required
 @auth.permission_required('/reportes/cuentas-a-pagar')
@@ -3426,22 +3895,24 @@ def reportes_analisis_index():
     proyectos = financiero.obtener_proyectos(activo=True)
     bancos = financiero.obtener_bancos(activo=True)
     
-    # Obtener datos del dashboard
-    saldos_bancos = reportes_clientes.obtener_saldos_bancos()
-    receita_mensual_raw = reportes_clientes.obtener_receita_bruta_mensual(
-        ano=ano, proyecto_id=proyecto_id, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
-        tipo_reporte=tipo_reporte
-    )
-    custos_mensual_raw = reportes_clientes.obtener_custos_despesas_mensual(
-        ano=ano, proyecto_id=proyecto_id, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
-        tipo_reporte=tipo_reporte
-    )
-    flujo_caja = reportes_clientes.obtener_flujo_caja_mensual(
-        ano=ano, proyecto_id=proyecto_id, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta
-    )
-    evolucion_saldo = reportes_clientes.obtener_evolucion_saldo_mensual(
-        banco_id=banco_id, ano=ano, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta
-    )
+    # Obtener datos del dashboard (consultas independientes, en paralelo)
+    filtros = dict(ano=ano, proyecto_id=proyecto_id, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
+    datos, tiempos_reportes = reportes_clientes.ejecutar_reportes_en_paralelo({
+        'saldos_bancos': (reportes_clientes.obtener_saldos_bancos, None, []),
+        'receita_mensual': (reportes_clientes.obtener_receita_bruta_mensual,
+                            dict(filtros, tipo_reporte=tipo_reporte), []),
+        'custos_mensual': (reportes_clientes.obtener_custos_despesas_mensual,
+                           dict(filtros, tipo_reporte=tipo_reporte), []),
+        'flujo_caja': (reportes_clientes.obtener_flujo_caja_mensual, filtros, []),
+        'evolucion_saldo': (reportes_clientes.obtener_evolucion_saldo_mensual,
+                            dict(filtros, banco_id=banco_id), []),
+    })
+    saldos_bancos = datos['saldos_bancos']
+    receita_mensual_raw = datos['receita_mensual']
+    custos_mensual_raw = datos['custos_mensual']
+    flujo_caja = datos['flujo_caja']
+    evolucion_saldo = datos['evolucion_saldo']
+    reportes_fallidos = [nombre for nombre, t in tiempos_reportes.items() if t['estado'] != 'ok']
     
     # Convertir datos a formato JSON-friendly (convertir Decimal a int/float)
     receita_mensual = []
@@ -3466,24 +3937,31 @@ def reportes_analisis_index():
     total_lucro = total_receita - total_custos
     total_saldo_bancos = sum(float(s['saldo_actual'] or 0) for s in saldos_bancos)
     
-    return render_template('reportes/analisis.html',
-                         saldos_bancos=saldos_bancos,
-                         receita_mensual=receita_mensual,
-                         custos_mensual=custos_mensual,
-                         flujo_caja=flujo_caja,
-                         evolucion_saldo=evolucion_saldo,
-                         total_receita=total_receita,
-                         total_custos=total_custos,
-                         total_lucro=total_lucro,
-                         total_saldo_bancos=total_saldo_bancos,
-                         proyectos=proyectos,
-                         bancos=bancos,
-                         fecha_desde=fecha_desde or '',
-                         fecha_hasta=fecha_hasta or '',
-                         ano=ano or date.today().year,
-                         proyecto_id=proyecto_id,
-                         banco_id=banco_id,
-                         tipo_reporte=tipo_reporte)
+    respuesta = make_response(render_template('reportes/analisis.html',
+                                              saldos_bancos=saldos_bancos,
+                                              receita_mensual=receita_mensual,
+                                              custos_mensual=custos_mensual,
+                                              flujo_caja=flujo_caja,
+                                              evolucion_saldo=evolucion_saldo,
+                                              total_receita=total_receita,
+                                              total_custos=total_custos,
+                                              total_lucro=total_lucro,
+                                              total_saldo_bancos=total_saldo_bancos,
+                                              proyectos=proyectos,
+                                              bancos=bancos,
+                                              fecha_desde=fecha_desde or '',
+                                              fecha_hasta=fecha_hasta or '',
+                                              ano=ano or date.today().year,
+                                              proyecto_id=proyecto_id,
+                                              banco_id=banco_id,
+                                              tipo_reporte=tipo_reporte,
+                                              tiempos_reportes=tiempos_reportes,
+                                              reportes_fallidos=reportes_fallidos))
+    # Tiempos por consulta visibles en las herramientas de desarrollo del navegador
+    respuesta.headers['Server-Timing'] = ', '.join(
+        f"{nombre};dur={t['segundos'] * 1000:.1f}" for nombre, t in tiempos_reportes.items()
+    )
+    return respuesta
 
 
 @app.route("/reportes/cuentas-a-recibir", methods=["GET"], endpoint="reportes_cuentas_a_recibir_index")
@@ -3639,6 +4117,9 @@ def reportes_conciliacion_bancaria_index():
     banco_id = request.args.get('banco_id', type=int)
     anio = request.args.get('anio', type=int, default=datetime.now().year)
     mes = request.args.get('mes', type=int, default=datetime.now().month)
+    # Rango de meses opcional (hasta, inclusive)
+    anio_hasta = request.args.get('anio_hasta', type=int)
+    mes_hasta = request.args.get('mes_hasta', type=int)
     
     # Obtener lista de bancos
     bancos = financiero.obtener_bancos(activo=True)
@@ -3652,7 +4133,9 @@ def reportes_conciliacion_bancaria_index():
     
     if banco_id:
         try:
-            conciliacion = reportes_clientes.obtener_conciliacion_bancaria(banco_id, anio, mes)
+            conciliacion = reportes_clientes.obtener_conciliacion_bancaria(
+                banco_id, anio, mes, anio_hasta=anio_hasta, mes_hasta=mes_hasta
+            )
             if not conciliacion:
                 error = 'Banco no encontrado'
         except Exception as e:
@@ -3663,10 +4146,187 @@ def reportes_conciliacion_bancaria_index():
                          banco_id=banco_id,
                          anio=anio,
                          mes=mes,
+                         anio_hasta=anio_hasta,
+                         mes_hasta=mes_hasta,
                          conciliacion=conciliacion,
                          error=error)
 
 
+@app.route("/reportes/cache/estadisticas", methods=["GET"], endpoint="reportes_cache_estadisticas")
+@auth.login_required
+@auth.permission_required('/reportes/analisis')
+def reportes_cache_estadisticas():
+    """Tasa de aciertos y tamaño de la caché de reportes financieros"""
+    return jsonify(reportes_clientes.estadisticas_cache_reportes())
+
+
+@app.route("/reportes/pdf/estadisticas", methods=["GET"], endpoint="reportes_pdf_estadisticas")
+@auth.login_required
+@auth.permission_required('/reportes/analisis')
+def reportes_pdf_estadisticas():
+    """Cola, errores y tiempos de generación del pool de PDF"""
+    return jsonify(pool_pdf.estadisticas_pool())
+
+
+# ==================== EXPORTACIÓN DE REPORTES ====================
+
+# Segundos que se conserva el estado de una exportación PDF en segundo plano
+EXPORTACION_PDF_TTL = 3600
+
+
+def _exportacion_pdf_vencida(estado):
+    """Una exportación en curso desde hace más que el timeout del PDF ya no va a terminar
+
+    El renderizado falla por timeout a los PDF_POOL_TIMEOUT segundos y deja el
+    estado en 'error'; si sigue 'procesando' o 'renderizando' es porque el worker
+    que la hacía se reinició o murió sin llegar a guardar el resultado.
+    """
+    return (estado['estado'] in ('procesando', 'renderizando')
+            and time.time() - estado.get('iniciado_en', 0) > pool_pdf.PDF_POOL_TIMEOUT)
+
+
+def _usuario_puede_exportar(reporte):
+    """El permiso para exportar un reporte es el mismo que para ver su página"""
+    usuario = auth.get_current_user()
+    if not usuario:
+        return False
+    if usuario.get('es_admin'):
+        return True
+    return auth.usuario_tiene_permiso(usuario['id'], exportar_reportes.permiso_reporte(reporte))
+
+
+def _run_exportacion_pdf_job(exportacion_id, estado, filtros, base_url):
+    reporte = estado['reporte']
+    try:
+        titulo, encabezados, filas = exportar_reportes.filas_reporte(reporte, filtros)
+        with app.app_context():
+            html = render_template('reportes/exportar_pdf.html',
+                                   titulo=titulo,
+                                   encabezados=encabezados,
+                                   filas=filas,
+                                   generado_en=datetime.now())
+        estado['estado'] = 'renderizando'
+        exportar_reportes.guardar_estado_exportacion(exportacion_id, estado)
+        pdf = exportar_reportes.html_a_pdf(html, base_url=base_url)
+        exportar_reportes.guardar_exportacion(estado['ruta'], pdf)
+        estado['estado'] = 'terminado'
+    except Exception as e:
+        print(f"❌ Error al exportar PDF de {reporte}: {e}")
+        estado['estado'] = 'error'
+        estado['error'] = str(e)
+    exportar_reportes.guardar_estado_exportacion(exportacion_id, estado)
+
+
+def _iniciar_exportacion_pdf(reporte, filtros, ruta):
+    """Lanza el renderizado del PDF en segundo plano y retorna su ID
+    
+    El ID es el nombre del archivo a generar y el estado se guarda en disco:
+    cualquier worker responde por la exportación, y si ya hay una en curso del
+    mismo archivo (aunque la haya iniciado otro worker) se reutiliza, salvo que
+    esté vencida (ver _exportacion_pdf_vencida): entonces se lanza de nuevo.
+    """
+    exportacion_id = os.path.splitext(os.path.basename(ruta))[0]
+    exportar_reportes.podar_estados_exportacion(EXPORTACION_PDF_TTL)
+    estado = exportar_reportes.leer_estado_exportacion(exportacion_id)
+    if estado and estado['estado'] in ('procesando', 'renderizando') and not _exportacion_pdf_vencida(estado):
+        return exportacion_id
+    estado = {
+        'tipo': 'reporte',
+        'estado': 'procesando',
+        'reporte': reporte,
+        'ruta': ruta,
+        'iniciado_en': time.time(),
+    }
+    exportar_reportes.guardar_estado_exportacion(exportacion_id, estado)
+    t = Thread(target=_run_exportacion_pdf_job,
+               args=(exportacion_id, estado, filtros, request.host_url),
+               daemon=True)
+    t.start()
+    return exportacion_id
+
+
+def _nombre_archivo_exportacion(reporte, formato):
+    extension = exportar_reportes.FORMATOS[formato][1]
+    return f"{reporte}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+
+@app.route("/reportes/exportar/<reporte>.<formato>", methods=["GET"], endpoint="reportes_exportar")
+@auth.login_required
+def reportes_exportar(reporte, formato):
+    """Exporta un reporte a CSV o XLSX (en streaming) o a PDF (en segundo plano)
+    
+    Los filtros son los mismos parámetros que usa la página del reporte.
+    """
+    if reporte not in exportar_reportes.REPORTES or formato not in exportar_reportes.FORMATOS:
+        return "Reporte o formato no válido", 404
+    if not _usuario_puede_exportar(reporte):
+        return redirect(url_for('menu', error='No tienes permiso para exportar este reporte'))
+    
+    try:
+        filtros = exportar_reportes.normalizar_filtros(reporte, request.args)
+    except ValueError as e:
+        return str(e), 400
+    
+    mimetype = exportar_reportes.FORMATOS[formato][0]
+    ruta = exportar_reportes.ruta_exportacion(reporte, formato, filtros)
+    
+    # Misma exportación con los mismos datos: se entrega el archivo ya generado
+    if exportar_reportes.exportacion_en_cache(ruta):
+        return send_file(ruta, mimetype=mimetype, as_attachment=True,
+                         download_name=_nombre_archivo_exportacion(reporte, formato))
+    
+    if formato == 'pdf':
+        exportacion_id = _iniciar_exportacion_pdf(reporte, filtros, ruta)
+        estado_url = url_for('reportes_exportar_pdf_estado', exportacion_id=exportacion_id)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'exportacion_id': exportacion_id, 'estado_url': estado_url}), 202
+        return render_template('reportes/exportacion_pdf.html', estado_url=estado_url)
+    
+    try:
+        titulo, encabezados, filas = exportar_reportes.filas_reporte(reporte, filtros)
+    except ValueError as e:
+        return str(e), 404
+    
+    if formato == 'csv':
+        partes = exportar_reportes.csv_en_partes(encabezados, filas)
+    else:
+        partes = exportar_reportes.xlsx_en_partes(titulo, encabezados, filas)
+    
+    response = Response(exportar_reportes.guardar_mientras_se_envia(ruta, partes), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={_nombre_archivo_exportacion(reporte, formato)}'
+    return response
+
+
+@app.route("/reportes/exportar/pdf/<exportacion_id>/estado", methods=["GET"], endpoint="reportes_exportar_pdf_estado")
+@auth.login_required
+def reportes_exportar_pdf_estado(exportacion_id):
+    """Estado de una exportación PDF en segundo plano"""
+    estado = exportar_reportes.leer_estado_exportacion(exportacion_id) or {}
+    if estado.get('tipo') != 'reporte' or not _usuario_puede_exportar(estado['reporte']):
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    if _exportacion_pdf_vencida(estado):
+        estado['estado'] = 'error'
+        estado['error'] = f'El PDF no se generó en {pool_pdf.PDF_POOL_TIMEOUT} segundos'
+    
+    respuesta = {'estado': estado['estado'], 'error': estado.get('error')}
+    if estado['estado'] == 'terminado':
+        respuesta['descargar_url'] = url_for('reportes_exportar_pdf_descargar', exportacion_id=exportacion_id)
+    return jsonify(respuesta)
+
+
+@app.route("/reportes/exportar/pdf/<exportacion_id>/descargar", methods=["GET"], endpoint="reportes_exportar_pdf_descargar")
+@auth.login_required
+def reportes_exportar_pdf_descargar(exportacion_id):
+    """Descarga el PDF generado en segundo plano"""
+    estado = exportar_reportes.leer_estado_exportacion(exportacion_id) or {}
+    if estado.get('tipo') != 'reporte' or not _usuario_puede_exportar(estado['reporte']):
+        return "Exportación no encontrada", 404
+    if estado['estado'] != 'terminado' or not exportar_reportes.exportacion_en_cache(estado['ruta']):
+        return "La exportación no está disponible", 409
+    return send_file(estado['ruta'], mimetype='application/pdf', as_attachment=True,
+                     download_name=_nombre_archivo_exportacion(estado['reporte'], 'pdf'))
+
+
 @app.route("/api/facturacion/eliminar-factura/<int:factura_id>", methods=["DELETE"])
 @auth.login_required
 @auth.permission_required('/facturacion')
@@ -4765,6 +5425,42 @@ def cuenta_a_recibir_agregar_pago(id):
         return jsonify({'success': False, 'error': f'Error al agregar pago: {str(e)}'}), 500
 
 
+def _leer_pagos_lote_request():
+    """Obtiene la lista de pagos de un POST en lote (JSON {'pagos': [...]} o archivo CSV de extracto)
+
+    Retorna (pagos, errores).
+    """
+    if 'archivo_csv' in request.files and request.files['archivo_csv'].filename:
+        archivo = request.files['archivo_csv']
+        if not archivo.filename.endswith('.csv'):
+            return [], ['El archivo debe ser CSV']
+        return financiero.leer_pagos_csv(archivo.read().decode('utf-8'))
+    
+    data = request.get_json(silent=True) or {}
+    pagos = data.get('pagos')
+    if not isinstance(pagos, list):
+        return [], ['Se esperaba una lista de pagos o un archivo CSV']
+    return pagos, []
+
+
+@app.route("/financiero/cuentas-a-recibir/agregar-pagos-lote", methods=["POST"], endpoint="cuentas_a_recibir_agregar_pagos_lote")
+@auth.login_required
+@auth.permission_required('/financiero/cuentas-a-recibir')
+def cuentas_a_recibir_agregar_pagos_lote():
+    """Registrar muchos pagos de cuentas a recibir en una sola transacción"""
+    try:
+        pagos, errores = _leer_pagos_lote_request()
+        if errores:
+            return jsonify({'success': False, 'error': 'Errores en los datos', 'errores': errores}), 400
+        
+        resumen = financiero.registrar_pagos_lote_cuentas_a_recibir(pagos)
+        return jsonify({'success': True, 'mensaje': f"Se registraron {resumen['pagos_aplicados']} pago(s)", 'resumen': resumen})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Error en los datos: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error al registrar pagos: {str(e)}'}), 500
+
+
 @app.route("/financiero/cuentas-a-recibir/exportar-csv", methods=["GET"], endpoint="cuentas_a_recibir_exportar_csv")
 @auth.login_required
 @auth.permission_required('/financiero/cuentas-a-recibir')
@@ -5255,6 +5951,24 @@ def cuenta_a_pagar_agregar_pago(id):
         return jsonify({'success': False, 'error': f'Error al agregar pago: {str(e)}'}), 500
 
 
+@app.route("/financiero/cuentas-a-pagar/agregar-pagos-lote", methods=["POST"], endpoint="cuentas_a_pagar_agregar_pagos_lote")
+@auth.login_required
+@auth.permission_required('/financiero/cuentas-a-pagar')
+def cuentas_a_pagar_agregar_pagos_lote():
+    """Registrar muchos pagos de cuentas a pagar en una sola transacción"""
+    try:
+        pagos, errores = _leer_pagos_lote_request()
+        if errores:
+            return jsonify({'success': False, 'error': 'Errores en los datos', 'errores': errores}), 400
+        
+        resumen = financiero.registrar_pagos_lote_cuentas_a_pagar(pagos)
+        return jsonify({'success': True, 'mensaje': f"Se registraron {resumen['pagos_aplicados']} pago(s)", 'resumen': resumen})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Error en los datos: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error al registrar pagos: {str(e)}'}), 500
+
+
 @app.route("/financiero/cuentas-a-pagar/exportar-csv", methods=["GET"], endpoint="cuentas_a_pagar_exportar_csv")
 @auth.login_required
 @auth.permission_required('/financiero/cuentas-a-pagar')
@@ -5290,6 +6004,50 @@ def cuentas_a_pagar_exportar_csv():
         return redirect(url_for('cuentas_a_pagar_index', error=f'Error al exportar CSV: {str(e)}'))
 
 
+# Filas que se validan dentro del request para la previsualización; el resto
+# del archivo se valida en un hilo en segundo plano
+PREVISUALIZACION_CSV_MUESTRA = 50
+# Segundos que se conserva el resultado de una validación en segundo plano
+VALIDACION_CSV_TTL = 3600
+
+
+def _run_validacion_csv_job(validacion_id, estado, csv_content):
+    # El estado se guarda en disco (como el de las exportaciones) porque la
+    # consulta de progreso puede llegar a cualquier worker de gunicorn
+    def progreso(filas_procesadas, filas_estimadas):
+        estado['filas_procesadas'] = filas_procesadas
+        estado['progreso'] = min(100, int(filas_procesadas * 100 / filas_estimadas)) if filas_estimadas else 100
+        exportar_reportes.guardar_estado_exportacion(validacion_id, estado)
+    
+    try:
+        resumen = financiero.validar_cuentas_a_pagar_csv(csv_content, progreso=progreso)
+        estado.update(resumen)
+        estado['estado'] = 'terminado'
+    except Exception as e:
+        print(f"❌ Error al validar CSV: {e}")
+        estado['estado'] = 'error'
+        estado['error'] = str(e)
+    exportar_reportes.guardar_estado_exportacion(validacion_id, estado)
+
+
+def _iniciar_validacion_csv(csv_content):
+    """Lanza la validación completa del CSV en segundo plano y retorna su ID"""
+    validacion_id = uuid.uuid4().hex
+    # Descartar resultados viejos
+    exportar_reportes.podar_estados_exportacion(VALIDACION_CSV_TTL)
+    estado = {
+        'tipo': 'validacion_csv',
+        'estado': 'procesando',
+        'progreso': 0,
+        'filas_procesadas': 0,
+        'iniciado_en': time.time(),
+    }
+    exportar_reportes.guardar_estado_exportacion(validacion_id, estado)
+    t = Thread(target=_run_validacion_csv_job, args=(validacion_id, estado, csv_content), daemon=True)
+    t.start()
+    return validacion_id
+
+
 @app.route("/financiero/cuentas-a-pagar/previsualizar-csv", methods=["POST"], endpoint="cuentas_a_pagar_previsualizar_csv")
 @auth.login_required
 @auth.permission_required('/financiero/cuentas-a-pagar')
@@ -5307,22 +6065,43 @@ def cuentas_a_pagar_previsualizar_csv():
             return jsonify({'error': 'El archivo debe ser CSV'}), 400
         
         csv_content = archivo.read().decode('utf-8')
-        datos_previsualizacion, errores = financiero.previsualizar_cuentas_a_pagar_csv(csv_content)
+        # Se lee una fila más que la muestra para saber si el archivo la supera
+        datos_previsualizacion, _ = financiero.previsualizar_cuentas_a_pagar_csv(
+            csv_content, limite=PREVISUALIZACION_CSV_MUESTRA + 1)
+        completo = len(datos_previsualizacion) <= PREVISUALIZACION_CSV_MUESTRA
+        datos_previsualizacion = datos_previsualizacion[:PREVISUALIZACION_CSV_MUESTRA]
         
         # Guardar el contenido CSV en sesión para importarlo después
         session['csv_content_para_importar'] = csv_content
         
-        return jsonify({
+        respuesta = {
             'datos': datos_previsualizacion,
-            'errores': errores,
+            'errores': [f"Fila {d['fila']}: {'; '.join(d['errores'])}" for d in datos_previsualizacion if not d['valida']],
             'total_filas': len(datos_previsualizacion),
             'filas_validas': sum(1 for d in datos_previsualizacion if d['valida']),
-            'filas_invalidas': sum(1 for d in datos_previsualizacion if not d['valida'])
-        })
+            'filas_invalidas': sum(1 for d in datos_previsualizacion if not d['valida']),
+            'completo': completo,
+        }
+        if not completo:
+            # Archivo grande: se muestra la muestra y el archivo completo se valida en segundo plano
+            respuesta['validacion_id'] = _iniciar_validacion_csv(csv_content)
+        
+        return jsonify(respuesta)
     except Exception as e:
         return jsonify({'error': f'Error al previsualizar CSV: {str(e)}'}), 500
 
 
+@app.route("/financiero/cuentas-a-pagar/previsualizar-csv/<validacion_id>/estado", methods=["GET"], endpoint="cuentas_a_pagar_previsualizar_csv_estado")
+@auth.login_required
+@auth.permission_required('/financiero/cuentas-a-pagar')
+def cuentas_a_pagar_previsualizar_csv_estado(validacion_id):
+    """Progreso y resultado de la validación completa de un CSV de cuentas a pagar"""
+    estado = exportar_reportes.leer_estado_exportacion(validacion_id) or {}
+    if estado.get('tipo') != 'validacion_csv':
+        return jsonify({'error': 'Validación no encontrada'}), 404
+    return jsonify({k: v for k, v in estado.items() if k not in ('tipo', 'iniciado_en')})
+
+
 @app.route("/financiero/cuentas-a-pagar/importar-csv", methods=["POST"], endpoint="cuentas_a_pagar_importar_csv")
 
 
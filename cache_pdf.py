@@ -0,0 +1,111 @@
+"""
+Caché en disco de los PDF de presupuestos y facturas
+
+Cada PDF se guarda con una clave derivada del documento (tipo e id), de los
+datos con los que se renderiza la plantilla y del contenido de la plantilla.
+Si cambia cualquiera de los tres cambia la clave, así que un PDF guardado
+nunca queda desactualizado: simplemente deja de usarse y se elimina al podar.
+La misma clave sirve como ETag de la respuesta.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from threading import Lock
+
+# Directorio de los PDF generados
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cache_pdf"))
+# Tamaño máximo que ocupa la caché en disco (MB)
+PDF_CACHE_MAX_MB = int(os.getenv("PDF_CACHE_MAX_MB", "200"))
+
+# (ruta de la plantilla) -> (mtime, hash)
+_hash_plantillas = {}
+_hash_plantillas_lock = Lock()
+
+
+def hash_plantilla(ruta):
+    """Hash del contenido de una plantilla; se recalcula solo si cambia su mtime"""
+    mtime = os.path.getmtime(ruta)
+    with _hash_plantillas_lock:
+        guardado = _hash_plantillas.get(ruta)
+        if guardado and guardado[0] == mtime:
+            return guardado[1]
+    with open(ruta, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    with _hash_plantillas_lock:
+        _hash_plantillas[ruta] = (mtime, digest)
+    return digest
+
+
+def clave_pdf(tipo, documento_id, datos, ruta_plantilla):
+    """Clave del PDF de un documento para los datos y la plantilla actuales"""
+    version = json.dumps(datos, sort_keys=True, default=str, ensure_ascii=False)
+    clave = '\n'.join([
+        tipo,
+        str(documento_id),
+        hashlib.sha256(version.encode('utf-8')).hexdigest(),
+        hash_plantilla(ruta_plantilla),
+    ])
+    return hashlib.sha256(clave.encode('utf-8')).hexdigest()
+
+
+def _ruta_pdf(clave):
+    return os.path.join(PDF_CACHE_DIR, f"{clave}.pdf")
+
+
+def obtener_pdf(clave):
+    """Devuelve el PDF guardado para la clave, o None si no está en la caché"""
+    ruta = _ruta_pdf(clave)
+    try:
+        with open(ruta, 'rb') as f:
+            pdf = f.read()
+    except OSError:
+        return None
+    try:
+        # Marca el archivo como usado recientemente para la poda
+        os.utime(ruta)
+    except OSError:
+        pass
+    return pdf
+
+
+def pdf_en_cache(clave):
+    """True si ya existe un PDF para la clave"""
+    return os.path.exists(_ruta_pdf(clave))
+
+
+def guardar_pdf(clave, pdf):
+    """Guarda un PDF en la caché y elimina los más viejos si se supera el tamaño máximo"""
+    try:
+        os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        ruta = _ruta_pdf(clave)
+        temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(pdf)
+        os.replace(temporal, ruta)
+    except OSError as e:
+        print(f"[WARN] No se pudo guardar el PDF en caché: {e}")
+        return
+    _podar_cache()
+
+
+def _podar_cache():
+    """Elimina los PDF usados hace más tiempo hasta quedar debajo de PDF_CACHE_MAX_MB"""
+    try:
+        archivos = []
+        for nombre in os.listdir(PDF_CACHE_DIR):
+            if nombre.endswith('.tmp'):
+                continue
+            ruta = os.path.join(PDF_CACHE_DIR, nombre)
+            estado = os.stat(ruta)
+            archivos.append((estado.st_mtime, estado.st_size, ruta))
+        total = sum(tamano for _, tamano, _ in archivos)
+        limite = PDF_CACHE_MAX_MB * 1024 * 1024
+        for _, tamano, ruta in sorted(archivos):
+            if total <= limite:
+                break
+            os.remove(ruta)
+            total -= tamano
+    except OSError as e:
+        print(f"[WARN] No se pudo podar la caché de PDF: {e}")
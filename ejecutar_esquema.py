@@ -169,6 +169,12 @@ def ejecutar_esquema(archivo_sql="schema_presupuestos.sql"):
                         nombre = partes[idx].split('(')[0]
                 except:
                     pass
+            elif 'CREATE EXTENSION' in comando_limpio.upper():
+                tipo = "Extensión"
+                try:
+                    nombre = comando_limpio.rstrip(';').split()[-1]
+                except:
+                    pass
             elif 'CREATE INDEX' in comando_limpio.upper():
                 tipo = "Índice"
             elif 'CREATE VIEW' in comando_limpio.upper() or 'CREATE OR REPLACE VIEW' in comando_limpio.upper():
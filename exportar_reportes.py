@@ -0,0 +1,498 @@
+"""
+Módulo de exportación de reportes
+Convierte los reportes de reportes_clientes a CSV, XLSX y PDF
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+import tempfile
+import uuid
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+import financiero
+import pool_pdf
+import reportes_clientes
+
+# Directorio de los archivos exportados (también funciona como caché en disco)
+EXPORTACIONES_DIR = os.getenv(
+    "EXPORTACIONES_DIR", os.path.join(tempfile.gettempdir(), "exportaciones_reportes")
+)
+# Estado de las exportaciones en segundo plano; se guarda en disco para que
+# cualquier worker de gunicorn pueda responder por una exportación
+EXPORTACIONES_ESTADOS_DIR = os.path.join(EXPORTACIONES_DIR, "estados")
+# Cantidad máxima de archivos exportados que se conservan
+EXPORTACIONES_CACHE_MAX = int(os.getenv("EXPORTACIONES_CACHE_MAX", "50"))
+# Filas que se piden por consulta al exportar reportes paginados
+EXPORTACIONES_LOTE = 500
+# Filas que se acumulan antes de entregar un bloque del archivo
+FILAS_POR_BLOQUE = 200
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'pdf': ('application/pdf', 'pdf'),
+}
+
+MESES_CORTOS = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
+
+
+# ==================== FILAS DE CADA REPORTE ====================
+
+def _fila_mensual(concepto, serie, total=None):
+    """Fila con el concepto, un valor por mes y el total"""
+    return [concepto] + list(serie) + [sum(serie) if total is None else total]
+
+
+def _porcentaje(parte, total):
+    return parte / total * 100 if total else 0
+
+
+def _filas_dre(ano=None, proyecto_id=None):
+    dre = reportes_clientes.obtener_dre_mensual(ano=ano, proyecto_id=proyecto_id)
+    encabezados = ['Concepto'] + MESES_CORTOS + ['Total']
+
+    def filas():
+        meses = dre['meses']
+
+        def serie(campo):
+            return [m[campo] for m in meses]
+
+        def por_categoria(campo, categorias):
+            for cat in categorias:
+                valores = [m[campo].get(cat['id'], 0) for m in meses]
+                if any(valores):
+                    yield _fila_mensual(f"   {cat['nombre']}", valores)
+
+        receita_liquida = sum(serie('receita_liquida'))
+        yield _fila_mensual('Ingresos Brutos', serie('receita_bruta'))
+        yield from por_categoria('ingresos_categoria', dre['categorias_ingresos'])
+        yield _fila_mensual('Deducciones sobre Ventas', serie('deducciones'))
+        yield _fila_mensual('Ingresos Netos', serie('receita_liquida'))
+        yield _fila_mensual('Costos Variables', serie('costos_variables'))
+        yield _fila_mensual('Margen de Contribución', serie('margem_contribuicao'))
+        yield _fila_mensual('% Margen de Contribución', serie('percentual_margem_contribuicao'),
+                            _porcentaje(sum(serie('margem_contribuicao')), receita_liquida))
+        yield _fila_mensual('Gastos', serie('despesas'))
+        yield from por_categoria('gastos_categoria', dre['categorias_gastos'])
+        yield _fila_mensual('Ganancia Operacional', serie('lucro_operacional'))
+        yield _fila_mensual('Resultado Financiero', serie('resultado_financeiro'))
+        yield _fila_mensual('   Ingresos Financieros', serie('ingresos_financieros'))
+        yield _fila_mensual('   Gastos Financieros', serie('gastos_financieros'))
+        yield _fila_mensual('Impuestos Directos', serie('impuestos_directos'))
+        yield _fila_mensual('Ganancia Neta', serie('lucro_liquido'))
+        yield _fila_mensual('% Margen Neto', serie('percentual_margem_liquida'),
+                            _porcentaje(sum(serie('lucro_liquido')), receita_liquida))
+
+    return f"DRE {ano or ''}".strip(), encabezados, filas()
+
+
+def _filas_flujo_caja_mensual(ano=None, proyecto_id=None, tipo_reporte='realizado'):
+    flujo = reportes_clientes.obtener_flujo_caja_mensual_detallado(
+        ano=ano, proyecto_id=proyecto_id, tipo_reporte=tipo_reporte)
+    encabezados = ['Concepto'] + MESES_CORTOS + ['Total']
+
+    def filas():
+        meses = flujo['meses']
+
+        def serie(campo):
+            return [m[campo] for m in meses]
+
+        def por_categoria(campo, categorias):
+            for cat in categorias:
+                yield _fila_mensual(f"   {cat['nombre']}", [m[campo].get(cat['id'], 0) for m in meses])
+
+        yield _fila_mensual('(A) SALDO INICIAL', serie('saldo_inicial'), meses[0]['saldo_inicial'])
+        yield _fila_mensual('(B) ENTRADAS', serie('total_ingresos'))
+        yield from por_categoria('ingresos_categoria', flujo['categorias_ingresos'])
+        yield _fila_mensual('(C) SALIDAS', serie('total_gastos'))
+        yield from por_categoria('gastos_categoria', flujo['categorias_gastos'])
+        yield _fila_mensual('SALDO OPERACIONAL (B - C)', serie('saldo_operacional'))
+        yield _fila_mensual('SALDO FINAL (A + B - C)', serie('saldo_final'), meses[-1]['saldo_final'])
+
+    return f"Flujo de Caja {ano or ''}".strip(), encabezados, filas()
+
+
+def _filas_conciliacion_bancaria(banco_id, anio, mes, anio_hasta=None, mes_hasta=None):
+    conciliacion = reportes_clientes.obtener_conciliacion_bancaria(
+        banco_id, anio, mes, anio_hasta=anio_hasta, mes_hasta=mes_hasta)
+    if not conciliacion:
+        raise ValueError('Banco no encontrado')
+    encabezados = ['Fecha', 'Ingresos del Día', 'Salidas del Día', 'Saldo del Día', 'Saldo Acumulado']
+
+    def filas():
+        yield ['Saldo anterior', None, None, None, conciliacion['saldo_mes_anterior']]
+        for m in conciliacion['movimientos']:
+            yield [m['fecha'], m['ingresos'], m['salidas'], m['saldo_dia'], m['saldo_acumulado']]
+
+    return f"Conciliación Bancaria - {conciliacion['banco_nombre']}", encabezados, filas()
+
+
+def _paginar(funcion, **filtros):
+    """Recorre un reporte paginado en SQL de a EXPORTACIONES_LOTE filas"""
+    offset = 0
+    while True:
+        lote = funcion(**filtros, limite=EXPORTACIONES_LOTE, offset=offset)
+        yield from lote
+        if len(lote) < EXPORTACIONES_LOTE:
+            return
+        offset += EXPORTACIONES_LOTE
+
+
+def _filas_cuentas(funcion, campo_persona, titulo_persona, **filtros):
+    encabezados = ['Factura', 'Fecha Emisión', titulo_persona, 'Descripción', 'Cuenta', 'Proyecto',
+                   'Banco', 'Cuotas', 'Vencimiento', 'Fecha Pago', 'Estado', 'Días Atraso',
+                   'Valor Cuota', 'Monto Abonado', 'Saldo']
+
+    def filas():
+        for r in _paginar(funcion, **filtros):
+            yield [r['numero_factura'], r['fecha_emision'], r[campo_persona], r['descripcion'],
+                   r['cuenta_nombre'], r['proyecto_nombre'], r['banco_nombre'], r['cuotas'],
+                   r['fecha_vencimiento'], r['fecha_pago'], r['estado_pago'], r['dias_atraso'],
+                   r['valor_cuota'], r['monto_abonado'], r['monto']]
+
+    return encabezados, filas()
+
+
+def _filas_cuentas_a_pagar(proveedor_nombre=None, fecha_desde=None, fecha_hasta=None,
+                           estado_pago_filtro=None, tipo_filtro=None):
+    encabezados, filas = _filas_cuentas(
+        reportes_clientes.obtener_reportes_cuentas_a_pagar, 'proveedor', 'Proveedor',
+        proveedor_nombre=proveedor_nombre, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+        estado_pago_filtro=estado_pago_filtro, tipo_filtro=tipo_filtro)
+    return 'Cuentas a Pagar', encabezados, filas
+
+
+def _filas_cuentas_a_recibir(cliente_nombre=None, fecha_desde=None, fecha_hasta=None,
+                             estado_pago_filtro=None, tipo_filtro=None):
+    encabezados, filas = _filas_cuentas(
+        reportes_clientes.obtener_reportes_cuentas_a_recibir, 'cliente', 'Cliente',
+        cliente_nombre=cliente_nombre, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+        estado_pago_filtro=estado_pago_filtro, tipo_filtro=tipo_filtro)
+    return 'Cuentas a Recibir', encabezados, filas
+
+
+# Reporte -> (función que arma las filas, ruta de permiso, {parámetro de la URL: (argumento, tipo)})
+# Los parámetros son los mismos que usa la página HTML de cada reporte.
+REPORTES = {
+    'dre': (_filas_dre, '/reportes/dre', {
+        'ano': ('ano', int),
+        'proyecto_id': ('proyecto_id', int),
+    }),
+    'flujo_caja_mensual': (_filas_flujo_caja_mensual, '/reportes/flujo-caja-mensual', {
+        'ano': ('ano', int),
+        'proyecto_id': ('proyecto_id', int),
+        'tipo_reporte': ('tipo_reporte', str),
+    }),
+    'conciliacion_bancaria': (_filas_conciliacion_bancaria, '/reportes/conciliacion-bancaria', {
+        'banco_id': ('banco_id', int),
+        'anio': ('anio', int),
+        'mes': ('mes', int),
+        'anio_hasta': ('anio_hasta', int),
+        'mes_hasta': ('mes_hasta', int),
+    }),
+    'cuentas_a_pagar': (_filas_cuentas_a_pagar, '/reportes/cuentas-a-pagar', {
+        'proveedor': ('proveedor_nombre', str),
+        'fecha_desde': ('fecha_desde', str),
+        'fecha_hasta': ('fecha_hasta', str),
+        'estado': ('estado_pago_filtro', str),
+        'tipo': ('tipo_filtro', str),
+    }),
+    'cuentas_a_recibir': (_filas_cuentas_a_recibir, '/reportes/cuentas-a-recibir', {
+        'cliente': ('cliente_nombre', str),
+        'fecha_desde': ('fecha_desde', str),
+        'fecha_hasta': ('fecha_hasta', str),
+        'estado': ('estado_pago_filtro', str),
+        'tipo': ('tipo_filtro', str),
+    }),
+}
+
+
+def normalizar_filtros(reporte, argumentos):
+    """Toma de `argumentos` (p. ej. request.args) solo los filtros del reporte, con su tipo.
+
+    Retorna un dict argumento -> valor listo para filas_reporte. Los valores
+    vacíos se descartan. Lanza ValueError si el reporte no existe o un filtro
+    numérico no es válido.
+    """
+    if reporte not in REPORTES:
+        raise ValueError(f"Reporte no válido: {reporte}")
+    filtros = {}
+    for parametro, (argumento, tipo) in REPORTES[reporte][2].items():
+        valor = (argumentos.get(parametro) or '').strip()
+        if valor:
+            try:
+                filtros[argumento] = tipo(valor)
+            except ValueError:
+                raise ValueError(f"Filtro {parametro} no válido: {valor}")
+    return filtros
+
+
+def permiso_reporte(reporte):
+    """Ruta de permiso (la de la página del reporte) que habilita su exportación"""
+    return REPORTES[reporte][1]
+
+
+def filas_reporte(reporte, filtros):
+    """Retorna (titulo, encabezados, iterador de filas) de un reporte"""
+    if reporte not in REPORTES:
+        raise ValueError(f"Reporte no válido: {reporte}")
+    return REPORTES[reporte][0](**filtros)
+
+
+# ==================== FORMATOS ====================
+
+def _texto_celda(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (date, datetime)):
+        return valor.strftime('%d/%m/%Y')
+    return valor
+
+
+def csv_en_partes(encabezados, filas):
+    """Genera el CSV en bloques de bytes a medida que se producen las filas"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(encabezados)
+    for i, fila in enumerate(filas, 1):
+        writer.writerow([_texto_celda(v) for v in fila])
+        if i % FILAS_POR_BLOQUE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _SalidaEnPartes:
+    """Archivo de solo escritura que acumula lo escrito para entregarlo por partes"""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def _columna_xlsx(indice):
+    """Letra de columna de Excel (0 -> A, 26 -> AA)"""
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _fila_xlsx(numero, valores):
+    celdas = []
+    for i, valor in enumerate(valores):
+        ref = f"{_columna_xlsx(i)}{numero}"
+        if valor is None:
+            continue
+        if isinstance(valor, bool) or not isinstance(valor, (int, float, Decimal)):
+            texto = escape(str(_texto_celda(valor)))
+            celdas.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>')
+        else:
+            celdas.append(f'<c r="{ref}"><v>{valor}</v></c>')
+    return f'<row r="{numero}">{"".join(celdas)}</row>'
+
+
+_XLSX_ARCHIVOS_FIJOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def xlsx_en_partes(titulo, encabezados, filas):
+    """Genera un XLSX de una hoja en bloques de bytes a medida que se producen las filas
+
+    Se escribe el SpreadsheetML directamente (celdas con texto en línea), así
+    no hace falta una librería de Excel ni tener todo el archivo en memoria.
+    """
+    salida = _SalidaEnPartes()
+    nombre_hoja = escape(''.join(c for c in titulo if c not in '[]:*?/\\')[:31] or 'Reporte')
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for nombre, contenido in _XLSX_ARCHIVOS_FIJOS.items():
+            zf.writestr(nombre, contenido)
+        zf.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{nombre_hoja}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        yield salida.vaciar()
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            hoja.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _fila_xlsx(1, encabezados)
+            ).encode('utf-8'))
+            for numero, fila in enumerate(filas, 2):
+                hoja.write(_fila_xlsx(numero, fila).encode('utf-8'))
+                if numero % FILAS_POR_BLOQUE == 0:
+                    yield salida.vaciar()
+            hoja.write(b'</sheetData></worksheet>')
+    yield salida.vaciar()
+
+
+def html_a_pdf(html, base_url=None):
+    """Convierte HTML a PDF en el pool de procesos de PDF"""
+    return pool_pdf.renderizar_pdf(html, base_url=base_url)
+
+
+# ==================== CACHÉ DE EXPORTACIONES ====================
+
+def ruta_exportacion(reporte, formato, filtros):
+    """Ruta del archivo exportado para (reporte, formato, filtros) con la versión actual de los datos
+
+    La versión se guarda en la base y cambia con cada escritura financiera de
+    cualquier worker; con ella cambia la ruta, así las exportaciones anteriores
+    dejan de usarse y se eliminan al podar.
+    """
+    version = financiero.version_datos_financieros()
+    if version is None:
+        # Sin versión no hay forma de saber si un archivo guardado sigue vigente
+        version = uuid.uuid4().hex
+    clave = repr((reporte, formato, sorted(filtros.items()), version))
+    nombre = hashlib.sha256(clave.encode('utf-8')).hexdigest()
+    return os.path.join(EXPORTACIONES_DIR, f"{nombre}.{FORMATOS[formato][1]}")
+
+
+def exportacion_en_cache(ruta):
+    """True si el archivo exportado ya existe y está completo"""
+    return os.path.exists(ruta)
+
+
+def guardar_exportacion(ruta, datos):
+    """Guarda un archivo exportado completo en la caché"""
+    os.makedirs(EXPORTACIONES_DIR, exist_ok=True)
+    temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+    with open(temporal, 'wb') as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+    _podar_cache()
+
+
+def guardar_mientras_se_envia(ruta, partes):
+    """Entrega las partes de un archivo y, si se completa, lo deja en la caché
+
+    Si el cliente corta la descarga el archivo temporal se descarta.
+    """
+    os.makedirs(EXPORTACIONES_DIR, exist_ok=True)
+    temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+    completo = False
+    try:
+        with open(temporal, 'wb') as f:
+            for parte in partes:
+                f.write(parte)
+                yield parte
+        completo = True
+        os.replace(temporal, ruta)
+        _podar_cache()
+    finally:
+        if not completo and os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def _podar_cache():
+    """Elimina los archivos exportados más viejos por encima de EXPORTACIONES_CACHE_MAX"""
+    try:
+        archivos = [
+            os.path.join(EXPORTACIONES_DIR, nombre)
+            for nombre in os.listdir(EXPORTACIONES_DIR)
+            if not nombre.endswith('.tmp') and os.path.isfile(os.path.join(EXPORTACIONES_DIR, nombre))
+        ]
+        archivos.sort(key=os.path.getmtime, reverse=True)
+        for ruta in archivos[EXPORTACIONES_CACHE_MAX:]:
+            os.remove(ruta)
+    except OSError as e:
+        print(f"[WARN] No se pudo podar la caché de exportaciones: {e}")
+
+
+# ==================== ESTADO DE EXPORTACIONES EN SEGUNDO PLANO ====================
+
+def _ruta_estado(exportacion_id):
+    # El ID viene de la URL: solo se aceptan IDs hexadecimales
+    if not exportacion_id or any(c not in '0123456789abcdef' for c in exportacion_id):
+        return None
+    return os.path.join(EXPORTACIONES_ESTADOS_DIR, f"{exportacion_id}.json")
+
+
+def guardar_estado_exportacion(exportacion_id, estado):
+    """Guarda el estado (dict serializable a JSON) de una exportación en segundo plano"""
+    ruta = _ruta_estado(exportacion_id)
+    if ruta is None:
+        raise ValueError(f"ID de exportación no válido: {exportacion_id}")
+    os.makedirs(EXPORTACIONES_ESTADOS_DIR, exist_ok=True)
+    temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(estado, f)
+    os.replace(temporal, ruta)
+
+
+def leer_estado_exportacion(exportacion_id):
+    """Estado de una exportación en segundo plano, o None si no existe"""
+    ruta = _ruta_estado(exportacion_id)
+    if ruta is None:
+        return None
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def podar_estados_exportacion(antiguedad_max):
+    """Elimina los estados de exportaciones modificados hace más de antiguedad_max segundos"""
+    limite = time.time() - antiguedad_max
+    try:
+        for nombre in os.listdir(EXPORTACIONES_ESTADOS_DIR):
+            ruta = os.path.join(EXPORTACIONES_ESTADOS_DIR, nombre)
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"[WARN] No se pudieron podar los estados de exportaciones: {e}")
@@ -2,11 +2,12 @@
 Módulo de facturación
 Maneja la creación de facturas, cálculo de totales y conversión de números a letras
 """
+import functools
 import psycopg2
 import psycopg2.extras
 import os
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
 
 load_dotenv()
 
@@ -167,6 +168,39 @@ def millones(num):
     return str_millones + " " + str_miles
 
 
+# Letras de 0 a 999 tal como las arma centenas(), para no recomponerlas en cada llamada
+_LETRAS_CENTENAS = tuple(centenas(n) for n in range(1000))
+
+
+def _letras_centenas(num):
+    """centenas(num) desde la tabla"""
+    # Fuera de 0-999, centenas() solo convierte las dos últimas cifras
+    return _LETRAS_CENTENAS[num if 0 <= num < 1000 else num % 100]
+
+
+def _letras_seccion(cientos, str_singular, str_plural):
+    """seccion() a partir del cociente ya calculado"""
+    if cientos > 1:
+        return _letras_centenas(cientos) + " " + str_plural
+    if cientos == 1:
+        return str_singular
+    return ""
+
+
+def _letras_millones(num):
+    """millones(num) usando la tabla de centenas"""
+    str_millones = _letras_seccion(num // 1000000, "UN MILLÓN", "MILLONES")
+    resto = num % 1000000
+    str_miles = _letras_seccion(resto // 1000, "UN MIL", "MIL")
+    str_centenas = _letras_centenas(resto % 1000)
+
+    letras_miles = str_centenas if str_miles == "" else str_miles + " " + str_centenas
+    if str_millones == "":
+        return letras_miles
+    return str_millones + " " + letras_miles
+
+
+@functools.lru_cache(maxsize=4096, typed=True)
 def numero_a_letras(num, centavos=True, moneda="Gs"):
     """Convierte un número a letras en español"""
     enteros = int(num)
@@ -198,12 +232,12 @@ def numero_a_letras(num, centavos=True, moneda="Gs"):
             resultado += " " + letras_centavos
         return resultado
     elif enteros == 1:
-        resultado = millones(enteros) + letras_moneda_singular
+        resultado = _letras_millones(enteros) + letras_moneda_singular
         if letras_centavos:
             resultado += " " + letras_centavos
         return resultado
     else:
-        resultado = letras_moneda + " " + millones(enteros) + letras_moneda_plural
+        resultado = letras_moneda + " " + _letras_millones(enteros) + letras_moneda_plural
         if letras_centavos:
             resultado += " " + letras_centavos
         return resultado + " ---"
@@ -259,86 +293,148 @@ def calcular_totales(items):
     }
 
 
-def crear_factura(fecha, cliente, ruc=None, direccion=None, nota_remision=None,
-                  moneda='Gs', tipo_venta='Contado', plazo_dias=None, items=None):
-    """Crea una nueva factura en la base de datos"""
-    conn, cur = conectar()
-    try:
-        # Calcular totales
-        totales = calcular_totales(items)
-        totales['enLetras'] = numero_a_letras(totales['total'], True, moneda)
-        
-        # Generar número de factura
-        año_actual = datetime.now().year
-        año_str = str(año_actual)
-        cur.execute("""
-            SELECT COALESCE(MAX(
+def _reservar_numeros_factura(cur, año, cantidad=1):
+    """Reserva `cantidad` números consecutivos de factura del año y retorna el primero
+    
+    La fila del contador del año queda bloqueada hasta el commit, así dos
+    facturas creadas al mismo tiempo nunca reciben el mismo número.
+    """
+    cur.execute("""
+        UPDATE facturas_numeracion
+        SET ultimo_numero = ultimo_numero + %s
+        WHERE anio = %s
+        RETURNING ultimo_numero
+    """, (cantidad, año))
+    fila = cur.fetchone()
+    if not fila:
+        # Primera factura del año con el contador: parte del mayor número ya emitido
+        cur.execute(r"""
+            INSERT INTO facturas_numeracion (anio, ultimo_numero)
+            SELECT %s, COALESCE(MAX(
                 CAST(SUBSTRING(numero_factura FROM '^FAC-' || %s || '-(\d+)$') AS INTEGER)
-            ), 0) + 1 AS siguiente_numero
+            ), 0) + %s
             FROM facturas
             WHERE numero_factura LIKE %s
-        """, (año_str, f'FAC-{año_str}-%'))
-        
-        resultado = cur.fetchone()
-        siguiente_numero = resultado['siguiente_numero'] if resultado else 1
-        numero_factura = f"FAC-{año_actual}-{str(siguiente_numero).zfill(4)}"
-        
-        # Calcular fecha de vencimiento y fecha de pago
-        fecha_vencimiento = None
-        fecha_pago = None
-        estado_pago = 'pendiente'
-        
-        if tipo_venta == 'Crédito' and plazo_dias:
-            from datetime import timedelta
-            fecha_vencimiento = fecha + timedelta(days=plazo_dias)
-        elif tipo_venta == 'Contado':
-            # Para contado, fecha de pago = fecha de emisión
-            fecha_pago = fecha
-            estado_pago = 'pagado'
+            ON CONFLICT (anio) DO UPDATE
+            SET ultimo_numero = facturas_numeracion.ultimo_numero + %s
+            RETURNING ultimo_numero
+        """, (año, str(año), cantidad, f'FAC-{año}-%', cantidad))
+        fila = cur.fetchone()
+    return fila['ultimo_numero'] - cantidad + 1
+
+
+def _valores_factura(numero_factura, fecha, cliente, ruc=None, direccion=None, nota_remision=None,
+                     moneda='Gs', tipo_venta='Contado', plazo_dias=None, items=None):
+    """Valores del INSERT de una factura: totales, vencimiento y estado de pago"""
+    # Calcular totales
+    totales = calcular_totales(items)
+    totales['enLetras'] = numero_a_letras(totales['total'], True, moneda)
+    
+    # Calcular fecha de vencimiento y fecha de pago
+    fecha_vencimiento = None
+    fecha_pago = None
+    estado_pago = 'pendiente'
+    
+    if tipo_venta == 'Crédito' and plazo_dias:
+        fecha_vencimiento = fecha + timedelta(days=plazo_dias)
+    elif tipo_venta == 'Contado':
+        # Para contado, fecha de pago = fecha de emisión
+        fecha_pago = fecha
+        estado_pago = 'pagado'
+    
+    return (
+        numero_factura, fecha, cliente, ruc, direccion, nota_remision,
+        moneda, tipo_venta, plazo_dias, fecha_vencimiento, fecha_pago, estado_pago,
+        totales['excentas'], totales['iva5'],
+        totales['iva10'], totales['ivaTotal'], totales['total'],
+        totales['enLetras']
+    )
+
+
+def crear_facturas(facturas):
+    """Crea varias facturas con sus items en una sola transacción
+    
+    Cada elemento de `facturas` es un dict con los mismos parámetros que
+    crear_factura. Retorna los IDs en el mismo orden; si alguna falla no se
+    crea ninguna y no se consumen números de factura.
+    """
+    if not facturas:
+        return []
+    conn, cur = conectar()
+    try:
+        # Generar números de factura
+        año_actual = datetime.now().year
+        primer_numero = _reservar_numeros_factura(cur, año_actual, len(facturas))
+        numeros = [
+            f"FAC-{año_actual}-{str(primer_numero + i).zfill(4)}"
+            for i in range(len(facturas))
+        ]
         
-        # Insertar factura
-        cur.execute("""
+        # Insertar facturas
+        valores = [
+            _valores_factura(numero, **factura)
+            for numero, factura in zip(numeros, facturas)
+        ]
+        filas = psycopg2.extras.execute_values(cur, """
             INSERT INTO facturas (
                 numero_factura, fecha, cliente, ruc, direccion, nota_remision,
                 moneda, tipo_venta, plazo_dias, fecha_vencimiento, fecha_pago, estado_pago,
                 total_excentas, total_iva5, total_iva10,
                 iva_total, total_general, total_en_letras
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (
-            numero_factura, fecha, cliente, ruc, direccion, nota_remision,
-            moneda, tipo_venta, plazo_dias, fecha_vencimiento, fecha_pago, estado_pago,
-            totales['excentas'], totales['iva5'],
-            totales['iva10'], totales['ivaTotal'], totales['total'],
-            totales['enLetras']
-        ))
-        
-        factura_id = cur.fetchone()['id']
+            ) VALUES %s
+            RETURNING id, numero_factura
+        """, valores, page_size=len(valores), fetch=True)
+        id_por_numero = {fila['numero_factura']: fila['id'] for fila in filas}
+        ids = [id_por_numero[numero] for numero in numeros]
         
         # Insertar items
-        if items:
-            for orden, item in enumerate(items):
-                cur.execute("""
-                    INSERT INTO facturas_items (
-                        factura_id, cantidad, descripcion, precio_unitario,
-                        impuesto, orden
-                    ) VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
-                    factura_id,
-                    float(item.get('cantidad', 0) or 0),
-                    item.get('descripcion', ''),
-                    float(item.get('precio_unitario', 0) or 0),
-                    item.get('impuesto', 'exc'),
-                    orden
-                ))
+        valores_items = [
+            (
+                factura_id,
+                float(item.get('cantidad', 0) or 0),
+                item.get('descripcion', ''),
+                float(item.get('precio_unitario', 0) or 0),
+                item.get('impuesto', 'exc'),
+                orden
+            )
+            for factura_id, factura in zip(ids, facturas)
+            for orden, item in enumerate(factura.get('items') or [])
+        ]
+        if valores_items:
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO facturas_items (
+                    factura_id, cantidad, descripcion, precio_unitario,
+                    impuesto, orden
+                ) VALUES %s
+            """, valores_items, page_size=len(valores_items))
         
         conn.commit()
-        return factura_id
+        return ids
+    except Exception as e:
+        conn.rollback()
+        print(f"Error al crear facturas: {e}")
+        raise
     finally:
         cur.close()
         conn.close()
 
 
+def crear_factura(fecha, cliente, ruc=None, direccion=None, nota_remision=None,
+                  moneda='Gs', tipo_venta='Contado', plazo_dias=None, items=None):
+    """Crea una nueva factura en la base de datos"""
+    return crear_facturas([{
+        'fecha': fecha,
+        'cliente': cliente,
+        'ruc': ruc,
+        'direccion': direccion,
+        'nota_remision': nota_remision,
+        'moneda': moneda,
+        'tipo_venta': tipo_venta,
+        'plazo_dias': plazo_dias,
+        'items': items,
+    }])[0]
+
+
 def obtener_factura_por_id(factura_id):
     """Obtiene una factura con sus items"""
     conn, cur = conectar()
@@ -368,6 +464,93 @@ def obtener_factura_por_id(factura_id):
         conn.close()
 
 
+def _filtros_facturas(ids=None, fecha_desde=None, fecha_hasta=None):
+    """Arma el WHERE (y sus parámetros) para elegir facturas por IDs y/o rango de fechas"""
+    condiciones = []
+    params = []
+    if ids:
+        condiciones.append("id = ANY(%s)")
+        params.append(list(ids))
+    if fecha_desde:
+        condiciones.append("fecha >= %s")
+        params.append(fecha_desde)
+    if fecha_hasta:
+        condiciones.append("fecha <= %s")
+        params.append(fecha_hasta)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return where, params
+
+
+def contar_facturas(ids=None, fecha_desde=None, fecha_hasta=None, limite=None):
+    """Cuenta las facturas que cumplen los filtros
+    
+    Con `limite` se deja de contar al llegar a ese número, así validar el
+    tamaño máximo de un lote no recorre todas las facturas del rango.
+    """
+    where, params = _filtros_facturas(ids, fecha_desde, fecha_hasta)
+    limite_sql = ""
+    if limite is not None:
+        limite_sql = "LIMIT %s"
+        params.append(limite)
+
+    conn, cur = conectar()
+    try:
+        cur.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM facturas
+                {where}
+                {limite_sql}
+            ) f
+        """, params)
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+
+
+def obtener_facturas_con_items(ids=None, fecha_desde=None, fecha_hasta=None, limite=None):
+    """Obtiene varias facturas con sus items en dos consultas, sin importar cuántas sean
+    
+    Retorna una lista con el mismo formato que obtener_factura_por_id,
+    ordenada por fecha y número de factura (como máximo `limite` facturas).
+    """
+    where, params = _filtros_facturas(ids, fecha_desde, fecha_hasta)
+    limite_sql = ""
+    if limite is not None:
+        limite_sql = "LIMIT %s"
+        params.append(limite)
+
+    conn, cur = conectar()
+    try:
+        cur.execute(f"""
+            SELECT * FROM facturas
+            {where}
+            ORDER BY fecha, id
+            {limite_sql}
+        """, params)
+        facturas = [dict(factura) for factura in cur.fetchall()]
+        if not facturas:
+            return []
+
+        cur.execute("""
+            SELECT * FROM facturas_items
+            WHERE factura_id = ANY(%s)
+            ORDER BY factura_id, orden
+        """, ([factura['id'] for factura in facturas],))
+
+        items_por_factura = {}
+        for item in cur.fetchall():
+            items_por_factura.setdefault(item['factura_id'], []).append(dict(item))
+
+        return [
+            {'factura': factura, 'items': items_por_factura.get(factura['id'], [])}
+            for factura in facturas
+        ]
+    finally:
+        cur.close()
+        conn.close()
+
+
 def obtener_facturas(limite=50):
     """Obtiene la lista de facturas"""
     conn, cur = conectar()
@@ -5,6 +5,8 @@ Maneja categorías y tipos de ingresos
 import psycopg2
 import psycopg2.extras
 import os
+import time
+from threading import Lock
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -25,8 +27,120 @@ def conectar():
     return conn, cur
 
 
+# ==================== CACHÉ DE CATÁLOGOS ====================
+
+# Segundos que una entrada de la caché se considera válida. La invalidación
+# explícita solo alcanza al proceso que hizo el cambio; el TTL acota cuánto
+# tardan los demás workers en ver datos nuevos.
+CATALOGOS_CACHE_TTL = int(os.getenv("CATALOGOS_CACHE_TTL", "60"))
+
+_cache_catalogos = {}
+_version_catalogos = {}
+_cache_catalogos_lock = Lock()
+
+
+def invalidar_catalogo(*catalogos):
+    """Invalida la caché en memoria de uno o más catálogos"""
+    with _cache_catalogos_lock:
+        for catalogo in catalogos:
+            _version_catalogos[catalogo] = _version_catalogos.get(catalogo, 0) + 1
+
+
+# Segundos que cada proceso reutiliza la versión de datos leída de la base.
+# Acota cuánto tardan los demás workers en ver una escritura; el worker que la
+# hizo la vuelve a leer enseguida (olvidar_version_datos_financieros).
+VERSION_DATOS_TTL = int(os.getenv("VERSION_DATOS_TTL", "3"))
+
+_version_datos = {'version': None, 'leida_en': 0.0}
+_version_datos_lock = Lock()
+
+
+def version_datos_financieros():
+    """Versión global de los datos financieros
+    
+    Los triggers del esquema la incrementan en la misma transacción de cada
+    escritura sobre las tablas financieras, así que es la misma para todos los
+    workers. Las cachés de reportes la usan para descartar resultados
+    calculados antes del cambio. Se lee de la base como mucho una vez cada
+    VERSION_DATOS_TTL segundos por proceso. Retorna None si no se pudo leer.
+    """
+    with _version_datos_lock:
+        if (_version_datos['version'] is not None
+                and time.monotonic() - _version_datos['leida_en'] < VERSION_DATOS_TTL):
+            return _version_datos['version']
+    
+    conn, cur = conectar()
+    try:
+        leida_en = time.monotonic()
+        cur.execute("SELECT version FROM version_datos_financieros WHERE id = 1")
+        fila = cur.fetchone()
+        version = fila['version'] if fila else None
+    except Exception as e:
+        print(f"[WARN] No se pudo leer la versión de los datos financieros: {e}")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+    
+    with _version_datos_lock:
+        # Una lectura más vieja que la guardada (u olvidada mientras tanto) no la reemplaza
+        if version is not None and leida_en >= _version_datos['leida_en']:
+            _version_datos['version'] = version
+            _version_datos['leida_en'] = leida_en
+    return version
+
+
+def olvidar_version_datos_financieros():
+    """Descarta la versión guardada en el proceso; la próxima lectura va a la base"""
+    with _version_datos_lock:
+        _version_datos['version'] = None
+        _version_datos['leida_en'] = time.monotonic()
+
+
+def _obtener_catalogo(catalogo, cargar, **filtros):
+    """
+    Devuelve la entrada en caché de un catálogo, cargándola si no existe,
+    expiró o fue invalidada.
+    La entrada contiene 'filas' (lista de filas), 'por_id' y 'por_nombre'.
+    """
+    clave = (catalogo, tuple(sorted(filtros.items())))
+    ahora = time.monotonic()
+    with _cache_catalogos_lock:
+        version = _version_catalogos.get(catalogo, 0)
+        entrada = _cache_catalogos.get(clave)
+    if (entrada is not None and entrada['version'] == version
+            and ahora - entrada['cargado_en'] < CATALOGOS_CACHE_TTL):
+        return entrada
+
+    # Se consulta fuera del lock; si el catálogo se invalida mientras tanto,
+    # la entrada queda guardada con la versión anterior y se recarga en la
+    # siguiente lectura.
+    filas = list(cargar(**filtros))
+    campo_nombre = 'descripcion' if catalogo.startswith('tipos_') and catalogo != 'tipos_documentos' else 'nombre'
+    por_nombre = {}
+    for fila in filas:
+        nombre = fila.get(campo_nombre)
+        if nombre:
+            por_nombre.setdefault(str(nombre).strip().upper(), fila)
+    entrada = {
+        'version': version,
+        'cargado_en': ahora,
+        'filas': filas,
+        'por_id': {fila['id']: fila for fila in filas},
+        'por_nombre': por_nombre,
+    }
+    with _cache_catalogos_lock:
+        _cache_catalogos[clave] = entrada
+    return entrada
+
+
 def obtener_categorias_ingresos(activo=None):
-    """Obtiene todas las categorías de ingresos"""
+    """Obtiene todas las categorías de ingresos (desde la caché de catálogos)"""
+    return list(_obtener_catalogo('categorias_ingresos', _consultar_categorias_ingresos, activo=activo)['filas'])
+
+
+def _consultar_categorias_ingresos(activo=None):
+    """Obtiene todas las categorías de ingresos (consulta directa a la base de datos)"""
     conn, cur = conectar()
     try:
         if activo is not None:
@@ -70,56 +184,89 @@ def _to_upper(valor):
     return texto.upper()
 
 
-def generar_codigo_categoria():
-    """Genera automáticamente el código de la siguiente categoría (números enteros: 1, 2, 3...)"""
+def condicion_texto_contiene(columna, valor):
+    """Construye un filtro de búsqueda por subcadena sin distinguir mayúsculas
+
+    La condición usa la expresión UPPER(columna), que es la misma que indexan los
+    índices trigram (pg_trgm) del esquema, para que PostgreSQL pueda usarlos en
+    búsquedas del tipo '%texto%'. Retorna (condicion_sql, parametro).
+    """
+    return f"UPPER({columna}) LIKE %s", f"%{_to_upper(valor)}%"
+
+
+def _reservar_codigos_categoria(cur, tabla, cantidad=1):
+    """
+    Reserva los próximos códigos de categoría en la transacción de `cur`.
+    La función SQL toma un advisory lock que se libera al terminar la
+    transacción, así dos altas concurrentes no obtienen el mismo código.
+    """
+    cur.execute("""
+        SELECT codigo FROM reservar_codigos_categoria_financiera(%s, %s) AS codigo
+    """, (tabla, cantidad))
+    return [fila['codigo'] for fila in cur.fetchall()]
+
+
+def _reservar_codigos_tipo(cur, tabla, categoria_id, cantidad=1):
+    """
+    Reserva los próximos códigos de tipo (categoria.N) en la transacción de `cur`.
+    Retorna una lista vacía si la categoría no existe.
+    """
+    cur.execute("""
+        SELECT codigo FROM reservar_codigos_tipo_financiero(%s, %s, %s) AS codigo
+    """, (tabla, categoria_id, cantidad))
+    return [fila['codigo'] for fila in cur.fetchall()]
+
+
+def _crear_tipos_lote(tabla, categoria_id, descripciones):
+    """
+    Crea varios tipos (de ingreso o gasto) en una categoría con una sola
+    reserva de códigos y un único INSERT. Retorna la lista de IDs en el
+    mismo orden que `descripciones`.
+    """
+    descripciones = [_to_upper(d.strip()) for d in descripciones if d and d.strip()]
+    if not descripciones:
+        return []
+
     conn, cur = conectar()
     try:
-        # Obtener todos los códigos de categorías existentes
-        cur.execute("SELECT codigo FROM categorias_ingresos ORDER BY codigo")
-        categorias_existentes = cur.fetchall()
-        
-        # Encontrar el siguiente número entero disponible
-        numeros_usados = []
-        for categoria in categorias_existentes:
-            codigo = categoria['codigo']
-            try:
-                # Intentar convertir el código a entero (debe ser un número simple: 1, 2, 3...)
-                numero = int(codigo)
-                numeros_usados.append(numero)
-            except ValueError:
-                # Si no es un número entero, intentar extraer el primer número
-                try:
-                    partes = codigo.split('.')
-                    if partes[0].isdigit():
-                        numeros_usados.append(int(partes[0]))
-                except:
-                    pass
-        
-        # Encontrar el siguiente número disponible
-        siguiente_numero = 1
-        if numeros_usados:
-            siguiente_numero = max(numeros_usados) + 1
-        
-        # Verificar que no exista (doble verificación)
-        codigo_generado = str(siguiente_numero)
-        cur.execute("SELECT COUNT(*) as count FROM categorias_ingresos WHERE codigo = %s", (codigo_generado,))
-        existe = cur.fetchone()['count'] > 0
-        
-        if existe:
-            # Si existe, incrementar hasta encontrar uno disponible
-            while existe:
-                siguiente_numero += 1
-                codigo_generado = str(siguiente_numero)
-                cur.execute("SELECT COUNT(*) as count FROM categorias_ingresos WHERE codigo = %s", (codigo_generado,))
-                existe = cur.fetchone()['count'] > 0
-        
-        return codigo_generado
+        codigos = _reservar_codigos_tipo(cur, tabla, categoria_id, len(descripciones))
+        if not codigos:
+            raise Exception("No se pudo generar el código. Verifique que la categoría existe.")
+
+        cur.execute(f"""
+            SELECT COALESCE(MAX(orden), 0)
+            FROM {tabla}
+            WHERE categoria_id = %s
+        """, (categoria_id,))
+        ultimo_orden = cur.fetchone()[0]
+
+        valores = [
+            (categoria_id, codigo, descripcion, ultimo_orden + i)
+            for i, (codigo, descripcion) in enumerate(zip(codigos, descripciones), start=1)
+        ]
+        filas = psycopg2.extras.execute_values(cur, f"""
+            INSERT INTO {tabla} (categoria_id, codigo, descripcion, orden)
+            VALUES %s
+            RETURNING id
+        """, valores, page_size=len(valores), fetch=True)
+
+        conn.commit()
+        invalidar_catalogo(tabla)
+        return [fila['id'] for fila in filas]
     except Exception as e:
-        print(f"Error al generar código de categoría: {e}")
-        import traceback
-        traceback.print_exc()
-        # Fallback: empezar con 1
-        return "1"
+        conn.rollback()
+        print(f"Error al crear tipos en lote ({tabla}): {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def generar_codigo_categoria():
+    """Retorna el código que recibiría la siguiente categoría (números enteros: 1, 2, 3...), sin reservarlo"""
+    conn, cur = conectar()
+    try:
+        return _reservar_codigos_categoria(cur, 'categorias_ingresos')[0]
     finally:
         cur.close()
         conn.close()
@@ -130,7 +277,7 @@ def crear_categoria_ingreso(nombre, orden=None):
     conn, cur = conectar()
     try:
         # Generar código automático
-        codigo = generar_codigo_categoria()
+        codigo = _reservar_codigos_categoria(cur, 'categorias_ingresos')[0]
         
         # Convertir nombre a mayúsculas
         nombre = _to_upper(nombre)
@@ -148,6 +295,7 @@ def crear_categoria_ingreso(nombre, orden=None):
         
         categoria_id = cur.fetchone()['id']
         conn.commit()
+        invalidar_catalogo('categorias_ingresos')
         return categoria_id
     except Exception as e:
         conn.rollback()
@@ -187,6 +335,7 @@ def actualizar_categoria_ingreso(categoria_id, nombre, orden=None, activo=None):
                 WHERE id = %s
             """, params)
             conn.commit()
+            invalidar_catalogo('categorias_ingresos', 'tipos_ingresos')
             return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -203,6 +352,7 @@ def eliminar_categoria_ingreso(categoria_id):
     try:
         cur.execute("DELETE FROM categorias_ingresos WHERE id = %s", (categoria_id,))
         conn.commit()
+        invalidar_catalogo('categorias_ingresos', 'tipos_ingresos')
         return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -214,7 +364,12 @@ def eliminar_categoria_ingreso(categoria_id):
 
 
 def obtener_tipos_ingresos(categoria_id=None, activo=None):
-    """Obtiene todos los tipos de ingresos, opcionalmente filtrados por categoría"""
+    """Obtiene todos los tipos de ingresos, opcionalmente filtrados por categoría (desde la caché de catálogos)"""
+    return list(_obtener_catalogo('tipos_ingresos', _consultar_tipos_ingresos, categoria_id=categoria_id, activo=activo)['filas'])
+
+
+def _consultar_tipos_ingresos(categoria_id=None, activo=None):
+    """Obtiene todos los tipos de ingresos, opcionalmente filtrados por categoría (consulta directa a la base de datos)"""
     conn, cur = conectar()
     try:
         where_clauses = []
@@ -263,86 +418,11 @@ def obtener_tipo_ingreso_por_id(tipo_id):
 
 
 def generar_codigo_tipo_ingreso(categoria_id):
-    """Genera automáticamente el código del siguiente tipo de ingreso para una categoría (formato: categoria.tipo)"""
+    """Retorna el código que recibiría el siguiente tipo de ingreso de una categoría (formato: categoria.tipo), sin reservarlo"""
     conn, cur = conectar()
     try:
-        # Obtener el código de la categoría (debe ser un número entero: 1, 2, 3...)
-        cur.execute("SELECT codigo FROM categorias_ingresos WHERE id = %s", (categoria_id,))
-        categoria = cur.fetchone()
-        if not categoria:
-            return None
-        
-        codigo_categoria = categoria['codigo']
-        
-        # Obtener todos los códigos de tipos existentes para esta categoría
-        cur.execute("""
-            SELECT codigo FROM tipos_ingresos
-            WHERE categoria_id = %s
-            ORDER BY codigo
-        """, (categoria_id,))
-        tipos_existentes = cur.fetchall()
-        
-        # Encontrar el siguiente número disponible
-        siguiente_numero = 1
-        if tipos_existentes:
-            numeros_usados = []
-            for tipo in tipos_existentes:
-                codigo_tipo = tipo['codigo']
-                try:
-                    # El código del tipo debe ser formato: "1.1", "1.2", "2.1", "2.2", etc.
-                    # El código debe empezar con el código de la categoría seguido de un punto
-                    if codigo_tipo.startswith(codigo_categoria + '.'):
-                        # Extraer la parte después del código de categoría y el punto
-                        parte_restante = codigo_tipo[len(codigo_categoria) + 1:]
-                        # Debe ser un número simple (ej: "1" en "1.1")
-                        if parte_restante.isdigit():
-                            numero = int(parte_restante)
-                            numeros_usados.append(numero)
-                        else:
-                            # Si hay más puntos, tomar el primer número después del punto de la categoría
-                            partes_restantes = parte_restante.split('.')
-                            if partes_restantes and partes_restantes[0].isdigit():
-                                numero = int(partes_restantes[0])
-                                numeros_usados.append(numero)
-                except (ValueError, IndexError, AttributeError) as e:
-                    print(f"Error al parsear código {codigo_tipo}: {e}")
-                    continue
-            
-            if numeros_usados:
-                siguiente_numero = max(numeros_usados) + 1
-        
-        # Generar el código completo: categoría.tipo (ej: "1.1", "1.2", "2.1")
-        codigo_generado = f"{codigo_categoria}.{siguiente_numero}"
-        
-        # Verificar que no exista (doble verificación)
-        cur.execute("""
-            SELECT COUNT(*) as count FROM tipos_ingresos
-            WHERE categoria_id = %s AND codigo = %s
-        """, (categoria_id, codigo_generado))
-        existe = cur.fetchone()['count'] > 0
-        
-        if existe:
-            # Si existe, incrementar hasta encontrar uno disponible
-            while existe:
-                siguiente_numero += 1
-                codigo_generado = f"{codigo_categoria}.{siguiente_numero}"
-                cur.execute("""
-                    SELECT COUNT(*) as count FROM tipos_ingresos
-                    WHERE categoria_id = %s AND codigo = %s
-                """, (categoria_id, codigo_generado))
-                existe = cur.fetchone()['count'] > 0
-        
-        return codigo_generado
-    except Exception as e:
-        print(f"Error al generar código de tipo de ingreso: {e}")
-        import traceback
-        traceback.print_exc()
-        # Fallback: usar método simple
-        try:
-            codigo_categoria = categoria['codigo'] if categoria else "1"
-            return f"{codigo_categoria}.1"
-        except:
-            return "1.1"
+        codigos = _reservar_codigos_tipo(cur, 'tipos_ingresos', categoria_id)
+        return codigos[0] if codigos else None
     finally:
         cur.close()
         conn.close()
@@ -353,9 +433,10 @@ def crear_tipo_ingreso(categoria_id, descripcion, orden=None):
     conn, cur = conectar()
     try:
         # Generar código automático
-        codigo = generar_codigo_tipo_ingreso(categoria_id)
-        if not codigo:
+        codigos = _reservar_codigos_tipo(cur, 'tipos_ingresos', categoria_id)
+        if not codigos:
             raise Exception("No se pudo generar el código. Verifique que la categoría existe.")
+        codigo = codigos[0]
         
         # Convertir descripción a mayúsculas
         descripcion = _to_upper(descripcion)
@@ -377,6 +458,7 @@ def crear_tipo_ingreso(categoria_id, descripcion, orden=None):
         
         tipo_id = cur.fetchone()['id']
         conn.commit()
+        invalidar_catalogo('tipos_ingresos')
         return tipo_id
     except Exception as e:
         conn.rollback()
@@ -387,6 +469,11 @@ def crear_tipo_ingreso(categoria_id, descripcion, orden=None):
         conn.close()
 
 
+def crear_tipos_ingresos_lote(categoria_id, descripciones):
+    """Crea varios tipos de ingreso en una categoría con códigos consecutivos. Retorna sus IDs"""
+    return _crear_tipos_lote('tipos_ingresos', categoria_id, descripciones)
+
+
 def actualizar_tipo_ingreso(tipo_id, descripcion=None, orden=None, activo=None):
     """Actualiza un tipo de ingreso (el código no se puede cambiar)"""
     conn, cur = conectar()
@@ -416,6 +503,7 @@ def actualizar_tipo_ingreso(tipo_id, descripcion=None, orden=None, activo=None):
                 WHERE id = %s
             """, params)
             conn.commit()
+            invalidar_catalogo('tipos_ingresos')
             return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -432,6 +520,7 @@ def eliminar_tipo_ingreso(tipo_id):
     try:
         cur.execute("DELETE FROM tipos_ingresos WHERE id = %s", (tipo_id,))
         conn.commit()
+        invalidar_catalogo('tipos_ingresos')
         return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -445,7 +534,12 @@ def eliminar_tipo_ingreso(tipo_id):
 # ==================== FUNCIONES PARA GASTOS ====================
 
 def obtener_categorias_gastos(activo=None):
-    """Obtiene todas las categorías de gastos"""
+    """Obtiene todas las categorías de gastos (desde la caché de catálogos)"""
+    return list(_obtener_catalogo('categorias_gastos', _consultar_categorias_gastos, activo=activo)['filas'])
+
+
+def _consultar_categorias_gastos(activo=None):
+    """Obtiene todas las categorías de gastos (consulta directa a la base de datos)"""
     conn, cur = conectar()
     try:
         if activo is not None:
@@ -480,69 +574,10 @@ def obtener_categoria_gasto_por_id(categoria_id):
 
 
 def generar_codigo_categoria_gasto():
-    """Genera automáticamente el código de la siguiente categoría de gasto (números enteros: 1, 2, 3...)"""
+    """Retorna el código que recibiría la siguiente categoría de gasto (números enteros: 1, 2, 3...), sin reservarlo"""
     conn, cur = conectar()
     try:
-        # Obtener todos los códigos de categorías de gastos existentes
-        cur.execute("SELECT codigo FROM categorias_gastos ORDER BY codigo")
-        categorias_existentes = cur.fetchall()
-        
-        # También considerar categorías de ingresos para evitar conflictos
-        cur.execute("SELECT codigo FROM categorias_ingresos ORDER BY codigo")
-        categorias_ingresos = cur.fetchall()
-        
-        # Encontrar el siguiente número entero disponible
-        numeros_usados = []
-        for categoria in categorias_existentes:
-            codigo = categoria['codigo']
-            try:
-                numero = int(codigo)
-                numeros_usados.append(numero)
-            except ValueError:
-                try:
-                    partes = codigo.split('.')
-                    if partes[0].isdigit():
-                        numeros_usados.append(int(partes[0]))
-                except:
-                    pass
-        
-        # También considerar números de categorías de ingresos
-        for categoria in categorias_ingresos:
-            codigo = categoria['codigo']
-            try:
-                numero = int(codigo)
-                numeros_usados.append(numero)
-            except ValueError:
-                try:
-                    partes = codigo.split('.')
-                    if partes[0].isdigit():
-                        numeros_usados.append(int(partes[0]))
-                except:
-                    pass
-        
-        # Encontrar el siguiente número disponible
-        siguiente_numero = 1
-        if numeros_usados:
-            siguiente_numero = max(numeros_usados) + 1
-        
-        # Verificar que no exista (doble verificación)
-        codigo_generado = str(siguiente_numero)
-        cur.execute("SELECT COUNT(*) as count FROM categorias_gastos WHERE codigo = %s", (codigo_generado,))
-        existe = cur.fetchone()['count'] > 0
-        
-        if existe:
-            while existe:
-                siguiente_numero += 1
-                codigo_generado = str(siguiente_numero)
-                cur.execute("SELECT COUNT(*) as count FROM categorias_gastos WHERE codigo = %s", (codigo_generado,))
-                existe = cur.fetchone()['count'] > 0
-        
-        return codigo_generado
-    except Exception as e:
-        print(f"Error al generar código de categoría de gasto: {e}")
-        import traceback
-        traceback.print_exc()
-        return "1"
+        return _reservar_codigos_categoria(cur, 'categorias_gastos')[0]
     finally:
         cur.close()
         conn.close()
@@ -553,7 +588,7 @@ def crear_categoria_gasto(nombre, orden=None):
     conn, cur = conectar()
     try:
         # Generar código automático
-        codigo = generar_codigo_categoria_gasto()
+        codigo = _reservar_codigos_categoria(cur, 'categorias_gastos')[0]
         
         # Convertir nombre a mayúsculas
         nombre = _to_upper(nombre)
@@ -571,6 +606,7 @@ def crear_categoria_gasto(nombre, orden=None):
         
         categoria_id = cur.fetchone()['id']
         conn.commit()
+        invalidar_catalogo('categorias_gastos')
         return categoria_id
     except Exception as e:
         conn.rollback()
@@ -610,6 +646,7 @@ def actualizar_categoria_gasto(categoria_id, nombre, orden=None, activo=None):
                 WHERE id = %s
             """, params)
             conn.commit()
+            invalidar_catalogo('categorias_gastos', 'tipos_gastos')
             return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -626,6 +663,7 @@ def eliminar_categoria_gasto(categoria_id):
     try:
         cur.execute("DELETE FROM categorias_gastos WHERE id = %s", (categoria_id,))
         conn.commit()
+        invalidar_catalogo('categorias_gastos', 'tipos_gastos')
         return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -637,7 +675,12 @@ def eliminar_categoria_gasto(categoria_id):
 
 
 def obtener_tipos_gastos(categoria_id=None, activo=None):
-    """Obtiene todos los tipos de gastos, opcionalmente filtrados por categoría"""
+    """Obtiene todos los tipos de gastos, opcionalmente filtrados por categoría (desde la caché de catálogos)"""
+    return list(_obtener_catalogo('tipos_gastos', _consultar_tipos_gastos, categoria_id=categoria_id, activo=activo)['filas'])
+
+
+def _consultar_tipos_gastos(categoria_id=None, activo=None):
+    """Obtiene todos los tipos de gastos, opcionalmente filtrados por categoría (consulta directa a la base de datos)"""
     conn, cur = conectar()
     try:
         where_clauses = []
@@ -686,79 +729,11 @@ def obtener_tipo_gasto_por_id(tipo_id):
 
 
 def generar_codigo_tipo_gasto(categoria_id):
-    """Genera automáticamente el código del siguiente tipo de gasto para una categoría (formato: categoria.tipo)"""
+    """Retorna el código que recibiría el siguiente tipo de gasto de una categoría (formato: categoria.tipo), sin reservarlo"""
     conn, cur = conectar()
     try:
-        # Obtener el código de la categoría (debe ser un número entero: 1, 2, 3...)
-        cur.execute("SELECT codigo FROM categorias_gastos WHERE id = %s", (categoria_id,))
-        categoria = cur.fetchone()
-        if not categoria:
-            return None
-        
-        codigo_categoria = categoria['codigo']
-        
-        # Obtener todos los códigos de tipos existentes para esta categoría
-        cur.execute("""
-            SELECT codigo FROM tipos_gastos
-            WHERE categoria_id = %s
-            ORDER BY codigo
-        """, (categoria_id,))
-        tipos_existentes = cur.fetchall()
-        
-        # Encontrar el siguiente número disponible
-        siguiente_numero = 1
-        if tipos_existentes:
-            numeros_usados = []
-            for tipo in tipos_existentes:
-                codigo_tipo = tipo['codigo']
-                try:
-                    if codigo_tipo.startswith(codigo_categoria + '.'):
-                        parte_restante = codigo_tipo[len(codigo_categoria) + 1:]
-                        if parte_restante.isdigit():
-                            numero = int(parte_restante)
-                            numeros_usados.append(numero)
-                        else:
-                            partes_restantes = parte_restante.split('.')
-                            if partes_restantes and partes_restantes[0].isdigit():
-                                numero = int(partes_restantes[0])
-                                numeros_usados.append(numero)
-                except (ValueError, IndexError, AttributeError) as e:
-                    print(f"Error al parsear código {codigo_tipo}: {e}")
-                    continue
-            
-            if numeros_usados:
-                siguiente_numero = max(numeros_usados) + 1
-        
-        # Generar el código completo: categoría.tipo (ej: "1.1", "1.2", "2.1")
-        codigo_generado = f"{codigo_categoria}.{siguiente_numero}"
-        
-        # Verificar que no exista (doble verificación)
-        cur.execute("""
-            SELECT COUNT(*) as count FROM tipos_gastos
-            WHERE categoria_id = %s AND codigo = %s
-        """, (categoria_id, codigo_generado))
-        existe = cur.fetchone()['count'] > 0
-        
-        if existe:
-            while existe:
-                siguiente_numero += 1
-                codigo_generado = f"{codigo_categoria}.{siguiente_numero}"
-                cur.execute("""
-                    SELECT COUNT(*) as count FROM tipos_gastos
-                    WHERE categoria_id = %s AND codigo = %s
-                """, (categoria_id, codigo_generado))
-                existe = cur.fetchone()['count'] > 0
-        
-        return codigo_generado
-    except Exception as e:
-        print(f"Error al generar código de tipo de gasto: {e}")
-        import traceback
-        traceback.print_exc()
-        try:
-            codigo_categoria = categoria['codigo'] if categoria else "1"
-            return f"{codigo_categoria}.1"
-        except:
-            return "1.1"
+        codigos = _reservar_codigos_tipo(cur, 'tipos_gastos', categoria_id)
+        return codigos[0] if codigos else None
     finally:
         cur.close()
         conn.close()
@@ -769,9 +744,10 @@ def crear_tipo_gasto(categoria_id, descripcion, orden=None):
     conn, cur = conectar()
     try:
         # Generar código automático
-        codigo = generar_codigo_tipo_gasto(categoria_id)
-        if not codigo:
+        codigos = _reservar_codigos_tipo(cur, 'tipos_gastos', categoria_id)
+        if not codigos:
             raise Exception("No se pudo generar el código. Verifique que la categoría existe.")
+        codigo = codigos[0]
         
         # Convertir descripción a mayúsculas
         descripcion = _to_upper(descripcion)
@@ -793,6 +769,7 @@ def crear_tipo_gasto(categoria_id, descripcion, orden=None):
         
         tipo_id = cur.fetchone()['id']
         conn.commit()
+        invalidar_catalogo('tipos_gastos')
         return tipo_id
     except Exception as e:
         conn.rollback()
@@ -803,6 +780,11 @@ def crear_tipo_gasto(categoria_id, descripcion, orden=None):
         conn.close()
 
 
+def crear_tipos_gastos_lote(categoria_id, descripciones):
+    """Crea varios tipos de gasto en una categoría con códigos consecutivos. Retorna sus IDs"""
+    return _crear_tipos_lote('tipos_gastos', categoria_id, descripciones)
+
+
 def actualizar_tipo_gasto(tipo_id, descripcion=None, orden=None, activo=None):
     """Actualiza un tipo de gasto (el código no se puede cambiar)"""
     conn, cur = conectar()
@@ -832,6 +814,7 @@ def actualizar_tipo_gasto(tipo_id, descripcion=None, orden=None, activo=None):
                 WHERE id = %s
             """, params)
             conn.commit()
+            invalidar_catalogo('tipos_gastos')
             return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -848,6 +831,7 @@ def eliminar_tipo_gasto(tipo_id):
     try:
         cur.execute("DELETE FROM tipos_gastos WHERE id = %s", (tipo_id,))
         conn.commit()
+        invalidar_catalogo('tipos_gastos')
         return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -861,7 +845,12 @@ def eliminar_tipo_gasto(tipo_id):
 # ==================== FUNCIONES PARA PROYECTOS ====================
 
 def obtener_proyectos(activo=None):
-    """Obtiene todos los proyectos"""
+    """Obtiene todos los proyectos (desde la caché de catálogos)"""
+    return list(_obtener_catalogo('proyectos', _consultar_proyectos, activo=activo)['filas'])
+
+
+def _consultar_proyectos(activo=None):
+    """Obtiene todos los proyectos (consulta directa a la base de datos)"""
     conn, cur = conectar()
     try:
         if activo is not None:
@@ -938,6 +927,7 @@ def crear_proyecto(nombre, codigo=None):
         
         proyecto_id = cur.fetchone()['id']
         conn.commit()
+        invalidar_catalogo('proyectos')
         return proyecto_id
     except Exception as e:
         conn.rollback()
@@ -973,6 +963,7 @@ def actualizar_proyecto(proyecto_id, nombre=None, activo=None):
                 WHERE id = %s
             """, params)
             conn.commit()
+            invalidar_catalogo('proyectos')
             return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -989,6 +980,7 @@ def eliminar_proyecto(proyecto_id):
     try:
         cur.execute("DELETE FROM proyectos WHERE id = %s", (proyecto_id,))
         conn.commit()
+        invalidar_catalogo('proyectos')
         return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -1002,7 +994,12 @@ def eliminar_proyecto(proyecto_id):
 # ==================== FUNCIONES PARA TIPOS DE DOCUMENTOS ====================
 
 def obtener_tipos_documentos(activo=None):
-    """Obtiene todos los tipos de documentos"""
+    """Obtiene todos los tipos de documentos (desde la caché de catálogos)"""
+    return list(_obtener_catalogo('tipos_documentos', _consultar_tipos_documentos, activo=activo)['filas'])
+
+
+def _consultar_tipos_documentos(activo=None):
+    """Obtiene todos los tipos de documentos (consulta directa a la base de datos)"""
     conn, cur = conectar()
     try:
         if activo is not None:
@@ -1079,6 +1076,7 @@ def crear_tipo_documento(nombre, codigo=None):
         
         tipo_id = cur.fetchone()['id']
         conn.commit()
+        invalidar_catalogo('tipos_documentos')
         return tipo_id
     except Exception as e:
         conn.rollback()
@@ -1114,6 +1112,7 @@ def actualizar_tipo_documento(tipo_id, nombre=None, activo=None):
                 WHERE id = %s
             """, params)
             conn.commit()
+            invalidar_catalogo('tipos_documentos')
             return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -1130,6 +1129,7 @@ def eliminar_tipo_documento(tipo_id):
     try:
         cur.execute("DELETE FROM tipos_documentos WHERE id = %s", (tipo_id,))
         conn.commit()
+        invalidar_catalogo('tipos_documentos')
         return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -1180,7 +1180,12 @@ def actualizar_fecha_saldo_inicial(fecha):
 
 
 def obtener_bancos(activo=None):
-    """Obtiene todos los bancos"""
+    """Obtiene todos los bancos (desde la caché de catálogos)"""
+    return list(_obtener_catalogo('bancos', _consultar_bancos, activo=activo)['filas'])
+
+
+def _consultar_bancos(activo=None):
+    """Obtiene todos los bancos (consulta directa a la base de datos)"""
     conn, cur = conectar()
     try:
         if activo is not None:
@@ -1228,6 +1233,7 @@ def crear_banco(nombre, saldo_inicial=0):
         
         banco_id = cur.fetchone()['id']
         conn.commit()
+        invalidar_catalogo('bancos')
         return banco_id
     except Exception as e:
         conn.rollback()
@@ -1267,6 +1273,7 @@ def actualizar_banco(banco_id, nombre=None, saldo_inicial=None, activo=None):
                 WHERE id = %s
             """, params)
             conn.commit()
+            invalidar_catalogo('bancos')
             return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -1283,6 +1290,7 @@ def eliminar_banco(banco_id):
     try:
         cur.execute("DELETE FROM bancos WHERE id = %s", (banco_id,))
         conn.commit()
+        invalidar_catalogo('bancos')
         return cur.rowcount > 0
     except Exception as e:
         conn.rollback()
@@ -1293,6 +1301,85 @@ def eliminar_banco(banco_id):
         conn.close()
 
 
+def reconstruir_movimientos_bancarios():
+    """
+    Reconstruye el libro diario movimientos_bancarios_diarios desde
+    cuentas_a_recibir, cuentas_a_pagar y transferencias_cuentas.
+    Normalmente lo mantienen los triggers del esquema; esto sirve para
+    corregirlo tras cargas masivas o cambios hechos con los triggers desactivados.
+    Retorna la cantidad de filas (banco, día) generadas.
+    """
+    conn, cur = conectar()
+    try:
+        cur.execute("SELECT reconstruir_movimientos_bancarios_diarios() as filas")
+        filas = cur.fetchone()['filas']
+        conn.commit()
+        return filas
+    except Exception as e:
+        conn.rollback()
+        print(f"Error al reconstruir movimientos bancarios: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def reconstruir_resumen_financiero_mensual():
+    """
+    Reconstruye resumen_financiero_mensual (totales por año, mes, proyecto,
+    categoría y banco que usan los reportes mensuales) desde cuentas_a_recibir
+    y cuentas_a_pagar. Normalmente lo mantienen los triggers del esquema.
+    Retorna la cantidad de filas generadas.
+    """
+    conn, cur = conectar()
+    try:
+        cur.execute("SELECT reconstruir_resumen_financiero_mensual() as filas")
+        filas = cur.fetchone()['filas']
+        conn.commit()
+        return filas
+    except Exception as e:
+        conn.rollback()
+        print(f"Error al reconstruir resumen financiero mensual: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+# ==================== BÚSQUEDAS EN CATÁLOGOS ====================
+
+_CARGADORES_CATALOGOS = {
+    'categorias_ingresos': _consultar_categorias_ingresos,
+    'tipos_ingresos': _consultar_tipos_ingresos,
+    'categorias_gastos': _consultar_categorias_gastos,
+    'tipos_gastos': _consultar_tipos_gastos,
+    'proyectos': _consultar_proyectos,
+    'tipos_documentos': _consultar_tipos_documentos,
+    'bancos': _consultar_bancos,
+}
+
+
+def indice_catalogo_por_id(catalogo, activo=None):
+    """Retorna un diccionario {id: fila} del catálogo indicado (desde la caché)"""
+    return dict(_obtener_catalogo(catalogo, _CARGADORES_CATALOGOS[catalogo], activo=activo)['por_id'])
+
+
+def indice_catalogo_por_nombre(catalogo, activo=True):
+    """
+    Retorna un diccionario {NOMBRE EN MAYÚSCULAS: fila} del catálogo indicado
+    (desde la caché). En los tipos de ingresos/gastos se usa la descripción.
+    Si hay nombres repetidos se conserva el primero según el orden del catálogo.
+    """
+    return dict(_obtener_catalogo(catalogo, _CARGADORES_CATALOGOS[catalogo], activo=activo)['por_nombre'])
+
+
+def buscar_en_catalogo(indice, nombre):
+    """Busca un nombre en un índice de indice_catalogo_por_nombre, sin distinguir mayúsculas"""
+    if not nombre:
+        return None
+    return indice.get(str(nombre).strip().upper())
+
+
 # ==================== FUNCIONES PARA CUENTAS A RECIBIR ====================
 
 def obtener_cuentas_a_recibir(filtros=None, limite=None, offset=None):
@@ -1312,8 +1399,9 @@ def obtener_cuentas_a_recibir(filtros=None, limite=None, offset=None):
                 params.append(filtros['fecha_hasta'])
             
             if filtros.get('cliente'):
-                where_clauses.append("UPPER(car.cliente) LIKE UPPER(%s)")
-                params.append(f"%{filtros['cliente']}%")
+                condicion, patron = condicion_texto_contiene("car.cliente", filtros['cliente'])
+                where_clauses.append(condicion)
+                params.append(patron)
             
             if filtros.get('estado'):
                 where_clauses.append("car.estado = %s")
@@ -1328,8 +1416,9 @@ def obtener_cuentas_a_recibir(filtros=None, limite=None, offset=None):
                 params.append(filtros['cuenta_id'])
             
             if filtros.get('plano_cuenta'):
-                where_clauses.append("UPPER(car.plano_cuenta) LIKE UPPER(%s)")
-                params.append(f"%{filtros['plano_cuenta']}%")
+                condicion, patron = condicion_texto_contiene("car.plano_cuenta", filtros['plano_cuenta'])
+                where_clauses.append(condicion)
+                params.append(patron)
             
             # Filtro de saldo (se aplicará después del cálculo del saldo)
             saldo_filtro = filtros.get('saldo')
@@ -1445,8 +1534,9 @@ def contar_cuentas_a_recibir(filtros=None):
                 params.append(filtros['fecha_hasta'])
             
             if filtros.get('cliente'):
-                where_clauses.append("UPPER(car.cliente) LIKE UPPER(%s)")
-                params.append(f"%{filtros['cliente']}%")
+                condicion, patron = condicion_texto_contiene("car.cliente", filtros['cliente'])
+                where_clauses.append(condicion)
+                params.append(patron)
             
             if filtros.get('estado'):
                 where_clauses.append("car.estado = %s")
@@ -1461,8 +1551,9 @@ def contar_cuentas_a_recibir(filtros=None):
                 params.append(filtros['cuenta_id'])
             
             if filtros.get('plano_cuenta'):
-                where_clauses.append("UPPER(car.plano_cuenta) LIKE UPPER(%s)")
-                params.append(f"%{filtros['plano_cuenta']}%")
+                condicion, patron = condicion_texto_contiene("car.plano_cuenta", filtros['plano_cuenta'])
+                where_clauses.append(condicion)
+                params.append(patron)
             
             # Filtro de saldo (se aplicará después del cálculo del saldo)
             saldo_filtro = filtros.get('saldo')
@@ -1861,8 +1952,9 @@ def obtener_cuentas_a_pagar(filtros=None, limite=None, offset=None):
                 params.append(filtros['fecha_hasta'])
             
             if filtros.get('proveedor'):
-                where_clauses.append("UPPER(cap.proveedor) LIKE UPPER(%s)")
-                params.append(f"%{filtros['proveedor']}%")
+                condicion, patron = condicion_texto_contiene("cap.proveedor", filtros['proveedor'])
+                where_clauses.append(condicion)
+                params.append(patron)
             
             if filtros.get('estado'):
                 where_clauses.append("cap.estado = %s")
@@ -1877,8 +1969,9 @@ def obtener_cuentas_a_pagar(filtros=None, limite=None, offset=None):
                 params.append(filtros['cuenta_id'])
             
             if filtros.get('plano_cuenta'):
-                where_clauses.append("UPPER(cap.plano_cuenta) LIKE UPPER(%s)")
-                params.append(f"%{filtros['plano_cuenta']}%")
+                condicion, patron = condicion_texto_contiene("cap.plano_cuenta", filtros['plano_cuenta'])
+                where_clauses.append(condicion)
+                params.append(patron)
             
             # Filtro de saldo (se aplicará después del cálculo del saldo)
             saldo_filtro = filtros.get('saldo')
@@ -1951,8 +2044,9 @@ def contar_cuentas_a_pagar(filtros=None):
                 params.append(filtros['fecha_hasta'])
             
             if filtros.get('proveedor'):
-                where_clauses.append("UPPER(cap.proveedor) LIKE UPPER(%s)")
-                params.append(f"%{filtros['proveedor']}%")
+                condicion, patron = condicion_texto_contiene("cap.proveedor", filtros['proveedor'])
+                where_clauses.append(condicion)
+                params.append(patron)
             
             if filtros.get('estado'):
                 where_clauses.append("cap.estado = %s")
@@ -1967,8 +2061,9 @@ def contar_cuentas_a_pagar(filtros=None):
                 params.append(filtros['cuenta_id'])
             
             if filtros.get('plano_cuenta'):
-                where_clauses.append("UPPER(cap.plano_cuenta) LIKE UPPER(%s)")
-                params.append(f"%{filtros['plano_cuenta']}%")
+                condicion, patron = condicion_texto_contiene("cap.plano_cuenta", filtros['plano_cuenta'])
+                where_clauses.append(condicion)
+                params.append(patron)
             
             # Filtro de saldo (se aplicará después del cálculo del saldo)
             saldo_filtro = filtros.get('saldo')
@@ -2311,6 +2406,183 @@ def agregar_pago_cuenta_a_pagar(cuenta_id, monto_pago, fecha_pago):
         conn.close()
 
 
+# ==================== PAGOS EN LOTE ====================
+
+def _normalizar_pagos_lote(pagos):
+    """Valida y normaliza una lista de pagos [(cuenta_id, monto, fecha), ...] o dicts equivalentes"""
+    from datetime import datetime, date as date_type
+
+    normalizados = []
+    errores = []
+    for idx, pago in enumerate(pagos, start=1):
+        try:
+            if isinstance(pago, dict):
+                cuenta_id, monto, fecha = pago.get('cuenta_id'), pago.get('monto'), pago.get('fecha')
+            else:
+                cuenta_id, monto, fecha = pago
+
+            cuenta_id = int(cuenta_id)
+            monto = float(monto)
+            if monto <= 0:
+                raise ValueError("el monto debe ser mayor a 0")
+
+            if isinstance(fecha, str):
+                fecha = datetime.strptime(fecha.strip(), "%Y-%m-%d").date()
+            elif isinstance(fecha, datetime):
+                fecha = fecha.date()
+            elif not isinstance(fecha, date_type):
+                raise ValueError("la fecha es obligatoria")
+
+            normalizados.append((idx, cuenta_id, monto, fecha))
+        except (TypeError, ValueError) as e:
+            errores.append(f"Pago {idx}: {str(e)}")
+
+    if errores:
+        raise ValueError("; ".join(errores))
+    return normalizados
+
+
+def _registrar_pagos_lote(tabla, campo_fecha, campo_status, estado_pagado, pagos):
+    """Aplica muchos pagos en una sola transacción con SQL basado en conjuntos
+
+    Los pagos de una misma cuenta se suman; la fecha de pago/recibo queda con la
+    del último pago de la lista (igual que al registrarlos uno por uno). El estado
+    y el status se recalculan en la misma sentencia UPDATE.
+    """
+    pagos = _normalizar_pagos_lote(pagos)
+    if not pagos:
+        return {'cuentas_actualizadas': 0, 'pagos_aplicados': 0, 'monto_total': 0, 'cuentas': []}
+
+    conn, cur = conectar()
+    try:
+        cuenta_ids = sorted({p[1] for p in pagos})
+
+        # La fila de versión de datos financieros es el primer bloqueo de toda
+        # escritura financiera (la toman los triggers BEFORE de cada sentencia).
+        # Se toma antes del FOR UPDATE para no invertir ese orden con un UPDATE
+        # concurrente sobre las mismas cuentas.
+        cur.execute("SELECT incrementar_version_datos_financieros()")
+
+        # Bloquear las cuentas en orden de ID para evitar deadlocks entre lotes concurrentes
+        cur.execute(f"""
+            SELECT id FROM {tabla}
+            WHERE id = ANY(%s)
+            ORDER BY id
+            FOR UPDATE
+        """, (cuenta_ids,))
+        encontradas = {r['id'] for r in cur.fetchall()}
+        faltantes = [c for c in cuenta_ids if c not in encontradas]
+        if faltantes:
+            raise ValueError(f"Cuentas no encontradas: {', '.join(str(c) for c in faltantes)}")
+
+        filas = psycopg2.extras.execute_values(cur, f"""
+            WITH pagos (orden, cuenta_id, monto, fecha) AS (
+                VALUES %s
+            ),
+            agregados AS (
+                SELECT
+                    cuenta_id,
+                    COUNT(*) AS cantidad,
+                    SUM(monto::numeric) AS monto,
+                    (ARRAY_AGG(fecha::date ORDER BY orden DESC))[1] AS fecha
+                FROM pagos
+                GROUP BY cuenta_id
+            )
+            UPDATE {tabla} c
+            SET monto_abonado = COALESCE(c.monto_abonado, 0) + a.monto,
+                {campo_fecha} = a.fecha,
+                {campo_status} = CASE
+                    WHEN c.vencimiento IS NULL THEN NULL
+                    WHEN a.fecha < c.vencimiento THEN 'ADELANTADO'
+                    WHEN a.fecha > c.vencimiento THEN 'ATRASADO'
+                    ELSE 'EN DIA'
+                END,
+                estado = CASE
+                    WHEN COALESCE(c.valor_cuota, c.valor, 0) = 0 THEN c.estado
+                    WHEN ABS(COALESCE(c.valor_cuota, c.valor)) - (COALESCE(c.monto_abonado, 0) + a.monto) <= 0 THEN '{estado_pagado}'
+                    ELSE 'ABIERTO'
+                END,
+                actualizado_en = CURRENT_TIMESTAMP
+            FROM agregados a
+            WHERE c.id = a.cuenta_id
+            RETURNING c.id, a.cantidad, a.monto AS monto_pagado, c.monto_abonado, c.estado
+        """, pagos, page_size=len(pagos), fetch=True)
+
+        conn.commit()
+
+        cuentas = [{
+            'id': f['id'],
+            'pagos': f['cantidad'],
+            'monto_pagado': float(f['monto_pagado']),
+            'monto_abonado': float(f['monto_abonado']),
+            'estado': f['estado']
+        } for f in sorted(filas, key=lambda f: f['id'])]
+
+        return {
+            'cuentas_actualizadas': len(cuentas),
+            'pagos_aplicados': len(pagos),
+            'monto_total': sum(c['monto_pagado'] for c in cuentas),
+            'cuentas': cuentas
+        }
+    except Exception as e:
+        conn.rollback()
+        print(f"Error al registrar pagos en lote ({tabla}): {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def registrar_pagos_lote_cuentas_a_recibir(pagos):
+    """Registra muchos pagos de cuentas a recibir en una sola transacción (ver _registrar_pagos_lote)"""
+    return _registrar_pagos_lote('cuentas_a_recibir', 'fecha_recibo', 'status_recibo', 'RECIBIDO', pagos)
+
+
+def registrar_pagos_lote_cuentas_a_pagar(pagos):
+    """Registra muchos pagos de cuentas a pagar en una sola transacción (ver _registrar_pagos_lote)"""
+    return _registrar_pagos_lote('cuentas_a_pagar', 'fecha_pago', 'status_pago', 'PAGADO', pagos)
+
+
+def leer_pagos_csv(csv_content):
+    """Lee pagos desde un CSV de extracto bancario
+
+    Columnas esperadas: 'ID' (o 'Cuenta ID'), 'Monto' y 'Fecha' (DD-MM-YYYY o YYYY-MM-DD).
+    Retorna (pagos, errores) donde pagos es una lista de (cuenta_id, monto, fecha).
+    """
+    import csv
+    import io
+    from datetime import datetime
+
+    pagos = []
+    errores = []
+
+    reader = csv.DictReader(io.StringIO(csv_content))
+
+    for idx, row in enumerate(reader, start=2):  # start=2 porque la fila 1 es el encabezado
+        try:
+            cuenta_id_str = (row.get('ID') or row.get('Cuenta ID') or row.get('id') or '').strip()
+            monto_str = (row.get('Monto') or '').strip()
+            fecha_str = (row.get('Fecha') or '').strip()
+
+            if not cuenta_id_str or not monto_str or not fecha_str:
+                errores.append(f"Fila {idx}: ID, Monto y Fecha son obligatorios")
+                continue
+
+            # Mismo formato que el formulario de pagos (punto de miles, coma decimal)
+            monto = float(monto_str.replace('.', '').replace(',', '.'))
+
+            if '-' in fecha_str and len(fecha_str.split('-')[0]) == 4:
+                fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+            else:
+                fecha = datetime.strptime(fecha_str, '%d-%m-%Y').date()
+
+            pagos.append((int(cuenta_id_str), monto, fecha))
+        except Exception as e:
+            errores.append(f"Fila {idx}: {str(e)}")
+
+    return pagos, errores
+
+
 # ==================== FUNCIONES DE EXPORTACIÓN/IMPORTACIÓN CSV ====================
 
 def exportar_cuentas_a_recibir_csv(filtros=None):
@@ -2412,6 +2684,12 @@ def importar_cuentas_a_recibir_csv(csv_content):
     cuentas_importadas = []
     errores = []
     
+    # Catálogos indexados por nombre, una sola vez para todo el archivo
+    idx_tipos_documentos = indice_catalogo_por_nombre('tipos_documentos')
+    idx_categorias_ingresos = indice_catalogo_por_nombre('categorias_ingresos')
+    idx_bancos = indice_catalogo_por_nombre('bancos')
+    idx_proyectos = indice_catalogo_por_nombre('proyectos')
+    
     reader = csv.DictReader(io.StringIO(csv_content))
     
     for idx, row in enumerate(reader, start=2):  # start=2 porque la fila 1 es el encabezado
@@ -2432,29 +2710,25 @@ def importar_cuentas_a_recibir_csv(csv_content):
             # Obtener IDs de relaciones
             documento_id = None
             if row.get('Documento'):
-                documento = financiero.obtener_tipos_documentos(activo=True)
-                doc = next((d for d in documento if d['nombre'].upper() == row['Documento'].upper()), None)
+                doc = buscar_en_catalogo(idx_tipos_documentos, row['Documento'])
                 if doc:
                     documento_id = doc['id']
             
             cuenta_id = None
             if row.get('Cuenta'):
-                categorias = financiero.obtener_categorias_ingresos(activo=True)
-                cat = next((c for c in categorias if c['nombre'].upper() == row['Cuenta'].upper()), None)
+                cat = buscar_en_catalogo(idx_categorias_ingresos, row['Cuenta'])
                 if cat:
                     cuenta_id = cat['id']
             
             banco_id = None
             if row.get('Banco'):
-                bancos = financiero.obtener_bancos(activo=True)
-                banco = next((b for b in bancos if b['nombre'].upper() == row['Banco'].upper()), None)
+                banco = buscar_en_catalogo(idx_bancos, row['Banco'])
                 if banco:
                     banco_id = banco['id']
             
             proyecto_id = None
             if row.get('Proyecto'):
-                proyectos = financiero.obtener_proyectos(activo=True)
-                proyecto = next((p for p in proyectos if p['nombre'].upper() == row['Proyecto'].upper()), None)
+                proyecto = buscar_en_catalogo(idx_proyectos, row['Proyecto'])
                 if proyecto:
                     proyecto_id = proyecto['id']
             
@@ -2513,6 +2787,12 @@ def importar_cuentas_a_pagar_csv(csv_content):
     cuentas_importadas = []
     errores = []
     
+    # Catálogos indexados por nombre, una sola vez para todo el archivo
+    idx_tipos_documentos = indice_catalogo_por_nombre('tipos_documentos')
+    idx_categorias_gastos = indice_catalogo_por_nombre('categorias_gastos')
+    idx_bancos = indice_catalogo_por_nombre('bancos')
+    idx_proyectos = indice_catalogo_por_nombre('proyectos')
+    
     reader = csv.DictReader(io.StringIO(csv_content))
     
     for idx, row in enumerate(reader, start=2):  # start=2 porque la fila 1 es el encabezado
@@ -2533,29 +2813,25 @@ def importar_cuentas_a_pagar_csv(csv_content):
             # Obtener IDs de relaciones
             documento_id = None
             if row.get('Documento'):
-                documentos = obtener_tipos_documentos(activo=True)
-                doc = next((d for d in documentos if d['nombre'].upper() == row['Documento'].upper()), None)
+                doc = buscar_en_catalogo(idx_tipos_documentos, row['Documento'])
                 if doc:
                     documento_id = doc['id']
             
             cuenta_id = None
             if row.get('Cuenta'):
-                categorias = obtener_categorias_gastos(activo=True)
-                cat = next((c for c in categorias if c['nombre'].upper() == row['Cuenta'].upper()), None)
+                cat = buscar_en_catalogo(idx_categorias_gastos, row['Cuenta'])
                 if cat:
                     cuenta_id = cat['id']
             
             banco_id = None
             if row.get('Banco'):
-                bancos = obtener_bancos(activo=True)
-                banco = next((b for b in bancos if b['nombre'].upper() == row['Banco'].upper()), None)
+                banco = buscar_en_catalogo(idx_bancos, row['Banco'])
                 if banco:
                     banco_id = banco['id']
             
             proyecto_id = None
             if row.get('Proyecto'):
-                proyectos = obtener_proyectos(activo=True)
-                proyecto = next((p for p in proyectos if p['nombre'].upper() == row['Proyecto'].upper()), None)
+                proyecto = buscar_en_catalogo(idx_proyectos, row['Proyecto'])
                 if proyecto:
                     proyecto_id = proyecto['id']
             
@@ -2605,180 +2881,217 @@ def importar_cuentas_a_pagar_csv(csv_content):
     return cuentas_importadas, errores
 
 
-def previsualizar_cuentas_a_pagar_csv(csv_content):
-    """Previsualiza cuentas a pagar desde CSV sin guardarlas"""
+def _indices_importacion_cuentas_a_pagar():
+    """Catálogos indexados por nombre que usa la validación del CSV de cuentas a pagar"""
+    return {
+        'tipos_documentos': indice_catalogo_por_nombre('tipos_documentos'),
+        'categorias_gastos': indice_catalogo_por_nombre('categorias_gastos'),
+        'bancos': indice_catalogo_por_nombre('bancos'),
+        'proyectos': indice_catalogo_por_nombre('proyectos'),
+    }
+
+
+def _validar_fila_cuenta_a_pagar_csv(idx, row, indices):
+    """Valida una fila del CSV de cuentas a pagar y retorna su previsualización"""
+    from datetime import datetime
+    
+    fila_data = {
+        'fila': idx,
+        'valida': True,
+        'errores': [],
+        'datos': {}
+    }
+    
+    try:
+        if 'ID' in row:
+            del row['ID']
+        if 'id' in row:
+            del row['id']
+        
+        if not row.get('Fecha Emisión'):
+            fila_data['valida'] = False
+            fila_data['errores'].append('Fecha Emisión es obligatoria')
+        
+        fecha_emision = None
+        if row.get('Fecha Emisión'):
+            try:
+                fecha_emision = datetime.strptime(row['Fecha Emisión'], '%d-%m-%Y').date()
+            except ValueError:
+                fila_data['valida'] = False
+                fila_data['errores'].append(f'Fecha Emisión inválida: {row.get("Fecha Emisión")}')
+        
+        documento_nombre = row.get('Documento', '')
+        documento_id = None
+        if documento_nombre:
+            doc = buscar_en_catalogo(indices['tipos_documentos'], documento_nombre)
+            if not doc:
+                fila_data['valida'] = False
+                fila_data['errores'].append(f'Documento no encontrado: {documento_nombre}')
+            else:
+                documento_id = doc['id']
+        
+        cuenta_nombre = row.get('Cuenta', '')
+        cuenta_id = None
+        if cuenta_nombre:
+            cat = buscar_en_catalogo(indices['categorias_gastos'], cuenta_nombre)
+            if not cat:
+                fila_data['valida'] = False
+                fila_data['errores'].append(f'Cuenta no encontrada: {cuenta_nombre}')
+            else:
+                cuenta_id = cat['id']
+        
+        banco_nombre = row.get('Banco', '')
+        banco_id = None
+        if banco_nombre:
+            banco = buscar_en_catalogo(indices['bancos'], banco_nombre)
+            if not banco:
+                fila_data['valida'] = False
+                fila_data['errores'].append(f'Banco no encontrado: {banco_nombre}')
+            else:
+                banco_id = banco['id']
+        
+        proyecto_nombre = row.get('Proyecto', '')
+        proyecto_id = None
+        if proyecto_nombre:
+            proyecto = buscar_en_catalogo(indices['proyectos'], proyecto_nombre)
+            if not proyecto:
+                fila_data['valida'] = False
+                fila_data['errores'].append(f'Proyecto no encontrado: {proyecto_nombre}')
+            else:
+                proyecto_id = proyecto['id']
+        
+        valor = None
+        if row.get('Valor'):
+            try:
+                valor = float(row.get('Valor', 0).replace(',', '.'))
+            except ValueError:
+                fila_data['valida'] = False
+                fila_data['errores'].append(f'Valor inválido: {row.get("Valor")}')
+        
+        valor_cuota = None
+        if row.get('Valor Cuota'):
+            try:
+                valor_cuota = float(row.get('Valor Cuota', 0).replace(',', '.'))
+            except ValueError:
+                fila_data['valida'] = False
+                fila_data['errores'].append(f'Valor Cuota inválido: {row.get("Valor Cuota")}')
+        
+        vencimiento = None
+        if row.get('Vencimiento'):
+            try:
+                vencimiento = datetime.strptime(row['Vencimiento'], '%d-%m-%Y').date()
+            except ValueError:
+                fila_data['valida'] = False
+                fila_data['errores'].append(f'Vencimiento inválido: {row.get("Vencimiento")}')
+        
+        fecha_pago = None
+        if row.get('Fecha Pago'):
+            try:
+                fecha_pago = datetime.strptime(row['Fecha Pago'], '%d-%m-%Y').date()
+            except ValueError:
+                fila_data['valida'] = False
+                fila_data['errores'].append(f'Fecha Pago inválida: {row.get("Fecha Pago")}')
+        
+        fila_data['datos'] = {
+            'fecha_emision': row.get('Fecha Emisión', ''),
+            'documento': documento_nombre,
+            'cuenta': cuenta_nombre,
+            'plano_cuenta': _to_upper(row.get('Plano de Cuenta', '')),
+            'proyecto': proyecto_nombre,
+            'tipo': _to_upper(row.get('Tipo', 'RECURRENTE')),
+            'proveedor': _to_upper(row.get('Proveedor', '')),
+            'factura': _to_upper(row.get('Factura', '')),
+            'descripcion': _to_upper(row.get('Descripción', '')),
+            'banco': banco_nombre,
+            'valor': row.get('Valor', ''),
+            'cuotas': _to_upper(row.get('Cuotas', '')),
+            'valor_cuota': row.get('Valor Cuota', ''),
+            'vencimiento': row.get('Vencimiento', ''),
+            'fecha_pago': row.get('Fecha Pago', ''),
+            'estado': _to_upper(row.get('Estado', 'ABIERTO'))
+        }
+        
+    except Exception as e:
+        fila_data['valida'] = False
+        fila_data['errores'].append(str(e))
+    
+    return fila_data
+
+
+def previsualizar_cuentas_a_pagar_csv(csv_content, limite=None):
+    """
+    Previsualiza cuentas a pagar desde CSV sin guardarlas.
+    Si se indica `limite`, solo se leen y validan las primeras `limite` filas
+    (muestra rápida para la interfaz; ver validar_cuentas_a_pagar_csv).
+    """
     import csv
     import io
-    from datetime import datetime
+    from itertools import islice
     
     datos_previsualizacion = []
     errores = []
+    indices = _indices_importacion_cuentas_a_pagar()
     
     reader = csv.DictReader(io.StringIO(csv_content))
+    filas = enumerate(reader, start=2)
+    if limite is not None:
+        filas = islice(filas, limite)
     
-    for idx, row in enumerate(reader, start=2):
-        fila_data = {
-            'fila': idx,
-            'valida': True,
-            'errores': [],
-            'datos': {}
-        }
-        
-        try:
-            if 'ID' in row:
-                del row['ID']
-            if 'id' in row:
-                del row['id']
-            
-            if not row.get('Fecha Emisión'):
-                fila_data['valida'] = False
-                fila_data['errores'].append('Fecha Emisión es obligatoria')
-                errores.append(f"Fila {idx}: Fecha Emisión es obligatoria")
-            
-            fecha_emision = None
-            if row.get('Fecha Emisión'):
-                try:
-                    fecha_emision = datetime.strptime(row['Fecha Emisión'], '%d-%m-%Y').date()
-                except ValueError:
-                    fila_data['valida'] = False
-                    fila_data['errores'].append(f'Fecha Emisión inválida: {row.get("Fecha Emisión")}')
-            
-            documento_nombre = row.get('Documento', '')
-            documento_id = None
-            if documento_nombre:
-                documentos = obtener_tipos_documentos(activo=True)
-                doc = next((d for d in documentos if d['nombre'].upper() == documento_nombre.upper()), None)
-                if not doc:
-                    fila_data['valida'] = False
-                    fila_data['errores'].append(f'Documento no encontrado: {documento_nombre}')
-                else:
-                    documento_id = doc['id']
-            
-            cuenta_nombre = row.get('Cuenta', '')
-            cuenta_id = None
-            if cuenta_nombre:
-                categorias = obtener_categorias_gastos(activo=True)
-                cat = next((c for c in categorias if c['nombre'].upper() == cuenta_nombre.upper()), None)
-                if not cat:
-                    fila_data['valida'] = False
-                    fila_data['errores'].append(f'Cuenta no encontrada: {cuenta_nombre}')
-                else:
-                    cuenta_id = cat['id']
-            
-            banco_nombre = row.get('Banco', '')
-            banco_id = None
-            if banco_nombre:
-                bancos = obtener_bancos(activo=True)
-                banco = next((b for b in bancos if b['nombre'].upper() == banco_nombre.upper()), None)
-                if not banco:
-                    fila_data['valida'] = False
-                    fila_data['errores'].append(f'Banco no encontrado: {banco_nombre}')
-                else:
-                    banco_id = banco['id']
-            
-            proyecto_nombre = row.get('Proyecto', '')
-            proyecto_id = None
-            if proyecto_nombre:
-                proyectos = obtener_proyectos(activo=True)
-                proyecto = next((p for p in proyectos if p['nombre'].upper() == proyecto_nombre.upper()), None)
-                if not proyecto:
-                    fila_data['valida'] = False
-                    fila_data['errores'].append(f'Proyecto no encontrado: {proyecto_nombre}')
-                else:
-                    proyecto_id = proyecto['id']
-            
-            valor = None
-            if row.get('Valor'):
-                try:
-                    valor = float(row.get('Valor', 0).replace(',', '.'))
-                except ValueError:
-                    fila_data['valida'] = False
-                    fila_data['errores'].append(f'Valor inválido: {row.get("Valor")}')
-            
-            valor_cuota = None
-            if row.get('Valor Cuota'):
-                try:
-                    valor_cuota = float(row.get('Valor Cuota', 0).replace(',', '.'))
-                except ValueError:
-                    fila_data['valida'] = False
-                    fila_data['errores'].append(f'Valor Cuota inválido: {row.get("Valor Cuota")}')
-            
-            vencimiento = None
-            if row.get('Vencimiento'):
-                try:
-                    vencimiento = datetime.strptime(row['Vencimiento'], '%d-%m-%Y').date()
-                except ValueError:
-                    fila_data['valida'] = False
-                    fila_data['errores'].append(f'Vencimiento inválido: {row.get("Vencimiento")}')
-            
-            fecha_pago = None
-            if row.get('Fecha Pago'):
-                try:
-                    fecha_pago = datetime.strptime(row['Fecha Pago'], '%d-%m-%Y').date()
-                except ValueError:
-                    fila_data['valida'] = False
-                    fila_data['errores'].append(f'Fecha Pago inválida: {row.get("Fecha Pago")}')
-            
-            fila_data['datos'] = {
-                'fecha_emision': row.get('Fecha Emisión', ''),
-                'documento': documento_nombre,
-                'cuenta': cuenta_nombre,
-                'plano_cuenta': _to_upper(row.get('Plano de Cuenta', '')),
-                'proyecto': proyecto_nombre,
-                'tipo': _to_upper(row.get('Tipo', 'RECURRENTE')),
-                'proveedor': _to_upper(row.get('Proveedor', '')),
-                'factura': _to_upper(row.get('Factura', '')),
-                'descripcion': _to_upper(row.get('Descripción', '')),
-                'banco': banco_nombre,
-                'valor': row.get('Valor', ''),
-                'cuotas': _to_upper(row.get('Cuotas', '')),
-                'valor_cuota': row.get('Valor Cuota', ''),
-                'vencimiento': row.get('Vencimiento', ''),
-                'fecha_pago': row.get('Fecha Pago', ''),
-                'estado': _to_upper(row.get('Estado', 'ABIERTO'))
-            }
-            
-            if not fila_data['valida']:
-                errores.append(f"Fila {idx}: {'; '.join(fila_data['errores'])}")
-            
-        except Exception as e:
-            fila_data['valida'] = False
-            fila_data['errores'].append(str(e))
-            errores.append(f"Fila {idx}: {str(e)}")
-        
+    for idx, row in filas:
+        fila_data = _validar_fila_cuenta_a_pagar_csv(idx, row, indices)
+        if not fila_data['valida']:
+            errores.append(f"Fila {idx}: {'; '.join(fila_data['errores'])}")
         datos_previsualizacion.append(fila_data)
     
     return datos_previsualizacion, errores
 
 
-# ==================== FUNCIONES PARA TRANSFERENCIAS ENTRE CUENTAS ====================
+def validar_cuentas_a_pagar_csv(csv_content, progreso=None, cada=500):
+    """
+    Valida todo el CSV de cuentas a pagar fila por fila, sin acumular la
+    previsualización completa en memoria.
+    `progreso`, si se indica, se llama cada `cada` filas con
+    (filas_procesadas, filas_estimadas); las filas estimadas se calculan por
+    saltos de línea y pueden diferir si hay campos multilínea.
+    Retorna un resumen con total_filas, filas_validas, filas_invalidas y errores.
+    """
+    import csv
+    import io
+    
+    filas_estimadas = max(csv_content.count('\n') - 1, 0)
+    indices = _indices_importacion_cuentas_a_pagar()
+    
+    total_filas = 0
+    filas_validas = 0
+    errores = []
+    
+    reader = csv.DictReader(io.StringIO(csv_content))
+    for idx, row in enumerate(reader, start=2):
+        fila_data = _validar_fila_cuenta_a_pagar_csv(idx, row, indices)
+        total_filas += 1
+        if fila_data['valida']:
+            filas_validas += 1
+        else:
+            errores.append(f"Fila {idx}: {'; '.join(fila_data['errores'])}")
+        
+        if progreso and total_filas % cada == 0:
+            progreso(total_filas, max(filas_estimadas, total_filas))
+    
+    if progreso:
+        progreso(total_filas, total_filas)
+    
+    return {
+        'total_filas': total_filas,
+        'filas_validas': filas_validas,
+        'filas_invalidas': total_filas - filas_validas,
+        'errores': errores,
+    }
 
-def crear_tabla_transferencias():
-    """Crea la tabla de transferencias entre cuentas si no existe"""
-    conn, cur = conectar()
-    try:
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS transferencias_cuentas (
-                id SERIAL PRIMARY KEY,
-                fecha DATE NOT NULL,
-                banco_origen_id INTEGER NOT NULL REFERENCES bancos(id),
-                banco_destino_id INTEGER NOT NULL REFERENCES bancos(id),
-                monto NUMERIC(15, 2) NOT NULL,
-                descripcion TEXT,
-                creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                CONSTRAINT banco_origen_destino_diferentes CHECK (banco_origen_id != banco_destino_id),
-                CONSTRAINT monto_positivo CHECK (monto > 0)
-            );
-        """)
-        conn.commit()
-    finally:
-        cur.close()
-        conn.close()
 
+# ==================== FUNCIONES PARA TRANSFERENCIAS ENTRE CUENTAS ====================
 
 def obtener_transferencias(filtros=None, limite=None, offset=None):
     """Obtiene las transferencias entre cuentas"""
-    crear_tabla_transferencias()  # Asegurar que la tabla existe
     conn, cur = conectar()
     try:
         where_clauses = []
@@ -2839,7 +3152,6 @@ def obtener_transferencias(filtros=None, limite=None, offset=None):
 
 def contar_transferencias(filtros=None):
     """Cuenta el total de transferencias"""
-    crear_tabla_transferencias()
     conn, cur = conectar()
     try:
         where_clauses = []
@@ -2881,7 +3193,6 @@ def contar_transferencias(filtros=None):
 
 def obtener_transferencia_por_id(transferencia_id):
     """Obtiene una transferencia por su ID"""
-    crear_tabla_transferencias()
     conn, cur = conectar()
     try:
         cur.execute("""
@@ -2908,7 +3219,6 @@ def obtener_transferencia_por_id(transferencia_id):
 
 def crear_transferencia(fecha, banco_origen_id, banco_destino_id, monto, descripcion=None):
     """Crea una nueva transferencia entre cuentas"""
-    crear_tabla_transferencias()
     conn, cur = conectar()
     try:
         if banco_origen_id == banco_destino_id:
@@ -2936,7 +3246,6 @@ def crear_transferencia(fecha, banco_origen_id, banco_destino_id, monto, descrip
 
 def actualizar_transferencia(transferencia_id, fecha, banco_origen_id, banco_destino_id, monto, descripcion=None):
     """Actualiza una transferencia existente"""
-    crear_tabla_transferencias()
     conn, cur = conectar()
     try:
         if banco_origen_id == banco_destino_id:
@@ -2967,7 +3276,6 @@ def actualizar_transferencia(transferencia_id, fecha, banco_origen_id, banco_des
 
 def eliminar_transferencia(transferencia_id):
     """Elimina una transferencia"""
-    crear_tabla_transferencias()
     conn, cur = conectar()
     try:
         cur.execute("DELETE FROM transferencias_cuentas WHERE id = %s", (transferencia_id,))
@@ -0,0 +1,202 @@
+"""
+Pool de procesos para generar PDF fuera de los workers web
+
+WeasyPrint ocupa la CPU durante todo el layout del documento; si se ejecuta en
+el worker de gunicorn ese hilo (y por el GIL, buena parte del proceso) queda
+bloqueado. Los PDF se generan en procesos dedicados que importan WeasyPrint y
+cargan las fuentes al arrancar, así la primera generación no paga ese costo.
+El worker web envía el HTML y recibe los bytes del PDF.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+
+# Procesos del pool por cada worker web (0 genera los PDF en el mismo proceso)
+PDF_POOL_PROCESOS = int(os.getenv("PDF_POOL_PROCESOS", "2"))
+# PDF que pueden estar generándose o esperando; por encima se rechazan
+PDF_POOL_COLA_MAX = int(os.getenv("PDF_POOL_COLA_MAX", "8"))
+# Segundos máximos que se espera un PDF
+PDF_POOL_TIMEOUT = int(os.getenv("PDF_POOL_TIMEOUT", "120"))
+# PDF que genera cada proceso antes de reemplazarse (acota la memoria retenida)
+PDF_POOL_TAREAS_POR_PROCESO = int(os.getenv("PDF_POOL_TAREAS_POR_PROCESO", "200"))
+
+
+class ColaPDFLlena(RuntimeError):
+    """Hay PDF_POOL_COLA_MAX PDF en curso y no se aceptan más por ahora"""
+
+
+_pool = None
+_pool_lock = Lock()
+_en_curso = 0
+_estadisticas = {
+    'generados': 0,
+    'errores': 0,
+    'rechazados': 0,
+    'segundos_render': 0.0,
+    'segundos_render_max': 0.0,
+    'segundos_espera': 0.0,
+}
+
+
+# ==================== PROCESOS DEL POOL ====================
+
+def _calentar_proceso():
+    """Importa WeasyPrint y genera un documento mínimo para cargar fuentes y estilos base"""
+    try:
+        from weasyprint import HTML
+        HTML(string="<p style='font-family: sans-serif'>.</p>").write_pdf()
+    except (ImportError, OSError):
+        try:
+            import xhtml2pdf.pisa  # noqa: F401
+        except ImportError:
+            pass
+
+
+def _generar_pdf(html, base_url=None):
+    """Convierte HTML a PDF con WeasyPrint, o con xhtml2pdf si WeasyPrint no está disponible"""
+    try:
+        from weasyprint import HTML
+        return HTML(string=html, base_url=base_url).write_pdf()
+    except (ImportError, OSError):
+        import io
+        from xhtml2pdf import pisa
+        pdf_buffer = io.BytesIO()
+        pisa_status = pisa.CreatePDF(html, dest=pdf_buffer)
+        if pisa_status.err:
+            raise RuntimeError('No se pudo generar el PDF')
+        return pdf_buffer.getvalue()
+
+
+def _generar_pdf_unido(htmls, base_url=None):
+    """Genera un único PDF con las páginas de varios HTML (requiere WeasyPrint)"""
+    from weasyprint import HTML
+    documentos = [HTML(string=html, base_url=base_url).render() for html in htmls]
+    paginas = [pagina for documento in documentos for pagina in documento.pages]
+    return documentos[0].copy(paginas).write_pdf()
+
+
+def _medir(funcion, *args):
+    inicio = time.perf_counter()
+    pdf = funcion(*args)
+    return pdf, time.perf_counter() - inicio
+
+
+# ==================== USO DESDE LOS WORKERS WEB ====================
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: no se heredan hilos ni conexiones del worker de gunicorn
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_POOL_PROCESOS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_calentar_proceso,
+                max_tasks_per_child=PDF_POOL_TAREAS_POR_PROCESO,
+            )
+        return _pool
+
+
+def _descartar_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iniciar_pool():
+    """Arranca los procesos del pool para que estén listos antes del primer PDF"""
+    if PDF_POOL_PROCESOS <= 0 or multiprocessing.parent_process() is not None:
+        # Dentro de un proceso del pool (spawn vuelve a importar el módulo principal)
+        return
+    pool = _obtener_pool()
+    for _ in range(PDF_POOL_PROCESOS):
+        pool.submit(_calentar_proceso)
+
+
+def renderizar_pdf(html, base_url=None, timeout=None):
+    """Genera el PDF de un HTML en el pool y devuelve sus bytes
+
+    Lanza ColaPDFLlena si ya hay PDF_POOL_COLA_MAX generaciones en curso.
+    """
+    return _renderizar(_generar_pdf, (html, base_url), timeout)
+
+
+def renderizar_pdf_unido(htmls, base_url=None, timeout=None):
+    """Genera en el pool un único PDF con todos los HTML, uno a continuación del otro"""
+    return _renderizar(_generar_pdf_unido, (list(htmls), base_url), timeout)
+
+
+def _liberar_lugar(futuro=None):
+    global _en_curso
+    with _pool_lock:
+        _en_curso -= 1
+
+
+def _renderizar(funcion, args, timeout):
+    global _en_curso
+    with _pool_lock:
+        if _en_curso >= PDF_POOL_COLA_MAX:
+            _estadisticas['rechazados'] += 1
+            raise ColaPDFLlena(f'Hay {_en_curso} PDF en generación, intente nuevamente en unos segundos')
+        _en_curso += 1
+
+    inicio = time.perf_counter()
+    futuro = None
+    try:
+        if PDF_POOL_PROCESOS <= 0:
+            pdf, segundos_render = _medir(funcion, *args)
+        else:
+            pool = _obtener_pool()
+            try:
+                futuro = pool.submit(_medir, funcion, *args)
+                # El lugar se libera cuando el proceso termina el PDF: un PDF que
+                # sigue generándose después del timeout sigue ocupando la cola
+                futuro.add_done_callback(_liberar_lugar)
+                pdf, segundos_render = futuro.result(timeout=timeout or PDF_POOL_TIMEOUT)
+            except BrokenProcessPool:
+                # Un proceso murió (p. ej. por memoria); el próximo PDF usa un pool nuevo
+                _descartar_pool(pool)
+                raise
+            except FuturesTimeoutError:
+                futuro.cancel()
+                raise TimeoutError(f'El PDF no se generó en {timeout or PDF_POOL_TIMEOUT} segundos')
+    except Exception:
+        with _pool_lock:
+            _estadisticas['errores'] += 1
+        raise
+    finally:
+        if futuro is None:
+            _liberar_lugar()
+
+    segundos_total = time.perf_counter() - inicio
+    with _pool_lock:
+        _estadisticas['generados'] += 1
+        _estadisticas['segundos_render'] += segundos_render
+        _estadisticas['segundos_render_max'] = max(_estadisticas['segundos_render_max'], segundos_render)
+        _estadisticas['segundos_espera'] += segundos_total - segundos_render
+    print(f"[PDF] Generado en {segundos_render:.2f}s (espera {segundos_total - segundos_render:.2f}s, {len(pdf)} bytes)")
+    return pdf
+
+
+def estadisticas_pool():
+    """PDF generados, errores, rechazos y tiempos promedio del pool"""
+    with _pool_lock:
+        estadisticas = dict(_estadisticas)
+        en_curso = _en_curso
+    generados = estadisticas['generados']
+    return {
+        'procesos': PDF_POOL_PROCESOS,
+        'cola_max': PDF_POOL_COLA_MAX,
+        'en_curso': en_curso,
+        'generados': generados,
+        'errores': estadisticas['errores'],
+        'rechazados': estadisticas['rechazados'],
+        'segundos_render_promedio': estadisticas['segundos_render'] / generados if generados else 0.0,
+        'segundos_render_max': estadisticas['segundos_render_max'],
+        'segundos_espera_promedio': estadisticas['segundos_espera'] / generados if generados else 0.0,
+    }
@@ -10,9 +10,27 @@ import io
 import base64
 import os
 import platform
+import queue
+import threading
+import time
+import hashlib
+import json
+import tempfile
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from dotenv import load_dotenv
 import requests
 
+# Motor de Tesseract persistente (opcional): tesserocr mantiene los idiomas
+# cargados entre llamadas en lugar de lanzar un proceso tesseract por imagen
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    tesserocr = None
+    TESSEROCR_AVAILABLE = False
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -20,6 +38,34 @@ load_dotenv()
 OCR_REMOTE_URL = os.getenv('OCR_SERVER_URL', '').strip()
 USE_REMOTE_OCR = os.getenv('USE_REMOTE_OCR', 'false').lower() == 'true'
 
+# Cliente de OCR remoto: timeouts (s), reintentos, pedidos simultáneos e imágenes por pedido en lote
+OCR_REMOTE_CONNECT_TIMEOUT = float(os.getenv('OCR_REMOTE_CONNECT_TIMEOUT', '5'))
+OCR_REMOTE_TIMEOUT = float(os.getenv('OCR_REMOTE_TIMEOUT', '120'))
+OCR_REMOTE_RETRIES = int(os.getenv('OCR_REMOTE_RETRIES', '3'))
+OCR_REMOTE_MAX_CONCURRENT = int(os.getenv('OCR_REMOTE_MAX_CONCURRENT', '4'))
+OCR_REMOTE_BATCH_SIZE = int(os.getenv('OCR_REMOTE_BATCH_SIZE', '8'))
+# Tiempo máximo (s) de un pedido remoto contando la espera de turno y los
+# reintentos; tiene que quedar por debajo del timeout de gunicorn (GUNICORN_TIMEOUT)
+OCR_REMOTE_DEADLINE = float(os.getenv('OCR_REMOTE_DEADLINE', '240'))
+
+# Configuración del pool de OCR local
+OCR_POOL_WORKERS = int(os.getenv('OCR_POOL_WORKERS', '2'))
+OCR_POOL_QUEUE_MAX = int(os.getenv('OCR_POOL_QUEUE_MAX', '8'))
+OCR_JOB_TIMEOUT = int(os.getenv('OCR_JOB_TIMEOUT', '120'))
+OCR_DEFAULT_LANG = 'spa+por+eng'
+
+# Caché de imágenes preprocesadas y resultados de OCR (0 la desactiva)
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'cache_ocr'))
+OCR_CACHE_MAX_MB = int(os.getenv('OCR_CACHE_MAX_MB', '200'))
+# Memoria por proceso para imágenes decodificadas (un escaneo A4 a 300 dpi ocupa ~25 MB)
+OCR_DECODED_CACHE_MB = int(os.getenv('OCR_DECODED_CACHE_MB', '100'))
+
+# Modo por franjas: las imágenes con un lado mayor se reducen antes del OCR
+OCR_MAX_DIMENSION = int(os.getenv('OCR_MAX_DIMENSION', '4000'))
+# Filas sin texto necesarias para cortar entre franjas y alto mínimo de cada franja (px)
+OCR_TILE_MIN_GAP = int(os.getenv('OCR_TILE_MIN_GAP', '12'))
+OCR_TILE_MIN_HEIGHT = int(os.getenv('OCR_TILE_MIN_HEIGHT', '200'))
+
 # Configurar ruta de Tesseract automáticamente
 def configure_tesseract_path():
     """Configura la ruta de Tesseract según el sistema operativo"""
@@ -99,13 +145,26 @@ def preprocess_image_opencv(image_bytes, config):
     Returns:
         numpy array de la imagen procesada
     """
-    # Leer imagen desde bytes
+    return apply_preprocessing(decode_image(image_bytes), config)
+
+def decode_image(image_bytes):
+    """
+    Decodifica los bytes de una imagen a un array BGR de OpenCV
+    """
     nparr = np.frombuffer(image_bytes, np.uint8)
     img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     
     if img is None:
         raise ValueError("No se pudo decodificar la imagen")
+    return img
+
+def apply_preprocessing(img, config):
+    """
+    Aplica recorte y preprocesamiento a una imagen ya decodificada
     
+    Ver preprocess_image_opencv para los parámetros de config. No modifica
+    el array recibido.
+    """
     # Recortar si hay región especificada
     if config.get('crop_region'):
         crop = config['crop_region']
@@ -146,25 +205,393 @@ def preprocess_image_opencv(image_bytes, config):
     
     return img
 
-def process_ocr_remote(image_bytes, config):
+# ==================== CACHÉ DE OCR ====================
+
+# sha256 de la imagen -> imagen decodificada
+_decoded_cache = OrderedDict()
+_decoded_cache_bytes = 0
+_ocr_cache_lock = threading.Lock()
+
+
+def _cache_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _preprocessing_key(image_hash, config):
+    """Clave de la imagen preprocesada: imagen + parámetros que afectan el preprocesamiento"""
+    crop = config.get('crop_region') or None
+    if crop:
+        crop = [crop.get('x', 0), crop.get('y', 0), crop.get('width'), crop.get('height')]
+        crop = [int(v) if v is not None else None for v in crop]
+    if not config.get('enable_preprocessing', True):
+        return _cache_key(image_hash, crop)
+    return _cache_key(
+        image_hash,
+        crop,
+        bool(config.get('enable_grayscale', True)),
+        int(config.get('brightness', 0)),
+        int(config.get('contrast', 0)),
+        bool(config.get('enable_smoothing', True)),
+        int(config.get('threshold', 128)),
+    )
+
+
+def _cache_path(key, extension):
+    return os.path.join(OCR_CACHE_DIR, f"{key}.{extension}")
+
+
+def _cache_read(key, extension, loader):
+    if OCR_CACHE_MAX_MB <= 0:
+        return None
+    path = _cache_path(key, extension)
+    try:
+        value = loader(path)
+    except (OSError, ValueError):
+        return None
+    try:
+        # Marca el archivo como usado recientemente para la poda
+        os.utime(path)
+    except OSError:
+        pass
+    return value
+
+
+def _cache_write(key, extension, writer):
+    if OCR_CACHE_MAX_MB <= 0:
+        return
+    try:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        path = _cache_path(key, extension)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            writer(f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Advertencia: no se pudo guardar en la caché de OCR: {e}")
+        return
+    _prune_cache()
+
+
+def _prune_cache():
+    """Elimina los archivos usados hace más tiempo hasta quedar debajo de OCR_CACHE_MAX_MB"""
+    try:
+        files = []
+        for name in os.listdir(OCR_CACHE_DIR):
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(OCR_CACHE_DIR, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        limit = OCR_CACHE_MAX_MB * 1024 * 1024
+        for _, size, path in sorted(files):
+            if total <= limit:
+                break
+            os.remove(path)
+            total -= size
+    except OSError as e:
+        print(f"Advertencia: no se pudo podar la caché de OCR: {e}")
+
+
+def _load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_png(f, img):
+    # Sin pérdida para las imágenes uint8 de apply_preprocessing; las binarizadas
+    # ocupan una fracción de lo que ocupa el array crudo
+    ok, buf = cv2.imencode('.png', img)
+    if not ok:
+        raise OSError("No se pudo codificar la imagen preprocesada")
+    f.write(buf.tobytes())
+
+
+def _load_png(path):
+    with open(path, 'rb') as f:
+        img = cv2.imdecode(np.frombuffer(f.read(), np.uint8), cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise ValueError(f"Imagen de caché inválida: {path}")
+    return img
+
+
+def _decode_image_cached(image_hash, image_bytes):
+    """Decodifica la imagen o la toma de memoria si se decodificó hace poco"""
+    global _decoded_cache_bytes
+    with _ocr_cache_lock:
+        img = _decoded_cache.get(image_hash)
+        if img is not None:
+            _decoded_cache.move_to_end(image_hash)
+            return img
+    img = decode_image(image_bytes)
+    # La imagen se comparte entre pedidos: el preprocesamiento no debe modificarla
+    img.flags.writeable = False
+    limit = OCR_DECODED_CACHE_MB * 1024 * 1024
+    if img.nbytes <= limit:
+        with _ocr_cache_lock:
+            if image_hash not in _decoded_cache:
+                _decoded_cache[image_hash] = img
+                _decoded_cache_bytes += img.nbytes
+            while _decoded_cache_bytes > limit:
+                _, old = _decoded_cache.popitem(last=False)
+                _decoded_cache_bytes -= old.nbytes
+    return img
+
+
+class OCRQueueFull(RuntimeError):
+    """Hay OCR_POOL_QUEUE_MAX imágenes en proceso y no se aceptan más por ahora"""
+
+
+# ==================== POOL DE OCR LOCAL ====================
+
+_ocr_executor = ThreadPoolExecutor(max_workers=OCR_POOL_WORKERS, thread_name_prefix='ocr')
+_ocr_lock = threading.Lock()
+_ocr_in_flight = 0
+_ocr_stats = {
+    'completed': 0,
+    'errors': 0,
+    'rejected': 0,
+    'timeouts': 0,
+    'seconds': 0.0,
+    'started_at': time.time(),
+}
+
+# lang -> motores tesserocr libres (con los idiomas ya cargados)
+_ocr_engines = {}
+
+_TSV_COLUMNS = ['level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+                'left', 'top', 'width', 'height', 'conf', 'text']
+
+
+def _acquire_engine(lang):
+    with _ocr_lock:
+        engines = _ocr_engines.setdefault(lang, queue.LifoQueue())
+    try:
+        return engines.get_nowait()
+    except queue.Empty:
+        return tesserocr.PyTessBaseAPI(lang=lang)
+
+
+def _release_engine(lang, api):
+    _ocr_engines[lang].put(api)
+
+
+def _warm_engine(lang):
+    """Crea un motor y lo deja libre para que la primera imagen no espere la carga de idiomas"""
+    api = tesserocr.PyTessBaseAPI(lang=lang)
+    with _ocr_lock:
+        engines = _ocr_engines.setdefault(lang, queue.LifoQueue())
+    engines.put(api)
+
+
+def _tsv_to_data(tsv):
+    """Convierte la salida TSV de Tesseract al mismo dict que image_to_data(output_type=DICT)"""
+    data = {column: [] for column in _TSV_COLUMNS}
+    for row in tsv.splitlines():
+        values = row.split('\t')
+        if len(values) < 11 or not values[0].isdigit():
+            continue
+        values = values[:12] + [''] * (12 - len(values))
+        for column, value in zip(_TSV_COLUMNS[:10], values[:10]):
+            data[column].append(int(value))
+        data['conf'].append(float(values[10]))
+        data['text'].append(values[11])
+    return data
+
+
+def _ocr_data_tesserocr(img_array, psm_mode, lang):
+    if len(img_array.shape) == 2:
+        pil_img = Image.fromarray(img_array)
+    else:
+        pil_img = Image.fromarray(cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB))
+    
+    api = _acquire_engine(lang)
+    try:
+        api.SetPageSegMode(int(psm_mode))
+        api.SetImage(pil_img)
+        api.Recognize()
+        return _tsv_to_data(api.GetTSVText(0))
+    finally:
+        api.Clear()
+        _release_engine(lang, api)
+
+
+def _ocr_data_pytesseract(img_array, psm_mode, lang):
+    return pytesseract.image_to_data(
+        img_array,
+        config=f'--psm {psm_mode} -l {lang}',
+        output_type=pytesseract.Output.DICT
+    )
+
+
+def _run_ocr_job(img_array, psm_mode, lang):
+    if TESSEROCR_AVAILABLE:
+        return _ocr_data_tesserocr(img_array, psm_mode, lang)
+    return _ocr_data_pytesseract(img_array, psm_mode, lang)
+
+
+def run_ocr(img_array, psm_mode='6', lang=OCR_DEFAULT_LANG, timeout=None):
     """
-    Procesa OCR usando un servidor remoto
+    Ejecuta Tesseract sobre una imagen ya preprocesada en el pool de OCR
     
     Args:
-        image_bytes: Bytes de la imagen
-        config: dict con parámetros de configuración
+        img_array: numpy array de la imagen
+        psm_mode: modo PSM de Tesseract
+        lang: idiomas de Tesseract
+        timeout: segundos máximos de espera (default OCR_JOB_TIMEOUT)
     
     Returns:
-        dict con text y words
+        dict con el mismo formato que pytesseract.image_to_data(output_type=DICT)
+    
+    Raises:
+        OCRQueueFull si ya hay OCR_POOL_QUEUE_MAX imágenes en proceso
     """
-    if not OCR_REMOTE_URL:
-        raise ValueError("OCR_SERVER_URL no está configurado en las variables de entorno")
+    return run_ocr_many([img_array], psm_mode, lang, timeout)[0]
+
+
+def _release_slot_when_done(futures):
+    """
+    Libera el lugar en la cola cuando terminan todas las partes
     
-    # Preparar datos para enviar
-    files = {
-        'imagen': ('image.png', image_bytes, 'image/png')
-    }
+    Una parte que sigue en Tesseract después del timeout ocupa un hilo y un
+    motor del pool, así que sigue contando en OCR_POOL_QUEUE_MAX.
+    """
+    pending = [len(futures)]
+    
+    def part_done(_future=None):
+        global _ocr_in_flight
+        with _ocr_lock:
+            pending[0] -= 1
+            if pending[0] <= 0:
+                _ocr_in_flight -= 1
+    
+    if not futures:
+        part_done()
+    for future in futures:
+        future.add_done_callback(part_done)
+
+
+def run_ocr_many(images, psm_mode='6', lang=OCR_DEFAULT_LANG, timeout=None):
+    """
+    Ejecuta Tesseract en paralelo sobre varias partes de una misma imagen
+    
+    Todas las partes ocupan un solo lugar de la cola y comparten el timeout.
+    
+    Returns:
+        lista de dicts de image_to_data, en el mismo orden que images
+    """
+    global _ocr_in_flight
+    with _ocr_lock:
+        if _ocr_in_flight >= OCR_POOL_QUEUE_MAX:
+            _ocr_stats['rejected'] += 1
+            raise OCRQueueFull(f'Hay {_ocr_in_flight} imágenes en proceso de OCR, intente nuevamente en unos segundos')
+        _ocr_in_flight += 1
     
+    start = time.perf_counter()
+    deadline = time.monotonic() + (timeout or OCR_JOB_TIMEOUT)
+    futures = []
+    try:
+        for img in images:
+            futures.append(_ocr_executor.submit(_run_ocr_job, img, psm_mode, lang))
+        try:
+            results = [future.result(timeout=max(0, deadline - time.monotonic())) for future in futures]
+        except FuturesTimeoutError:
+            for future in futures:
+                future.cancel()
+            with _ocr_lock:
+                _ocr_stats['timeouts'] += 1
+            raise TimeoutError(f'El OCR no terminó en {timeout or OCR_JOB_TIMEOUT} segundos')
+    except Exception:
+        for future in futures:
+            future.cancel()
+        with _ocr_lock:
+            _ocr_stats['errors'] += 1
+        raise
+    finally:
+        _release_slot_when_done(futures)
+    
+    with _ocr_lock:
+        _ocr_stats['completed'] += 1
+        _ocr_stats['seconds'] += time.perf_counter() - start
+    return results
+
+
+def ocr_pool_stats():
+    """Imágenes procesadas, errores, rechazos, tiempo promedio e imágenes por minuto del pool"""
+    with _ocr_lock:
+        stats = dict(_ocr_stats)
+        in_flight = _ocr_in_flight
+    completed = stats['completed']
+    minutes = (time.time() - stats['started_at']) / 60
+    return {
+        'engine': 'tesserocr' if TESSEROCR_AVAILABLE else 'pytesseract',
+        'workers': OCR_POOL_WORKERS,
+        'queue_max': OCR_POOL_QUEUE_MAX,
+        'in_flight': in_flight,
+        'completed': completed,
+        'errors': stats['errors'],
+        'rejected': stats['rejected'],
+        'timeouts': stats['timeouts'],
+        'avg_seconds': stats['seconds'] / completed if completed else 0.0,
+        'images_per_minute': completed / minutes if minutes else 0.0,
+    }
+
+
+# Cargar los idiomas por defecto en segundo plano al importar el módulo
+if TESSEROCR_AVAILABLE:
+    for _ in range(OCR_POOL_WORKERS):
+        _ocr_executor.submit(_warm_engine, OCR_DEFAULT_LANG)
+
+
+# ==================== CLIENTE DE OCR REMOTO ====================
+
+_remote_session = None
+_remote_session_lock = threading.Lock()
+_remote_semaphore = threading.BoundedSemaphore(max(1, OCR_REMOTE_MAX_CONCURRENT))
+
+
+def _get_remote_session():
+    """Sesión HTTP compartida con conexiones keep-alive y reintentos de conexión"""
+    global _remote_session
+    with _remote_session_lock:
+        if _remote_session is None:
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            
+            # Solo se reintentan los errores de conexión (el pedido no llegó al
+            # servidor). Un timeout de lectura no se reintenta: el servidor ya
+            # estuvo procesando OCR_REMOTE_TIMEOUT segundos. Las respuestas
+            # 502/503/504 se reintentan en _post_remote, dentro del plazo total.
+            retry = Retry(
+                total=OCR_REMOTE_RETRIES,
+                connect=OCR_REMOTE_RETRIES,
+                read=0,
+                status=0,
+                backoff_factor=0.5,
+                allowed_methods=frozenset(['POST']),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1,
+                                  pool_maxsize=max(1, OCR_REMOTE_MAX_CONCURRENT),
+                                  max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _remote_session = session
+        return _remote_session
+
+
+def _remote_url(endpoint):
+    """URL de un endpoint del servidor OCR a partir de OCR_SERVER_URL"""
+    base_url = OCR_REMOTE_URL.rstrip('/')
+    # OCR_SERVER_URL puede ser la URL base o la del endpoint /api/ocr/process
+    if base_url.endswith('/api/ocr/process'):
+        base_url = base_url[:-len('/api/ocr/process')]
+    return f"{base_url}/{endpoint}"
+
+
+def _remote_form_data(config):
+    """Campos del formulario con la configuración, en el formato de /api/ocr/process"""
     data = {
         'enable_preprocessing': str(config.get('enable_preprocessing', True)),
         'threshold': str(config.get('threshold', 128)),
@@ -173,73 +600,305 @@ def process_ocr_remote(image_bytes, config):
         'enable_smoothing': str(config.get('enable_smoothing', True)),
         'enable_grayscale': str(config.get('enable_grayscale', True)),
         'psm_mode': str(config.get('psm_mode', '6')),
-        'lang': config.get('lang', 'spa+por+eng')
+        'lang': config.get('lang', 'spa+por+eng'),
+        'tiled': str(config.get('tiled', False))
     }
     
     # Agregar región de recorte si existe
     if config.get('crop_region'):
-        import json
         data['crop_region'] = json.dumps(config['crop_region'])
+    return data
+
+
+def _convert_remote_result(result):
+    """Convierte la respuesta del servidor remoto al formato de process_ocr_opencv"""
+    # Convertir formato de palabras si es necesario
+    words = []
+    for word in result.get('words', []):
+        if isinstance(word, list) and len(word) >= 3:
+            # Formato: [[coords], text, confidence]
+            bbox_coords = word[0]
+            text = word[1]
+            conf = word[2]
+            
+            # Convertir coordenadas a formato esperado
+            if len(bbox_coords) >= 4:
+                words.append({
+                    'text': text,
+                    'confidence': conf * 100 if conf < 1 else conf,
+                    'bbox': {
+                        'x0': bbox_coords[0][0],
+                        'y0': bbox_coords[0][1],
+                        'x1': bbox_coords[2][0],
+                        'y1': bbox_coords[2][1]
+                    }
+                })
+        elif isinstance(word, dict):
+            # Ya está en formato correcto
+            words.append(word)
     
-    # Determinar URL del endpoint
-    if OCR_REMOTE_URL.endswith('/'):
-        ocr_url = OCR_REMOTE_URL.rstrip('/')
-    else:
-        ocr_url = OCR_REMOTE_URL
+    return {
+        'text': result.get('text', ''),
+        'words': words
+    }
+
+
+_REMOTE_RETRY_STATUS = (502, 503, 504)
+
+
+def _remote_retry_wait(response, attempt):
+    """Segundos a esperar antes de reintentar: Retry-After si viene, si no backoff exponencial"""
+    retry_after = response.headers.get('Retry-After', '')
+    if retry_after.isdigit():
+        return float(retry_after)
+    return 0.5 * (2 ** attempt)
+
+
+def _post_remote(url, files, data):
+    """POST al servidor OCR respetando el límite de pedidos simultáneos
+
+    El OCR no modifica nada en el servidor, así que un 502/503/504 se reintenta
+    hasta OCR_REMOTE_RETRIES veces. Todo el pedido (espera de turno, intentos
+    y pausas entre ellos) se corta a los OCR_REMOTE_DEADLINE segundos.
+    """
+    deadline = time.monotonic() + OCR_REMOTE_DEADLINE
+    if not _remote_semaphore.acquire(timeout=OCR_REMOTE_DEADLINE):
+        raise Exception(f"El servidor OCR remoto está ocupado; no se pudo enviar el pedido en {OCR_REMOTE_DEADLINE:.0f}s")
+    try:
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Exception(f"El servidor OCR remoto no respondió en {OCR_REMOTE_DEADLINE:.0f}s ({url})")
+            try:
+                response = _get_remote_session().post(
+                    url,
+                    files=files,
+                    data=data,
+                    timeout=(min(OCR_REMOTE_CONNECT_TIMEOUT, remaining), min(OCR_REMOTE_TIMEOUT, remaining))
+                )
+                if response.status_code in _REMOTE_RETRY_STATUS and attempt < OCR_REMOTE_RETRIES:
+                    wait = _remote_retry_wait(response, attempt)
+                    if time.monotonic() + wait < deadline:
+                        attempt += 1
+                        time.sleep(wait)
+                        continue
+                response.raise_for_status()
+                break
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"Error al conectar con servidor OCR remoto ({url}): {str(e)}")
+    finally:
+        _remote_semaphore.release()
+    try:
+        return response.json()
+    except ValueError as e:
+        raise Exception(f"Error al procesar respuesta del servidor OCR remoto: {str(e)}")
+
+
+def process_ocr_remote(image_bytes, config):
+    """
+    Procesa OCR usando un servidor remoto
     
-    # Si no termina con /api/ocr/process, agregarlo
-    if '/api/ocr/process' not in ocr_url:
-        if not ocr_url.endswith('/'):
-            ocr_url += '/'
-        ocr_url += 'api/ocr/process'
+    Args:
+        image_bytes: Bytes de la imagen
+        config: dict con parámetros de configuración
     
-    try:
-        # Enviar petición al servidor remoto
-        response = requests.post(
-            ocr_url,
-            files=files,
-            data=data,
-            timeout=120  # 2 minutos de timeout
-        )
-        
-        response.raise_for_status()
-        result = response.json()
-        
-        # Convertir formato de palabras si es necesario
-        words = []
-        if 'words' in result:
-            for word in result['words']:
-                if isinstance(word, list) and len(word) >= 3:
-                    # Formato: [[coords], text, confidence]
-                    bbox_coords = word[0]
-                    text = word[1]
-                    conf = word[2]
-                    
-                    # Convertir coordenadas a formato esperado
-                    if len(bbox_coords) >= 4:
-                        words.append({
-                            'text': text,
-                            'confidence': conf * 100 if conf < 1 else conf,
-                            'bbox': {
-                                'x0': bbox_coords[0][0],
-                                'y0': bbox_coords[0][1],
-                                'x1': bbox_coords[2][0],
-                                'y1': bbox_coords[2][1]
-                            }
-                        })
-                elif isinstance(word, dict):
-                    # Ya está en formato correcto
-                    words.append(word)
+    Returns:
+        dict con text y words
+    """
+    if not OCR_REMOTE_URL:
+        raise ValueError("OCR_SERVER_URL no está configurado en las variables de entorno")
+    
+    files = {
+        'imagen': ('image.png', image_bytes, 'image/png')
+    }
+    result = _post_remote(_remote_url('api/ocr/process'), files, _remote_form_data(config))
+    return _convert_remote_result(result)
+
+
+def process_ocr_remote_batch(images, config):
+    """
+    Procesa varias imágenes con la misma configuración en el servidor remoto
+    
+    Las imágenes se envían de a OCR_REMOTE_BATCH_SIZE por pedido a
+    /api/ocr/process-batch, con hasta OCR_REMOTE_MAX_CONCURRENT pedidos a la vez.
+    
+    Args:
+        images: lista de bytes de imágenes
+        config: dict con parámetros de configuración
+    
+    Returns:
+        lista de dicts con text y words (o error), en el mismo orden que images
+    """
+    if not OCR_REMOTE_URL:
+        raise ValueError("OCR_SERVER_URL no está configurado en las variables de entorno")
+    
+    url = _remote_url('api/ocr/process-batch')
+    data = _remote_form_data(config)
+    batch_size = max(1, OCR_REMOTE_BATCH_SIZE)
+    batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+    
+    def send(batch):
+        files = [('imagenes', (f'image_{i}.png', image_bytes, 'image/png'))
+                 for i, image_bytes in enumerate(batch)]
+        results = _post_remote(url, files, data).get('results', [])
+        if len(results) != len(batch):
+            raise Exception("El servidor OCR remoto no devolvió un resultado por imagen")
+        return [result if 'error' in result else _convert_remote_result(result) for result in results]
+    
+    if len(batches) <= 1:
+        return [result for batch in batches for result in send(batch)]
+    with ThreadPoolExecutor(max_workers=min(len(batches), max(1, OCR_REMOTE_MAX_CONCURRENT))) as executor:
+        return [result for batch_results in executor.map(send, batches) for result in batch_results]
+
+
+def text_from_ocr_data(ocr_data):
+    """
+    Reconstruye el texto completo a partir del resultado de image_to_data
+    
+    Sigue el formato de salida de Tesseract (image_to_string): palabras de una
+    línea separadas por espacio, cada línea terminada en salto de línea, una
+    línea en blanco al final de cada párrafo y un salto de página al final de
+    cada página.
+    
+    Args:
+        ocr_data: dict devuelto por pytesseract.image_to_data(output_type=DICT)
+    
+    Returns:
+        str con el texto extraído
+    """
+    pages = []
+    paragraphs = []
+    lines = []
+    words = []
+    current_page = current_paragraph = current_line = None
+    
+    def close_line():
+        if words:
+            lines.append(' '.join(words))
+            words.clear()
+    
+    def close_paragraph():
+        close_line()
+        if lines:
+            paragraphs.append(''.join(line + '\n' for line in lines) + '\n')
+            lines.clear()
+    
+    def close_page():
+        close_paragraph()
+        if paragraphs:
+            pages.append(''.join(paragraphs) + '\f')
+            paragraphs.clear()
+    
+    for i in range(len(ocr_data['text'])):
+        # Solo las filas de nivel palabra (5) tienen texto
+        if int(ocr_data['level'][i]) != 5:
+            continue
+        word_text = ocr_data['text'][i].strip()
+        if not word_text:
+            continue
         
-        return {
-            'text': result.get('text', ''),
-            'words': words
-        }
-    
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Error al conectar con servidor OCR remoto ({ocr_url}): {str(e)}")
-    except Exception as e:
-        raise Exception(f"Error al procesar respuesta del servidor OCR remoto: {str(e)}")
+        page = ocr_data['page_num'][i]
+        paragraph = (page, ocr_data['block_num'][i], ocr_data['par_num'][i])
+        line = paragraph + (ocr_data['line_num'][i],)
+        if page != current_page:
+            close_page()
+        elif paragraph != current_paragraph:
+            close_paragraph()
+        elif line != current_line:
+            close_line()
+        current_page, current_paragraph, current_line = page, paragraph, line
+        words.append(word_text)
+    
+    close_page()
+    return ''.join(pages)
+
+def downscale_image(img, max_dimension=OCR_MAX_DIMENSION):
+    """
+    Reduce la imagen si su lado mayor supera max_dimension
+    
+    Returns:
+        tupla (imagen, escala aplicada)
+    """
+    height, width = img.shape[:2]
+    largest = max(height, width)
+    if max_dimension <= 0 or largest <= max_dimension:
+        return img, 1.0
+    scale = max_dimension / largest
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA), scale
+
+def text_bands(img, min_gap=OCR_TILE_MIN_GAP, min_height=OCR_TILE_MIN_HEIGHT):
+    """
+    Divide la imagen en franjas horizontales cortando por filas sin texto
+    
+    Returns:
+        lista de (y0, y1) de las franjas con texto
+    """
+    gray = img if len(img.shape) == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    ink_rows = np.count_nonzero(gray < 128, axis=1) > max(1, width // 500)
+    
+    # Cortar en la mitad de cada tramo de filas en blanco suficientemente alto
+    cuts = [0]
+    y = 0
+    while y < height:
+        if ink_rows[y]:
+            y += 1
+            continue
+        start = y
+        while y < height and not ink_rows[y]:
+            y += 1
+        if start > 0 and y < height and y - start >= min_gap:
+            cuts.append((start + y) // 2)
+    cuts.append(height)
+    
+    # Unir tramos consecutivos hasta alcanzar el alto mínimo
+    bands = []
+    y0 = 0
+    for y1 in cuts[1:]:
+        if y1 - y0 >= min_height or y1 == height:
+            bands.append((y0, y1))
+            y0 = y1
+    if len(bands) > 1 and bands[-1][1] - bands[-1][0] < min_height:
+        last = bands.pop()
+        bands[-1] = (bands[-1][0], last[1])
+    
+    bands = [(y0, y1) for y0, y1 in bands if ink_rows[y0:y1].any()]
+    return bands or [(0, height)]
+
+def _merge_band_data(band_results, bands, scale):
+    """Une los resultados de cada franja llevando las coordenadas a las de la imagen completa"""
+    merged = {column: [] for column in _TSV_COLUMNS}
+    for index, ((y0, _), data) in enumerate(zip(bands, band_results)):
+        for i in range(len(data['text'])):
+            for column in ('level', 'page_num', 'par_num', 'line_num', 'word_num', 'conf', 'text'):
+                merged[column].append(data[column][i])
+            # Cada franja aporta sus propios bloques para no mezclar párrafos
+            merged['block_num'].append(index * 1000 + int(data['block_num'][i]))
+            merged['left'].append(round(data['left'][i] / scale))
+            merged['top'].append(round((data['top'][i] + y0) / scale))
+            merged['width'].append(round(data['width'][i] / scale))
+            merged['height'].append(round(data['height'][i] / scale))
+    return merged
+
+def ocr_tiled(img, psm_mode='6', lang=OCR_DEFAULT_LANG):
+    """
+    OCR de una imagen grande por franjas horizontales en paralelo
+    
+    Reduce la imagen si supera OCR_MAX_DIMENSION, la divide en franjas de
+    texto y procesa cada franja en el pool. Las coordenadas del resultado
+    son las de la imagen recibida.
+    
+    Returns:
+        dict con el mismo formato que pytesseract.image_to_data(output_type=DICT)
+    """
+    small, scale = downscale_image(img)
+    # Al menos dos franjas por worker para repartir bien la carga
+    min_height = max(OCR_TILE_MIN_HEIGHT, small.shape[0] // (OCR_POOL_WORKERS * 2))
+    bands = text_bands(small, min_height=min_height)
+    results = run_ocr_many([small[y0:y1] for y0, y1 in bands], psm_mode, lang)
+    return _merge_band_data(results, bands, scale)
 
 def process_ocr_opencv(image_bytes, config):
     """
@@ -257,31 +916,43 @@ def process_ocr_opencv(image_bytes, config):
             - crop_region: dict (opcional)
             - psm_mode: str (modo PSM de Tesseract, default '6')
             - lang: str (idiomas, default 'spa+por+eng')
+            - tiled: bool (OCR por franjas en paralelo, para escaneos grandes)
     
     Returns:
         dict con:
             - text: str (texto extraído)
             - words: list de dicts con {text, confidence, bbox}
     """
-    # Preprocesar imagen
-    processed_img = preprocess_image_opencv(image_bytes, config)
-    
     # Configurar Tesseract
     psm_mode = config.get('psm_mode', '6')
-    lang = config.get('lang', 'spa+por+eng')
+    lang = config.get('lang', OCR_DEFAULT_LANG)
     
-    # Configuración de Tesseract
-    custom_config = f'--psm {psm_mode} -l {lang}'
+    # Misma imagen con la misma configuración: el resultado ya está en caché
+    image_hash = hashlib.sha256(image_bytes).hexdigest()
+    preprocessing_key = _preprocessing_key(image_hash, config)
+    tiled = bool(config.get('tiled', False))
+    result_key = _cache_key(preprocessing_key, str(psm_mode), lang,
+                            'tesserocr' if TESSEROCR_AVAILABLE else 'pytesseract',
+                            [OCR_MAX_DIMENSION, OCR_TILE_MIN_GAP, OCR_TILE_MIN_HEIGHT] if tiled else None)
+    cached_result = _cache_read(result_key, 'json', _load_json)
+    if cached_result is not None:
+        return cached_result
     
-    # Ejecutar OCR
-    ocr_data = pytesseract.image_to_data(
-        processed_img,
-        config=custom_config,
-        output_type=pytesseract.Output.DICT
-    )
+    # Preprocesar imagen (o reutilizar la preprocesada con la misma configuración)
+    processed_img = _cache_read(preprocessing_key, 'png', _load_png)
+    if processed_img is None:
+        img = _decode_image_cached(image_hash, image_bytes)
+        processed_img = apply_preprocessing(img, config)
+        _cache_write(preprocessing_key, 'png', lambda f: _save_png(f, processed_img))
+    
+    # Ejecutar OCR en el pool (una sola pasada de Tesseract para texto y palabras)
+    if tiled:
+        ocr_data = ocr_tiled(processed_img, psm_mode, lang)
+    else:
+        ocr_data = run_ocr(processed_img, psm_mode, lang)
     
     # Extraer texto completo
-    text = pytesseract.image_to_string(processed_img, config=custom_config, lang=lang)
+    text = text_from_ocr_data(ocr_data)
     
     # Procesar palabras con coordenadas y confianza
     words = []
@@ -309,10 +980,12 @@ def process_ocr_opencv(image_bytes, config):
                 }
             })
     
-    return {
+    result = {
         'text': text,
         'words': words
     }
+    _cache_write(result_key, 'json', lambda f: f.write(json.dumps(result).encode('utf-8')))
+    return result
 
 def process_ocr(image_bytes, config):
     """
@@ -330,6 +1003,26 @@ def process_ocr(image_bytes, config):
     else:
         return process_ocr_opencv(image_bytes, config)
 
+def process_ocr_batch(images, config):
+    """
+    Procesa varias imágenes con la misma configuración, en el servidor remoto o localmente
+    
+    Returns:
+        lista de dicts con text y words, o con error si falló esa imagen
+    """
+    if USE_REMOTE_OCR and OCR_REMOTE_URL:
+        return process_ocr_remote_batch(images, config)
+    
+    results = []
+    for image_bytes in images:
+        try:
+            results.append(process_ocr_opencv(image_bytes, config))
+        except OCRQueueFull:
+            raise
+        except Exception as e:
+            results.append({'error': str(e)})
+    return results
+
 def image_to_base64(img_array):
     """
     Convierte un array de numpy (imagen OpenCV) a base64
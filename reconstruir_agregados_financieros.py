@@ -0,0 +1,37 @@
+"""
+Script para reconstruir las tablas agregadas de los reportes financieros:
+- movimientos_bancarios_diarios (libro diario por banco)
+- resumen_financiero_mensual (totales mensuales por proyecto, categoría y banco)
+Normalmente las mantienen los triggers del esquema; usar tras cargas masivas.
+Uso: python reconstruir_agregados_financieros.py [movimientos|resumen]
+"""
+import sys
+from dotenv import load_dotenv
+import financiero
+
+load_dotenv()
+
+AGREGADOS = {
+    'movimientos': ("movimientos bancarios diarios", financiero.reconstruir_movimientos_bancarios),
+    'resumen': ("resumen financiero mensual", financiero.reconstruir_resumen_financiero_mensual),
+}
+
+def main():
+    nombres = sys.argv[1:] or list(AGREGADOS)
+    for nombre in nombres:
+        if nombre not in AGREGADOS:
+            print(f"Uso: python reconstruir_agregados_financieros.py [{'|'.join(AGREGADOS)}]")
+            sys.exit(1)
+    
+    for nombre in nombres:
+        descripcion, reconstruir = AGREGADOS[nombre]
+        print(f"Reconstruyendo {descripcion}...")
+        try:
+            filas = reconstruir()
+        except Exception as e:
+            print(f"❌ Error al reconstruir {descripcion}: {e}")
+            sys.exit(1)
+        print(f"✅ {descripcion.capitalize()} reconstruido ({filas} filas)")
+
+if __name__ == "__main__":
+    main()
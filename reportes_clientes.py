@@ -5,8 +5,20 @@ Maneja la consulta y cálculo de reportes de facturas por cliente
 import psycopg2
 import psycopg2.extras
 import os
+import time
+import copy
+import functools
+import inspect
+import threading
+import operator
+from collections import OrderedDict
+from itertools import accumulate
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from dotenv import load_dotenv
 from datetime import datetime, date, timedelta
+import financiero
 
 load_dotenv()
 
@@ -18,14 +30,121 @@ PG_CONN = {
     "port": os.getenv("DB_PORT"),
 }
 
+# Límite de tiempo por consulta de reporte (segundos); 0 desactiva el límite
+REPORTES_TIMEOUT = float(os.getenv("REPORTES_TIMEOUT", "30"))
+REPORTES_PARALELOS_MAX = int(os.getenv("REPORTES_PARALELOS_MAX", "6"))
+
 
 def conectar():
     """Conecta a la base de datos"""
-    conn = psycopg2.connect(**PG_CONN)
+    opciones = {}
+    if REPORTES_TIMEOUT > 0:
+        # Que el servidor también corte la consulta, no solo quien la espera
+        opciones["options"] = f"-c statement_timeout={int(REPORTES_TIMEOUT * 1000)}"
+    conn = psycopg2.connect(**PG_CONN, **opciones)
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
     return conn, cur
 
 
+# ==================== CACHÉ DE REPORTES ====================
+
+# Los reportes financieros se guardan por (reporte, filtros normalizados) y se
+# descartan cuando cambia financiero.version_datos_financieros(). La versión
+# está en la base y la incrementan los triggers de las tablas financieras, así
+# que una escritura hecha desde cualquier worker invalida la caché de todos
+# (los demás workers la ven pasados como mucho financiero.VERSION_DATOS_TTL
+# segundos, porque cada proceso reutiliza la versión leída durante ese lapso).
+REPORTES_CACHE_MAX = int(os.getenv("REPORTES_CACHE_MAX", "256"))
+
+_cache_reportes = OrderedDict()
+_cache_reportes_lock = Lock()
+_estadisticas_cache_reportes = {'aciertos': 0, 'fallos': 0}
+# Versión fijada para el hilo actual: los reportes anidados o ejecutados juntos
+# en ejecutar_reportes_en_paralelo no vuelven a consultarla
+_version_reportes = threading.local()
+
+
+def _normalizar_filtro(valor):
+    """Normaliza un filtro para la clave de caché ('' equivale a None, fechas en ISO)"""
+    if isinstance(valor, str):
+        return valor.strip() or None
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def _ejecutar_con_version(version, funcion, *args, **kwargs):
+    """Ejecuta funcion con la versión de datos fijada para el hilo actual"""
+    anterior = getattr(_version_reportes, 'version', None)
+    _version_reportes.version = version
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        _version_reportes.version = anterior
+
+
+def _cachear_reporte(funcion):
+    """Decorador: reutiliza el resultado de un reporte mientras los datos no cambien
+    
+    El resultado devuelto es una copia superficial; las filas se comparten
+    entre llamadas y no deben modificarse.
+    """
+    firma = inspect.signature(funcion)
+    
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        argumentos = firma.bind(*args, **kwargs)
+        argumentos.apply_defaults()
+        clave = (funcion.__name__, tuple(
+            (nombre, _normalizar_filtro(valor)) for nombre, valor in argumentos.arguments.items()
+        ))
+        # La versión se lee antes de consultar: si hay una escritura durante la
+        # consulta, el resultado queda guardado con la versión vieja y se descarta
+        version = getattr(_version_reportes, 'version', None)
+        if version is None:
+            version = financiero.version_datos_financieros()
+        if version is None:
+            # Sin versión no se puede saber si una entrada sigue vigente
+            with _cache_reportes_lock:
+                _estadisticas_cache_reportes['fallos'] += 1
+            return funcion(*args, **kwargs)
+        with _cache_reportes_lock:
+            entrada = _cache_reportes.get(clave)
+            if entrada is not None and entrada['version'] == version:
+                _cache_reportes.move_to_end(clave)
+                _estadisticas_cache_reportes['aciertos'] += 1
+                return copy.copy(entrada['resultado'])
+            _estadisticas_cache_reportes['fallos'] += 1
+        
+        resultado = _ejecutar_con_version(version, funcion, *args, **kwargs)
+        
+        with _cache_reportes_lock:
+            _cache_reportes[clave] = {'version': version, 'resultado': resultado}
+            _cache_reportes.move_to_end(clave)
+            while len(_cache_reportes) > REPORTES_CACHE_MAX:
+                _cache_reportes.popitem(last=False)
+        return copy.copy(resultado)
+    
+    return envoltura
+
+
+def estadisticas_cache_reportes():
+    """Aciertos, fallos, tasa de aciertos y tamaño de la caché de reportes"""
+    with _cache_reportes_lock:
+        aciertos = _estadisticas_cache_reportes['aciertos']
+        fallos = _estadisticas_cache_reportes['fallos']
+        entradas = len(_cache_reportes)
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': aciertos / total if total else 0.0,
+        'entradas': entradas,
+        'max_entradas': REPORTES_CACHE_MAX,
+        'version_datos': financiero.version_datos_financieros(),
+    }
+
+
 def calcular_estado_pago(fecha_vencimiento, fecha_pago, tipo_venta):
     """Calcula el estado de pago basado en fechas"""
     if tipo_venta == 'Contado':
@@ -77,40 +196,66 @@ def calcular_dias_atraso(fecha_vencimiento, fecha_pago, tipo_venta):
     return 0
 
 
+# Expresiones SQL del saldo y del estado de pago (funciones definidas en schema_presupuestos.sql)
+_SALDO_CUENTA_A_PAGAR_SQL = "saldo_cuenta(cap.valor, cap.valor_cuota, cap.monto_abonado)"
+_ESTADO_PAGO_CUENTA_A_PAGAR_SQL = (
+    f"estado_pago_cuenta_a_pagar(cap.estado, {_SALDO_CUENTA_A_PAGAR_SQL}, "
+    "cap.vencimiento, cap.fecha_pago, cap.status_pago)"
+)
+
+# Filtro de estado -> (estado guardado, estados de pago calculados que se aceptan)
+_FILTROS_ESTADO_CUENTAS_A_PAGAR = {
+    'pagado': ('PAGADO', ['Pagado', 'Pagado (Atrasado)', 'Pagado (Adelantado)', 'Pagado (En día)']),
+    'pendiente': ('ABIERTO', ['Pendiente']),
+    'atrasado': ('ABIERTO', ['Atrasado', 'Pagado (Atrasado)']),
+    'adelantado': ('ABIERTO', ['Adelantado', 'Pagado (Adelantado)']),
+    'en día': ('ABIERTO', ['En día', 'Pagado (En día)']),
+    'en dia': ('ABIERTO', ['En día', 'Pagado (En día)']),
+}
+
+
+def _filtros_reportes_cuentas_a_pagar(proveedor_nombre=None, fecha_desde=None, fecha_hasta=None, estado_pago_filtro=None, tipo_filtro=None):
+    """Arma el WHERE (y sus parámetros) compartido por el conteo y el listado de cuentas a pagar"""
+    where_clauses = []
+    params = []
+    
+    if proveedor_nombre:
+        condicion, patron = financiero.condicion_texto_contiene("cap.proveedor", proveedor_nombre)
+        where_clauses.append(condicion)
+        params.append(patron)
+    
+    if fecha_desde:
+        where_clauses.append("cap.fecha_emision >= %s")
+        params.append(fecha_desde)
+    
+    if fecha_hasta:
+        where_clauses.append("cap.fecha_emision <= %s")
+        params.append(fecha_hasta)
+    
+    if tipo_filtro:
+        where_clauses.append("cap.tipo = %s")
+        params.append(tipo_filtro)
+    
+    # El estado de pago se calcula en SQL, así que el filtro, el conteo y la
+    # paginación se resuelven en la base de datos
+    if estado_pago_filtro and estado_pago_filtro.lower() in _FILTROS_ESTADO_CUENTAS_A_PAGAR:
+        estado, estados_pago = _FILTROS_ESTADO_CUENTAS_A_PAGAR[estado_pago_filtro.lower()]
+        where_clauses.append("cap.estado = %s")
+        where_clauses.append(f"{_ESTADO_PAGO_CUENTA_A_PAGAR_SQL} = ANY(%s)")
+        params.extend([estado, estados_pago])
+    
+    where_sql = ""
+    if where_clauses:
+        where_sql = "WHERE " + " AND ".join(where_clauses)
+    return where_sql, params
+
+
 def contar_reportes_cuentas_a_pagar(proveedor_nombre=None, fecha_desde=None, fecha_hasta=None, estado_pago_filtro=None, tipo_filtro=None):
     """Cuenta el total de reportes de cuentas a pagar según los filtros"""
     conn, cur = conectar()
     try:
-        where_clauses = []
-        params = []
-        
-        if proveedor_nombre:
-            where_clauses.append("UPPER(cap.proveedor) LIKE UPPER(%s)")
-            params.append(f"%{proveedor_nombre}%")
-        
-        if fecha_desde:
-            where_clauses.append("cap.fecha_emision >= %s")
-            params.append(fecha_desde)
-        
-        if fecha_hasta:
-            where_clauses.append("cap.fecha_emision <= %s")
-            params.append(fecha_hasta)
-        
-        if tipo_filtro:
-            where_clauses.append("cap.tipo = %s")
-            params.append(tipo_filtro)
-        
-        if estado_pago_filtro:
-            if estado_pago_filtro.lower() == 'pagado':
-                where_clauses.append("cap.estado = 'PAGADO'")
-            elif estado_pago_filtro.lower() == 'pendiente':
-                where_clauses.append("cap.estado = 'ABIERTO'")
-            elif estado_pago_filtro.lower() == 'atrasado':
-                where_clauses.append("(cap.estado = 'ABIERTO' AND cap.vencimiento < CURRENT_DATE) OR cap.status_pago = 'ATRASADO'")
-        
-        where_sql = ""
-        if where_clauses:
-            where_sql = "WHERE " + " AND ".join(where_clauses)
+        where_sql, params = _filtros_reportes_cuentas_a_pagar(
+            proveedor_nombre, fecha_desde, fecha_hasta, estado_pago_filtro, tipo_filtro)
         
         query = f"""
             SELECT COUNT(*)
@@ -126,48 +271,24 @@ def contar_reportes_cuentas_a_pagar(proveedor_nombre=None, fecha_desde=None, fec
 
 
 def obtener_reportes_cuentas_a_pagar(proveedor_nombre=None, fecha_desde=None, fecha_hasta=None, estado_pago_filtro=None, tipo_filtro=None, limite=None, offset=None):
-    """Obtiene reportes de cuentas a pagar de un proveedor o todos los proveedores"""
+    """Obtiene reportes de cuentas a pagar de un proveedor o todos los proveedores
+    
+    El saldo, el estado de pago y los días de atraso se calculan en SQL
+    (ver saldo_cuenta y estado_pago_cuenta_a_pagar en el esquema), por eso
+    LIMIT/OFFSET se aplican directamente en la consulta.
+    """
     conn, cur = conectar()
     try:
-        reportes = []
-        
-        # ========== OBTENER CUENTAS A PAGAR ==========
-        where_clauses = []
-        params = []
-        
-        if proveedor_nombre:
-            where_clauses.append("UPPER(cap.proveedor) LIKE UPPER(%s)")
-            params.append(f"%{proveedor_nombre}%")
-        
-        if fecha_desde:
-            where_clauses.append("cap.fecha_emision >= %s")
-            params.append(fecha_desde)
+        where_sql, params = _filtros_reportes_cuentas_a_pagar(
+            proveedor_nombre, fecha_desde, fecha_hasta, estado_pago_filtro, tipo_filtro)
         
-        if fecha_hasta:
-            where_clauses.append("cap.fecha_emision <= %s")
-            params.append(fecha_hasta)
-        
-        if tipo_filtro:
-            where_clauses.append("cap.tipo = %s")
-            params.append(tipo_filtro)
-        
-        # El filtro de estado se aplicará después de calcular el estado_pago en Python
-        # porque el estado depende de múltiples factores (fecha_vencimiento, status_pago, saldo, etc.)
-        # Solo filtramos "Pagado" en SQL porque es el único estado que es directo
-        if estado_pago_filtro:
-            if estado_pago_filtro.lower() == 'pagado':
-                where_clauses.append("cap.estado = 'PAGADO'")
-            # Para otros estados (pendiente, atrasado, adelantado), filtramos en Python
-            # después de calcular el estado real, pero pre-filtramos por ABIERTO para eficiencia
-            elif estado_pago_filtro.lower() in ['pendiente', 'atrasado', 'adelantado', 'en día', 'en dia']:
-                where_clauses.append("cap.estado = 'ABIERTO'")
-        
-        where_sql = ""
-        if where_clauses:
-            where_sql = "WHERE " + " AND ".join(where_clauses)
+        paginacion_sql = ""
+        if limite is not None:
+            paginacion_sql = "LIMIT %s OFFSET %s"
+            params.extend([limite, offset or 0])
         
-        # Query de cuentas a pagar
-        # NO aplicamos LIMIT/OFFSET aquí porque necesitamos filtrar por estado en Python primero
+        # Días de atraso: con fecha de pago es la diferencia (en cualquier sentido)
+        # contra el vencimiento; sin fecha de pago, los días vencidos hasta hoy
         query = f"""
             SELECT 
                 cap.id,
@@ -175,15 +296,19 @@ def obtener_reportes_cuentas_a_pagar(proveedor_nombre=None, fecha_desde=None, fe
                 cap.proveedor,
                 cap.factura,
                 cap.descripcion,
-                cap.valor,
                 cap.valor_cuota,
                 cap.monto_abonado,
                 cap.cuotas,
                 cap.vencimiento,
                 cap.fecha_pago,
-                cap.estado,
-                cap.status_pago,
                 cap.tipo,
+                {_SALDO_CUENTA_A_PAGAR_SQL} AS saldo,
+                {_ESTADO_PAGO_CUENTA_A_PAGAR_SQL} AS estado_pago,
+                CASE
+                    WHEN cap.vencimiento IS NULL THEN 0
+                    WHEN cap.fecha_pago IS NOT NULL THEN ABS(cap.fecha_pago - cap.vencimiento)
+                    ELSE GREATEST(CURRENT_DATE - cap.vencimiento, 0)
+                END AS dias_atraso,
                 td.nombre AS documento_nombre,
                 b.nombre AS banco_nombre,
                 cg.nombre AS cuenta_nombre,
@@ -195,135 +320,29 @@ def obtener_reportes_cuentas_a_pagar(proveedor_nombre=None, fecha_desde=None, fe
             LEFT JOIN proyectos p ON cap.proyecto_id = p.id
             {where_sql}
             ORDER BY cap.fecha_emision DESC, cap.id DESC
+            {paginacion_sql}
         """
         
         cur.execute(query, params)
-        cuentas_a_pagar = cur.fetchall()
         
-        # Procesar cuentas a pagar
-        for cuenta in cuentas_a_pagar:
-            fecha_emision = cuenta['fecha_emision']
-            if isinstance(fecha_emision, str):
-                fecha_emision = datetime.strptime(fecha_emision, "%Y-%m-%d").date()
-            elif isinstance(fecha_emision, datetime):
-                fecha_emision = fecha_emision.date()
-            
-            fecha_vencimiento = cuenta['vencimiento']
-            if fecha_vencimiento:
-                if isinstance(fecha_vencimiento, str):
-                    fecha_vencimiento = datetime.strptime(fecha_vencimiento, "%Y-%m-%d").date()
-                elif isinstance(fecha_vencimiento, datetime):
-                    fecha_vencimiento = fecha_vencimiento.date()
-            
-            fecha_pago = cuenta['fecha_pago']
-            if fecha_pago:
-                if isinstance(fecha_pago, str):
-                    fecha_pago = datetime.strptime(fecha_pago, "%Y-%m-%d").date()
-                elif isinstance(fecha_pago, datetime):
-                    fecha_pago = fecha_pago.date()
-            
-            # Calcular días de atraso
-            dias_atraso = 0
-            estado_pago_detalle = None  # Para indicar si fue adelantado, en día o atrasado cuando está pagado
-            
-            if fecha_vencimiento:
-                if fecha_pago:
-                    # Si tiene fecha de pago, calcular días de atraso/adelanto
-                    if fecha_pago > fecha_vencimiento:
-                        dias_atraso = (fecha_pago - fecha_vencimiento).days
-                        estado_pago_detalle = 'Atrasado'
-                    elif fecha_pago < fecha_vencimiento:
-                        dias_atraso = (fecha_vencimiento - fecha_pago).days
-                        estado_pago_detalle = 'Adelantado'
-                    else:
-                        dias_atraso = 0
-                        estado_pago_detalle = 'En día'
-                else:
-                    # Sin fecha de pago, calcular días de atraso desde hoy
-                    hoy = date.today()
-                    if hoy > fecha_vencimiento:
-                        dias_atraso = (hoy - fecha_vencimiento).days
-            
-            # Calcular saldo primero para determinar el estado
-            valor_cuota = float(cuenta['valor_cuota']) if cuenta['valor_cuota'] else None
-            valor = float(cuenta['valor']) if cuenta['valor'] else 0
-            monto_abonado = float(cuenta.get('monto_abonado') or 0)
-            monto_comparar = valor_cuota if valor_cuota is not None else valor
-            
-            # Calcular saldo correctamente
-            # El saldo es la diferencia entre lo que se debe y lo que se ha abonado
-            if monto_comparar is not None:
-                # Para valores positivos: saldo = valor - monto_abonado
-                # Para valores negativos (NCRE): el monto_abonado se guarda como positivo,
-                # pero conceptualmente es negativo, entonces: saldo = valor + monto_abonado
-                if monto_comparar < 0:
-                    # NCRE: el valor es negativo, el monto_abonado es positivo pero conceptualmente negativo
-                    saldo = monto_comparar + monto_abonado
-                    # Si el saldo es positivo (se pagó de más), poner 0
-                    if saldo > 0:
-                        saldo = 0
-                else:
-                    # Valor positivo: saldo = valor - monto_abonado
-                    saldo = monto_comparar - monto_abonado
-                    # Si el saldo queda negativo (se pagó de más), poner 0
-                    if saldo < 0:
-                        saldo = 0
-            else:
-                saldo = 0
-            
-            # Determinar estado de pago basándose en el saldo
-            estado_pago = cuenta['estado'] or 'ABIERTO'
-            
-            # Si el saldo es > 0, el estado debe ser "Pendiente" (a menos que ya sea "Pagado")
-            if saldo > 0.01 and estado_pago != 'PAGADO':
-                estado_pago = 'Pendiente'
-            # Si tiene fecha de pago, siempre es "Pagado" pero con detalle
-            elif fecha_pago:
-                if estado_pago_detalle:
-                    estado_pago = f'Pagado ({estado_pago_detalle})'
-                else:
-                    estado_pago = 'Pagado'
-            elif estado_pago == 'PAGADO':
-                # Si está marcado como PAGADO pero no tiene fecha_pago, solo mostrar "Pagado"
-                estado_pago = 'Pagado'
-            elif estado_pago == 'ABIERTO':
-                # Si no hay saldo, determinar estado según fecha de vencimiento
-                if fecha_vencimiento:
-                    hoy = date.today()
-                    if hoy > fecha_vencimiento:
-                        estado_pago = 'Atrasado'
-                    elif hoy == fecha_vencimiento:
-                        estado_pago = 'En día'
-                    else:
-                        estado_pago = 'Pendiente'
-                else:
-                    estado_pago = 'Pendiente'
-            
-            # Usar status_pago si está disponible (solo si no hay saldo pendiente y no tiene fecha_pago)
-            if saldo <= 0.01 and cuenta['status_pago'] and not fecha_pago:
-                status_map = {
-                    'ADELANTADO': 'Adelantado',
-                    'ATRASADO': 'Atrasado',
-                    'EN DIA': 'En día'
-                }
-                estado_pago = status_map.get(cuenta['status_pago'], estado_pago)
-            
-            reporte = {
+        reportes = []
+        for cuenta in cur.fetchall():
+            reportes.append({
                 'tipo': 'CUENTA_A_PAGAR',
                 'id': cuenta['id'],
                 'numero_factura': cuenta['factura'] or f"CAP-{cuenta['id']}",
-                'fecha_emision': fecha_emision,
+                'fecha_emision': cuenta['fecha_emision'],
                 'proveedor': cuenta['proveedor'],
                 'ruc': None,
                 'moneda': 'Gs',
                 'tipo_venta': cuenta.get('tipo', 'FCON'),
                 'plazo_dias': None,
-                'fecha_vencimiento': fecha_vencimiento,
-                'fecha_pago': fecha_pago,
-                'estado_pago': estado_pago,
-                'dias_atraso': dias_atraso,
-                'monto': saldo,  # Mostrar saldo en lugar del monto total
-                'monto_abonado': monto_abonado,  # Monto abonado
+                'fecha_vencimiento': cuenta['vencimiento'],
+                'fecha_pago': cuenta['fecha_pago'],
+                'estado_pago': cuenta['estado_pago'],
+                'dias_atraso': cuenta['dias_atraso'],
+                'monto': float(cuenta['saldo']),  # Mostrar saldo en lugar del monto total
+                'monto_abonado': float(cuenta.get('monto_abonado') or 0),  # Monto abonado
                 # Campos adicionales
                 'documento_nombre': cuenta.get('documento_nombre'),
                 'banco_nombre': cuenta.get('banco_nombre'),
@@ -332,38 +351,7 @@ def obtener_reportes_cuentas_a_pagar(proveedor_nombre=None, fecha_desde=None, fe
                 'descripcion': cuenta.get('descripcion'),
                 'cuotas': cuenta.get('cuotas'),
                 'valor_cuota': float(cuenta['valor_cuota']) if cuenta['valor_cuota'] else None
-            }
-            
-            # Aplicar filtro de estado después de calcular el estado_pago
-            if estado_pago_filtro:
-                estado_filtro_lower = estado_pago_filtro.lower()
-                if estado_filtro_lower == 'pagado':
-                    # Para "Pagado", aceptar cualquier variante que contenga "pagado"
-                    if 'pagado' not in estado_pago.lower():
-                        continue
-                elif estado_filtro_lower == 'pendiente':
-                    if estado_pago.lower() != 'pendiente':
-                        continue
-                elif estado_filtro_lower == 'atrasado':
-                    if estado_pago.lower() != 'atrasado' and 'atrasado' not in estado_pago.lower():
-                        continue
-                elif estado_filtro_lower == 'adelantado':
-                    if estado_pago.lower() != 'adelantado' and 'adelantado' not in estado_pago.lower():
-                        continue
-                elif estado_filtro_lower == 'en día' or estado_filtro_lower == 'en dia':
-                    if estado_pago.lower() != 'en día' and estado_pago.lower() != 'en dia' and 'en día' not in estado_pago.lower() and 'en dia' not in estado_pago.lower():
-                        continue
-            
-            reportes.append(reporte)
-        
-        # Ordenar por fecha de emisión descendente
-        reportes.sort(key=lambda x: x['fecha_emision'] if x['fecha_emision'] else date.min, reverse=True)
-        
-        # Aplicar paginación después del filtro de estado
-        if limite is not None:
-            inicio = offset if offset is not None else 0
-            fin = inicio + limite
-            reportes = reportes[inicio:fin]
+            })
         
         return reportes
     finally:
@@ -387,40 +375,66 @@ def obtener_proveedores_con_cuentas():
         conn.close()
 
 
+_SALDO_CUENTA_A_RECIBIR_SQL = "saldo_cuenta(car.valor, car.valor_cuota, car.monto_abonado)"
+_ESTADO_PAGO_CUENTA_A_RECIBIR_SQL = (
+    f"estado_pago_cuenta_a_recibir(car.estado, {_SALDO_CUENTA_A_RECIBIR_SQL}, "
+    "car.vencimiento, car.status_recibo)"
+)
+
+# Filtro de estado -> (estado guardado, estados de pago calculados que se aceptan)
+_FILTROS_ESTADO_CUENTAS_A_RECIBIR = {
+    'pagado': ('RECIBIDO', ['Pagado']),
+    'recibido': ('RECIBIDO', ['Pagado']),
+    'pendiente': ('ABIERTO', ['Pendiente']),
+    'atrasado': ('ABIERTO', ['Atrasado']),
+    'adelantado': ('ABIERTO', ['Adelantado']),
+    'en día': ('ABIERTO', ['En día']),
+    'en dia': ('ABIERTO', ['En día']),
+}
+
+
+def _filtros_reportes_cuentas_a_recibir(cliente_nombre=None, fecha_desde=None, fecha_hasta=None, estado_pago_filtro=None, tipo_filtro=None):
+    """Arma el WHERE (y sus parámetros) compartido por el conteo y el listado de cuentas a recibir"""
+    where_clauses = []
+    params = []
+    
+    if cliente_nombre:
+        condicion, patron = financiero.condicion_texto_contiene("car.cliente", cliente_nombre)
+        where_clauses.append(condicion)
+        params.append(patron)
+    
+    if fecha_desde:
+        where_clauses.append("car.fecha_emision >= %s")
+        params.append(fecha_desde)
+    
+    if fecha_hasta:
+        where_clauses.append("car.fecha_emision <= %s")
+        params.append(fecha_hasta)
+    
+    if tipo_filtro:
+        where_clauses.append("car.tipo = %s")
+        params.append(tipo_filtro)
+    
+    # El estado de pago se calcula en SQL, así que el filtro, el conteo y la
+    # paginación se resuelven en la base de datos
+    if estado_pago_filtro and estado_pago_filtro.lower() in _FILTROS_ESTADO_CUENTAS_A_RECIBIR:
+        estado, estados_pago = _FILTROS_ESTADO_CUENTAS_A_RECIBIR[estado_pago_filtro.lower()]
+        where_clauses.append("car.estado = %s")
+        where_clauses.append(f"{_ESTADO_PAGO_CUENTA_A_RECIBIR_SQL} = ANY(%s)")
+        params.extend([estado, estados_pago])
+    
+    where_sql = ""
+    if where_clauses:
+        where_sql = "WHERE " + " AND ".join(where_clauses)
+    return where_sql, params
+
+
 def contar_reportes_cuentas_a_recibir(cliente_nombre=None, fecha_desde=None, fecha_hasta=None, estado_pago_filtro=None, tipo_filtro=None):
     """Cuenta el total de reportes de cuentas a recibir según los filtros"""
     conn, cur = conectar()
     try:
-        where_clauses = []
-        params = []
-        
-        if cliente_nombre:
-            where_clauses.append("UPPER(car.cliente) LIKE UPPER(%s)")
-            params.append(f"%{cliente_nombre}%")
-        
-        if fecha_desde:
-            where_clauses.append("car.fecha_emision >= %s")
-            params.append(fecha_desde)
-        
-        if fecha_hasta:
-            where_clauses.append("car.fecha_emision <= %s")
-            params.append(fecha_hasta)
-        
-        if tipo_filtro:
-            where_clauses.append("car.tipo = %s")
-            params.append(tipo_filtro)
-        
-        if estado_pago_filtro:
-            if estado_pago_filtro.lower() == 'pagado' or estado_pago_filtro.lower() == 'recibido':
-                where_clauses.append("car.estado = 'RECIBIDO'")
-            elif estado_pago_filtro.lower() == 'pendiente':
-                where_clauses.append("car.estado = 'ABIERTO'")
-            elif estado_pago_filtro.lower() == 'atrasado':
-                where_clauses.append("(car.estado = 'ABIERTO' AND car.vencimiento < CURRENT_DATE) OR car.status_recibo = 'ATRASADO'")
-        
-        where_sql = ""
-        if where_clauses:
-            where_sql = "WHERE " + " AND ".join(where_clauses)
+        where_sql, params = _filtros_reportes_cuentas_a_recibir(
+            cliente_nombre, fecha_desde, fecha_hasta, estado_pago_filtro, tipo_filtro)
         
         query = f"""
             SELECT COUNT(*)
@@ -436,48 +450,24 @@ def contar_reportes_cuentas_a_recibir(cliente_nombre=None, fecha_desde=None, fec
 
 
 def obtener_reportes_cuentas_a_recibir(cliente_nombre=None, fecha_desde=None, fecha_hasta=None, estado_pago_filtro=None, tipo_filtro=None, limite=None, offset=None):
-    """Obtiene reportes de cuentas a recibir de un cliente o todos los clientes"""
+    """Obtiene reportes de cuentas a recibir de un cliente o todos los clientes
+    
+    El saldo, el estado de pago y los días de atraso se calculan en SQL
+    (ver saldo_cuenta y estado_pago_cuenta_a_recibir en el esquema), por eso
+    LIMIT/OFFSET se aplican directamente en la consulta.
+    """
     conn, cur = conectar()
     try:
-        reportes = []
-        
-        # ========== OBTENER CUENTAS A RECIBIR ==========
-        where_clauses = []
-        params = []
+        where_sql, params = _filtros_reportes_cuentas_a_recibir(
+            cliente_nombre, fecha_desde, fecha_hasta, estado_pago_filtro, tipo_filtro)
         
-        if cliente_nombre:
-            where_clauses.append("UPPER(car.cliente) LIKE UPPER(%s)")
-            params.append(f"%{cliente_nombre}%")
-        
-        if fecha_desde:
-            where_clauses.append("car.fecha_emision >= %s")
-            params.append(fecha_desde)
-        
-        if fecha_hasta:
-            where_clauses.append("car.fecha_emision <= %s")
-            params.append(fecha_hasta)
-        
-        if tipo_filtro:
-            where_clauses.append("car.tipo = %s")
-            params.append(tipo_filtro)
-        
-        # El filtro de estado se aplicará después de calcular el estado_pago en Python
-        # porque el estado depende de múltiples factores (fecha_vencimiento, status_recibo, etc.)
-        # Solo filtramos "Pagado" en SQL porque es el único estado que es directo
-        if estado_pago_filtro:
-            if estado_pago_filtro.lower() == 'pagado' or estado_pago_filtro.lower() == 'recibido':
-                where_clauses.append("car.estado = 'RECIBIDO'")
-            # Para otros estados (pendiente, atrasado, adelantado), filtramos en Python
-            # después de calcular el estado real, pero pre-filtramos por ABIERTO para eficiencia
-            elif estado_pago_filtro.lower() in ['pendiente', 'atrasado', 'adelantado', 'en día', 'en dia']:
-                where_clauses.append("car.estado = 'ABIERTO'")
-        
-        where_sql = ""
-        if where_clauses:
-            where_sql = "WHERE " + " AND ".join(where_clauses)
+        paginacion_sql = ""
+        if limite is not None:
+            paginacion_sql = "LIMIT %s OFFSET %s"
+            params.extend([limite, offset or 0])
         
-        # Query de cuentas a recibir
-        # NO aplicamos LIMIT/OFFSET aquí porque necesitamos filtrar por estado en Python primero
+        # Días de atraso: con fecha de recibo, los días recibidos después del
+        # vencimiento; sin fecha de recibo, los días vencidos hasta hoy
         query = f"""
             SELECT 
                 car.id,
@@ -485,15 +475,19 @@ def obtener_reportes_cuentas_a_recibir(cliente_nombre=None, fecha_desde=None, fe
                 car.cliente,
                 car.factura,
                 car.descripcion,
-                car.valor,
                 car.valor_cuota,
                 car.monto_abonado,
                 car.cuotas,
                 car.vencimiento,
                 car.fecha_recibo,
-                car.estado,
-                car.status_recibo,
                 car.tipo,
+                {_SALDO_CUENTA_A_RECIBIR_SQL} AS saldo,
+                {_ESTADO_PAGO_CUENTA_A_RECIBIR_SQL} AS estado_pago,
+                CASE
+                    WHEN car.vencimiento IS NULL THEN 0
+                    WHEN car.fecha_recibo IS NOT NULL THEN GREATEST(car.fecha_recibo - car.vencimiento, 0)
+                    ELSE GREATEST(CURRENT_DATE - car.vencimiento, 0)
+                END AS dias_atraso,
                 td.nombre AS documento_nombre,
                 b.nombre AS banco_nombre,
                 ci.nombre AS cuenta_nombre,
@@ -505,116 +499,29 @@ def obtener_reportes_cuentas_a_recibir(cliente_nombre=None, fecha_desde=None, fe
             LEFT JOIN proyectos p ON car.proyecto_id = p.id
             {where_sql}
             ORDER BY car.fecha_emision DESC, car.id DESC
+            {paginacion_sql}
         """
         
         cur.execute(query, params)
-        cuentas_a_recibir = cur.fetchall()
         
-        # Procesar cuentas a recibir
-        for cuenta in cuentas_a_recibir:
-            fecha_emision = cuenta['fecha_emision']
-            if isinstance(fecha_emision, str):
-                fecha_emision = datetime.strptime(fecha_emision, "%Y-%m-%d").date()
-            elif isinstance(fecha_emision, datetime):
-                fecha_emision = fecha_emision.date()
-            
-            fecha_vencimiento = cuenta['vencimiento']
-            if fecha_vencimiento:
-                if isinstance(fecha_vencimiento, str):
-                    fecha_vencimiento = datetime.strptime(fecha_vencimiento, "%Y-%m-%d").date()
-                elif isinstance(fecha_vencimiento, datetime):
-                    fecha_vencimiento = fecha_vencimiento.date()
-            
-            fecha_recibo = cuenta['fecha_recibo']
-            if fecha_recibo:
-                if isinstance(fecha_recibo, str):
-                    fecha_recibo = datetime.strptime(fecha_recibo, "%Y-%m-%d").date()
-                elif isinstance(fecha_recibo, datetime):
-                    fecha_recibo = fecha_recibo.date()
-            
-            # Calcular días de atraso
-            dias_atraso = 0
-            if fecha_vencimiento:
-                if fecha_recibo:
-                    if fecha_recibo > fecha_vencimiento:
-                        dias_atraso = (fecha_recibo - fecha_vencimiento).days
-                else:
-                    hoy = date.today()
-                    if hoy > fecha_vencimiento:
-                        dias_atraso = (hoy - fecha_vencimiento).days
-            
-            # Calcular saldo primero para determinar el estado
-            valor_cuota = float(cuenta['valor_cuota']) if cuenta['valor_cuota'] else None
-            valor = float(cuenta['valor']) if cuenta['valor'] else 0
-            monto_abonado = float(cuenta.get('monto_abonado') or 0)
-            monto_comparar = valor_cuota if valor_cuota is not None else valor
-            
-            # Calcular saldo correctamente
-            # El saldo es la diferencia entre lo que se debe y lo que se ha abonado
-            if monto_comparar is not None:
-                # Para valores positivos: saldo = valor - monto_abonado
-                # Para valores negativos (NCRE): el monto_abonado se guarda como positivo,
-                # pero conceptualmente es negativo, entonces: saldo = valor + monto_abonado
-                if monto_comparar < 0:
-                    # NCRE: el valor es negativo, el monto_abonado es positivo pero conceptualmente negativo
-                    saldo = monto_comparar + monto_abonado
-                    # Si el saldo es positivo (se pagó de más), poner 0
-                    if saldo > 0:
-                        saldo = 0
-                else:
-                    # Valor positivo: saldo = valor - monto_abonado
-                    saldo = monto_comparar - monto_abonado
-                    # Si el saldo queda negativo (se pagó de más), poner 0
-                    if saldo < 0:
-                        saldo = 0
-            else:
-                saldo = 0
-            
-            # Determinar estado de pago basándose en el saldo
-            estado_pago = cuenta['estado'] or 'ABIERTO'
-            if estado_pago == 'RECIBIDO':
-                estado_pago = 'Pagado'
-            elif saldo > 0.01:
-                # Si hay saldo pendiente, siempre es "Pendiente"
-                estado_pago = 'Pendiente'
-            elif estado_pago == 'ABIERTO':
-                # Si no hay saldo, determinar estado según fecha de vencimiento
-                if fecha_vencimiento:
-                    hoy = date.today()
-                    if hoy > fecha_vencimiento:
-                        estado_pago = 'Atrasado'
-                    elif hoy == fecha_vencimiento:
-                        estado_pago = 'En día'
-                    else:
-                        estado_pago = 'Pendiente'
-                else:
-                    estado_pago = 'Pendiente'
-            
-            # Usar status_recibo si está disponible (solo si no hay saldo pendiente)
-            if saldo <= 0.01 and cuenta['status_recibo']:
-                status_map = {
-                    'ADELANTADO': 'Adelantado',
-                    'ATRASADO': 'Atrasado',
-                    'EN DIA': 'En día'
-                }
-                estado_pago = status_map.get(cuenta['status_recibo'], estado_pago)
-            
-            reporte = {
+        reportes = []
+        for cuenta in cur.fetchall():
+            reportes.append({
                 'tipo': 'CUENTA_A_RECIBIR',
                 'id': cuenta['id'],
                 'numero_factura': cuenta['factura'] or f"CAR-{cuenta['id']}",
-                'fecha_emision': fecha_emision,
+                'fecha_emision': cuenta['fecha_emision'],
                 'cliente': cuenta['cliente'],
                 'ruc': None,
                 'moneda': 'Gs',
                 'tipo_venta': cuenta.get('tipo', 'FCON'),
                 'plazo_dias': None,
-                'fecha_vencimiento': fecha_vencimiento,
-                'fecha_pago': fecha_recibo,
-                'estado_pago': estado_pago,
-                'dias_atraso': dias_atraso,
-                'monto': saldo,  # Mostrar saldo en lugar del monto total
-                'monto_abonado': monto_abonado,  # Monto abonado
+                'fecha_vencimiento': cuenta['vencimiento'],
+                'fecha_pago': cuenta['fecha_recibo'],
+                'estado_pago': cuenta['estado_pago'],
+                'dias_atraso': cuenta['dias_atraso'],
+                'monto': float(cuenta['saldo']),  # Mostrar saldo en lugar del monto total
+                'monto_abonado': float(cuenta.get('monto_abonado') or 0),  # Monto abonado
                 # Campos adicionales
                 'documento_nombre': cuenta.get('documento_nombre'),
                 'banco_nombre': cuenta.get('banco_nombre'),
@@ -623,37 +530,7 @@ def obtener_reportes_cuentas_a_recibir(cliente_nombre=None, fecha_desde=None, fe
                 'descripcion': cuenta.get('descripcion'),
                 'cuotas': cuenta.get('cuotas'),
                 'valor_cuota': float(cuenta['valor_cuota']) if cuenta['valor_cuota'] else None
-            }
-            
-            # Aplicar filtro de estado después de calcular el estado_pago
-            if estado_pago_filtro:
-                estado_filtro_lower = estado_pago_filtro.lower()
-                if estado_filtro_lower == 'pagado' or estado_filtro_lower == 'recibido':
-                    if estado_pago.lower() != 'pagado':
-                        continue
-                elif estado_filtro_lower == 'pendiente':
-                    if estado_pago.lower() != 'pendiente':
-                        continue
-                elif estado_filtro_lower == 'atrasado':
-                    if estado_pago.lower() != 'atrasado':
-                        continue
-                elif estado_filtro_lower == 'adelantado':
-                    if estado_pago.lower() != 'adelantado':
-                        continue
-                elif estado_filtro_lower == 'en día' or estado_filtro_lower == 'en dia':
-                    if estado_pago.lower() != 'en día' and estado_pago.lower() != 'en dia':
-                        continue
-            
-            reportes.append(reporte)
-        
-        # Ordenar por fecha de emisión descendente
-        reportes.sort(key=lambda x: x['fecha_emision'] if x['fecha_emision'] else date.min, reverse=True)
-        
-        # Aplicar paginación después del filtro de estado
-        if limite is not None:
-            inicio = offset if offset is not None else 0
-            fin = inicio + limite
-            reportes = reportes[inicio:fin]
+            })
         
         return reportes
     finally:
@@ -679,6 +556,93 @@ def obtener_clientes_con_cuentas_a_recibir():
 
 # ==================== FUNCIONES PARA DASHBOARD DE ANÁLISIS ====================
 
+def _consultar_saldos_bancos(cur, fecha_hasta=None, banco_id=None, solo_activos=True):
+    """Calcula los saldos por banco a partir del libro diario movimientos_bancarios_diarios.
+    
+    Se suman las filas diarias de cada banco (una por banco y día con
+    movimientos) y se unen a bancos. Con `fecha_hasta` se obtiene el saldo
+    acumulado a esa fecha (inclusive); con `banco_id` se limita a un banco.
+    """
+    filtro_movimientos = ["TRUE"]
+    params_movimientos = []
+    filtro_bancos = ["TRUE"]
+    params_bancos = []
+    
+    if fecha_hasta:
+        filtro_movimientos.append("fecha <= %s")
+        params_movimientos.append(fecha_hasta)
+    
+    if banco_id:
+        filtro_movimientos.append("banco_id = %s")
+        params_movimientos.append(banco_id)
+        filtro_bancos.append("b.id = %s")
+        params_bancos.append(banco_id)
+    
+    if solo_activos:
+        filtro_bancos.append("b.activo = true")
+    
+    cur.execute(f"""
+        WITH totales AS (
+            SELECT banco_id,
+                   SUM(entradas) as entradas,
+                   SUM(salidas) as salidas,
+                   SUM(transferencias_recibidas) as transferencias_recibidas,
+                   SUM(transferencias_enviadas) as transferencias_enviadas
+            FROM movimientos_bancarios_diarios
+            WHERE {' AND '.join(filtro_movimientos)}
+            GROUP BY banco_id
+        )
+        SELECT 
+            b.id,
+            b.nombre,
+            COALESCE(b.saldo_inicial, 0) as saldo_inicial,
+            COALESCE(t.entradas, 0) as entradas,
+            COALESCE(t.salidas, 0) as salidas,
+            COALESCE(t.transferencias_recibidas, 0) as transferencias_recibidas,
+            COALESCE(t.transferencias_enviadas, 0) as transferencias_enviadas,
+            COALESCE(b.saldo_inicial, 0)
+                + COALESCE(t.entradas, 0)
+                - COALESCE(t.salidas, 0)
+                + COALESCE(t.transferencias_recibidas, 0)
+                - COALESCE(t.transferencias_enviadas, 0) as saldo_actual
+        FROM bancos b
+        LEFT JOIN totales t ON t.banco_id = b.id
+        WHERE {' AND '.join(filtro_bancos)}
+        ORDER BY b.nombre
+    """, params_movimientos + params_bancos)
+    return cur.fetchall()
+
+
+def _consultar_saldo_a_fecha(cur, fecha, banco_id=None, solo_activos=True):
+    """Saldo total (o de un banco) al cierre de `fecha`, inclusive.
+    
+    Usa el neto_acumulado del último día con movimientos de cada banco, que se
+    obtiene con una búsqueda en la clave primaria (banco_id, fecha).
+    """
+    filtro_bancos = ["TRUE"]
+    params = [fecha]
+    if banco_id:
+        filtro_bancos.append("b.id = %s")
+        params.append(banco_id)
+    if solo_activos:
+        filtro_bancos.append("b.activo = true")
+    
+    cur.execute(f"""
+        SELECT COALESCE(SUM(COALESCE(b.saldo_inicial, 0) + COALESCE(m.neto_acumulado, 0)), 0) as saldo
+        FROM bancos b
+        LEFT JOIN LATERAL (
+            SELECT neto_acumulado
+            FROM movimientos_bancarios_diarios
+            WHERE banco_id = b.id AND fecha <= %s
+            ORDER BY fecha DESC
+            LIMIT 1
+        ) m ON true
+        WHERE {' AND '.join(filtro_bancos)}
+    """, params)
+    return float(cur.fetchone()['saldo'] or 0)
+
+
+@_cachear_reporte
 def obtener_saldos_bancos():
     """Obtiene los saldos actuales de todos los bancos
     
@@ -691,85 +655,225 @@ def obtener_saldos_bancos():
     """
     conn, cur = conectar()
     try:
-        # Asegurar que la tabla de transferencias existe
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS transferencias_cuentas (
-                id SERIAL PRIMARY KEY,
-                fecha DATE NOT NULL,
-                banco_origen_id INTEGER NOT NULL REFERENCES bancos(id),
-                banco_destino_id INTEGER NOT NULL REFERENCES bancos(id),
-                monto NUMERIC(15, 2) NOT NULL,
-                descripcion TEXT,
-                creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                CONSTRAINT banco_origen_destino_diferentes CHECK (banco_origen_id != banco_destino_id),
-                CONSTRAINT monto_positivo CHECK (monto > 0)
-            );
-        """)
-        conn.commit()
-        
-        cur.execute("""
-            SELECT 
-                b.id,
-                b.nombre,
-                COALESCE(b.saldo_inicial, 0) as saldo_inicial,
-                COALESCE((
-                    SELECT SUM(COALESCE(car.monto_abonado, 0))
-                    FROM cuentas_a_recibir car
-                    WHERE car.banco_id = b.id 
-                    AND car.fecha_recibo IS NOT NULL
-                ), 0) as entradas,
-                COALESCE((
-                    SELECT SUM(COALESCE(cap.monto_abonado, 0))
-                    FROM cuentas_a_pagar cap
-                    WHERE cap.banco_id = b.id 
-                    AND cap.fecha_pago IS NOT NULL
-                ), 0) as salidas,
-                COALESCE((
-                    SELECT SUM(COALESCE(t.monto, 0))
-                    FROM transferencias_cuentas t
-                    WHERE t.banco_destino_id = b.id
-                ), 0) as transferencias_recibidas,
-                COALESCE((
-                    SELECT SUM(COALESCE(t.monto, 0))
-                    FROM transferencias_cuentas t
-                    WHERE t.banco_origen_id = b.id
-                ), 0) as transferencias_enviadas,
-                (COALESCE(b.saldo_inicial, 0) + 
-                 COALESCE((
-                     SELECT SUM(COALESCE(car.monto_abonado, 0))
-                     FROM cuentas_a_recibir car
-                     WHERE car.banco_id = b.id 
-                     AND car.fecha_recibo IS NOT NULL
-                 ), 0) - 
-                 COALESCE((
-                     SELECT SUM(COALESCE(cap.monto_abonado, 0))
-                     FROM cuentas_a_pagar cap
-                     WHERE cap.banco_id = b.id 
-                     AND cap.fecha_pago IS NOT NULL
-                 ), 0) +
-                 COALESCE((
-                     SELECT SUM(COALESCE(t.monto, 0))
-                     FROM transferencias_cuentas t
-                     WHERE t.banco_destino_id = b.id
-                 ), 0) -
-                 COALESCE((
-                     SELECT SUM(COALESCE(t.monto, 0))
-                     FROM transferencias_cuentas t
-                     WHERE t.banco_origen_id = b.id
-                 ), 0)) as saldo_actual
-            FROM bancos b
-            WHERE b.activo = true
-            ORDER BY b.nombre
-        """)
-        return cur.fetchall()
+        return _consultar_saldos_bancos(cur)
     finally:
         cur.close()
         conn.close()
 
 
+# ==================== RESUMEN FINANCIERO MENSUAL ====================
+
+def _meses_del_filtro(ano=None, fecha_desde=None, fecha_hasta=None):
+    """Traduce los filtros de año/fechas a un rango de meses (desde, hasta) inclusive.
+    
+    Cada extremo es una tupla (ano, mes) o None. Retorna None si fecha_desde no
+    es el primer día de un mes o fecha_hasta no es el último, porque en ese
+    caso el resumen mensual no alcanza y hay que ir a las cuentas.
+    """
+    from calendar import monthrange
+    fecha_desde = _a_fecha(fecha_desde)
+    fecha_hasta = _a_fecha(fecha_hasta)
+    
+    if fecha_desde and fecha_desde.day != 1:
+        return None
+    if fecha_hasta and fecha_hasta.day != monthrange(fecha_hasta.year, fecha_hasta.month)[1]:
+        return None
+    
+    desde = (fecha_desde.year, fecha_desde.month) if fecha_desde else None
+    hasta = (fecha_hasta.year, fecha_hasta.month) if fecha_hasta else None
+    if ano:
+        desde = max(desde, (ano, 1)) if desde else (ano, 1)
+        hasta = min(hasta, (ano, 12)) if hasta else (ano, 12)
+    return desde, hasta
+
+
+def _consultar_resumen_mensual(cur, fecha_base, medida, tipo=None, proyecto_id=None,
+                               desde=None, hasta=None, por_categoria=False):
+    """Totales mensuales de resumen_financiero_mensual.
+    
+    fecha_base: 'pago', 'emision' o 'pago_o_emision'
+    medida: 'realizado' o 'proyectado'
+    tipo: 'ingreso', 'gasto' o None para ambos
+    desde/hasta: tuplas (ano, mes) inclusive
+    Retorna filas con tipo, [categoria_id,] ano, mes y total, ordenadas por mes.
+    """
+    if medida not in ('realizado', 'proyectado'):
+        raise ValueError(f"Medida no válida: {medida}")
+    
+    where = ["fecha_base = %s"]
+    params = [fecha_base]
+    if tipo:
+        where.append("tipo = %s")
+        params.append(tipo)
+    if proyecto_id:
+        where.append("proyecto_id = %s")
+        params.append(proyecto_id)
+    if desde:
+        where.append("(ano, mes) >= (%s, %s)")
+        params.extend(desde)
+    if hasta:
+        where.append("(ano, mes) <= (%s, %s)")
+        params.extend(hasta)
+    
+    columnas = "tipo, categoria_id, ano, mes" if por_categoria else "tipo, ano, mes"
+    cur.execute(f"""
+        SELECT {columnas}, SUM({medida}) as total
+        FROM resumen_financiero_mensual
+        WHERE {' AND '.join(where)}
+        GROUP BY {columnas}
+        ORDER BY ano, mes
+    """, params)
+    return cur.fetchall()
+
+
+# ==================== SERIES MENSUALES ====================
+# Una serie es una lista densa con un valor por mes de un rango (desde, hasta)
+# inclusive; una matriz es un dict clave -> serie (por ejemplo, por categoría).
+# Las operaciones trabajan sobre listas completas en vez de claves "ano-mes".
+
+def _cantidad_meses(desde, hasta):
+    """Cantidad de meses del rango inclusive [desde, hasta] (tuplas (ano, mes))"""
+    return (hasta[0] - desde[0]) * 12 + hasta[1] - desde[1] + 1
+
+
+def _mes_del_indice(desde, indice):
+    """(ano, mes) correspondiente a la posición `indice` de una serie que empieza en `desde`"""
+    ano, mes = divmod(desde[0] * 12 + desde[1] - 1 + indice, 12)
+    return ano, mes + 1
+
+
+def _matriz_mensual(filas, desde, hasta, claves=(None,), clave=None):
+    """Reparte filas con ano, mes y total en una matriz densa {clave: serie}.
+    
+    clave: función fila -> clave (None agrupa todo bajo la clave None).
+    Las filas con claves que no están en `claves` o meses fuera del rango se ignoran.
+    """
+    largo = _cantidad_meses(desde, hasta)
+    base = desde[0] * 12 + desde[1] - 1
+    matriz = {k: [0.0] * largo for k in claves}
+    for f in filas:
+        serie = matriz.get(clave(f) if clave else None)
+        indice = f['ano'] * 12 + f['mes'] - 1 - base
+        if serie is not None and 0 <= indice < largo:
+            serie[indice] += float(f['total'] or 0)
+    return matriz
+
+
+def _sumar_series(series, largo):
+    """Suma elemento a elemento una colección de series del mismo largo"""
+    series = list(series)
+    if not series:
+        return [0.0] * largo
+    return [sum(valores) for valores in zip(*series)]
+
+
+def _restar_series(a, b):
+    """Diferencia elemento a elemento de dos series"""
+    return list(map(operator.sub, a, b))
+
+
+def _acumular_serie(serie, inicial=0.0):
+    """Saldos acumulados: inicial + serie[0], inicial + serie[0] + serie[1], ..."""
+    return list(accumulate(serie, initial=inicial))[1:]
+
+
+def _porcentaje_series(parte, total):
+    """parte / total * 100 elemento a elemento (0 donde el total es 0)"""
+    return [p / t * 100 if t != 0 else 0 for p, t in zip(parte, total)]
+
+
+def _columna_matriz(matriz, indice):
+    """Valores de un mes de la matriz como dict clave -> valor"""
+    return {k: serie[indice] for k, serie in matriz.items()}
+
+
+@_cachear_reporte
 def obtener_receita_bruta_mensual(ano=None, proyecto_id=None, fecha_desde=None, fecha_hasta=None, tipo_reporte='realizado'):
     """Obtiene la receita bruta mensual (suma de cuentas a recibir)
     
+    Args:
+        tipo_reporte: 'proyectado' usa valor_cuota (o valor si es NULL), 'realizado' usa monto_abonado
+        Usa fecha_recibo (o fecha_emision si no hay recibo) para agrupar por mes
+    """
+    meses = _meses_del_filtro(ano, fecha_desde, fecha_hasta)
+    if meses is None:
+        return _receita_bruta_mensual_directa(ano, proyecto_id, fecha_desde, fecha_hasta, tipo_reporte)
+    
+    conn, cur = conectar()
+    try:
+        medida = 'proyectado' if tipo_reporte == 'proyectado' else 'realizado'
+        filas = _consultar_resumen_mensual(cur, 'pago_o_emision', medida, tipo='ingreso',
+                                           proyecto_id=proyecto_id, desde=meses[0], hasta=meses[1])
+        return [{'mes': f['mes'], 'ano': f['ano'], 'receita_bruta': f['total']} for f in filas]
+    finally:
+        cur.close()
+        conn.close()
+
+
+@_cachear_reporte
+def obtener_custos_despesas_mensual(ano=None, proyecto_id=None, fecha_desde=None, fecha_hasta=None, tipo_reporte='realizado'):
+    """Obtiene los custos e despesas mensuales (suma de cuentas a pagar)
+    
+    Args:
+        tipo_reporte: 'proyectado' usa valor_cuota (o valor si es NULL), 'realizado' usa monto_abonado
+        Usa fecha_pago (o fecha_emision si no hay pago) para agrupar por mes
+    """
+    meses = _meses_del_filtro(ano, fecha_desde, fecha_hasta)
+    if meses is None:
+        return _custos_despesas_mensual_directa(ano, proyecto_id, fecha_desde, fecha_hasta, tipo_reporte)
+    
+    conn, cur = conectar()
+    try:
+        medida = 'proyectado' if tipo_reporte == 'proyectado' else 'realizado'
+        filas = _consultar_resumen_mensual(cur, 'pago_o_emision', medida, tipo='gasto',
+                                           proyecto_id=proyecto_id, desde=meses[0], hasta=meses[1])
+        return [{'mes': f['mes'], 'ano': f['ano'], 'custos_despesas': f['total']} for f in filas]
+    finally:
+        cur.close()
+        conn.close()
+
+
+@_cachear_reporte
+def obtener_flujo_caja_mensual(ano=None, proyecto_id=None, fecha_desde=None, fecha_hasta=None):
+    """Obtiene el flujo de caja mensual (entradas - salidas)"""
+    meses = _meses_del_filtro(ano, fecha_desde, fecha_hasta)
+    if meses is None:
+        return _flujo_caja_mensual_directo(ano, proyecto_id, fecha_desde, fecha_hasta)
+    
+    conn, cur = conectar()
+    try:
+        filas = _consultar_resumen_mensual(cur, 'pago', 'realizado', proyecto_id=proyecto_id,
+                                           desde=meses[0], hasta=meses[1])
+        return _flujo_caja_de_filas(filas, *meses)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _flujo_caja_de_filas(filas, desde=None, hasta=None):
+    """Flujo de caja de los meses con movimientos a partir de filas tipo, ano, mes y total
+    
+    Las filas deben venir ordenadas por mes; sin desde/hasta, el rango va del
+    primer al último mes con datos.
+    """
+    if not filas:
+        return []
+    desde = desde or (filas[0]['ano'], filas[0]['mes'])
+    hasta = hasta or (filas[-1]['ano'], filas[-1]['mes'])
+    matriz = _matriz_mensual(filas, desde, hasta, claves=('ingreso', 'gasto'), clave=lambda f: f['tipo'])
+    con_datos = {_cantidad_meses(desde, (f['ano'], f['mes'])) - 1 for f in filas}
+    
+    resultado = []
+    for i, (entradas, salidas) in enumerate(zip(matriz['ingreso'], matriz['gasto'])):
+        if i in con_datos:
+            ano_fila, mes = _mes_del_indice(desde, i)
+            resultado.append({'ano': ano_fila, 'mes': mes, 'entradas': entradas, 'salidas': salidas})
+    return resultado
+
+
+def _receita_bruta_mensual_directa(ano=None, proyecto_id=None, fecha_desde=None, fecha_hasta=None, tipo_reporte='realizado'):
+    """Receita bruta mensual calculada sobre cuentas_a_recibir (filtros de fecha que no cubren meses completos)
+    
     Args:
         tipo_reporte: 'proyectado' usa valor_cuota (o valor si es NULL), 'realizado' usa monto_abonado
         Usa fecha_recibo para agrupar por mes (régimen de competencia)
@@ -777,25 +881,16 @@ def obtener_receita_bruta_mensual(ano=None, proyecto_id=None, fecha_desde=None,
     conn, cur = conectar()
     try:
         where_clauses = []
-        params = []
         
         # Usar fecha_recibo para los filtros y agrupación (régimen de competencia)
-        if ano:
-            where_clauses.append("EXTRACT(YEAR FROM COALESCE(car.fecha_recibo, car.fecha_emision)) = %s")
-            params.append(ano)
+        condiciones, params = _condiciones_rango(
+            "COALESCE(car.fecha_recibo, car.fecha_emision)", _rango_fechas(ano, fecha_desde, fecha_hasta))
+        where_clauses.extend(condiciones)
         
         if proyecto_id:
             where_clauses.append("car.proyecto_id = %s")
             params.append(proyecto_id)
         
-        if fecha_desde:
-            where_clauses.append("COALESCE(car.fecha_recibo, car.fecha_emision) >= %s")
-            params.append(fecha_desde)
-        
-        if fecha_hasta:
-            where_clauses.append("COALESCE(car.fecha_recibo, car.fecha_emision) <= %s")
-            params.append(fecha_hasta)
-        
         where_sql = ""
         if where_clauses:
             where_sql = "WHERE " + " AND ".join(where_clauses)
@@ -826,8 +921,8 @@ def obtener_receita_bruta_mensual(ano=None, proyecto_id=None, fecha_desde=None,
         conn.close()
 
 
-def obtener_custos_despesas_mensual(ano=None, proyecto_id=None, fecha_desde=None, fecha_hasta=None, tipo_reporte='realizado'):
-    """Obtiene los custos e despesas mensuales (suma de cuentas a pagar)
+def _custos_despesas_mensual_directa(ano=None, proyecto_id=None, fecha_desde=None, fecha_hasta=None, tipo_reporte='realizado'):
+    """Custos e despesas mensuales calculados sobre cuentas_a_pagar (filtros de fecha que no cubren meses completos)
     
     Args:
         tipo_reporte: 'proyectado' usa valor_cuota (o valor si es NULL), 'realizado' usa monto_abonado
@@ -836,25 +931,16 @@ def obtener_custos_despesas_mensual(ano=None, proyecto_id=None, fecha_desde=None
     conn, cur = conectar()
     try:
         where_clauses = []
-        params = []
         
         # Usar fecha_pago para los filtros y agrupación (régimen de competencia)
-        if ano:
-            where_clauses.append("EXTRACT(YEAR FROM COALESCE(cap.fecha_pago, cap.fecha_emision)) = %s")
-            params.append(ano)
+        condiciones, params = _condiciones_rango(
+            "COALESCE(cap.fecha_pago, cap.fecha_emision)", _rango_fechas(ano, fecha_desde, fecha_hasta))
+        where_clauses.extend(condiciones)
         
         if proyecto_id:
             where_clauses.append("cap.proyecto_id = %s")
             params.append(proyecto_id)
         
-        if fecha_desde:
-            where_clauses.append("COALESCE(cap.fecha_pago, cap.fecha_emision) >= %s")
-            params.append(fecha_desde)
-        
-        if fecha_hasta:
-            where_clauses.append("COALESCE(cap.fecha_pago, cap.fecha_emision) <= %s")
-            params.append(fecha_hasta)
-        
         where_sql = ""
         if where_clauses:
             where_sql = "WHERE " + " AND ".join(where_clauses)
@@ -885,20 +971,13 @@ def obtener_custos_despesas_mensual(ano=None, proyecto_id=None, fecha_desde=None
         conn.close()
 
 
-def obtener_flujo_caja_mensual(ano=None, proyecto_id=None, fecha_desde=None, fecha_hasta=None):
-    """Obtiene el flujo de caja mensual (entradas - salidas)"""
+def _flujo_caja_mensual_directo(ano=None, proyecto_id=None, fecha_desde=None, fecha_hasta=None):
+    """Flujo de caja mensual calculado sobre las cuentas (filtros de fecha que no cubren meses completos)"""
     conn, cur = conectar()
     try:
-        where_entradas = []
-        where_salidas = []
-        params_entradas = []
-        params_salidas = []
-        
-        if ano:
-            where_entradas.append("EXTRACT(YEAR FROM car.fecha_recibo) = %s")
-            where_salidas.append("EXTRACT(YEAR FROM cap.fecha_pago) = %s")
-            params_entradas.append(ano)
-            params_salidas.append(ano)
+        rango = _rango_fechas(ano, fecha_desde, fecha_hasta)
+        where_entradas, params_entradas = _condiciones_rango("car.fecha_recibo", rango)
+        where_salidas, params_salidas = _condiciones_rango("cap.fecha_pago", rango)
         
         if proyecto_id:
             where_entradas.append("car.proyecto_id = %s")
@@ -906,18 +985,6 @@ def obtener_flujo_caja_mensual(ano=None, proyecto_id=None, fecha_desde=None, fec
             params_entradas.append(proyecto_id)
             params_salidas.append(proyecto_id)
         
-        if fecha_desde:
-            where_entradas.append("car.fecha_recibo >= %s")
-            where_salidas.append("cap.fecha_pago >= %s")
-            params_entradas.append(fecha_desde)
-            params_salidas.append(fecha_desde)
-        
-        if fecha_hasta:
-            where_entradas.append("car.fecha_recibo <= %s")
-            where_salidas.append("cap.fecha_pago <= %s")
-            params_entradas.append(fecha_hasta)
-            params_salidas.append(fecha_hasta)
-        
         where_sql_entradas = ""
         if where_entradas:
             where_sql_entradas = "AND " + " AND ".join(where_entradas)
@@ -926,321 +993,223 @@ def obtener_flujo_caja_mensual(ano=None, proyecto_id=None, fecha_desde=None, fec
         if where_salidas:
             where_sql_salidas = "AND " + " AND ".join(where_salidas)
         
-        # Entradas (cuentas a recibir - monto abonado)
-        query_entradas = f"""
+        # Entradas (cuentas a recibir) y salidas (cuentas a pagar) por mes de pago,
+        # con el mismo formato que el resumen mensual
+        query = f"""
             SELECT 
-                EXTRACT(MONTH FROM car.fecha_recibo) as mes,
-                EXTRACT(YEAR FROM car.fecha_recibo) as ano,
-                SUM(COALESCE(car.monto_abonado, 0)) as entradas
+                'ingreso' as tipo,
+                EXTRACT(YEAR FROM car.fecha_recibo)::INTEGER as ano,
+                EXTRACT(MONTH FROM car.fecha_recibo)::INTEGER as mes,
+                SUM(COALESCE(car.monto_abonado, 0)) as total
             FROM cuentas_a_recibir car
             WHERE car.fecha_recibo IS NOT NULL
             {where_sql_entradas}
-            GROUP BY EXTRACT(MONTH FROM car.fecha_recibo), EXTRACT(YEAR FROM car.fecha_recibo)
-        """
-        
-        # Salidas (cuentas a pagar - monto abonado)
-        query_salidas = f"""
+            GROUP BY 2, 3
+            UNION ALL
             SELECT 
-                EXTRACT(MONTH FROM cap.fecha_pago) as mes,
-                EXTRACT(YEAR FROM cap.fecha_pago) as ano,
-                SUM(COALESCE(cap.monto_abonado, 0)) as salidas
+                'gasto' as tipo,
+                EXTRACT(YEAR FROM cap.fecha_pago)::INTEGER as ano,
+                EXTRACT(MONTH FROM cap.fecha_pago)::INTEGER as mes,
+                SUM(COALESCE(cap.monto_abonado, 0)) as total
             FROM cuentas_a_pagar cap
             WHERE cap.fecha_pago IS NOT NULL
             {where_sql_salidas}
-            GROUP BY EXTRACT(MONTH FROM cap.fecha_pago), EXTRACT(YEAR FROM cap.fecha_pago)
+            GROUP BY 2, 3
+            ORDER BY ano, mes
         """
         
-        cur.execute(query_entradas, params_entradas)
-        entradas = {f"{int(r['ano'])}-{int(r['mes'])}": float(r['entradas']) for r in cur.fetchall()}
-        
-        cur.execute(query_salidas, params_salidas)
-        salidas = {f"{int(r['ano'])}-{int(r['mes'])}": float(r['salidas']) for r in cur.fetchall()}
-        
-        # Combinar datos
-        todos_meses = set(list(entradas.keys()) + list(salidas.keys()))
-        resultado = []
-        for mes_key in sorted(todos_meses):
-            ano_val, mes_val = mes_key.split('-')
-            resultado.append({
-                'ano': int(ano_val),
-                'mes': int(mes_val),
-                'entradas': entradas.get(mes_key, 0),
-                'salidas': salidas.get(mes_key, 0)
-            })
-        
-        return resultado
+        cur.execute(query, params_entradas + params_salidas)
+        return _flujo_caja_de_filas(cur.fetchall())
     finally:
         cur.close()
         conn.close()
 
 
+def _a_fecha(valor):
+    """Convierte un string YYYY-MM-DD (o date) en date; None si está vacío"""
+    if not valor:
+        return None
+    if isinstance(valor, date):
+        return valor
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def _rango_fechas(ano=None, fecha_desde=None, fecha_hasta=None):
+    """Traduce los filtros de año y fechas a un rango semiabierto [inicio, fin).
+    
+    Comparar la columna contra el rango (en vez de EXTRACT(YEAR FROM ...) = ano)
+    permite que PostgreSQL use los índices sobre esas fechas.
+    Cualquiera de los extremos puede ser None.
+    """
+    inicio = _a_fecha(fecha_desde)
+    fecha_hasta = _a_fecha(fecha_hasta)
+    fin = fecha_hasta + timedelta(days=1) if fecha_hasta else None
+    if ano:
+        inicio = max(inicio, date(ano, 1, 1)) if inicio else date(ano, 1, 1)
+        fin = min(fin, date(ano + 1, 1, 1)) if fin else date(ano + 1, 1, 1)
+    return inicio, fin
+
+
+def _condiciones_rango(expresion, rango):
+    """Condiciones SQL (y sus parámetros) para `expresion` dentro de un rango de _rango_fechas"""
+    inicio, fin = rango
+    condiciones = []
+    params = []
+    if inicio:
+        condiciones.append(f"{expresion} >= %s")
+        params.append(inicio)
+    if fin:
+        condiciones.append(f"{expresion} < %s")
+        params.append(fin)
+    return condiciones, params
+
+
+@_cachear_reporte
 def obtener_evolucion_saldo_mensual(banco_id=None, ano=None, fecha_desde=None, fecha_hasta=None):
-    """Obtiene la evolución del saldo mensual de los bancos"""
+    """Obtiene la evolución del saldo mensual de los bancos
+    
+    Se lee del libro diario movimientos_bancarios_diarios (incluye
+    transferencias). El saldo de partida es el saldo al día anterior al inicio
+    del período filtrado, así los meses reflejan el saldo real del banco.
+    """
     conn, cur = conectar()
     try:
-        # Obtener saldo inicial total
-        query_saldos_iniciales = """
-            SELECT SUM(COALESCE(saldo_inicial, 0)) as saldo_inicial_total
-            FROM bancos
-            WHERE activo = true
-        """
-        if banco_id:
+        # Inicio y fin del período como rango de fechas [inicio, fin)
+        inicio, fin = _rango_fechas(ano, fecha_desde, fecha_hasta)
+        
+        # Saldo de partida
+        if inicio:
+            saldo_acumulado = _consultar_saldo_a_fecha(cur, inicio - timedelta(days=1), banco_id=banco_id)
+        else:
             query_saldos_iniciales = """
-                SELECT COALESCE(saldo_inicial, 0) as saldo_inicial_total
+                SELECT COALESCE(SUM(COALESCE(saldo_inicial, 0)), 0) as saldo_inicial_total
                 FROM bancos
-                WHERE id = %s AND activo = true
+                WHERE activo = true
             """
-            cur.execute(query_saldos_iniciales, (banco_id,))
-        else:
-            cur.execute(query_saldos_iniciales)
-        
-        saldo_inicial_total = float(cur.fetchone()['saldo_inicial_total'] or 0)
-        
-        # Construir filtros
-        where_entradas = []
-        where_salidas = []
-        params_entradas = []
-        params_salidas = []
-        
+            params = []
+            if banco_id:
+                query_saldos_iniciales += " AND id = %s"
+                params.append(banco_id)
+            cur.execute(query_saldos_iniciales, params)
+            saldo_acumulado = float(cur.fetchone()['saldo_inicial_total'] or 0)
+        
+        where = ["b.activo = true"]
+        params = []
         if banco_id:
-            where_entradas.append("car.banco_id = %s")
-            where_salidas.append("cap.banco_id = %s")
-            params_entradas.append(banco_id)
-            params_salidas.append(banco_id)
-        
-        if ano:
-            where_entradas.append("EXTRACT(YEAR FROM car.fecha_recibo) = %s")
-            where_salidas.append("EXTRACT(YEAR FROM cap.fecha_pago) = %s")
-            params_entradas.append(ano)
-            params_salidas.append(ano)
-        
-        if fecha_desde:
-            where_entradas.append("car.fecha_recibo >= %s")
-            where_salidas.append("cap.fecha_pago >= %s")
-            params_entradas.append(fecha_desde)
-            params_salidas.append(fecha_desde)
-        
-        if fecha_hasta:
-            where_entradas.append("car.fecha_recibo <= %s")
-            where_salidas.append("cap.fecha_pago <= %s")
-            params_entradas.append(fecha_hasta)
-            params_salidas.append(fecha_hasta)
-        
-        where_sql_entradas = ""
-        if where_entradas:
-            where_sql_entradas = "AND " + " AND ".join(where_entradas)
-        
-        where_sql_salidas = ""
-        if where_salidas:
-            where_sql_salidas = "AND " + " AND ".join(where_salidas)
-        
-        # Obtener entradas mensuales
-        query_entradas = f"""
-            SELECT 
-                EXTRACT(MONTH FROM car.fecha_recibo) as mes,
-                EXTRACT(YEAR FROM car.fecha_recibo) as ano,
-                SUM(COALESCE(car.monto_abonado, 0)) as entradas
-            FROM cuentas_a_recibir car
-            WHERE car.fecha_recibo IS NOT NULL
-            {where_sql_entradas}
-            GROUP BY EXTRACT(MONTH FROM car.fecha_recibo), EXTRACT(YEAR FROM car.fecha_recibo)
-        """
+            where.append("m.banco_id = %s")
+            params.append(banco_id)
+        condiciones, params_rango = _condiciones_rango("m.fecha", (inicio, fin))
+        where.extend(condiciones)
+        params.extend(params_rango)
         
-        # Obtener salidas mensuales
-        query_salidas = f"""
+        cur.execute(f"""
             SELECT 
-                EXTRACT(MONTH FROM cap.fecha_pago) as mes,
-                EXTRACT(YEAR FROM cap.fecha_pago) as ano,
-                SUM(COALESCE(cap.monto_abonado, 0)) as salidas
-            FROM cuentas_a_pagar cap
-            WHERE cap.fecha_pago IS NOT NULL
-            {where_sql_salidas}
-            GROUP BY EXTRACT(MONTH FROM cap.fecha_pago), EXTRACT(YEAR FROM cap.fecha_pago)
-        """
-        
-        cur.execute(query_entradas, params_entradas)
-        entradas_mes = {f"{int(r['ano'])}-{int(r['mes'])}": float(r['entradas']) for r in cur.fetchall()}
-        
-        cur.execute(query_salidas, params_salidas)
-        salidas_mes = {f"{int(r['ano'])}-{int(r['mes'])}": float(r['salidas']) for r in cur.fetchall()}
-        
-        # Calcular saldos acumulados
-        todos_meses = sorted(set(list(entradas_mes.keys()) + list(salidas_mes.keys())))
-        resultado = []
-        saldo_acumulado = saldo_inicial_total
-        
-        for mes_key in todos_meses:
-            ano_val, mes_val = mes_key.split('-')
-            entradas = entradas_mes.get(mes_key, 0)
-            salidas = salidas_mes.get(mes_key, 0)
-            saldo_acumulado += entradas - salidas
-            
-            resultado.append({
-                'ano': int(ano_val),
-                'mes': int(mes_val),
-                'saldo': saldo_acumulado
-            })
-        
-        return resultado
+                EXTRACT(YEAR FROM m.fecha)::INTEGER as ano,
+                EXTRACT(MONTH FROM m.fecha)::INTEGER as mes,
+                SUM(m.entradas - m.salidas + m.transferencias_recibidas - m.transferencias_enviadas) as neto
+            FROM movimientos_bancarios_diarios m
+            JOIN bancos b ON b.id = m.banco_id
+            WHERE {' AND '.join(where)}
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """, params)
+        
+        filas = cur.fetchall()
+        saldos = _acumular_serie([float(r['neto'] or 0) for r in filas], saldo_acumulado)
+        return [{'ano': r['ano'], 'mes': r['mes'], 'saldo': saldo} for r, saldo in zip(filas, saldos)]
     finally:
         cur.close()
         conn.close()
 
 
-def obtener_conciliacion_bancaria(banco_id, anio, mes):
+@_cachear_reporte
+def obtener_conciliacion_bancaria(banco_id, anio, mes, anio_hasta=None, mes_hasta=None):
     """Obtiene la conciliación bancaria diaria para un banco, año y mes específicos
     
+    Con anio_hasta/mes_hasta se obtiene un rango de meses (ambos inclusive).
+    Todo se resuelve en una sola consulta: el saldo de apertura sale del
+    neto_acumulado del libro diario (búsqueda en la clave primaria) y el saldo
+    acumulado de cada día con SUM() OVER sobre los días del período.
+    
     Retorna:
-    - diccionario con banco_id, banco_nombre, saldo_mes_anterior, movimientos
+    - diccionario con banco_id, banco_nombre, saldo_mes_anterior, saldo_final,
+      fecha_desde, fecha_hasta y movimientos; None si el banco no existe
     """
-    from calendar import monthrange
+    inicio = date(anio, mes, 1)
+    anio_fin, mes_fin = (anio_hasta or anio), (mes_hasta or mes)
+    if (anio_fin, mes_fin) < (anio, mes):
+        anio_fin, mes_fin = anio, mes
+    # Primer día del mes siguiente al último del rango (rango semiabierto)
+    fin = date(anio_fin + mes_fin // 12, mes_fin % 12 + 1, 1)
+    
     conn, cur = conectar()
     try:
-        # Asegurar que la tabla de transferencias existe
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS transferencias_cuentas (
-                id SERIAL PRIMARY KEY,
-                fecha DATE NOT NULL,
-                banco_origen_id INTEGER NOT NULL REFERENCES bancos(id),
-                banco_destino_id INTEGER NOT NULL REFERENCES bancos(id),
-                monto NUMERIC(15, 2) NOT NULL,
-                descripcion TEXT,
-                creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                CONSTRAINT banco_origen_destino_diferentes CHECK (banco_origen_id != banco_destino_id),
-                CONSTRAINT monto_positivo CHECK (monto > 0)
-            );
-        """)
-        conn.commit()
-        
-        # Obtener información del banco
-        cur.execute("""
-            SELECT id, nombre, COALESCE(saldo_inicial, 0) as saldo_inicial
-            FROM bancos
-            WHERE id = %s AND activo = true
-        """, (banco_id,))
-        banco = cur.fetchone()
-        
-        if not banco:
+            WITH apertura AS (
+                SELECT b.nombre,
+                       COALESCE(b.saldo_inicial, 0) + COALESCE((
+                           SELECT m.neto_acumulado
+                           FROM movimientos_bancarios_diarios m
+                           WHERE m.banco_id = b.id AND m.fecha < %(inicio)s
+                           ORDER BY m.fecha DESC
+                           LIMIT 1
+                       ), 0) as saldo
+                FROM bancos b
+                WHERE b.id = %(banco_id)s AND b.activo = true
+            ),
+            dias AS (
+                SELECT m.fecha,
+                       m.entradas + m.transferencias_recibidas as ingresos,
+                       m.salidas + m.transferencias_enviadas as salidas
+                FROM movimientos_bancarios_diarios m
+                WHERE m.banco_id = %(banco_id)s
+                AND m.fecha >= %(inicio)s AND m.fecha < %(fin)s
+                UNION ALL
+                -- El primer día de cada mes siempre se muestra
+                SELECT generate_series(%(inicio)s::date, %(fin)s::date - 1, INTERVAL '1 month')::date, 0, 0
+            ),
+            diario AS (
+                SELECT a.nombre,
+                       a.saldo as saldo_apertura,
+                       d.fecha,
+                       SUM(d.ingresos) as ingresos,
+                       SUM(d.salidas) as salidas
+                FROM apertura a
+                CROSS JOIN dias d
+                GROUP BY a.nombre, a.saldo, d.fecha
+            ),
+            acumulado AS (
+                SELECT diario.*,
+                       ingresos - salidas as saldo_dia,
+                       saldo_apertura + SUM(ingresos - salidas) OVER (ORDER BY fecha) as saldo_acumulado
+                FROM diario
+            )
+            SELECT *
+            FROM acumulado
+            WHERE ingresos > 0 OR salidas > 0 OR EXTRACT(DAY FROM fecha) = 1
+            ORDER BY fecha
+        """, {'banco_id': banco_id, 'inicio': inicio, 'fin': fin})
+        filas = cur.fetchall()
+        
+        # Sin filas solo si el banco no existe: el día 1 de cada mes siempre está
+        if not filas:
             return None
         
-        # Calcular el último día del mes anterior
-        if mes == 1:
-            mes_anterior = 12
-            anio_anterior = anio - 1
-        else:
-            mes_anterior = mes - 1
-            anio_anterior = anio
-        
-        # Obtener el último día del mes anterior
-        ultimo_dia_mes_anterior = monthrange(anio_anterior, mes_anterior)[1]
-        fecha_fin_mes_anterior = date(anio_anterior, mes_anterior, ultimo_dia_mes_anterior)
-        
-        # Calcular saldo acumulado al final del mes anterior
-        cur.execute("""
-            SELECT 
-                COALESCE(b.saldo_inicial, 0) +
-                COALESCE((
-                    SELECT SUM(COALESCE(car.monto_abonado, 0))
-                    FROM cuentas_a_recibir car
-                    WHERE car.banco_id = b.id 
-                    AND car.fecha_recibo IS NOT NULL
-                    AND car.fecha_recibo <= %s
-                ), 0) - 
-                COALESCE((
-                    SELECT SUM(COALESCE(cap.monto_abonado, 0))
-                    FROM cuentas_a_pagar cap
-                    WHERE cap.banco_id = b.id 
-                    AND cap.fecha_pago IS NOT NULL
-                    AND cap.fecha_pago <= %s
-                ), 0) +
-                COALESCE((
-                    SELECT SUM(COALESCE(t.monto, 0))
-                    FROM transferencias_cuentas t
-                    WHERE t.banco_destino_id = b.id
-                    AND t.fecha <= %s
-                ), 0) -
-                COALESCE((
-                    SELECT SUM(COALESCE(t.monto, 0))
-                    FROM transferencias_cuentas t
-                    WHERE t.banco_origen_id = b.id
-                    AND t.fecha <= %s
-                ), 0) as saldo_acumulado
-            FROM bancos b
-            WHERE b.id = %s
-        """, (fecha_fin_mes_anterior, fecha_fin_mes_anterior, fecha_fin_mes_anterior, fecha_fin_mes_anterior, banco_id))
-        
-        saldo_mes_anterior = cur.fetchone()['saldo_acumulado'] or 0
-        
-        # Obtener el número de días del mes
-        ultimo_dia_mes = monthrange(anio, mes)[1]
-        
-        # Generar lista de días del mes
-        movimientos = []
-        saldo_acumulado = float(saldo_mes_anterior)
-        
-        for dia in range(1, ultimo_dia_mes + 1):
-            fecha_actual = date(anio, mes, dia)
-            
-            # Ingresos del día (cuentas a recibir)
-            cur.execute("""
-                SELECT COALESCE(SUM(COALESCE(monto_abonado, 0)), 0) as total
-                FROM cuentas_a_recibir
-                WHERE banco_id = %s
-                AND fecha_recibo = %s
-            """, (banco_id, fecha_actual))
-            ingresos_cuentas = float(cur.fetchone()['total'] or 0)
-            
-            # Salidas del día (cuentas a pagar)
-            cur.execute("""
-                SELECT COALESCE(SUM(COALESCE(monto_abonado, 0)), 0) as total
-                FROM cuentas_a_pagar
-                WHERE banco_id = %s
-                AND fecha_pago = %s
-            """, (banco_id, fecha_actual))
-            salidas_cuentas = float(cur.fetchone()['total'] or 0)
-            
-            # Transferencias recibidas del día (entradas)
-            cur.execute("""
-                SELECT COALESCE(SUM(COALESCE(monto, 0)), 0) as total
-                FROM transferencias_cuentas
-                WHERE banco_destino_id = %s
-                AND fecha = %s
-            """, (banco_id, fecha_actual))
-            transferencias_recibidas = float(cur.fetchone()['total'] or 0)
-            
-            # Transferencias enviadas del día (salidas)
-            cur.execute("""
-                SELECT COALESCE(SUM(COALESCE(monto, 0)), 0) as total
-                FROM transferencias_cuentas
-                WHERE banco_origen_id = %s
-                AND fecha = %s
-            """, (banco_id, fecha_actual))
-            transferencias_enviadas = float(cur.fetchone()['total'] or 0)
-            
-            # Sumar transferencias a ingresos y salidas
-            ingresos = ingresos_cuentas + transferencias_recibidas
-            salidas = salidas_cuentas + transferencias_enviadas
-            
-            # Calcular saldo del día
-            saldo_dia = ingresos - salidas
-            
-            # Actualizar saldo acumulado
-            saldo_acumulado += saldo_dia
-            
-            # Solo agregar si hay movimientos o es el primer día
-            if ingresos > 0 or salidas > 0 or dia == 1:
-                movimientos.append({
-                    'fecha': fecha_actual,
-                    'ingresos': ingresos,
-                    'salidas': salidas,
-                    'saldo_dia': saldo_dia,
-                    'saldo_acumulado': saldo_acumulado
-                })
+        movimientos = [{
+            'fecha': r['fecha'],
+            'ingresos': float(r['ingresos'] or 0),
+            'salidas': float(r['salidas'] or 0),
+            'saldo_dia': float(r['saldo_dia'] or 0),
+            'saldo_acumulado': float(r['saldo_acumulado'] or 0)
+        } for r in filas]
         
         return {
             'banco_id': banco_id,
-            'banco_nombre': banco['nombre'],
-            'saldo_mes_anterior': float(saldo_mes_anterior),
+            'banco_nombre': filas[0]['nombre'],
+            'saldo_mes_anterior': float(filas[0]['saldo_apertura'] or 0),
+            'saldo_final': movimientos[-1]['saldo_acumulado'],
+            'fecha_desde': inicio,
+            'fecha_hasta': fin - timedelta(days=1),
             'movimientos': movimientos
         }
     finally:
@@ -1248,6 +1217,7 @@ def obtener_conciliacion_bancaria(banco_id, anio, mes):
         conn.close()
 
 
+@_cachear_reporte
 def obtener_flujo_caja_mensual_detallado(ano=None, proyecto_id=None, tipo_reporte='realizado'):
     """Obtiene el flujo de caja mensual detallado por categorías
     
@@ -1274,87 +1244,24 @@ def obtener_flujo_caja_mensual_detallado(ano=None, proyecto_id=None, tipo_report
         """)
         categorias_gastos = cur.fetchall()
         
-        # Construir filtros
-        where_clauses_ingresos = []
-        where_clauses_gastos = []
-        params_ingresos = []
-        params_gastos = []
-        
-        if ano:
-            if tipo_reporte == 'proyectado':
-                where_clauses_ingresos.append("EXTRACT(YEAR FROM car.fecha_emision) = %s")
-                where_clauses_gastos.append("EXTRACT(YEAR FROM cap.fecha_emision) = %s")
-            else:
-                where_clauses_ingresos.append("EXTRACT(YEAR FROM car.fecha_recibo) = %s")
-                where_clauses_gastos.append("EXTRACT(YEAR FROM cap.fecha_pago) = %s")
-            params_ingresos.append(ano)
-            params_gastos.append(ano)
-        
-        if proyecto_id:
-            where_clauses_ingresos.append("car.proyecto_id = %s")
-            where_clauses_gastos.append("cap.proyecto_id = %s")
-            params_ingresos.append(proyecto_id)
-            params_gastos.append(proyecto_id)
-        
-        where_sql_ingresos = ""
-        if where_clauses_ingresos:
-            where_sql_ingresos = "AND " + " AND ".join(where_clauses_ingresos)
-        
-        where_sql_gastos = ""
-        if where_clauses_gastos:
-            where_sql_gastos = "AND " + " AND ".join(where_clauses_gastos)
-        
-        # Determinar qué columna usar según el tipo de reporte
+        # Totales por categoría y mes desde el resumen mensual
         if tipo_reporte == 'proyectado':
-            campo_ingresos = "COALESCE(car.valor_cuota, car.valor, 0)"
-            campo_gastos = "COALESCE(cap.valor_cuota, cap.valor, 0)"
-            fecha_ingresos = "car.fecha_emision"
-            fecha_gastos = "cap.fecha_emision"
+            fecha_base, medida = 'emision', 'proyectado'
         else:
-            campo_ingresos = "COALESCE(car.monto_abonado, 0)"
-            campo_gastos = "COALESCE(cap.monto_abonado, 0)"
-            fecha_ingresos = "car.fecha_recibo"
-            fecha_gastos = "cap.fecha_pago"
-            where_sql_ingresos += " AND car.fecha_recibo IS NOT NULL"
-            where_sql_gastos += " AND cap.fecha_pago IS NOT NULL"
-        
-        # Obtener ingresos por categoría y mes
-        ingresos_por_categoria = {}
-        for cat in categorias_ingresos:
-            query = f"""
-                SELECT 
-                    EXTRACT(MONTH FROM {fecha_ingresos}) as mes,
-                    EXTRACT(YEAR FROM {fecha_ingresos}) as ano,
-                    SUM({campo_ingresos}) as total
-                FROM cuentas_a_recibir car
-                WHERE car.cuenta_id = %s
-                {where_sql_ingresos}
-                GROUP BY EXTRACT(MONTH FROM {fecha_ingresos}), EXTRACT(YEAR FROM {fecha_ingresos})
-            """
-            cur.execute(query, [cat['id']] + params_ingresos)
-            ingresos_por_categoria[cat['id']] = {
-                f"{int(r['ano'])}-{int(r['mes'])}": float(r['total']) 
-                for r in cur.fetchall()
-            }
-        
-        # Obtener gastos por categoría y mes
-        gastos_por_categoria = {}
-        for cat in categorias_gastos:
-            query = f"""
-                SELECT 
-                    EXTRACT(MONTH FROM {fecha_gastos}) as mes,
-                    EXTRACT(YEAR FROM {fecha_gastos}) as ano,
-                    SUM({campo_gastos}) as total
-                FROM cuentas_a_pagar cap
-                WHERE cap.cuenta_id = %s
-                {where_sql_gastos}
-                GROUP BY EXTRACT(MONTH FROM {fecha_gastos}), EXTRACT(YEAR FROM {fecha_gastos})
-            """
-            cur.execute(query, [cat['id']] + params_gastos)
-            gastos_por_categoria[cat['id']] = {
-                f"{int(r['ano'])}-{int(r['mes'])}": float(r['total']) 
-                for r in cur.fetchall()
-            }
+            fecha_base, medida = 'pago', 'realizado'
+        
+        # Matrices densas categoría -> total por mes (enero a diciembre)
+        periodo = ((ano or 0, 1), (ano or 0, 12))
+        filas = _consultar_resumen_mensual(
+            cur, fecha_base, medida, proyecto_id=proyecto_id,
+            desde=periodo[0], hasta=periodo[1], por_categoria=True
+        ) if ano else []
+        ingresos = _matriz_mensual([f for f in filas if f['tipo'] == 'ingreso'], *periodo,
+                                   claves=[c['id'] for c in categorias_ingresos],
+                                   clave=lambda f: f['categoria_id'])
+        gastos = _matriz_mensual([f for f in filas if f['tipo'] == 'gasto'], *periodo,
+                                 claves=[c['id'] for c in categorias_gastos],
+                                 clave=lambda f: f['categoria_id'])
         
         # Obtener saldo inicial total de bancos
         cur.execute("""
@@ -1364,39 +1271,15 @@ def obtener_flujo_caja_mensual_detallado(ano=None, proyecto_id=None, tipo_report
         """)
         saldo_inicial_total = float(cur.fetchone()['saldo_inicial_total'] or 0)
         
-        # Obtener movimientos anteriores al año seleccionado para calcular saldo inicial
+        # Movimientos anteriores al año seleccionado para calcular saldo inicial
         if ano:
-            fecha_inicio_ano = date(ano, 1, 1)
-            
-            # Entradas anteriores
-            if tipo_reporte == 'realizado':
-                cur.execute("""
-                    SELECT SUM(COALESCE(monto_abonado, 0)) as total
-                    FROM cuentas_a_recibir
-                    WHERE fecha_recibo IS NOT NULL AND fecha_recibo < %s
-                """, (fecha_inicio_ano,))
-            else:
-                cur.execute("""
-                    SELECT SUM(COALESCE(valor_cuota, valor, 0)) as total
-                    FROM cuentas_a_recibir
-                    WHERE fecha_emision < %s
-                """, (fecha_inicio_ano,))
-            entradas_anteriores = float(cur.fetchone()['total'] or 0)
-            
-            # Salidas anteriores
-            if tipo_reporte == 'realizado':
-                cur.execute("""
-                    SELECT SUM(COALESCE(monto_abonado, 0)) as total
-                    FROM cuentas_a_pagar
-                    WHERE fecha_pago IS NOT NULL AND fecha_pago < %s
-                """, (fecha_inicio_ano,))
-            else:
-                cur.execute("""
-                    SELECT SUM(COALESCE(valor_cuota, valor, 0)) as total
-                    FROM cuentas_a_pagar
-                    WHERE fecha_emision < %s
-                """, (fecha_inicio_ano,))
-            salidas_anteriores = float(cur.fetchone()['total'] or 0)
+            entradas_anteriores = 0
+            salidas_anteriores = 0
+            for f in _consultar_resumen_mensual(cur, fecha_base, medida, hasta=(ano - 1, 12)):
+                if f['tipo'] == 'ingreso':
+                    entradas_anteriores += float(f['total'] or 0)
+                else:
+                    salidas_anteriores += float(f['total'] or 0)
             
             saldo_inicial_enero = saldo_inicial_total + entradas_anteriores - salidas_anteriores
         else:
@@ -1415,48 +1298,24 @@ def obtener_flujo_caja_mensual_detallado(ano=None, proyecto_id=None, tipo_report
             'meses': []
         }
         
-        saldo_actual = saldo_inicial_enero
+        total_ingresos = _sumar_series(ingresos.values(), 12)
+        total_gastos = _sumar_series(gastos.values(), 12)
+        saldo_operacional = _restar_series(total_ingresos, total_gastos)
+        saldo_final = _acumular_serie(saldo_operacional, saldo_inicial_enero)
+        # Saldo inicial de cada mes = saldo final del mes anterior
+        saldo_inicial = [saldo_inicial_enero] + saldo_final[:-1]
         
-        for mes in range(1, 13):
-            mes_key = f"{ano}-{mes}" if ano else None
-            mes_nombre = meses_nombres[mes - 1]
-            
-            # Calcular saldo inicial del mes (saldo final del mes anterior)
-            saldo_inicial_mes = saldo_actual
-            
-            # Total de ingresos del mes
-            total_ingresos = 0
-            ingresos_categoria = {}
-            for cat in categorias_ingresos:
-                valor = ingresos_por_categoria.get(cat['id'], {}).get(mes_key, 0)
-                ingresos_categoria[cat['id']] = valor
-                total_ingresos += valor
-            
-            # Total de gastos del mes
-            total_gastos = 0
-            gastos_categoria = {}
-            for cat in categorias_gastos:
-                valor = gastos_por_categoria.get(cat['id'], {}).get(mes_key, 0)
-                gastos_categoria[cat['id']] = valor
-                total_gastos += valor
-            
-            # Saldo operacional
-            saldo_operacional = total_ingresos - total_gastos
-            
-            # Saldo final
-            saldo_final = saldo_inicial_mes + total_ingresos - total_gastos
-            saldo_actual = saldo_final
-            
+        for i, mes_nombre in enumerate(meses_nombres):
             resultado['meses'].append({
-                'mes': mes,
+                'mes': i + 1,
                 'mes_nombre': mes_nombre,
-                'saldo_inicial': saldo_inicial_mes,
-                'total_ingresos': total_ingresos,
-                'ingresos_categoria': ingresos_categoria,
-                'total_gastos': total_gastos,
-                'gastos_categoria': gastos_categoria,
-                'saldo_operacional': saldo_operacional,
-                'saldo_final': saldo_final
+                'saldo_inicial': saldo_inicial[i],
+                'total_ingresos': total_ingresos[i],
+                'ingresos_categoria': _columna_matriz(ingresos, i),
+                'total_gastos': total_gastos[i],
+                'gastos_categoria': _columna_matriz(gastos, i),
+                'saldo_operacional': saldo_operacional[i],
+                'saldo_final': saldo_final[i]
             })
         
         return resultado
@@ -1465,6 +1324,7 @@ def obtener_flujo_caja_mensual_detallado(ano=None, proyecto_id=None, tipo_report
         conn.close()
 
 
+@_cachear_reporte
 def obtener_dre_mensual(ano=None, proyecto_id=None):
     """Obtiene el DRE (Demonstrativo de Resultado) mensual
     Siempre usa fecha de emisión y valor_cuota/valor (facturado, no cobrado)
@@ -1511,76 +1371,20 @@ def obtener_dre_mensual(ano=None, proyecto_id=None):
             if 'INGRESO FINANCIERO' in nombre_upper or 'INGRESOS FINANCIEROS' in nombre_upper:
                 categoria_ingresos_financieros_id = cat['id']
         
-        # Construir filtros
-        where_clauses_ingresos = []
-        where_clauses_gastos = []
-        params_ingresos = []
-        params_gastos = []
-        
-        if ano:
-            # Siempre usar fecha de emisión (facturado, no cobrado)
-            where_clauses_ingresos.append("EXTRACT(YEAR FROM car.fecha_emision) = %s")
-            where_clauses_gastos.append("EXTRACT(YEAR FROM cap.fecha_emision) = %s")
-            params_ingresos.append(ano)
-            params_gastos.append(ano)
-        
-        if proyecto_id:
-            where_clauses_ingresos.append("car.proyecto_id = %s")
-            where_clauses_gastos.append("cap.proyecto_id = %s")
-            params_ingresos.append(proyecto_id)
-            params_gastos.append(proyecto_id)
-        
-        where_sql_ingresos = ""
-        if where_clauses_ingresos:
-            where_sql_ingresos = "AND " + " AND ".join(where_clauses_ingresos)
-        
-        where_sql_gastos = ""
-        if where_clauses_gastos:
-            where_sql_gastos = "AND " + " AND ".join(where_clauses_gastos)
-        
-        # Siempre usar fecha de emisión y valor_cuota/valor (facturado, no cobrado)
-        campo_ingresos = "COALESCE(car.valor_cuota, car.valor, 0)"
-        campo_gastos = "COALESCE(cap.valor_cuota, cap.valor, 0)"
-        fecha_ingresos = "car.fecha_emision"
-        fecha_gastos = "cap.fecha_emision"
-        
-        # Obtener ingresos por categoría y mes
-        ingresos_por_categoria = {}
-        for cat in categorias_ingresos:
-            query = f"""
-                SELECT 
-                    EXTRACT(MONTH FROM {fecha_ingresos}) as mes,
-                    EXTRACT(YEAR FROM {fecha_ingresos}) as ano,
-                    SUM({campo_ingresos}) as total
-                FROM cuentas_a_recibir car
-                WHERE car.cuenta_id = %s
-                {where_sql_ingresos}
-                GROUP BY EXTRACT(MONTH FROM {fecha_ingresos}), EXTRACT(YEAR FROM {fecha_ingresos})
-            """
-            cur.execute(query, [cat['id']] + params_ingresos)
-            ingresos_por_categoria[cat['id']] = {
-                f"{int(r['ano'])}-{int(r['mes'])}": float(r['total']) 
-                for r in cur.fetchall()
-            }
-        
-        # Obtener gastos por categoría y mes
-        gastos_por_categoria = {}
-        for cat in categorias_gastos:
-            query = f"""
-                SELECT 
-                    EXTRACT(MONTH FROM {fecha_gastos}) as mes,
-                    EXTRACT(YEAR FROM {fecha_gastos}) as ano,
-                    SUM({campo_gastos}) as total
-                FROM cuentas_a_pagar cap
-                WHERE cap.cuenta_id = %s
-                {where_sql_gastos}
-                GROUP BY EXTRACT(MONTH FROM {fecha_gastos}), EXTRACT(YEAR FROM {fecha_gastos})
-            """
-            cur.execute(query, [cat['id']] + params_gastos)
-            gastos_por_categoria[cat['id']] = {
-                f"{int(r['ano'])}-{int(r['mes'])}": float(r['total']) 
-                for r in cur.fetchall()
-            }
+        # Totales por categoría y mes desde el resumen mensual
+        # (siempre fecha de emisión y valor_cuota/valor: facturado, no cobrado)
+        periodo = ((ano or 0, 1), (ano or 0, 12))
+        filas = _consultar_resumen_mensual(
+            cur, 'emision', 'proyectado', proyecto_id=proyecto_id,
+            desde=periodo[0], hasta=periodo[1], por_categoria=True
+        ) if ano else []
+        ingresos = _matriz_mensual([f for f in filas if f['tipo'] == 'ingreso'], *periodo,
+                                   claves=[c['id'] for c in categorias_ingresos],
+                                   clave=lambda f: f['categoria_id'])
+        gastos = _matriz_mensual([f for f in filas if f['tipo'] == 'gasto'], *periodo,
+                                 claves=[c['id'] for c in categorias_gastos],
+                                 clave=lambda f: f['categoria_id'])
+        ceros = [0.0] * 12
         
         # Construir estructura de datos por mes
         meses_nombres = ['ENERO', 'FEBRERO', 'MARZO', 'ABRIL', 'MAYO', 'JUNIO', 
@@ -1599,86 +1403,117 @@ def obtener_dre_mensual(ano=None, proyecto_id=None):
             'meses': []
         }
         
-        for mes in range(1, 13):
-            mes_key = f"{ano}-{mes}" if ano else None
-            mes_nombre = meses_nombres[mes - 1]
-            
-            # Receita Bruta (suma de todos los ingresos)
-            receita_bruta = 0
-            ingresos_categoria = {}
-            for cat in categorias_ingresos:
-                valor = ingresos_por_categoria.get(cat['id'], {}).get(mes_key, 0)
-                ingresos_categoria[cat['id']] = valor
-                receita_bruta += valor
-            
-            # Deducciones sobre Ventas
-            deducciones = gastos_por_categoria.get(categoria_deducciones_id, {}).get(mes_key, 0) if categoria_deducciones_id else 0
-            
-            # Receita Líquida
-            receita_liquida = receita_bruta - deducciones
-            
-            # Costos Variables
-            costos_variables = gastos_por_categoria.get(categoria_costos_variables_id, {}).get(mes_key, 0) if categoria_costos_variables_id else 0
-            
-            # Margem Contribuição
-            margem_contribuicao = receita_liquida - costos_variables
-            
-            # % Margem Contribuição
-            percentual_margem_contribuicao = (margem_contribuicao / receita_liquida * 100) if receita_liquida != 0 else 0
-            
-            # Despesas (todas las categorías de gastos excepto deducciones, costos variables, gastos financieros e impuestos)
-            despesas = 0
-            gastos_categoria = {}
-            for cat in categorias_gastos:
-                if cat['id'] not in [categoria_deducciones_id, categoria_costos_variables_id, 
-                                     categoria_gastos_financieros_id, categoria_impuestos_directos_id]:
-                    valor = gastos_por_categoria.get(cat['id'], {}).get(mes_key, 0)
-                    gastos_categoria[cat['id']] = valor
-                    despesas += valor
-            
-            # Lucro Operacional
-            lucro_operacional = margem_contribuicao - despesas
-            
-            # Ingresos Financieros
-            ingresos_financieros = ingresos_por_categoria.get(categoria_ingresos_financieros_id, {}).get(mes_key, 0) if categoria_ingresos_financieros_id else 0
-            
-            # Gastos Financieros
-            gastos_financieros = gastos_por_categoria.get(categoria_gastos_financieros_id, {}).get(mes_key, 0) if categoria_gastos_financieros_id else 0
-            
-            # Resultado Financeiro
-            resultado_financeiro = ingresos_financieros - gastos_financieros
-            
-            # Impuestos Directos
-            impuestos_directos = gastos_por_categoria.get(categoria_impuestos_directos_id, {}).get(mes_key, 0) if categoria_impuestos_directos_id else 0
-            
-            # Lucro Líquido
-            lucro_liquido = lucro_operacional + resultado_financeiro - impuestos_directos
-            
-            # % Margem Líquida
-            percentual_margem_liquida = (lucro_liquido / receita_liquida * 100) if receita_liquida != 0 else 0
-            
+        especiales = [categoria_deducciones_id, categoria_costos_variables_id,
+                      categoria_gastos_financieros_id, categoria_impuestos_directos_id]
+        gastos_despesas = {cid: serie for cid, serie in gastos.items() if cid not in especiales}
+        
+        # Receita Bruta (suma de todos los ingresos)
+        receita_bruta = _sumar_series(ingresos.values(), 12)
+        # Deducciones sobre Ventas
+        deducciones = gastos.get(categoria_deducciones_id, ceros)
+        receita_liquida = _restar_series(receita_bruta, deducciones)
+        costos_variables = gastos.get(categoria_costos_variables_id, ceros)
+        margem_contribuicao = _restar_series(receita_liquida, costos_variables)
+        percentual_margem_contribuicao = _porcentaje_series(margem_contribuicao, receita_liquida)
+        # Despesas (todas las categorías de gastos excepto deducciones, costos variables, gastos financieros e impuestos)
+        despesas = _sumar_series(gastos_despesas.values(), 12)
+        lucro_operacional = _restar_series(margem_contribuicao, despesas)
+        ingresos_financieros = ingresos.get(categoria_ingresos_financieros_id, ceros)
+        gastos_financieros = gastos.get(categoria_gastos_financieros_id, ceros)
+        resultado_financeiro = _restar_series(ingresos_financieros, gastos_financieros)
+        impuestos_directos = gastos.get(categoria_impuestos_directos_id, ceros)
+        # Lucro Líquido = lucro operacional + resultado financiero - impuestos directos
+        lucro_liquido = _restar_series(_sumar_series([lucro_operacional, resultado_financeiro], 12),
+                                       impuestos_directos)
+        percentual_margem_liquida = _porcentaje_series(lucro_liquido, receita_liquida)
+        
+        for i, mes_nombre in enumerate(meses_nombres):
             resultado['meses'].append({
-                'mes': mes,
+                'mes': i + 1,
                 'mes_nombre': mes_nombre,
-                'receita_bruta': receita_bruta,
-                'ingresos_categoria': ingresos_categoria,
-                'deducciones': deducciones,
-                'receita_liquida': receita_liquida,
-                'costos_variables': costos_variables,
-                'margem_contribuicao': margem_contribuicao,
-                'percentual_margem_contribuicao': percentual_margem_contribuicao,
-                'despesas': despesas,
-                'gastos_categoria': gastos_categoria,
-                'lucro_operacional': lucro_operacional,
-                'ingresos_financieros': ingresos_financieros,
-                'gastos_financieros': gastos_financieros,
-                'resultado_financeiro': resultado_financeiro,
-                'impuestos_directos': impuestos_directos,
-                'lucro_liquido': lucro_liquido,
-                'percentual_margem_liquida': percentual_margem_liquida
+                'receita_bruta': receita_bruta[i],
+                'ingresos_categoria': _columna_matriz(ingresos, i),
+                'deducciones': deducciones[i],
+                'receita_liquida': receita_liquida[i],
+                'costos_variables': costos_variables[i],
+                'margem_contribuicao': margem_contribuicao[i],
+                'percentual_margem_contribuicao': percentual_margem_contribuicao[i],
+                'despesas': despesas[i],
+                'gastos_categoria': _columna_matriz(gastos_despesas, i),
+                'lucro_operacional': lucro_operacional[i],
+                'ingresos_financieros': ingresos_financieros[i],
+                'gastos_financieros': gastos_financieros[i],
+                'resultado_financeiro': resultado_financeiro[i],
+                'impuestos_directos': impuestos_directos[i],
+                'lucro_liquido': lucro_liquido[i],
+                'percentual_margem_liquida': percentual_margem_liquida[i]
             })
         
         return resultado
     finally:
         cur.close()
         conn.close()
+
+
+# ==================== EJECUCIÓN PARALELA DE REPORTES ====================
+
+_ejecutor_reportes = ThreadPoolExecutor(max_workers=REPORTES_PARALELOS_MAX,
+                                        thread_name_prefix="reportes")
+
+
+def _ejecutar_reporte_medido(funcion, kwargs, version):
+    """Ejecuta una función de reporte y devuelve (resultado, segundos)"""
+    inicio = time.perf_counter()
+    resultado = _ejecutar_con_version(version, funcion, **kwargs)
+    return resultado, time.perf_counter() - inicio
+
+
+def ejecutar_reportes_en_paralelo(consultas, timeout=None):
+    """Ejecuta consultas de reportes independientes en paralelo
+    
+    Cada consulta abre su propia conexión, así que el costo total es
+    aproximadamente el de la consulta más lenta y no la suma de todas.
+    
+    Args:
+        consultas: dict nombre -> (funcion, kwargs, valor_por_defecto)
+        timeout: segundos máximos por consulta (por defecto REPORTES_TIMEOUT)
+    
+    Returns:
+        (resultados, tiempos): resultados es dict nombre -> valor (el valor por
+        defecto si la consulta falló o excedió el tiempo); tiempos es dict
+        nombre -> {'segundos', 'estado' ('ok'|'timeout'|'error'), 'error'}
+    """
+    if timeout is None:
+        timeout = REPORTES_TIMEOUT
+    
+    inicio = time.perf_counter()
+    # Una sola lectura de la versión de datos para todas las consultas
+    version = getattr(_version_reportes, 'version', None)
+    if version is None:
+        version = financiero.version_datos_financieros()
+    futuros = {
+        nombre: _ejecutor_reportes.submit(_ejecutar_reporte_medido, funcion, kwargs or {}, version)
+        for nombre, (funcion, kwargs, _) in consultas.items()
+    }
+    
+    resultados = {}
+    tiempos = {}
+    for nombre, futuro in futuros.items():
+        valor_por_defecto = consultas[nombre][2]
+        restante = max(0, timeout - (time.perf_counter() - inicio)) if timeout else None
+        try:
+            resultados[nombre], segundos = futuro.result(timeout=restante)
+            tiempos[nombre] = {'segundos': segundos, 'estado': 'ok', 'error': None}
+        except FuturesTimeoutError:
+            futuro.cancel()
+            resultados[nombre] = valor_por_defecto
+            tiempos[nombre] = {'segundos': time.perf_counter() - inicio,
+                               'estado': 'timeout', 'error': None}
+            print(f"[WARN] Reporte '{nombre}' excedió {timeout}s")
+        except Exception as e:
+            resultados[nombre] = valor_por_defecto
+            tiempos[nombre] = {'segundos': time.perf_counter() - inicio,
+                               'estado': 'error', 'error': str(e)}
+            print(f"[ERROR] Error en reporte '{nombre}': {e}")
+    
+    return resultados, tiempos
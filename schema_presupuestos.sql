@@ -766,6 +766,24 @@ CREATE TRIGGER trigger_facturas_actualizado
     FOR EACH ROW
     EXECUTE FUNCTION actualizar_timestamp();
 
+-- Último número de factura emitido por año (FAC-YYYY-NNNN)
+-- crear_facturas bloquea la fila del año al reservar números
+CREATE TABLE IF NOT EXISTS facturas_numeracion (
+    anio INTEGER PRIMARY KEY,
+    ultimo_numero INTEGER NOT NULL DEFAULT 0
+);
+
+-- Inicializar los contadores con las facturas ya emitidas
+INSERT INTO facturas_numeracion (anio, ultimo_numero)
+SELECT
+    CAST(SUBSTRING(numero_factura FROM '^FAC-(\d{4})-\d+$') AS INTEGER),
+    MAX(CAST(SUBSTRING(numero_factura FROM '^FAC-\d{4}-(\d+)$') AS INTEGER))
+FROM facturas
+WHERE numero_factura ~ '^FAC-\d{4}-\d+$'
+GROUP BY 1
+ON CONFLICT (anio) DO UPDATE
+SET ultimo_numero = GREATEST(facturas_numeracion.ultimo_numero, EXCLUDED.ultimo_numero);
+
 -- ============================================
 -- TABLAS FINANCIERAS
 -- ============================================
@@ -828,6 +846,84 @@ CREATE INDEX IF NOT EXISTS idx_categorias_gastos_orden ON categorias_gastos(orde
 CREATE INDEX IF NOT EXISTS idx_tipos_gastos_categoria ON tipos_gastos(categoria_id);
 CREATE INDEX IF NOT EXISTS idx_tipos_gastos_orden ON tipos_gastos(orden);
 
+-- Reserva los próximos códigos de categoría (1, 2, 3...) para categorias_ingresos
+-- o categorias_gastos. El advisory lock se mantiene hasta el fin de la transacción,
+-- por lo que debe llamarse en la misma transacción que inserta las categorías.
+CREATE OR REPLACE FUNCTION reservar_codigos_categoria_financiera(p_tabla TEXT, p_cantidad INTEGER DEFAULT 1)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    ultimo_numero INTEGER;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('categorias_financieras'));
+
+    IF p_tabla = 'categorias_ingresos' THEN
+        SELECT COALESCE(MAX(SPLIT_PART(codigo, '.', 1)::INTEGER), 0) INTO ultimo_numero
+        FROM categorias_ingresos
+        WHERE SPLIT_PART(codigo, '.', 1) ~ '^[0-9]+$';
+    ELSIF p_tabla = 'categorias_gastos' THEN
+        -- Las categorías de gastos también evitan los números usados por ingresos
+        SELECT COALESCE(MAX(SPLIT_PART(codigo, '.', 1)::INTEGER), 0) INTO ultimo_numero
+        FROM (
+            SELECT codigo FROM categorias_gastos
+            UNION ALL
+            SELECT codigo FROM categorias_ingresos
+        ) c
+        WHERE SPLIT_PART(codigo, '.', 1) ~ '^[0-9]+$';
+    ELSE
+        RAISE EXCEPTION 'Tabla de categorías no soportada: %', p_tabla;
+    END IF;
+
+    RETURN QUERY
+    SELECT (ultimo_numero + n)::TEXT
+    FROM generate_series(1, p_cantidad) AS n;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reserva los próximos códigos de tipo (categoria.N) para tipos_ingresos o
+-- tipos_gastos dentro de una categoría. No devuelve filas si la categoría no existe.
+-- Igual que la anterior, el lock dura hasta el fin de la transacción.
+CREATE OR REPLACE FUNCTION reservar_codigos_tipo_financiero(p_tabla TEXT, p_categoria_id INTEGER, p_cantidad INTEGER DEFAULT 1)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    tabla_categorias TEXT;
+    codigo_categoria TEXT;
+    ultimo_numero INTEGER;
+BEGIN
+    IF p_tabla = 'tipos_ingresos' THEN
+        tabla_categorias := 'categorias_ingresos';
+    ELSIF p_tabla = 'tipos_gastos' THEN
+        tabla_categorias := 'categorias_gastos';
+    ELSE
+        RAISE EXCEPTION 'Tabla de tipos no soportada: %', p_tabla;
+    END IF;
+
+    PERFORM pg_advisory_xact_lock(hashtext(p_tabla), p_categoria_id);
+
+    EXECUTE format('SELECT codigo FROM %I WHERE id = $1', tabla_categorias)
+    INTO codigo_categoria
+    USING p_categoria_id;
+
+    IF codigo_categoria IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- Primer número después de "codigo_categoria." (ej: 3 en "2.3" o en "2.3.1")
+    EXECUTE format($sql$
+        SELECT COALESCE(MAX(SPLIT_PART(SUBSTRING(codigo FROM LENGTH($2) + 2), '.', 1)::INTEGER), 0)
+        FROM %I
+        WHERE categoria_id = $1
+          AND LEFT(codigo, LENGTH($2) + 1) = $2 || '.'
+          AND SPLIT_PART(SUBSTRING(codigo FROM LENGTH($2) + 2), '.', 1) ~ '^[0-9]+$'
+    $sql$, p_tabla)
+    INTO ultimo_numero
+    USING p_categoria_id, codigo_categoria;
+
+    RETURN QUERY
+    SELECT codigo_categoria || '.' || (ultimo_numero + n)
+    FROM generate_series(1, p_cantidad) AS n;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Agregar permisos para módulo financiero
 INSERT INTO permisos_rutas (ruta, nombre, descripcion) 
 VALUES ('/financiero', 'Módulo Financiero', 'Acceso al módulo financiero')
@@ -874,6 +970,43 @@ INSERT INTO permisos_rutas (ruta, nombre, descripcion)
 VALUES ('/financiero/tipos-documentos', 'Tipos de Documentos', 'Gestión de tipos de documentos')
 ON CONFLICT (ruta) DO NOTHING;
 
+-- Versión de los datos financieros. Cada sentencia que modifica una tabla que
+-- aparece en los reportes la incrementa en su misma transacción (ver los
+-- triggers trigger_*_version_datos más abajo), así todos los workers ven el
+-- cambio al confirmarse y pueden descartar los reportes calculados antes.
+CREATE TABLE IF NOT EXISTS version_datos_financieros (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    version BIGINT NOT NULL DEFAULT 0,
+    CONSTRAINT version_datos_financieros_single_row CHECK (id = 1)
+);
+
+INSERT INTO version_datos_financieros (id, version) VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
+
+-- Incrementa la versión. La fila queda bloqueada hasta el fin de la transacción:
+-- todas las escrituras financieras se serializan sobre esta fila durante toda
+-- su transacción (no solo durante la sentencia), y una transacción larga que
+-- escriba en estas tablas demora a todas las demás hasta confirmarse.
+CREATE OR REPLACE FUNCTION incrementar_version_datos_financieros()
+RETURNS VOID AS $$
+BEGIN
+    UPDATE version_datos_financieros SET version = version + 1 WHERE id = 1;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Se ejecuta BEFORE de cada sentencia: el bloqueo de la fila de versión se toma
+-- antes que los bloqueos de filas y los advisory locks por banco del libro diario.
+-- Para mantener ese orden, el código que bloquea filas antes de su primera
+-- escritura (SELECT ... FOR UPDATE) debe llamar antes a
+-- incrementar_version_datos_financieros().
+CREATE OR REPLACE FUNCTION trigger_version_datos_financieros()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM incrementar_version_datos_financieros();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Tabla de bancos
 CREATE TABLE IF NOT EXISTS bancos (
     id SERIAL PRIMARY KEY,
@@ -975,6 +1108,10 @@ CREATE INDEX IF NOT EXISTS idx_cuentas_a_recibir_fecha_emision ON cuentas_a_reci
 CREATE INDEX IF NOT EXISTS idx_cuentas_a_recibir_cliente ON cuentas_a_recibir(cliente);
 CREATE INDEX IF NOT EXISTS idx_cuentas_a_recibir_estado ON cuentas_a_recibir(estado);
 CREATE INDEX IF NOT EXISTS idx_cuentas_a_recibir_vencimiento ON cuentas_a_recibir(vencimiento);
+-- Índices para los reportes mensuales (filtros por rango de fechas, no EXTRACT)
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_recibir_fecha_recibo ON cuentas_a_recibir(fecha_recibo);
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_recibir_fecha_recibo_o_emision ON cuentas_a_recibir((COALESCE(fecha_recibo, fecha_emision)));
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_recibir_proyecto ON cuentas_a_recibir(proyecto_id);
 
 -- Tabla de cuentas a pagar
 CREATE TABLE IF NOT EXISTS cuentas_a_pagar (
@@ -1027,6 +1164,545 @@ CREATE INDEX IF NOT EXISTS idx_cuentas_a_pagar_fecha_emision ON cuentas_a_pagar(
 CREATE INDEX IF NOT EXISTS idx_cuentas_a_pagar_proveedor ON cuentas_a_pagar(proveedor);
 CREATE INDEX IF NOT EXISTS idx_cuentas_a_pagar_estado ON cuentas_a_pagar(estado);
 CREATE INDEX IF NOT EXISTS idx_cuentas_a_pagar_vencimiento ON cuentas_a_pagar(vencimiento);
+-- Índices para los reportes mensuales (filtros por rango de fechas, no EXTRACT)
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_pagar_fecha_pago ON cuentas_a_pagar(fecha_pago);
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_pagar_fecha_pago_o_emision ON cuentas_a_pagar((COALESCE(fecha_pago, fecha_emision)));
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_pagar_proyecto ON cuentas_a_pagar(proyecto_id);
+
+-- Búsqueda por subcadena (LIKE '%texto%') en cliente, proveedor y plano de cuenta
+-- Los filtros usan UPPER(columna) LIKE ..., por eso los índices se crean sobre esa expresión
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_recibir_cliente_trgm ON cuentas_a_recibir USING GIN (UPPER(cliente) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_recibir_plano_cuenta_trgm ON cuentas_a_recibir USING GIN (UPPER(plano_cuenta) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_pagar_proveedor_trgm ON cuentas_a_pagar USING GIN (UPPER(proveedor) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_pagar_plano_cuenta_trgm ON cuentas_a_pagar USING GIN (UPPER(plano_cuenta) gin_trgm_ops);
+
+-- Saldo y estado de pago de cuentas a pagar / a recibir
+-- Los reportes filtran, cuentan, ordenan y paginan por estos valores en SQL
+-- Saldo pendiente: valor de la cuota (o valor total) menos lo abonado, nunca
+-- con el signo invertido (las notas de crédito tienen valor negativo)
+CREATE OR REPLACE FUNCTION saldo_cuenta(p_valor NUMERIC, p_valor_cuota NUMERIC, p_monto_abonado NUMERIC)
+RETURNS NUMERIC AS $$
+    SELECT CASE
+        WHEN COALESCE(NULLIF(p_valor_cuota, 0), p_valor, 0) < 0
+            THEN LEAST(COALESCE(NULLIF(p_valor_cuota, 0), p_valor, 0) + COALESCE(p_monto_abonado, 0), 0)
+        ELSE GREATEST(COALESCE(NULLIF(p_valor_cuota, 0), p_valor, 0) - COALESCE(p_monto_abonado, 0), 0)
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Estado de pago de una cuenta a pagar: 'Pendiente', 'Atrasado', 'En día', 'Adelantado',
+-- 'Pagado' o 'Pagado (<Atrasado|Adelantado|En día>)' según la fecha de pago
+CREATE OR REPLACE FUNCTION estado_pago_cuenta_a_pagar(
+    p_estado TEXT, p_saldo NUMERIC, p_vencimiento DATE, p_fecha_pago DATE, p_status_pago TEXT
+)
+RETURNS TEXT AS $$
+    SELECT CASE
+        -- Sin saldo ni fecha de pago, manda el status_pago cargado
+        WHEN p_saldo <= 0.01 AND p_fecha_pago IS NULL AND p_status_pago = 'ADELANTADO' THEN 'Adelantado'
+        WHEN p_saldo <= 0.01 AND p_fecha_pago IS NULL AND p_status_pago = 'ATRASADO' THEN 'Atrasado'
+        WHEN p_saldo <= 0.01 AND p_fecha_pago IS NULL AND p_status_pago = 'EN DIA' THEN 'En día'
+        WHEN p_saldo > 0.01 AND COALESCE(NULLIF(p_estado, ''), 'ABIERTO') <> 'PAGADO' THEN 'Pendiente'
+        WHEN p_fecha_pago IS NOT NULL THEN
+            CASE
+                WHEN p_vencimiento IS NULL THEN 'Pagado'
+                WHEN p_fecha_pago > p_vencimiento THEN 'Pagado (Atrasado)'
+                WHEN p_fecha_pago < p_vencimiento THEN 'Pagado (Adelantado)'
+                ELSE 'Pagado (En día)'
+            END
+        WHEN p_estado = 'PAGADO' THEN 'Pagado'
+        WHEN COALESCE(NULLIF(p_estado, ''), 'ABIERTO') = 'ABIERTO' THEN
+            CASE
+                WHEN p_vencimiento IS NULL THEN 'Pendiente'
+                WHEN CURRENT_DATE > p_vencimiento THEN 'Atrasado'
+                WHEN CURRENT_DATE = p_vencimiento THEN 'En día'
+                ELSE 'Pendiente'
+            END
+        ELSE p_estado
+    END
+$$ LANGUAGE sql STABLE;
+
+-- Estado de pago de una cuenta a recibir: 'Pagado', 'Pendiente', 'Atrasado', 'En día' o 'Adelantado'
+CREATE OR REPLACE FUNCTION estado_pago_cuenta_a_recibir(
+    p_estado TEXT, p_saldo NUMERIC, p_vencimiento DATE, p_status_recibo TEXT
+)
+RETURNS TEXT AS $$
+    SELECT CASE
+        -- Sin saldo, manda el status_recibo cargado
+        WHEN p_saldo <= 0.01 AND p_status_recibo = 'ADELANTADO' THEN 'Adelantado'
+        WHEN p_saldo <= 0.01 AND p_status_recibo = 'ATRASADO' THEN 'Atrasado'
+        WHEN p_saldo <= 0.01 AND p_status_recibo = 'EN DIA' THEN 'En día'
+        WHEN p_estado = 'RECIBIDO' THEN 'Pagado'
+        WHEN p_saldo > 0.01 THEN 'Pendiente'
+        WHEN COALESCE(NULLIF(p_estado, ''), 'ABIERTO') = 'ABIERTO' THEN
+            CASE
+                WHEN p_vencimiento IS NULL THEN 'Pendiente'
+                WHEN CURRENT_DATE > p_vencimiento THEN 'Atrasado'
+                WHEN CURRENT_DATE = p_vencimiento THEN 'En día'
+                ELSE 'Pendiente'
+            END
+        ELSE p_estado
+    END
+$$ LANGUAGE sql STABLE;
+
+-- Orden de los reportes (más recientes primero) resuelto por índice
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_pagar_fecha_emision_id ON cuentas_a_pagar(fecha_emision DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_cuentas_a_recibir_fecha_emision_id ON cuentas_a_recibir(fecha_emision DESC, id DESC);
+
+-- Tabla de transferencias entre cuentas bancarias
+CREATE TABLE IF NOT EXISTS transferencias_cuentas (
+    id SERIAL PRIMARY KEY,
+    fecha DATE NOT NULL,
+    banco_origen_id INTEGER NOT NULL REFERENCES bancos(id),
+    banco_destino_id INTEGER NOT NULL REFERENCES bancos(id),
+    monto NUMERIC(15, 2) NOT NULL,
+    descripcion TEXT,
+    creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT banco_origen_destino_diferentes CHECK (banco_origen_id != banco_destino_id),
+    CONSTRAINT monto_positivo CHECK (monto > 0)
+);
+
+CREATE INDEX IF NOT EXISTS idx_transferencias_cuentas_fecha ON transferencias_cuentas(fecha);
+CREATE INDEX IF NOT EXISTS idx_transferencias_cuentas_origen ON transferencias_cuentas(banco_origen_id, fecha);
+CREATE INDEX IF NOT EXISTS idx_transferencias_cuentas_destino ON transferencias_cuentas(banco_destino_id, fecha);
+
+-- Libro diario de movimientos por banco, mantenido por triggers sobre
+-- cuentas_a_recibir (fecha_recibo), cuentas_a_pagar (fecha_pago) y transferencias_cuentas.
+-- neto_acumulado = suma de (entradas - salidas + recibidas - enviadas) hasta ese día inclusive;
+-- el saldo de cierre del día es bancos.saldo_inicial + neto_acumulado.
+CREATE TABLE IF NOT EXISTS movimientos_bancarios_diarios (
+    banco_id INTEGER NOT NULL REFERENCES bancos(id) ON DELETE CASCADE,
+    fecha DATE NOT NULL,
+    entradas NUMERIC(15, 2) NOT NULL DEFAULT 0,
+    salidas NUMERIC(15, 2) NOT NULL DEFAULT 0,
+    transferencias_recibidas NUMERIC(15, 2) NOT NULL DEFAULT 0,
+    transferencias_enviadas NUMERIC(15, 2) NOT NULL DEFAULT 0,
+    neto_acumulado NUMERIC(15, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (banco_id, fecha)
+);
+
+CREATE INDEX IF NOT EXISTS idx_movimientos_bancarios_diarios_fecha ON movimientos_bancarios_diarios(fecha);
+
+-- Aplica un delta de movimientos a un banco y día, y desplaza el acumulado de los días posteriores.
+-- El advisory lock por banco serializa las actualizaciones concurrentes del mismo banco.
+CREATE OR REPLACE FUNCTION aplicar_movimiento_bancario(
+    p_banco_id INTEGER, p_fecha DATE,
+    p_entradas NUMERIC, p_salidas NUMERIC, p_recibidas NUMERIC, p_enviadas NUMERIC
+)
+RETURNS VOID AS $$
+DECLARE
+    v_neto NUMERIC := p_entradas - p_salidas + p_recibidas - p_enviadas;
+BEGIN
+    IF p_banco_id IS NULL OR p_fecha IS NULL THEN
+        RETURN;
+    END IF;
+    IF p_entradas = 0 AND p_salidas = 0 AND p_recibidas = 0 AND p_enviadas = 0 THEN
+        RETURN;
+    END IF;
+
+    PERFORM pg_advisory_xact_lock(hashtext('movimientos_bancarios_diarios'), p_banco_id);
+
+    INSERT INTO movimientos_bancarios_diarios AS m
+        (banco_id, fecha, entradas, salidas, transferencias_recibidas, transferencias_enviadas, neto_acumulado)
+    VALUES (
+        p_banco_id, p_fecha, p_entradas, p_salidas, p_recibidas, p_enviadas,
+        COALESCE((
+            SELECT neto_acumulado FROM movimientos_bancarios_diarios
+            WHERE banco_id = p_banco_id AND fecha < p_fecha
+            ORDER BY fecha DESC
+            LIMIT 1
+        ), 0) + v_neto
+    )
+    ON CONFLICT (banco_id, fecha) DO UPDATE SET
+        entradas = m.entradas + EXCLUDED.entradas,
+        salidas = m.salidas + EXCLUDED.salidas,
+        transferencias_recibidas = m.transferencias_recibidas + EXCLUDED.transferencias_recibidas,
+        transferencias_enviadas = m.transferencias_enviadas + EXCLUDED.transferencias_enviadas,
+        neto_acumulado = m.neto_acumulado + v_neto;
+
+    IF v_neto <> 0 THEN
+        UPDATE movimientos_bancarios_diarios
+        SET neto_acumulado = neto_acumulado + v_neto
+        WHERE banco_id = p_banco_id AND fecha > p_fecha;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Toma los advisory locks de varios bancos en orden ascendente. Una fila que
+-- mueve dinero entre dos bancos (transferencias, o un cambio de banco_id) los
+-- bloquea antes de aplicar los movimientos: si cada llamada a
+-- aplicar_movimiento_bancario bloqueara su banco en el orden de la fila, dos
+-- transferencias en sentidos opuestos podrían bloquearse mutuamente.
+CREATE OR REPLACE FUNCTION bloquear_bancos_movimientos(VARIADIC p_bancos INTEGER[])
+RETURNS VOID AS $$
+DECLARE
+    v_banco_id INTEGER;
+BEGIN
+    FOR v_banco_id IN
+        SELECT DISTINCT banco_id FROM unnest(p_bancos) AS banco_id
+        WHERE banco_id IS NOT NULL
+        ORDER BY banco_id
+    LOOP
+        PERFORM pg_advisory_xact_lock(hashtext('movimientos_bancarios_diarios'), v_banco_id);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trigger_movimientos_cuentas_a_recibir()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.banco_id IS NOT DISTINCT FROM NEW.banco_id
+       AND OLD.fecha_recibo IS NOT DISTINCT FROM NEW.fecha_recibo
+       AND OLD.monto_abonado IS NOT DISTINCT FROM NEW.monto_abonado THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.banco_id IS DISTINCT FROM NEW.banco_id THEN
+        PERFORM bloquear_bancos_movimientos(OLD.banco_id, NEW.banco_id);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM aplicar_movimiento_bancario(OLD.banco_id, OLD.fecha_recibo, -COALESCE(OLD.monto_abonado, 0), 0, 0, 0);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM aplicar_movimiento_bancario(NEW.banco_id, NEW.fecha_recibo, COALESCE(NEW.monto_abonado, 0), 0, 0, 0);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trigger_movimientos_cuentas_a_pagar()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.banco_id IS NOT DISTINCT FROM NEW.banco_id
+       AND OLD.fecha_pago IS NOT DISTINCT FROM NEW.fecha_pago
+       AND OLD.monto_abonado IS NOT DISTINCT FROM NEW.monto_abonado THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.banco_id IS DISTINCT FROM NEW.banco_id THEN
+        PERFORM bloquear_bancos_movimientos(OLD.banco_id, NEW.banco_id);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM aplicar_movimiento_bancario(OLD.banco_id, OLD.fecha_pago, 0, -COALESCE(OLD.monto_abonado, 0), 0, 0);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM aplicar_movimiento_bancario(NEW.banco_id, NEW.fecha_pago, 0, COALESCE(NEW.monto_abonado, 0), 0, 0);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trigger_movimientos_transferencias()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bloquear_bancos_movimientos(NEW.banco_origen_id, NEW.banco_destino_id);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM bloquear_bancos_movimientos(OLD.banco_origen_id, OLD.banco_destino_id);
+    ELSE
+        PERFORM bloquear_bancos_movimientos(OLD.banco_origen_id, OLD.banco_destino_id,
+                                            NEW.banco_origen_id, NEW.banco_destino_id);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM aplicar_movimiento_bancario(OLD.banco_destino_id, OLD.fecha, 0, 0, -OLD.monto, 0);
+        PERFORM aplicar_movimiento_bancario(OLD.banco_origen_id, OLD.fecha, 0, 0, 0, -OLD.monto);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM aplicar_movimiento_bancario(NEW.banco_destino_id, NEW.fecha, 0, 0, NEW.monto, 0);
+        PERFORM aplicar_movimiento_bancario(NEW.banco_origen_id, NEW.fecha, 0, 0, 0, NEW.monto);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_cuentas_a_recibir_movimientos ON cuentas_a_recibir;
+CREATE TRIGGER trigger_cuentas_a_recibir_movimientos
+    AFTER INSERT OR DELETE OR UPDATE OF banco_id, fecha_recibo, monto_abonado ON cuentas_a_recibir
+    FOR EACH ROW
+    EXECUTE FUNCTION trigger_movimientos_cuentas_a_recibir();
+
+DROP TRIGGER IF EXISTS trigger_cuentas_a_pagar_movimientos ON cuentas_a_pagar;
+CREATE TRIGGER trigger_cuentas_a_pagar_movimientos
+    AFTER INSERT OR DELETE OR UPDATE OF banco_id, fecha_pago, monto_abonado ON cuentas_a_pagar
+    FOR EACH ROW
+    EXECUTE FUNCTION trigger_movimientos_cuentas_a_pagar();
+
+DROP TRIGGER IF EXISTS trigger_transferencias_cuentas_movimientos ON transferencias_cuentas;
+CREATE TRIGGER trigger_transferencias_cuentas_movimientos
+    AFTER INSERT OR DELETE OR UPDATE ON transferencias_cuentas
+    FOR EACH ROW
+    EXECUTE FUNCTION trigger_movimientos_transferencias();
+
+-- Reconstruye el libro diario completo desde las tablas de origen.
+-- Bloquea las escrituras sobre esas tablas mientras se ejecuta.
+CREATE OR REPLACE FUNCTION reconstruir_movimientos_bancarios_diarios()
+RETURNS INTEGER AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    LOCK TABLE cuentas_a_recibir, cuentas_a_pagar, transferencias_cuentas IN SHARE MODE;
+    LOCK TABLE movimientos_bancarios_diarios IN EXCLUSIVE MODE;
+
+    DELETE FROM movimientos_bancarios_diarios;
+
+    INSERT INTO movimientos_bancarios_diarios
+        (banco_id, fecha, entradas, salidas, transferencias_recibidas, transferencias_enviadas, neto_acumulado)
+    SELECT
+        banco_id,
+        fecha,
+        SUM(entradas),
+        SUM(salidas),
+        SUM(recibidas),
+        SUM(enviadas),
+        SUM(SUM(entradas) - SUM(salidas) + SUM(recibidas) - SUM(enviadas))
+            OVER (PARTITION BY banco_id ORDER BY fecha)
+    FROM (
+        SELECT banco_id, fecha_recibo AS fecha, COALESCE(monto_abonado, 0) AS entradas,
+               0 AS salidas, 0 AS recibidas, 0 AS enviadas
+        FROM cuentas_a_recibir
+        WHERE banco_id IS NOT NULL AND fecha_recibo IS NOT NULL
+        UNION ALL
+        SELECT banco_id, fecha_pago, 0, COALESCE(monto_abonado, 0), 0, 0
+        FROM cuentas_a_pagar
+        WHERE banco_id IS NOT NULL AND fecha_pago IS NOT NULL
+        UNION ALL
+        SELECT banco_destino_id, fecha, 0, 0, monto, 0
+        FROM transferencias_cuentas
+        UNION ALL
+        SELECT banco_origen_id, fecha, 0, 0, 0, monto
+        FROM transferencias_cuentas
+    ) movimientos
+    GROUP BY banco_id, fecha;
+
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    PERFORM incrementar_version_datos_financieros();
+    RETURN filas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Carga inicial del libro diario para bases existentes
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM movimientos_bancarios_diarios) THEN
+        PERFORM reconstruir_movimientos_bancarios_diarios();
+    END IF;
+END;
+$$;
+
+-- Resumen mensual de cuentas a recibir (tipo 'ingreso') y a pagar (tipo 'gasto')
+-- para los reportes mensuales (análisis, flujo de caja, DRE). Cada cuenta aporta a
+-- tres bases de fecha:
+--   'pago'           mes de fecha_recibo / fecha_pago (solo cuentas con esa fecha)
+--   'emision'        mes de fecha_emision
+--   'pago_o_emision' mes de COALESCE(fecha de pago, fecha_emision)
+-- realizado = SUM(monto_abonado); proyectado = SUM(COALESCE(valor_cuota, valor, 0)).
+-- proyecto_id, categoria_id (cuenta_id) y banco_id usan 0 cuando la cuenta no los tiene.
+CREATE TABLE IF NOT EXISTS resumen_financiero_mensual (
+    tipo VARCHAR(10) NOT NULL,
+    fecha_base VARCHAR(20) NOT NULL,
+    ano INTEGER NOT NULL,
+    mes INTEGER NOT NULL,
+    proyecto_id INTEGER NOT NULL DEFAULT 0,
+    categoria_id INTEGER NOT NULL DEFAULT 0,
+    banco_id INTEGER NOT NULL DEFAULT 0,
+    realizado NUMERIC(15, 2) NOT NULL DEFAULT 0,
+    proyectado NUMERIC(15, 2) NOT NULL DEFAULT 0,
+    cantidad INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tipo, fecha_base, ano, mes, proyecto_id, categoria_id, banco_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_resumen_financiero_mensual_proyecto ON resumen_financiero_mensual(proyecto_id, tipo, fecha_base, ano, mes);
+
+-- Suma (signo = 1) o resta (signo = -1) el aporte de una cuenta al resumen mensual
+CREATE OR REPLACE FUNCTION aplicar_resumen_financiero(
+    p_tipo TEXT, p_signo INTEGER,
+    p_fecha_pago DATE, p_fecha_emision DATE,
+    p_proyecto_id INTEGER, p_categoria_id INTEGER, p_banco_id INTEGER,
+    p_realizado NUMERIC, p_proyectado NUMERIC
+)
+RETURNS VOID AS $$
+DECLARE
+    v_base TEXT;
+    v_fecha DATE;
+BEGIN
+    FOREACH v_base IN ARRAY ARRAY['pago', 'emision', 'pago_o_emision'] LOOP
+        v_fecha := CASE v_base
+            WHEN 'pago' THEN p_fecha_pago
+            WHEN 'emision' THEN p_fecha_emision
+            ELSE COALESCE(p_fecha_pago, p_fecha_emision)
+        END;
+        CONTINUE WHEN v_fecha IS NULL;
+
+        INSERT INTO resumen_financiero_mensual AS r
+            (tipo, fecha_base, ano, mes, proyecto_id, categoria_id, banco_id, realizado, proyectado, cantidad)
+        VALUES (
+            p_tipo, v_base,
+            EXTRACT(YEAR FROM v_fecha)::INTEGER, EXTRACT(MONTH FROM v_fecha)::INTEGER,
+            COALESCE(p_proyecto_id, 0), COALESCE(p_categoria_id, 0), COALESCE(p_banco_id, 0),
+            p_signo * COALESCE(p_realizado, 0), p_signo * COALESCE(p_proyectado, 0), p_signo
+        )
+        ON CONFLICT (tipo, fecha_base, ano, mes, proyecto_id, categoria_id, banco_id) DO UPDATE SET
+            realizado = r.realizado + EXCLUDED.realizado,
+            proyectado = r.proyectado + EXCLUDED.proyectado,
+            cantidad = r.cantidad + EXCLUDED.cantidad;
+    END LOOP;
+
+    IF p_signo < 0 THEN
+        DELETE FROM resumen_financiero_mensual
+        WHERE tipo = p_tipo
+          AND proyecto_id = COALESCE(p_proyecto_id, 0)
+          AND categoria_id = COALESCE(p_categoria_id, 0)
+          AND banco_id = COALESCE(p_banco_id, 0)
+          AND cantidad <= 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trigger_resumen_cuentas_a_recibir()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.fecha_recibo IS NOT DISTINCT FROM NEW.fecha_recibo
+       AND OLD.fecha_emision IS NOT DISTINCT FROM NEW.fecha_emision
+       AND OLD.proyecto_id IS NOT DISTINCT FROM NEW.proyecto_id
+       AND OLD.cuenta_id IS NOT DISTINCT FROM NEW.cuenta_id
+       AND OLD.banco_id IS NOT DISTINCT FROM NEW.banco_id
+       AND OLD.monto_abonado IS NOT DISTINCT FROM NEW.monto_abonado
+       AND OLD.valor IS NOT DISTINCT FROM NEW.valor
+       AND OLD.valor_cuota IS NOT DISTINCT FROM NEW.valor_cuota THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM aplicar_resumen_financiero('ingreso', -1, OLD.fecha_recibo, OLD.fecha_emision,
+            OLD.proyecto_id, OLD.cuenta_id, OLD.banco_id,
+            OLD.monto_abonado, COALESCE(OLD.valor_cuota, OLD.valor, 0));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM aplicar_resumen_financiero('ingreso', 1, NEW.fecha_recibo, NEW.fecha_emision,
+            NEW.proyecto_id, NEW.cuenta_id, NEW.banco_id,
+            NEW.monto_abonado, COALESCE(NEW.valor_cuota, NEW.valor, 0));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trigger_resumen_cuentas_a_pagar()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.fecha_pago IS NOT DISTINCT FROM NEW.fecha_pago
+       AND OLD.fecha_emision IS NOT DISTINCT FROM NEW.fecha_emision
+       AND OLD.proyecto_id IS NOT DISTINCT FROM NEW.proyecto_id
+       AND OLD.cuenta_id IS NOT DISTINCT FROM NEW.cuenta_id
+       AND OLD.banco_id IS NOT DISTINCT FROM NEW.banco_id
+       AND OLD.monto_abonado IS NOT DISTINCT FROM NEW.monto_abonado
+       AND OLD.valor IS NOT DISTINCT FROM NEW.valor
+       AND OLD.valor_cuota IS NOT DISTINCT FROM NEW.valor_cuota THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM aplicar_resumen_financiero('gasto', -1, OLD.fecha_pago, OLD.fecha_emision,
+            OLD.proyecto_id, OLD.cuenta_id, OLD.banco_id,
+            OLD.monto_abonado, COALESCE(OLD.valor_cuota, OLD.valor, 0));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM aplicar_resumen_financiero('gasto', 1, NEW.fecha_pago, NEW.fecha_emision,
+            NEW.proyecto_id, NEW.cuenta_id, NEW.banco_id,
+            NEW.monto_abonado, COALESCE(NEW.valor_cuota, NEW.valor, 0));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_cuentas_a_recibir_resumen ON cuentas_a_recibir;
+CREATE TRIGGER trigger_cuentas_a_recibir_resumen
+    AFTER INSERT OR UPDATE OR DELETE ON cuentas_a_recibir
+    FOR EACH ROW
+    EXECUTE FUNCTION trigger_resumen_cuentas_a_recibir();
+
+DROP TRIGGER IF EXISTS trigger_cuentas_a_pagar_resumen ON cuentas_a_pagar;
+CREATE TRIGGER trigger_cuentas_a_pagar_resumen
+    AFTER INSERT OR UPDATE OR DELETE ON cuentas_a_pagar
+    FOR EACH ROW
+    EXECUTE FUNCTION trigger_resumen_cuentas_a_pagar();
+
+-- Reconstruye el resumen mensual completo desde cuentas_a_recibir y cuentas_a_pagar
+CREATE OR REPLACE FUNCTION reconstruir_resumen_financiero_mensual()
+RETURNS INTEGER AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    LOCK TABLE cuentas_a_recibir, cuentas_a_pagar IN SHARE MODE;
+    LOCK TABLE resumen_financiero_mensual IN EXCLUSIVE MODE;
+
+    DELETE FROM resumen_financiero_mensual;
+
+    INSERT INTO resumen_financiero_mensual
+        (tipo, fecha_base, ano, mes, proyecto_id, categoria_id, banco_id, realizado, proyectado, cantidad)
+    SELECT
+        c.tipo,
+        b.fecha_base,
+        EXTRACT(YEAR FROM b.fecha)::INTEGER,
+        EXTRACT(MONTH FROM b.fecha)::INTEGER,
+        c.proyecto_id,
+        c.categoria_id,
+        c.banco_id,
+        SUM(c.realizado),
+        SUM(c.proyectado),
+        COUNT(*)
+    FROM (
+        SELECT 'ingreso' AS tipo, fecha_recibo AS fecha_pago, fecha_emision,
+               COALESCE(proyecto_id, 0) AS proyecto_id, COALESCE(cuenta_id, 0) AS categoria_id,
+               COALESCE(banco_id, 0) AS banco_id,
+               COALESCE(monto_abonado, 0) AS realizado, COALESCE(valor_cuota, valor, 0) AS proyectado
+        FROM cuentas_a_recibir
+        UNION ALL
+        SELECT 'gasto', fecha_pago, fecha_emision,
+               COALESCE(proyecto_id, 0), COALESCE(cuenta_id, 0), COALESCE(banco_id, 0),
+               COALESCE(monto_abonado, 0), COALESCE(valor_cuota, valor, 0)
+        FROM cuentas_a_pagar
+    ) c
+    CROSS JOIN LATERAL (
+        VALUES ('pago', c.fecha_pago),
+               ('emision', c.fecha_emision),
+               ('pago_o_emision', COALESCE(c.fecha_pago, c.fecha_emision))
+    ) AS b(fecha_base, fecha)
+    WHERE b.fecha IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5, 6, 7;
+
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    PERFORM incrementar_version_datos_financieros();
+    RETURN filas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Carga inicial del resumen mensual para bases existentes
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM resumen_financiero_mensual) THEN
+        PERFORM reconstruir_resumen_financiero_mensual();
+    END IF;
+END;
+$$;
+
+-- Triggers de versión sobre las tablas que leen los reportes financieros
+DO $$
+DECLARE
+    tabla TEXT;
+BEGIN
+    FOREACH tabla IN ARRAY ARRAY[
+        'cuentas_a_recibir', 'cuentas_a_pagar', 'transferencias_cuentas',
+        'bancos', 'configuracion_saldos_iniciales', 'proyectos', 'tipos_documentos',
+        'categorias_ingresos', 'tipos_ingresos', 'categorias_gastos', 'tipos_gastos'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_%s_version_datos ON %I', tabla, tabla);
+        EXECUTE format(
+            'CREATE TRIGGER trigger_%s_version_datos BEFORE INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION trigger_version_datos_financieros()',
+            tabla, tabla);
+    END LOOP;
+END;
+$$;
 
 -- Agregar permisos para nuevos módulos
 INSERT INTO permisos_rutas (ruta, nombre, descripcion) 
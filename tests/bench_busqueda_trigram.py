@@ -0,0 +1,94 @@
+"""
+Benchmark de la búsqueda por subcadena con índices trigram (pg_trgm)
+
+Carga N filas (por defecto 1.000.000) en una tabla temporal con los mismos
+textos que cliente/plano_cuenta, y mide los filtros que arma
+financiero.condicion_texto_contiene sin índice (seq scan) y con el índice
+GIN sobre UPPER(columna) que crea el esquema. No modifica las tablas de la base.
+
+Requiere la extensión pg_trgm disponible en el servidor y las variables de
+entorno de la base (DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT).
+
+Uso: python tests/bench_busqueda_trigram.py [filas] [repeticiones]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import financiero  # noqa: E402
+
+# Búsquedas típicas desde los filtros de la pantalla: frecuente, media, rara y sin resultados
+BUSQUEDAS = ['comercial', 'del este', 'san lorenzo 0042', 'inexistente xyz']
+
+
+def cargar_datos(cur, filas):
+    cur.execute("""
+        CREATE TEMP TABLE bench_cuentas AS
+        SELECT
+            g AS id,
+            (ARRAY['COMERCIAL', 'DISTRIBUIDORA', 'CONSTRUCTORA', 'SERVICIOS', 'INVERSIONES',
+                   'AGROPECUARIA', 'TRANSPORTADORA', 'FERRETERIA'])[1 + g %% 8]
+            || ' ' || (ARRAY['DEL ESTE', 'PARAGUAY', 'GUARANI', 'CENTRAL', 'DEL SUR', 'ITAPUA',
+                             'ASUNCION', 'SAN LORENZO', 'LUQUE', 'ENCARNACION', 'CAAGUAZU'])[1 + (g / 8) %% 11]
+            || ' ' || lpad((g %% 10000)::text, 4, '0') || ' S.A.' AS cliente,
+            (ARRAY['1.1.01 VENTAS', '1.1.02 SERVICIOS', '2.1.05 ALQUILERES', '3.2.01 HONORARIOS',
+                   '4.1.03 COMBUSTIBLES'])[1 + g %% 5] || ' ' || md5(g::text) AS plano_cuenta
+        FROM generate_series(1, %s) AS g
+    """, (filas,))
+    cur.execute("ANALYZE bench_cuentas")
+
+
+def medir(cur, busqueda, repeticiones):
+    condicion, patron = financiero.condicion_texto_contiene("car.cliente", busqueda)
+    query = f"SELECT COUNT(*) FROM bench_cuentas car WHERE {condicion}"
+    cur.execute("EXPLAIN " + query, (patron,))
+    nodos = [fila[0].strip().lstrip('-> ').split('  ')[0] for fila in cur.fetchall()
+             if 'Scan' in fila[0]]
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cur.execute(query, (patron,))
+        cantidad = cur.fetchone()[0]
+        tiempos.append(time.perf_counter() - inicio)
+    return cantidad, min(tiempos), ', '.join(nodos)
+
+
+def main():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    conn, cur = financiero.conectar()
+    try:
+        cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cur.fetchone() is None:
+            sys.exit("La extensión pg_trgm no está disponible en este servidor PostgreSQL")
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+        inicio = time.perf_counter()
+        cargar_datos(cur, filas)
+        print(f"{filas} filas cargadas en {time.perf_counter() - inicio:.1f} s")
+
+        sin_indice = {b: medir(cur, b, repeticiones) for b in BUSQUEDAS}
+
+        inicio = time.perf_counter()
+        cur.execute("CREATE INDEX ON bench_cuentas USING GIN (UPPER(cliente) gin_trgm_ops)")
+        cur.execute("ANALYZE bench_cuentas")
+        print(f"Índice GIN trigram creado en {time.perf_counter() - inicio:.1f} s")
+
+        print(f"{'búsqueda':>18} {'filas':>9} {'sin índice':>12} {'con índice':>12}  plan con índice")
+        for busqueda in BUSQUEDAS:
+            cantidad, segundos_sin, _ = sin_indice[busqueda]
+            cantidad_con, segundos_con, plan = medir(cur, busqueda, repeticiones)
+            assert cantidad == cantidad_con, (busqueda, cantidad, cantidad_con)
+            print(f"{busqueda:>18} {cantidad:>9} {segundos_sin * 1000:>9.1f} ms {segundos_con * 1000:>9.1f} ms  {plan}")
+    finally:
+        # La tabla temporal y la extensión (si se creó ahora) se descartan con la transacción
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
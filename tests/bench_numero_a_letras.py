@@ -0,0 +1,50 @@
+"""
+Benchmark de numero_a_letras de facturacion
+
+Compara la conversión con la tabla de centenas (con y sin lru_cache) contra la
+copia de la versión anterior basada en millones() que usan los tests.
+
+Uso: python tests/bench_numero_a_letras.py [montos] [repeticiones]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import facturacion  # noqa: E402
+from test_facturacion import numero_a_letras_anterior  # noqa: E402
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    aleatorio = random.Random(1)
+    # Montos de factura típicos: guaraníes enteros y dólares con centavos
+    montos = [(int(10 ** aleatorio.uniform(3, 9)), 'Gs') for _ in range(cantidad // 2)]
+    montos += [(round(10 ** aleatorio.uniform(0, 6), 2), 'USD') for _ in range(cantidad - len(montos))]
+
+    for monto, moneda in montos:
+        assert facturacion.numero_a_letras.__wrapped__(monto, True, moneda) == numero_a_letras_anterior(monto, True, moneda)
+
+    def con_cache():
+        facturacion.numero_a_letras.cache_clear()
+        for monto, moneda in montos:
+            facturacion.numero_a_letras(monto, True, moneda)
+
+    variantes = (
+        ('millones() anterior', lambda: [numero_a_letras_anterior(m, True, mo) for m, mo in montos]),
+        ('tabla de centenas', lambda: [facturacion.numero_a_letras.__wrapped__(m, True, mo) for m, mo in montos]),
+        ('tabla + lru_cache', con_cache),
+    )
+    print(f"{len(montos)} montos")
+    for nombre, funcion in variantes:
+        tiempos = timeit.repeat(funcion, number=1, repeat=repeticiones)
+        print(f"{nombre:>20}: mejor {min(tiempos) * 1000:8.1f} ms  ({min(tiempos) / len(montos) * 1e6:.2f} µs por monto)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark del OCR por franjas de procesar_ocr_opencv
+
+Sobre un escaneo sintético (por defecto A4 a 600 dpi) mide la reducción, el
+corte en franjas y la unión de resultados. Si Tesseract está instalado compara
+además ocr_tiled contra run_ocr sobre la imagen completa.
+
+Uso: python tests/bench_ocr_tiled.py [alto] [ancho] [repeticiones]
+"""
+import os
+import sys
+import timeit
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import procesar_ocr_opencv as ocr  # noqa: E402
+
+
+def escaneo_sintetico(alto, ancho):
+    """Página blanca con renglones de texto y algo de suciedad de escaneo"""
+    img = np.full((alto, ancho), 255, dtype=np.uint8)
+    escala = alto / 3500
+    alto_renglon = max(20, int(70 * escala))
+    y = int(200 * escala)
+    numero = 1
+    while y < alto - int(200 * escala):
+        texto = f"{numero:04d} SERVICIO DE MANTENIMIENTO MENSUAL  1.250.000 Gs"
+        cv2.putText(img, texto, (int(150 * escala), y), cv2.FONT_HERSHEY_SIMPLEX, 1.6 * escala, 0,
+                    max(1, int(3 * escala)), cv2.LINE_AA)
+        y += alto_renglon * (3 if numero % 8 == 0 else 1)
+        numero += 1
+    ruido = np.random.default_rng(1).random(img.shape) < 0.0005
+    img[ruido] = 0
+    return img
+
+
+def tesseract_disponible():
+    try:
+        ocr.pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def main():
+    alto = int(sys.argv[1]) if len(sys.argv) > 1 else 7016
+    ancho = int(sys.argv[2]) if len(sys.argv) > 2 else 4961
+    repeticiones = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    img = escaneo_sintetico(alto, ancho)
+    small, scale = ocr.downscale_image(img)
+    min_height = max(ocr.OCR_TILE_MIN_HEIGHT, small.shape[0] // (ocr.OCR_POOL_WORKERS * 2))
+    bands = ocr.text_bands(small, min_height=min_height)
+    print(f"Imagen {ancho}x{alto}, reducida {small.shape[1]}x{small.shape[0]} (escala {scale:.3f}), "
+          f"{len(bands)} franjas")
+
+    # Resultados simulados: un renglón por franja con una palabra por renglón de texto
+    simulados = []
+    for y0, y1 in bands:
+        filas = max(1, (y1 - y0) // 40)
+        data = {columna: [] for columna in ocr._TSV_COLUMNS}
+        for i in range(filas * 8):
+            valores = [5, 1, 1, 1, i // 8 + 1, i % 8 + 1, 50 * (i % 8), 40 * (i // 8), 45, 30, 95.0, 'palabra']
+            for columna, valor in zip(ocr._TSV_COLUMNS, valores):
+                data[columna].append(valor)
+        simulados.append(data)
+
+    variantes = [
+        ('downscale_image', lambda: ocr.downscale_image(img)),
+        ('text_bands', lambda: ocr.text_bands(small, min_height=min_height)),
+        ('_merge_band_data', lambda: ocr._merge_band_data(simulados, bands, scale)),
+    ]
+    if tesseract_disponible():
+        variantes += [
+            ('run_ocr (imagen completa)', lambda: ocr.run_ocr(small)),
+            ('ocr_tiled', lambda: ocr.ocr_tiled(img)),
+        ]
+        repeticiones = min(repeticiones, 2)
+    else:
+        print("Tesseract no está instalado: solo se mide la preparación de las franjas")
+
+    for nombre, funcion in variantes:
+        tiempos = timeit.repeat(funcion, number=1, repeat=repeticiones)
+        print(f"{nombre:>26}: mejor {min(tiempos) * 1000:9.1f} ms  promedio {sum(tiempos) / len(tiempos) * 1000:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
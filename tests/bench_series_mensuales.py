@@ -0,0 +1,100 @@
+"""
+Benchmark de las series mensuales densas de reportes_clientes
+
+Compara, para 10 años x 200 categorías, el armado de un flujo de caja por
+categoría con diccionarios indexados por claves "ano-mes" (como se hacía antes)
+contra _matriz_mensual y las operaciones sobre series densas.
+
+Uso: python tests/bench_series_mensuales.py [anos] [categorias] [repeticiones]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reportes_clientes as rc  # noqa: E402
+
+
+def generar_filas(anos, categorias, desde_ano=2015, semilla=1):
+    """Filas tipo/categoria_id/ano/mes/total como las de _consultar_resumen_mensual(por_categoria=True)"""
+    aleatorio = random.Random(semilla)
+    filas = []
+    for ano in range(desde_ano, desde_ano + anos):
+        for mes in range(1, 13):
+            for categoria_id in range(1, categorias + 1):
+                # Como en los datos reales, no todas las categorías tienen movimientos todos los meses
+                if aleatorio.random() < 0.7:
+                    filas.append({
+                        'tipo': 'ingreso' if categoria_id % 2 else 'gasto',
+                        'categoria_id': categoria_id,
+                        'ano': ano,
+                        'mes': mes,
+                        'total': aleatorio.randint(1, 1_000_000),
+                    })
+    return filas
+
+
+def flujo_con_claves_texto(filas, categorias, desde, hasta, saldo_inicial):
+    """Versión anterior: dict categoría -> {"ano-mes": total} y un recorrido por mes"""
+    por_categoria = {c: {} for c in range(1, categorias + 1)}
+    tipos = {}
+    for f in filas:
+        por_categoria[f['categoria_id']][f"{f['ano']}-{f['mes']}"] = float(f['total'] or 0)
+        tipos[f['categoria_id']] = f['tipo']
+    meses = []
+    saldo = saldo_inicial
+    for indice in range(rc._cantidad_meses(desde, hasta)):
+        ano, mes = rc._mes_del_indice(desde, indice)
+        clave = f"{ano}-{mes}"
+        ingresos = gastos = 0
+        for categoria_id, valores in por_categoria.items():
+            valor = valores.get(clave, 0)
+            if tipos.get(categoria_id) == 'ingreso':
+                ingresos += valor
+            else:
+                gastos += valor
+        saldo += ingresos - gastos
+        meses.append((ingresos, gastos, saldo))
+    return meses
+
+
+def flujo_con_series_densas(filas, categorias, desde, hasta, saldo_inicial):
+    """Versión actual: matriz densa por categoría y operaciones sobre series completas"""
+    largo = rc._cantidad_meses(desde, hasta)
+    claves = range(1, categorias + 1)
+    ingresos = rc._matriz_mensual([f for f in filas if f['tipo'] == 'ingreso'], desde, hasta,
+                                  claves=claves, clave=lambda f: f['categoria_id'])
+    gastos = rc._matriz_mensual([f for f in filas if f['tipo'] == 'gasto'], desde, hasta,
+                                claves=claves, clave=lambda f: f['categoria_id'])
+    total_ingresos = rc._sumar_series(ingresos.values(), largo)
+    total_gastos = rc._sumar_series(gastos.values(), largo)
+    saldo = rc._acumular_serie(rc._restar_series(total_ingresos, total_gastos), saldo_inicial)
+    return list(zip(total_ingresos, total_gastos, saldo))
+
+
+def main():
+    anos = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    categorias = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    repeticiones = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    filas = generar_filas(anos, categorias)
+    desde, hasta = (2015, 1), (2015 + anos - 1, 12)
+    print(f"{anos} años x {categorias} categorías: {len(filas)} filas, {rc._cantidad_meses(desde, hasta)} meses")
+
+    anterior = flujo_con_claves_texto(filas, categorias, desde, hasta, 1000.0)
+    actual = flujo_con_series_densas(filas, categorias, desde, hasta, 1000.0)
+    assert len(anterior) == len(actual)
+    for a, b in zip(anterior, actual):
+        assert all(abs(x - y) < 1e-6 * max(1.0, abs(x)) for x, y in zip(a, b)), (a, b)
+
+    for nombre, funcion in (('claves "ano-mes"', flujo_con_claves_texto),
+                            ('series densas', flujo_con_series_densas)):
+        tiempos = timeit.repeat(lambda: funcion(filas, categorias, desde, hasta, 1000.0),
+                                number=1, repeat=repeticiones)
+        print(f"{nombre:>18}: mejor {min(tiempos) * 1000:8.1f} ms  promedio {sum(tiempos) / len(tiempos) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
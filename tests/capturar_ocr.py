@@ -0,0 +1,33 @@
+"""
+Captura la salida de Tesseract de un escaneo para los tests de test_ocr_texto
+
+Escribe tests/datos/ocr_<nombre>.tsv (image_to_data) y ocr_<nombre>.txt
+(image_to_string) con la misma configuración que usa procesar_ocr_opencv.
+
+Uso: python tests/capturar_ocr.py <nombre> <imagen> [psm] [idiomas]
+"""
+import os
+import sys
+
+import pytesseract
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import procesar_ocr_opencv as ocr  # noqa: E402
+
+DATOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos')
+
+
+def capturar(nombre, imagen, psm=3, lang=ocr.OCR_DEFAULT_LANG):
+    config = f'--psm {psm} -l {lang}'
+    tsv = pytesseract.image_to_data(imagen, config=config)
+    texto = pytesseract.image_to_string(imagen, config=config)
+    for ext, contenido in (('tsv', tsv), ('txt', texto)):
+        with open(os.path.join(DATOS_DIR, f'ocr_{nombre}.{ext}'), 'w', encoding='utf-8', newline='') as f:
+            f.write(contenido)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    capturar(*sys.argv[1:])
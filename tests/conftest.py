@@ -0,0 +1,69 @@
+"""
+Configuración común de los tests
+
+Los tests que usan la base de datos se conectan con las mismas variables de
+entorno que la aplicación (DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT) y
+se saltean si no hay una base accesible con el esquema aplicado
+(python ejecutar_esquema.py).
+"""
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+
+@pytest.fixture(scope="session")
+def base_datos():
+    """Verifica que haya una base con el esquema; saltea el test si no la hay"""
+    psycopg2 = pytest.importorskip("psycopg2")
+    import reportes_clientes
+
+    if not reportes_clientes.PG_CONN.get("dbname"):
+        pytest.skip("DB_NAME no está configurado")
+    try:
+        conn, cur = reportes_clientes.conectar()
+    except psycopg2.Error as e:
+        pytest.skip(f"No hay conexión a la base de datos: {e}")
+    try:
+        cur.execute("SELECT to_regclass('cuentas_a_recibir')")
+        if cur.fetchone()[0] is None:
+            pytest.skip("El esquema no está aplicado (python ejecutar_esquema.py)")
+    finally:
+        cur.close()
+        conn.close()
+    return reportes_clientes.PG_CONN
+
+
+@pytest.fixture
+def conexion(base_datos):
+    """Conexión con DictCursor cuya transacción se descarta al terminar el test"""
+    import reportes_clientes
+
+    conn, cur = reportes_clientes.conectar()
+    try:
+        yield conn, cur
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+
+@pytest.fixture(scope="session")
+def aplicacion():
+    """Módulo app, sin levantar el pool de procesos de PDF al importarlo"""
+    pytest.importorskip("flask")
+    os.environ.setdefault("PDF_POOL_PROCESOS", "0")
+    import app
+
+    return app
+
+
+def vista(aplicacion, endpoint):
+    """Función de una ruta sin los decoradores de login y permisos"""
+    import inspect
+
+    return inspect.unwrap(aplicacion.app.view_functions[endpoint])
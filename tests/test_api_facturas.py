@@ -0,0 +1,53 @@
+"""
+Tests de la validación de /api/facturacion/crear-facturas
+
+El impuesto de cada item se normaliza a 'exc', '5' o '10' (los valores que
+entiende calcular_totales); cualquier otro valor rechaza la solicitud.
+"""
+import pytest
+
+import facturacion
+from conftest import vista
+
+
+@pytest.fixture
+def facturas_creadas(monkeypatch):
+    creadas = []
+
+    def crear_facturas(facturas):
+        creadas.extend(facturas)
+        return list(range(1, len(facturas) + 1))
+
+    monkeypatch.setattr(facturacion, 'crear_facturas', crear_facturas)
+    return creadas
+
+
+def _crear(aplicacion, impuesto):
+    item = {'cantidad': 2, 'descripcion': 'servicio', 'precio_unitario': 55000}
+    if impuesto is not None:
+        item['impuesto'] = impuesto
+    cuerpo = {'facturas': [{'fecha': '2024-05-02', 'cliente': 'cliente', 'items': [item]}]}
+    with aplicacion.app.test_request_context(method='POST', json=cuerpo):
+        respuesta, status = vista(aplicacion, 'api_crear_facturas')()
+    return respuesta.get_json(), status
+
+
+@pytest.mark.parametrize('impuesto, esperado', [
+    (10, '10'), (10.0, '10'), ('10', '10'), (5, '5'), (' 5 ', '5'),
+    ('exc', 'exc'), ('EXC', 'exc'), (None, 'exc'), ('', 'exc'),
+])
+def test_impuesto_numerico_o_texto(aplicacion, facturas_creadas, impuesto, esperado):
+    respuesta, status = _crear(aplicacion, impuesto)
+    assert status == 201, respuesta
+    item = facturas_creadas[0]['items'][0]
+    assert item['impuesto'] == esperado
+    # El item cuenta en los totales de la factura
+    assert facturacion.calcular_totales([item])['total'] == 110000
+
+
+@pytest.mark.parametrize('impuesto', [12, '12', 10.5, 'iva', True, [10]])
+def test_impuesto_invalido_rechaza_la_solicitud(aplicacion, facturas_creadas, impuesto):
+    respuesta, status = _crear(aplicacion, impuesto)
+    assert status == 400
+    assert 'Impuesto inválido' in respuesta['error']
+    assert facturas_creadas == []
@@ -0,0 +1,35 @@
+"""
+Tests de los filtros por subcadena (cliente, proveedor, plano de cuenta)
+
+condicion_texto_contiene arma UPPER(columna) LIKE '%TEXTO%', la misma
+expresión de los índices trigram del esquema. El test de EXPLAIN se saltea si
+la base no tiene pg_trgm (los índices no se crean sin la extensión).
+"""
+import pytest
+
+import financiero
+
+
+def test_condicion_texto_contiene():
+    assert financiero.condicion_texto_contiene("car.cliente", "  del Este ") == (
+        "UPPER(car.cliente) LIKE %s", "%DEL ESTE%")
+    assert financiero.condicion_texto_contiene("cap.proveedor", "ñandutí") == (
+        "UPPER(cap.proveedor) LIKE %s", "%ÑANDUTÍ%")
+
+
+@pytest.mark.parametrize('tabla, columna, indice', [
+    ('cuentas_a_recibir car', 'car.cliente', 'idx_cuentas_a_recibir_cliente_trgm'),
+    ('cuentas_a_recibir car', 'car.plano_cuenta', 'idx_cuentas_a_recibir_plano_cuenta_trgm'),
+    ('cuentas_a_pagar cap', 'cap.proveedor', 'idx_cuentas_a_pagar_proveedor_trgm'),
+    ('cuentas_a_pagar cap', 'cap.plano_cuenta', 'idx_cuentas_a_pagar_plano_cuenta_trgm'),
+])
+def test_filtro_usa_el_indice_trigram(conexion, tabla, columna, indice):
+    _, cur = conexion
+    cur.execute("SELECT to_regclass(%s)", (indice,))
+    if cur.fetchone()[0] is None:
+        pytest.skip(f"{indice} no existe (¿falta la extensión pg_trgm?)")
+    condicion, patron = financiero.condicion_texto_contiene(columna, 'comercial')
+    cur.execute("SET LOCAL enable_seqscan = off")
+    cur.execute(f"EXPLAIN SELECT COUNT(*) FROM {tabla} WHERE {condicion}", (patron,))
+    plan = '\n'.join(fila[0] for fila in cur.fetchall())
+    assert f"Bitmap Index Scan on {indice}" in plan, plan
@@ -0,0 +1,130 @@
+"""
+Tests de la caché de exportaciones y del estado de las exportaciones en segundo plano
+
+El estado se guarda en disco para que cualquier worker de gunicorn pueda
+responder por una exportación iniciada en otro.
+"""
+import os
+import time
+
+import pytest
+
+import exportar_reportes
+import financiero
+import pool_pdf
+from conftest import vista
+
+
+@pytest.fixture
+def directorio_exportaciones(tmp_path, monkeypatch):
+    monkeypatch.setattr(exportar_reportes, 'EXPORTACIONES_DIR', str(tmp_path))
+    monkeypatch.setattr(exportar_reportes, 'EXPORTACIONES_ESTADOS_DIR', str(tmp_path / 'estados'))
+    return tmp_path
+
+
+def test_ruta_exportacion_cambia_con_la_version_de_datos(directorio_exportaciones, monkeypatch):
+    filtros = {'ano': 2024}
+    monkeypatch.setattr(financiero, 'version_datos_financieros', lambda: 7)
+    ruta = exportar_reportes.ruta_exportacion('dre', 'csv', filtros)
+    assert ruta == exportar_reportes.ruta_exportacion('dre', 'csv', filtros)
+    assert ruta.endswith('.csv')
+
+    monkeypatch.setattr(financiero, 'version_datos_financieros', lambda: 8)
+    assert exportar_reportes.ruta_exportacion('dre', 'csv', filtros) != ruta
+
+
+def test_ruta_exportacion_sin_version_no_se_reutiliza(directorio_exportaciones, monkeypatch):
+    monkeypatch.setattr(financiero, 'version_datos_financieros', lambda: None)
+    assert (exportar_reportes.ruta_exportacion('dre', 'csv', {})
+            != exportar_reportes.ruta_exportacion('dre', 'csv', {}))
+
+
+def test_estado_exportacion_ida_y_vuelta(directorio_exportaciones):
+    estado = {'estado': 'procesando', 'reporte': 'dre', 'ruta': '/tmp/x.pdf', 'iniciado_en': time.time()}
+    exportar_reportes.guardar_estado_exportacion('abc123', estado)
+    assert exportar_reportes.leer_estado_exportacion('abc123') == estado
+    assert exportar_reportes.leer_estado_exportacion('def456') is None
+
+
+@pytest.mark.parametrize('exportacion_id', ['', '../secreto', 'ABC', 'a/b'])
+def test_estado_exportacion_rechaza_ids_no_hexadecimales(directorio_exportaciones, exportacion_id):
+    assert exportar_reportes.leer_estado_exportacion(exportacion_id) is None
+    with pytest.raises(ValueError):
+        exportar_reportes.guardar_estado_exportacion(exportacion_id, {})
+
+
+def test_podar_estados_exportacion(directorio_exportaciones):
+    exportar_reportes.guardar_estado_exportacion('aaa', {'estado': 'terminado'})
+    exportar_reportes.guardar_estado_exportacion('bbb', {'estado': 'terminado'})
+    viejo = os.path.join(exportar_reportes.EXPORTACIONES_ESTADOS_DIR, 'aaa.json')
+    os.utime(viejo, (time.time() - 7200, time.time() - 7200))
+
+    exportar_reportes.podar_estados_exportacion(3600)
+
+    assert exportar_reportes.leer_estado_exportacion('aaa') is None
+    assert exportar_reportes.leer_estado_exportacion('bbb') == {'estado': 'terminado'}
+
+
+def test_podar_cache_conserva_el_directorio_de_estados(directorio_exportaciones, monkeypatch):
+    monkeypatch.setattr(exportar_reportes, 'EXPORTACIONES_CACHE_MAX', 2)
+    exportar_reportes.guardar_estado_exportacion('aaa', {'estado': 'terminado'})
+    for i in range(4):
+        ruta = os.path.join(str(directorio_exportaciones), f"{i}.csv")
+        with open(ruta, 'wb') as f:
+            f.write(b'x')
+        os.utime(ruta, (time.time() + i, time.time() + i))
+
+    exportar_reportes._podar_cache()
+
+    archivos = sorted(n for n in os.listdir(directorio_exportaciones) if n.endswith('.csv'))
+    assert archivos == ['2.csv', '3.csv']
+    assert exportar_reportes.leer_estado_exportacion('aaa') == {'estado': 'terminado'}
+
+
+@pytest.fixture
+def exportaciones_lanzadas(aplicacion, directorio_exportaciones, monkeypatch):
+    """IDs de las exportaciones PDF que se lanzan, sin renderizar nada"""
+    lanzadas = []
+    monkeypatch.setattr(aplicacion, '_run_exportacion_pdf_job',
+                        lambda exportacion_id, estado, filtros, base_url: lanzadas.append(exportacion_id))
+    monkeypatch.setattr(aplicacion, '_usuario_puede_exportar', lambda reporte: True)
+    return lanzadas
+
+
+def _iniciar(aplicacion, ruta):
+    with aplicacion.app.test_request_context():
+        return aplicacion._iniciar_exportacion_pdf('dre', {}, ruta)
+
+
+@pytest.mark.parametrize('estado', ['procesando', 'renderizando'])
+def test_exportacion_pdf_en_curso_se_reutiliza(aplicacion, exportaciones_lanzadas, directorio_exportaciones, estado):
+    ruta = os.path.join(str(directorio_exportaciones), 'abc123.pdf')
+    exportar_reportes.guardar_estado_exportacion('abc123', {
+        'tipo': 'reporte', 'estado': estado, 'reporte': 'dre', 'ruta': ruta, 'iniciado_en': time.time() - 5,
+    })
+    assert _iniciar(aplicacion, ruta) == 'abc123'
+    assert exportaciones_lanzadas == []
+
+
+@pytest.mark.parametrize('estado', ['procesando', 'renderizando'])
+def test_exportacion_pdf_vencida_se_lanza_de_nuevo(aplicacion, exportaciones_lanzadas, directorio_exportaciones, estado):
+    ruta = os.path.join(str(directorio_exportaciones), 'abc123.pdf')
+    iniciado_en = time.time() - pool_pdf.PDF_POOL_TIMEOUT - 1
+    exportar_reportes.guardar_estado_exportacion('abc123', {
+        'tipo': 'reporte', 'estado': estado, 'reporte': 'dre', 'ruta': ruta, 'iniciado_en': iniciado_en,
+    })
+    assert _iniciar(aplicacion, ruta) == 'abc123'
+    assert exportaciones_lanzadas == ['abc123']
+    nuevo = exportar_reportes.leer_estado_exportacion('abc123')
+    assert nuevo['estado'] == 'procesando' and nuevo['iniciado_en'] > iniciado_en
+
+
+def test_estado_de_exportacion_pdf_vencida_es_error(aplicacion, exportaciones_lanzadas, directorio_exportaciones):
+    exportar_reportes.guardar_estado_exportacion('abc123', {
+        'tipo': 'reporte', 'estado': 'renderizando', 'reporte': 'dre', 'ruta': '/tmp/abc123.pdf',
+        'iniciado_en': time.time() - pool_pdf.PDF_POOL_TIMEOUT - 1,
+    })
+    with aplicacion.app.test_request_context():
+        respuesta = vista(aplicacion, 'reportes_exportar_pdf_estado')('abc123').get_json()
+    assert respuesta['estado'] == 'error'
+    assert respuesta['error']
@@ -0,0 +1,108 @@
+"""
+Tests de la conversión de montos a letras de facturacion
+
+numero_a_letras arma las letras con la tabla de centenas; se compara contra
+una copia de la versión anterior, que las componía con millones() en cada
+llamada, sobre montos aleatorios y sobre los bordes de cada sección.
+"""
+import random
+
+import pytest
+
+import facturacion
+
+SEMILLA = 20240101
+MUESTRAS = 5000
+
+
+def numero_a_letras_anterior(num, centavos=True, moneda="Gs"):
+    """Copia de numero_a_letras antes de la tabla de centenas (usa millones())"""
+    enteros = int(num)
+    centavos_num = round((num - enteros) * 100)
+
+    if moneda == "Gs":
+        letras_moneda = "SON GUARANIES"
+        letras_moneda_plural = "GUARANIES"
+        letras_moneda_singular = "GUARANI"
+    elif moneda == "USD":
+        letras_moneda = "SON DOLARES AMERICANOS"
+        letras_moneda_plural = "DOLARES AMERICANOS"
+        letras_moneda_singular = "DOLAR AMERICANO"
+    else:
+        letras_moneda = ""
+        letras_moneda_plural = ""
+        letras_moneda_singular = ""
+
+    letras_centavos = ""
+    if centavos and centavos_num > 0:
+        if moneda == "Gs":
+            letras_centavos = "CON " + numero_a_letras_anterior(centavos_num, False, "")
+        elif moneda == "USD":
+            letras_centavos = f"CON {centavos_num}/100"
+
+    if enteros == 0:
+        resultado = "CERO " + letras_moneda_plural
+        if letras_centavos:
+            resultado += " " + letras_centavos
+        return resultado
+    elif enteros == 1:
+        resultado = facturacion.millones(enteros) + letras_moneda_singular
+        if letras_centavos:
+            resultado += " " + letras_centavos
+        return resultado
+    else:
+        resultado = letras_moneda + " " + facturacion.millones(enteros) + letras_moneda_plural
+        if letras_centavos:
+            resultado += " " + letras_centavos
+        return resultado + " ---"
+
+
+def _bordes():
+    """Montos alrededor de cada cambio de sección (0, 1, 10, 100, 1.000, ... 10.000 millones)"""
+    montos = set()
+    for potencia in range(11):
+        for base in (10 ** potencia, 2 * 10 ** potencia, 10 ** potencia * 9):
+            montos.update(m for m in (base - 1, base, base + 1) if m >= 0)
+    return sorted(montos)
+
+
+def _montos(con_centavos, semilla):
+    aleatorio = random.Random(semilla)
+    montos = list(_bordes())
+    for _ in range(MUESTRAS):
+        # Magnitudes repartidas uniformemente entre 1 y 10.000 millones
+        enteros = int(10 ** aleatorio.uniform(0, 10))
+        montos.append(enteros)
+    if not con_centavos:
+        return montos
+    return [m + aleatorio.randint(0, 99) / 100 for m in montos]
+
+
+@pytest.mark.parametrize('moneda', ['Gs', 'USD', ''])
+@pytest.mark.parametrize('con_centavos', [False, True])
+def test_numero_a_letras_igual_a_la_version_anterior(moneda, con_centavos):
+    for monto in _montos(con_centavos, SEMILLA):
+        for centavos in (True, False):
+            esperado = numero_a_letras_anterior(monto, centavos, moneda)
+            assert facturacion.numero_a_letras(monto, centavos, moneda) == esperado, (monto, centavos, moneda)
+            # Sin la caché de lru_cache
+            assert facturacion.numero_a_letras.__wrapped__(monto, centavos, moneda) == esperado
+
+
+def test_numero_a_letras_distingue_enteros_de_decimales_en_la_cache():
+    facturacion.numero_a_letras.cache_clear()
+    assert facturacion.numero_a_letras(1500) == numero_a_letras_anterior(1500)
+    assert facturacion.numero_a_letras(1500.5) == numero_a_letras_anterior(1500.5)
+    assert facturacion.numero_a_letras(1500.5, moneda='USD').endswith('CON 50/100 ---')
+
+
+@pytest.mark.parametrize('monto, esperado', [
+    (0, 'CERO GUARANIES'),
+    (1, 'UNO GUARANI'),
+    (21, 'SON GUARANIES VEINTIUNO GUARANIES ---'),
+    (100, 'SON GUARANIES CIEN GUARANIES ---'),
+    (1000, 'SON GUARANIES UN MIL GUARANIES ---'),
+    (1_000_000, 'SON GUARANIES UN MILLÓN GUARANIES ---'),
+])
+def test_numero_a_letras_casos_conocidos(monto, esperado):
+    assert facturacion.numero_a_letras(monto) == esperado
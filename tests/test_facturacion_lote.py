@@ -0,0 +1,56 @@
+"""
+Tests de la selección de facturas para los lotes de PDF
+
+El tamaño del lote se valida en la solicitud con contar_facturas, que deja
+de contar al llegar al límite.
+"""
+from datetime import date
+
+import pytest
+
+import facturacion
+
+
+@pytest.fixture
+def facturas_de_prueba(base_datos):
+    ids = facturacion.crear_facturas([
+        {
+            'fecha': date(1999, 1, dia),
+            'cliente': 'CLIENTE TEST LOTE',
+            'items': [{'cantidad': 1, 'descripcion': 'Servicio', 'precio_unitario': 1000 * dia, 'impuesto': '10'}],
+        }
+        for dia in (3, 1, 2)
+    ])
+    yield ids
+    conn, cur = facturacion.conectar()
+    try:
+        cur.execute("DELETE FROM facturas_items WHERE factura_id = ANY(%s)", (ids,))
+        cur.execute("DELETE FROM facturas WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+RANGO = {'fecha_desde': date(1999, 1, 1), 'fecha_hasta': date(1999, 1, 31)}
+
+
+def test_contar_facturas(facturas_de_prueba):
+    assert facturacion.contar_facturas(**RANGO) == 3
+    assert facturacion.contar_facturas(ids=facturas_de_prueba[:2]) == 2
+    assert facturacion.contar_facturas(ids=facturas_de_prueba, fecha_desde=date(1999, 1, 2),
+                                       fecha_hasta=date(1999, 1, 31)) == 2
+
+
+def test_contar_facturas_se_detiene_en_el_limite(facturas_de_prueba):
+    assert facturacion.contar_facturas(**RANGO, limite=2) == 2
+    assert facturacion.contar_facturas(**RANGO, limite=10) == 3
+
+
+def test_obtener_facturas_con_items_ordenadas_y_limitadas(facturas_de_prueba):
+    lote = facturacion.obtener_facturas_con_items(**RANGO)
+    assert [d['factura']['fecha'] for d in lote] == [date(1999, 1, 1), date(1999, 1, 2), date(1999, 1, 3)]
+    assert all(len(d['items']) == 1 for d in lote)
+
+    lote = facturacion.obtener_facturas_con_items(**RANGO, limite=2)
+    assert [d['factura']['fecha'] for d in lote] == [date(1999, 1, 1), date(1999, 1, 2)]
@@ -0,0 +1,139 @@
+"""
+Tests de los triggers del libro diario movimientos_bancarios_diarios
+
+Una transferencia toca dos bancos; los advisory locks de ambos se toman en
+orden ascendente de banco_id antes de aplicar los movimientos, así dos
+transferencias en sentidos opuestos no pueden bloquearse mutuamente.
+"""
+import threading
+import time
+import uuid
+from datetime import date
+
+import pytest
+
+import financiero
+
+
+@pytest.fixture
+def dos_bancos(base_datos):
+    conn, cur = financiero.conectar()
+    try:
+        ids = []
+        for _ in range(2):
+            cur.execute("INSERT INTO bancos (nombre) VALUES (%s) RETURNING id", (f"TEST {uuid.uuid4().hex}",))
+            ids.append(cur.fetchone()['id'])
+        conn.commit()
+        yield sorted(ids)
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM bancos WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+        cur.close()
+        conn.close()
+
+
+def _bloquear_banco(cur, banco_id, esperar=True):
+    funcion = 'pg_advisory_xact_lock' if esperar else 'pg_try_advisory_xact_lock'
+    cur.execute(f"SELECT {funcion}(hashtext('movimientos_bancarios_diarios'), %s) AS ok", (banco_id,))
+    return cur.fetchone()['ok']
+
+
+def _esperando_lock(cur, pid):
+    cur.execute("SELECT COUNT(*) AS n FROM pg_locks WHERE pid = %s AND NOT granted", (pid,))
+    return cur.fetchone()['n'] > 0
+
+
+def test_transferencia_bloquea_los_bancos_en_orden_ascendente(dos_bancos):
+    banco_menor, banco_mayor = dos_bancos
+    conn_b, cur_b = financiero.conectar()
+    conn_a, cur_a = financiero.conectar()
+    hilo = None
+    try:
+        # B tiene el banco mayor; A inserta una transferencia hacia ese banco
+        _bloquear_banco(cur_b, banco_mayor)
+        cur_a.execute("SELECT pg_backend_pid() AS pid")
+        pid_a = cur_a.fetchone()['pid']
+        errores = []
+
+        def transferir():
+            try:
+                cur_a.execute("""
+                    INSERT INTO transferencias_cuentas (fecha, banco_origen_id, banco_destino_id, monto)
+                    VALUES (%s, %s, %s, 100)
+                """, (date(2024, 1, 15), banco_menor, banco_mayor))
+            except Exception as e:
+                errores.append(e)
+
+        hilo = threading.Thread(target=transferir, daemon=True)
+        hilo.start()
+        limite = time.monotonic() + 10
+        while not _esperando_lock(cur_b, pid_a):
+            assert time.monotonic() < limite, "la transferencia no llegó a esperar el lock"
+            time.sleep(0.05)
+
+        # A espera el banco mayor y ya tiene el menor: B no puede tomarlo
+        menor_libre = _bloquear_banco(cur_b, banco_menor, esperar=False)
+
+        conn_b.rollback()
+        hilo.join(10)
+        assert not hilo.is_alive()
+        assert not errores
+        assert menor_libre is False
+    finally:
+        # B primero: mientras tenga el lock, la conexión de A sigue ocupada
+        conn_b.rollback()
+        if hilo is not None:
+            hilo.join(10)
+        conn_a.rollback()
+        for cur, conn in ((cur_a, conn_a), (cur_b, conn_b)):
+            cur.close()
+            conn.close()
+
+
+def test_transferencias_en_sentidos_opuestos_actualizan_el_libro(dos_bancos):
+    banco_menor, banco_mayor = dos_bancos
+    fecha = date(2024, 2, 1)
+    errores = []
+
+    def transferir(origen, destino, monto):
+        conn, cur = financiero.conectar()
+        try:
+            cur.execute("""
+                INSERT INTO transferencias_cuentas (fecha, banco_origen_id, banco_destino_id, monto)
+                VALUES (%s, %s, %s, %s)
+            """, (fecha, origen, destino, monto))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            errores.append(e)
+        finally:
+            cur.close()
+            conn.close()
+
+    hilos = [threading.Thread(target=transferir, args=args)
+             for args in [(banco_menor, banco_mayor, 100), (banco_mayor, banco_menor, 30)] * 5]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(30)
+    assert not errores
+
+    conn, cur = financiero.conectar()
+    try:
+        cur.execute("""
+            SELECT banco_id, transferencias_recibidas, transferencias_enviadas, neto_acumulado
+            FROM movimientos_bancarios_diarios
+            WHERE banco_id = ANY(%s) AND fecha = %s
+            ORDER BY banco_id
+        """, ([banco_menor, banco_mayor], fecha))
+        filas = [tuple(fila) for fila in cur.fetchall()]
+        assert filas == [(banco_menor, 150, 500, -350), (banco_mayor, 500, 150, 350)]
+        cur.execute("DELETE FROM transferencias_cuentas WHERE banco_origen_id = ANY(%s)",
+                    ([banco_menor, banco_mayor],))
+        cur.execute("DELETE FROM movimientos_bancarios_diarios WHERE banco_id = ANY(%s)",
+                    ([banco_menor, banco_mayor],))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
@@ -0,0 +1,116 @@
+"""
+Tests de las cachés de process_ocr_opencv con run_ocr simulado (sin Tesseract)
+
+- Misma imagen y misma configuración: el resultado sale de la caché en disco.
+- Cambia solo la configuración: la imagen decodificada se reutiliza de memoria.
+- Las imágenes preprocesadas se guardan comprimidas (PNG) sin pérdida.
+- La memoria de imágenes decodificadas se limita por bytes (OCR_DECODED_CACHE_MB).
+"""
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('pytesseract')
+import procesar_ocr_opencv as ocr  # noqa: E402
+
+
+def _imagen(semilla=0):
+    img = np.full((400, 600, 3), 255, dtype=np.uint8)
+    cv2.putText(img, f'Factura {semilla}', (40, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+    ok, buf = cv2.imencode('.png', img)
+    assert ok
+    return buf.tobytes()
+
+
+@pytest.fixture
+def llamadas(monkeypatch, tmp_path):
+    """Caché en un directorio del test; cuenta decodificaciones y pasadas de OCR"""
+    monkeypatch.setattr(ocr, 'OCR_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(ocr, 'OCR_CACHE_MAX_MB', 200)
+    monkeypatch.setattr(ocr, '_decoded_cache', ocr.OrderedDict())
+    monkeypatch.setattr(ocr, '_decoded_cache_bytes', 0)
+    contador = {'decode': 0, 'ocr': []}
+    decode_image = ocr.decode_image
+
+    def decode_contado(image_bytes):
+        contador['decode'] += 1
+        return decode_image(image_bytes)
+
+    def ocr_simulado(img, psm_mode, lang):
+        contador['ocr'].append(img.copy())
+        return {
+            'level': [5], 'page_num': [1], 'block_num': [1], 'par_num': [1], 'line_num': [1],
+            'word_num': [1], 'left': [10], 'top': [20], 'width': [30], 'height': [40],
+            'conf': [95], 'text': ['Factura'],
+        }
+
+    monkeypatch.setattr(ocr, 'decode_image', decode_contado)
+    monkeypatch.setattr(ocr, 'run_ocr', ocr_simulado)
+    return contador
+
+
+def test_misma_imagen_y_configuracion_usa_el_resultado_en_cache(llamadas):
+    imagen = _imagen()
+    primero = ocr.process_ocr_opencv(imagen, {'threshold': 128})
+    ocr._decoded_cache.clear()
+    segundo = ocr.process_ocr_opencv(imagen, {'threshold': 128})
+    assert segundo == primero
+    assert primero['text'] == 'Factura\n\n\f'
+    assert len(llamadas['ocr']) == 1
+    assert llamadas['decode'] == 1
+
+
+def test_cambio_de_configuracion_reutiliza_la_imagen_decodificada(llamadas):
+    imagen = _imagen()
+    ocr.process_ocr_opencv(imagen, {'threshold': 128})
+    ocr.process_ocr_opencv(imagen, {'threshold': 200})
+    ocr.process_ocr_opencv(imagen, {'threshold': 128, 'psm_mode': '3'})
+    assert llamadas['decode'] == 1
+    # threshold cambia el preprocesamiento; psm_mode solo el OCR
+    assert len(llamadas['ocr']) == 3
+    assert not np.array_equal(llamadas['ocr'][0], llamadas['ocr'][1])
+    assert np.array_equal(llamadas['ocr'][0], llamadas['ocr'][2])
+
+
+def test_imagen_preprocesada_se_guarda_comprimida_sin_perdida(llamadas, tmp_path):
+    imagen = _imagen()
+    for config in ({'threshold': 128}, {'enable_preprocessing': False}):
+        ocr.process_ocr_opencv(imagen, config)
+        procesada = llamadas['ocr'][-1]
+        ruta = tmp_path / f"{ocr._preprocessing_key(ocr.hashlib.sha256(imagen).hexdigest(), config)}.png"
+        assert os.path.getsize(ruta) < procesada.nbytes / 10
+        guardada = ocr._load_png(str(ruta))
+        assert guardada.dtype == procesada.dtype
+        assert np.array_equal(guardada, procesada)
+    assert not list(tmp_path.glob('*.npy'))
+
+
+def test_cambio_de_psm_lee_la_imagen_preprocesada_de_disco(llamadas):
+    imagen = _imagen()
+    ocr.process_ocr_opencv(imagen, {'threshold': 128})
+    ocr._decoded_cache.clear()
+    ocr.process_ocr_opencv(imagen, {'threshold': 128, 'psm_mode': '3'})
+    assert llamadas['decode'] == 1
+    assert np.array_equal(llamadas['ocr'][0], llamadas['ocr'][1])
+
+
+def test_memoria_de_imagenes_decodificadas_limitada_por_bytes(llamadas, monkeypatch):
+    monkeypatch.setattr(ocr, 'OCR_DECODED_CACHE_MB', 1)
+    imagenes = [_imagen(i) for i in range(3)]  # 720 KB decodificada cada una
+    for i, imagen in enumerate(imagenes):
+        ocr._decode_image_cached(str(i), imagen)
+    assert list(ocr._decoded_cache) == ['2']
+    assert ocr._decoded_cache_bytes == 400 * 600 * 3
+
+    ocr._decode_image_cached('2', imagenes[2])
+    assert llamadas['decode'] == 3
+
+
+def test_imagen_mayor_al_limite_no_se_guarda_en_memoria(llamadas, monkeypatch):
+    monkeypatch.setattr(ocr, 'OCR_DECODED_CACHE_MB', 0)
+    ocr._decode_image_cached('a', _imagen())
+    ocr._decode_image_cached('a', _imagen())
+    assert llamadas['decode'] == 2
+    assert not ocr._decoded_cache and ocr._decoded_cache_bytes == 0
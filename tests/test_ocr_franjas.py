@@ -0,0 +1,115 @@
+"""
+Tests del OCR por franjas: cortes de text_bands y coordenadas que devuelve
+_merge_band_data, sobre imágenes sintéticas (sin Tesseract)
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('pytesseract')
+import procesar_ocr_opencv as ocr  # noqa: E402
+
+
+def _pagina(alto, ancho, renglones, canales=1):
+    """Página blanca con un rectángulo negro por cada renglón (y0, y1)"""
+    img = np.full((alto, ancho) if canales == 1 else (alto, ancho, canales), 255, dtype=np.uint8)
+    for y0, y1 in renglones:
+        img[y0:y1, 100:ancho - 100] = 0
+    return img
+
+
+def test_corta_en_la_mitad_de_cada_espacio_en_blanco():
+    img = _pagina(1000, 800, [(100, 140), (300, 340), (700, 740)])
+    assert ocr.text_bands(img, min_gap=12, min_height=100) == [(0, 220), (220, 520), (520, 1000)]
+
+
+def test_imagen_color_da_las_mismas_franjas():
+    renglones = [(100, 140), (300, 340), (700, 740)]
+    assert (ocr.text_bands(_pagina(1000, 800, renglones, canales=3), min_gap=12, min_height=100)
+            == ocr.text_bands(_pagina(1000, 800, renglones), min_gap=12, min_height=100))
+
+
+def test_no_corta_espacios_menores_a_min_gap():
+    img = _pagina(1000, 800, [(100, 140), (145, 185), (600, 640)])
+    assert ocr.text_bands(img, min_gap=12, min_height=100) == [(0, 392), (392, 1000)]
+
+
+def test_une_tramos_hasta_el_alto_minimo():
+    img = _pagina(1000, 800, [(100, 140), (300, 340), (700, 740)])
+    assert ocr.text_bands(img, min_gap=12, min_height=400) == [(0, 520), (520, 1000)]
+
+
+def test_la_ultima_franja_baja_se_une_a_la_anterior():
+    img = _pagina(1000, 800, [(100, 140), (400, 440), (900, 990)])
+    assert ocr.text_bands(img, min_gap=12, min_height=300) == [(0, 670), (670, 1000)]
+    assert ocr.text_bands(img, min_gap=12, min_height=350) == [(0, 1000)]
+
+
+def test_las_franjas_cubren_la_imagen_sin_franjas_en_blanco():
+    renglones = [(40 + i * 90, 70 + i * 90) for i in range(20)]
+    img = _pagina(2000, 800, renglones)
+    bands = ocr.text_bands(img, min_gap=12, min_height=200)
+    assert bands[0][0] == 0 and bands[-1][1] == 2000
+    assert all(a[1] == b[0] for a, b in zip(bands, bands[1:]))
+    assert all(b - a >= 200 for a, b in bands)
+    assert all((img[y0:y1] < 128).any() for y0, y1 in bands)
+
+
+def test_imagen_en_blanco_es_una_sola_franja():
+    assert ocr.text_bands(_pagina(1000, 800, []), min_gap=12, min_height=100) == [(0, 1000)]
+
+
+def test_puntos_sueltos_no_cuentan_como_texto():
+    img = _pagina(1000, 1000, [(100, 140), (700, 740)])
+    # Suciedad del escaneo: menos de width // 500 píxeles oscuros por fila
+    img[150:690, 500] = 0
+    img[150:690, 900] = 0
+    assert ocr.text_bands(img, min_gap=12, min_height=100) == [(0, 420), (420, 1000)]
+    img = _pagina(1000, 1000, [])
+    img[:, 500] = 0
+    assert ocr.text_bands(img, min_gap=12, min_height=100) == [(0, 1000)]
+
+
+def _datos_palabras(recortes):
+    """image_to_data simulado: una palabra por cada mancha negra del recorte"""
+    data = {columna: [] for columna in ocr._TSV_COLUMNS}
+    contornos, _ = cv2.findContours((recortes < 128).astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for numero, contorno in enumerate(sorted(contornos, key=lambda c: cv2.boundingRect(c)[1]), 1):
+        left, top, width, height = cv2.boundingRect(contorno)
+        valores = [5, 1, 1, 1, numero, 1, left, top, width, height, 95.0, f'p{numero}']
+        for columna, valor in zip(ocr._TSV_COLUMNS, valores):
+            data[columna].append(valor)
+    return data
+
+
+def test_merge_lleva_las_coordenadas_a_la_imagen_original():
+    # Palabras en la imagen original (left, top, width, height)
+    palabras = [(200, 120, 600, 80), (400, 900, 1000, 80), (240, 2500, 800, 120), (300, 3600, 1200, 80)]
+    img = np.full((4000, 2000), 255, dtype=np.uint8)
+    for left, top, width, height in palabras:
+        img[top:top + height, left:left + width] = 0
+
+    small, scale = ocr.downscale_image(img, max_dimension=1000)
+    assert scale == 0.25 and small.shape == (1000, 500)
+    bands = ocr.text_bands(small, min_gap=12, min_height=100)
+    assert len(bands) > 1
+    merged = ocr._merge_band_data([_datos_palabras(small[y0:y1]) for y0, y1 in bands], bands, scale)
+
+    encontradas = sorted(zip(merged['left'], merged['top'], merged['width'], merged['height']), key=lambda p: p[1])
+    assert len(encontradas) == len(palabras)
+    # Error máximo: un píxel de la imagen reducida
+    for encontrada, original in zip(encontradas, palabras):
+        assert all(abs(a - b) <= 1 / scale for a, b in zip(encontrada, original)), (encontrada, original)
+
+
+def test_merge_separa_los_bloques_de_cada_franja():
+    franja = {columna: [] for columna in ocr._TSV_COLUMNS}
+    for columna, valor in zip(ocr._TSV_COLUMNS, [5, 1, 1, 1, 1, 1, 10, 5, 30, 12, 90.0, 'hola']):
+        franja[columna].append(valor)
+    merged = ocr._merge_band_data([franja, franja], [(0, 50), (50, 120)], 0.5)
+    assert merged['block_num'] == [1, 1001]
+    assert merged['top'] == [10, 110]
+    assert merged['left'] == [20, 20] and merged['width'] == [60, 60] and merged['height'] == [24, 24]
+    assert merged['text'] == ['hola', 'hola']
+    # Cada franja queda en su propio párrafo al armar el texto
+    assert ocr.text_from_ocr_data(merged) == 'hola\n\nhola\n\n\f'
@@ -0,0 +1,101 @@
+"""
+Tests de la cola del pool de OCR local con un _run_ocr_job simulado
+
+Cada llamada a run_ocr_many ocupa un lugar en la cola hasta que terminan
+todas sus partes, aunque el llamador haya dejado de esperarlas por timeout.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip('cv2')
+pytest.importorskip('pytesseract')
+import procesar_ocr_opencv as ocr  # noqa: E402
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Pool de OCR propio del test, con contadores en cero"""
+    ejecutor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ocr-test')
+    monkeypatch.setattr(ocr, '_ocr_executor', ejecutor)
+    monkeypatch.setattr(ocr, '_ocr_in_flight', 0)
+    monkeypatch.setattr(ocr, '_ocr_stats', {
+        'completed': 0, 'errors': 0, 'rejected': 0, 'timeouts': 0, 'seconds': 0.0, 'started_at': time.time(),
+    })
+    monkeypatch.setattr(ocr, 'OCR_POOL_QUEUE_MAX', 1)
+    liberar = threading.Event()
+
+    def ocr_simulado(img, psm_mode, lang):
+        if img == 'lenta':
+            liberar.wait(10)
+        if img == 'falla':
+            raise RuntimeError('Tesseract falló')
+        return {'text': [img]}
+
+    monkeypatch.setattr(ocr, '_run_ocr_job', ocr_simulado)
+    yield liberar
+    liberar.set()
+    ejecutor.shutdown(wait=True)
+
+
+def _esperar_cola_vacia(timeout=10):
+    limite = time.monotonic() + timeout
+    while ocr.ocr_pool_stats()['in_flight']:
+        assert time.monotonic() < limite, "el OCR no liberó su lugar en la cola"
+        time.sleep(0.01)
+
+
+def test_partes_en_orden_y_un_solo_lugar_en_la_cola(pool):
+    assert ocr.run_ocr_many(['a', 'b', 'c']) == [{'text': ['a']}, {'text': ['b']}, {'text': ['c']}]
+    assert ocr.run_ocr('d') == {'text': ['d']}
+    _esperar_cola_vacia()
+    stats = ocr.ocr_pool_stats()
+    assert stats['completed'] == 2
+    assert stats['errors'] == stats['rejected'] == stats['timeouts'] == 0
+    assert stats['avg_seconds'] >= 0 and stats['queue_max'] == 1
+
+
+def test_cola_llena_rechaza(pool):
+    resultado = []
+    hilo = threading.Thread(target=lambda: resultado.append(ocr.run_ocr('lenta')), daemon=True)
+    hilo.start()
+    limite = time.monotonic() + 10
+    while not ocr.ocr_pool_stats()['in_flight']:
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+
+    with pytest.raises(ocr.OCRQueueFull):
+        ocr.run_ocr('b')
+    assert ocr.ocr_pool_stats()['rejected'] == 1
+
+    pool.set()
+    hilo.join(10)
+    assert resultado == [{'text': ['lenta']}]
+    _esperar_cola_vacia()
+    assert ocr.run_ocr('b') == {'text': ['b']}
+
+
+def test_timeout_mantiene_el_lugar_hasta_que_termina_tesseract(pool):
+    with pytest.raises(TimeoutError):
+        ocr.run_ocr_many(['a', 'lenta'], timeout=0.1)
+    stats = ocr.ocr_pool_stats()
+    assert stats['timeouts'] == 1 and stats['errors'] == 1 and stats['completed'] == 0
+
+    # La parte lenta sigue ocupando un hilo y un motor: no se acepta otra imagen
+    assert stats['in_flight'] == 1
+    with pytest.raises(ocr.OCRQueueFull):
+        ocr.run_ocr('b')
+
+    pool.set()
+    _esperar_cola_vacia()
+    assert ocr.run_ocr('b') == {'text': ['b']}
+
+
+def test_error_de_tesseract_libera_el_lugar(pool):
+    with pytest.raises(RuntimeError, match='Tesseract falló'):
+        ocr.run_ocr_many(['a', 'falla'])
+    _esperar_cola_vacia()
+    stats = ocr.ocr_pool_stats()
+    assert stats['errors'] == 1 and stats['timeouts'] == 0 and stats['completed'] == 0
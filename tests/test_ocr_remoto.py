@@ -0,0 +1,114 @@
+"""
+Tests del cliente de OCR remoto contra un servidor local que imita
+/api/ocr/process y /api/ocr/process-batch
+
+El servidor de prueba responde cada imagen con su propio contenido como texto
+y permite simular errores 503/504 y respuestas lentas.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('cv2')
+pytest.importorskip('pytesseract')
+import procesar_ocr_opencv as ocr  # noqa: E402
+
+
+class ServidorOCR:
+    """Servidor HTTP en un hilo; `respuestas` es una lista de (status, demora) a usar en orden"""
+
+    def __init__(self):
+        self.pedidos = []
+        self.respuestas = []
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers['Content-Length']))
+                servidor.pedidos.append(self.path)
+                status, demora = servidor.respuestas.pop(0) if servidor.respuestas else (200, 0)
+                time.sleep(demora)
+                if status != 200:
+                    self.send_response(status)
+                    self.send_header('Retry-After', '0')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                textos = [t.decode() for t in re.findall(rb'IMG\d+', cuerpo)]
+                palabras = [[[[0, 0], [10, 0], [10, 5], [0, 5]], texto, 0.9] for texto in textos]
+                if self.path == '/api/ocr/process-batch':
+                    respuesta = {'results': [{'text': t, 'words': [p]} for t, p in zip(textos, palabras)]}
+                else:
+                    respuesta = {'text': ' '.join(textos), 'words': palabras}
+                datos = json.dumps(respuesta).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+        self.http = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.http.server_address[1]}"
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.http.shutdown()
+        self.http.server_close()
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    servidor = ServidorOCR()
+    monkeypatch.setattr(ocr, 'OCR_REMOTE_URL', servidor.url)
+    monkeypatch.setattr(ocr, '_remote_session', None)
+    yield servidor
+    servidor.cerrar()
+
+
+def test_process_ocr_remote(servidor):
+    resultado = ocr.process_ocr_remote(b'IMG1', {})
+    assert servidor.pedidos == ['/api/ocr/process']
+    assert resultado['text'] == 'IMG1'
+    assert resultado['words'] == [{'text': 'IMG1', 'confidence': 90.0,
+                                   'bbox': {'x0': 0, 'y0': 0, 'x1': 10, 'y1': 5}}]
+
+
+def test_process_ocr_remote_batch_respeta_el_orden(servidor, monkeypatch):
+    monkeypatch.setattr(ocr, 'OCR_REMOTE_BATCH_SIZE', 2)
+    imagenes = [f'IMG{i}'.encode() for i in range(5)]
+    resultados = ocr.process_ocr_remote_batch(imagenes, {})
+    assert servidor.pedidos == ['/api/ocr/process-batch'] * 3
+    assert [r['text'] for r in resultados] == [f'IMG{i}' for i in range(5)]
+
+
+def test_reintenta_respuestas_503(servidor):
+    servidor.respuestas = [(503, 0), (504, 0)]
+    assert ocr.process_ocr_remote(b'IMG7', {})['text'] == 'IMG7'
+    assert len(servidor.pedidos) == 3
+
+
+def test_no_reintenta_timeouts_de_lectura(servidor, monkeypatch):
+    monkeypatch.setattr(ocr, 'OCR_REMOTE_TIMEOUT', 0.3)
+    servidor.respuestas = [(200, 1)]
+    with pytest.raises(Exception, match='servidor OCR remoto'):
+        ocr.process_ocr_remote(b'IMG1', {})
+    time.sleep(0.8)
+    assert len(servidor.pedidos) == 1
+
+
+def test_plazo_total_acota_los_reintentos(servidor, monkeypatch):
+    monkeypatch.setattr(ocr, 'OCR_REMOTE_RETRIES', 50)
+    monkeypatch.setattr(ocr, 'OCR_REMOTE_DEADLINE', 1.0)
+    servidor.respuestas = [(504, 0.3)] * 50
+    inicio = time.monotonic()
+    with pytest.raises(Exception):
+        ocr.process_ocr_remote(b'IMG1', {})
+    assert time.monotonic() - inicio < 1.5
+    assert len(servidor.pedidos) <= 4
@@ -0,0 +1,139 @@
+"""
+Tests de text_from_ocr_data: el texto armado desde image_to_data tiene que
+ser el mismo que devuelve image_to_string para la misma imagen
+
+- Con Tesseract instalado se ejecutan las dos llamadas sobre páginas de
+  prueba (columnas, regiones en blanco, varias páginas) y se comparan.
+- Sin Tesseract se usan los pares tests/datos/ocr_*.tsv / ocr_*.txt: la salida
+  TSV de image_to_data y el texto de image_to_string de la misma imagen. Se
+  agregan capturas de escaneos reales con tests/capturar_ocr.py.
+  ocr_factura es un diseño escrito a mano con el formato de Tesseract (dos
+  páginas, varios bloques y párrafos), no una captura.
+"""
+import glob
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+pytesseract = pytest.importorskip('pytesseract')
+import procesar_ocr_opencv as ocr  # noqa: E402
+
+DATOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos')
+CAPTURAS = sorted(os.path.basename(ruta)[:-len('.tsv')]
+                  for ruta in glob.glob(os.path.join(DATOS_DIR, 'ocr_*.tsv')))
+
+
+def _leer(nombre):
+    with open(os.path.join(DATOS_DIR, nombre), encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+@pytest.fixture(scope='module')
+def tsv_factura():
+    return _leer('ocr_factura.tsv')
+
+
+@pytest.fixture(scope='module')
+def texto_factura():
+    return _leer('ocr_factura.txt')
+
+
+@pytest.mark.parametrize('captura', CAPTURAS)
+def test_texto_igual_a_image_to_string(captura):
+    # Lo que arma image_to_data(output_type=Output.DICT) a partir del TSV
+    ocr_data = pytesseract.pytesseract.file_to_dict(_leer(f'{captura}.tsv'), '\t', -1)
+    assert ocr.text_from_ocr_data(ocr_data) == _leer(f'{captura}.txt')
+
+
+@pytest.mark.parametrize('captura', CAPTURAS)
+def test_texto_igual_con_el_tsv_de_tesserocr(captura):
+    ocr_data = ocr._tsv_to_data(_leer(f'{captura}.tsv'))
+    assert ocr.text_from_ocr_data(ocr_data) == _leer(f'{captura}.txt')
+
+
+def test_ignora_palabras_vacias_y_filas_sin_texto(tsv_factura, texto_factura):
+    ocr_data = ocr._tsv_to_data(tsv_factura)
+    # Tesseract devuelve palabras con solo espacios en regiones sin texto
+    for columna, valor in zip(ocr._TSV_COLUMNS, [5, 1, 1, 1, 2, 3, 0, 0, 0, 0, 95.0, ' ']):
+        ocr_data[columna].insert(10, valor)
+    assert ocr.text_from_ocr_data(ocr_data) == texto_factura
+
+
+def test_sin_palabras_devuelve_texto_vacio():
+    assert ocr.text_from_ocr_data({columna: [] for columna in ocr._TSV_COLUMNS}) == ''
+    ocr_data = ocr._tsv_to_data("1\t1\t0\t0\t0\t0\t0\t0\t100\t100\t-1\t\n")
+    assert ocr.text_from_ocr_data(ocr_data) == ''
+
+
+# ==================== CON TESSERACT ====================
+
+def _tesseract_instalado():
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+con_tesseract = pytest.mark.skipif(not _tesseract_instalado(), reason='Tesseract no está instalado')
+
+
+def _pagina(renglones, alto=1650, ancho=1275):
+    """Página blanca con renglones (x, y, texto) escritos a ~150 dpi"""
+    img = np.full((alto, ancho), 255, dtype=np.uint8)
+    for x, y, texto in renglones:
+        cv2.putText(img, texto, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2, cv2.LINE_AA)
+    return img
+
+
+PAGINAS = {
+    'encabezado_e_items': _pagina([
+        (80, 100, 'PRESUPUESTO N 0042'), (80, 150, 'Fecha: 15/03/2024'),
+        (80, 300, 'Cliente: COMERCIAL DEL ESTE S.A.'), (80, 350, 'RUC: 80012345-6'),
+        (80, 500, '2 Cable 2x4 mm 150.000'), (80, 550, '1 Tablero 12 bocas 480.000'),
+        (80, 600, '10 Tomas dobles 95.000'),
+        (80, 800, 'Total: 725.000 Gs'),
+    ]),
+    # Dos columnas: Tesseract las separa en bloques distintos
+    'dos_columnas': _pagina([
+        (80, 120, 'Materiales'), (80, 170, 'Cemento 50 kg'), (80, 220, 'Arena lavada'),
+        (80, 270, 'Ladrillo comun'),
+        (700, 120, 'Mano de obra'), (700, 170, 'Albanil por dia'), (700, 220, 'Ayudante por dia'),
+    ]),
+    # Regiones vacías y un recuadro sin texto entre los párrafos
+    'regiones_en_blanco': _pagina([
+        (80, 100, 'Observaciones'),
+        (80, 1400, 'Validez de la oferta: 15 dias'),
+    ]),
+}
+cv2.rectangle(PAGINAS['regiones_en_blanco'], (300, 500), (900, 900), 0, 3)
+
+
+def _configuracion():
+    idiomas = pytesseract.get_languages(config='')
+    return '--psm 3 -l ' + ('spa' if 'spa' in idiomas else 'eng')
+
+
+@con_tesseract
+@pytest.mark.parametrize('nombre', sorted(PAGINAS))
+def test_igual_a_image_to_string_en_paginas_de_prueba(nombre):
+    img = PAGINAS[nombre]
+    config = _configuracion()
+    datos = pytesseract.image_to_data(img, config=config, output_type=pytesseract.Output.DICT)
+    assert ocr.text_from_ocr_data(datos) == pytesseract.image_to_string(img, config=config)
+
+
+@con_tesseract
+@pytest.mark.parametrize('psm', ['3', '6'])
+def test_igual_a_image_to_string_en_varias_paginas(tmp_path, psm):
+    from PIL import Image
+
+    ruta = str(tmp_path / 'paginas.tif')
+    paginas = [Image.fromarray(PAGINAS[nombre]) for nombre in sorted(PAGINAS)]
+    paginas[0].save(ruta, save_all=True, append_images=paginas[1:], dpi=(150, 150))
+    config = _configuracion().replace('--psm 3', f'--psm {psm}')
+    datos = pytesseract.image_to_data(ruta, config=config, output_type=pytesseract.Output.DICT)
+    assert len(set(datos['page_num'])) == len(paginas)
+    assert ocr.text_from_ocr_data(datos) == pytesseract.image_to_string(ruta, config=config)
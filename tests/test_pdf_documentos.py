@@ -0,0 +1,44 @@
+"""
+Tests del HTML de los PDF de documentos que se guardan en cache_pdf
+
+La clave de la caché sale de los datos del documento y de la plantilla: el
+HTML no puede depender de nada más (por ejemplo la hora en que se generó).
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+
+class _RelojAdelantado(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.now(tz) + timedelta(days=400)
+
+    @classmethod
+    def utcnow(cls):
+        return datetime.utcnow() + timedelta(days=400)
+
+
+@pytest.fixture
+def datos_lista():
+    return {
+        'presupuesto': {
+            'numero_presupuesto': 'LM-0042', 'titulo': 'Tablero', 'nombre_cliente': 'Cliente S.A.',
+            'fecha_presupuesto': date(2024, 3, 15), 'validez_dias': 30, 'estado': 'borrador',
+            'cantidad_items': 1, 'subtotal': 1000, 'iva_porcentaje': 10, 'iva_monto': 100, 'total': 1100,
+            'tiempo_ejecucion_total': 2, 'items_sin_subgrupo': [
+                {'descripcion': 'Cable', 'cantidad': 10, 'precio_unitario': 100, 'subtotal': 1000,
+                 'tiempo_ejecucion_horas': 2, 'notas': None},
+            ],
+        },
+        'items_disponibles': [],
+        'tipos_items': [],
+    }
+
+
+def test_html_de_la_lista_no_depende_de_la_hora(aplicacion, datos_lista, monkeypatch):
+    with aplicacion.app.test_request_context():
+        html = aplicacion._html_documento_pdf('lista', datos_lista)
+        monkeypatch.setattr(aplicacion, 'datetime', _RelojAdelantado)
+        assert aplicacion._html_documento_pdf('lista', datos_lista) == html
+    assert 'LM-0042' in html
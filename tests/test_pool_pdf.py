@@ -0,0 +1,66 @@
+"""
+Tests de la cola del pool de procesos de PDF
+
+Un PDF ocupa su lugar en la cola hasta que el proceso del pool termina de
+generarlo, aunque el worker web haya dejado de esperarlo por timeout; así
+PDF_POOL_COLA_MAX sigue acotando el trabajo pendiente.
+"""
+import time
+
+import pytest
+
+import pool_pdf
+
+
+def pdf_lento(segundos):
+    """Render simulado: se ejecuta en un proceso del pool"""
+    time.sleep(segundos)
+    return b'%PDF-1.4 prueba'
+
+
+@pytest.fixture
+def pool_de_un_proceso(monkeypatch):
+    monkeypatch.setattr(pool_pdf, 'PDF_POOL_PROCESOS', 1)
+    monkeypatch.setattr(pool_pdf, 'PDF_POOL_COLA_MAX', 1)
+    monkeypatch.setattr(pool_pdf, '_pool', None)
+    monkeypatch.setattr(pool_pdf, '_en_curso', 0)
+    yield
+    if pool_pdf._pool is not None:
+        pool_pdf._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _esperar_cola_vacia(timeout=30):
+    limite = time.monotonic() + timeout
+    while pool_pdf._en_curso:
+        assert time.monotonic() < limite, "el PDF no liberó su lugar en la cola"
+        time.sleep(0.05)
+
+
+def test_pdf_generado_libera_su_lugar(pool_de_un_proceso):
+    assert pool_pdf._renderizar(pdf_lento, (0,), timeout=60) == b'%PDF-1.4 prueba'
+    _esperar_cola_vacia()
+
+
+def test_pdf_con_timeout_sigue_ocupando_la_cola(pool_de_un_proceso):
+    # El primer uso arranca el proceso; se espera para que el timeout no lo incluya
+    pool_pdf._renderizar(pdf_lento, (0,), timeout=60)
+    _esperar_cola_vacia()
+
+    with pytest.raises(TimeoutError):
+        pool_pdf._renderizar(pdf_lento, (2,), timeout=0.2)
+    # El render sigue en el proceso: un PDF nuevo se rechaza en vez de encolarse detrás
+    with pytest.raises(pool_pdf.ColaPDFLlena):
+        pool_pdf._renderizar(pdf_lento, (0,), timeout=60)
+
+    _esperar_cola_vacia()
+    assert pool_pdf._renderizar(pdf_lento, (0,), timeout=60) == b'%PDF-1.4 prueba'
+
+
+def test_sin_pool_el_lugar_se_libera_al_terminar(monkeypatch):
+    monkeypatch.setattr(pool_pdf, 'PDF_POOL_PROCESOS', 0)
+    monkeypatch.setattr(pool_pdf, '_en_curso', 0)
+    with pytest.raises(ZeroDivisionError):
+        pool_pdf._renderizar(lambda: 1 / 0, (), timeout=None)
+    assert pool_pdf._en_curso == 0
+    assert pool_pdf._renderizar(pdf_lento, (0,), timeout=None) == b'%PDF-1.4 prueba'
+    assert pool_pdf._en_curso == 0
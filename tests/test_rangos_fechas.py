@@ -0,0 +1,120 @@
+"""
+Tests de los filtros de fecha de los reportes mensuales directos
+
+Los filtros de año y fechas se traducen a rangos semiabiertos [inicio, fin)
+sobre la misma expresión que indexa el esquema. Los tests de EXPLAIN registran
+el SQL que ejecuta cada reporte y verifican que el plan use esos índices; con
+tablas de prueba chicas se desactiva el seq scan para que el planificador no
+prefiera recorrer la tabla.
+"""
+import json
+from datetime import date
+
+import pytest
+
+import reportes_clientes
+
+
+@pytest.mark.parametrize('filtros, esperado', [
+    ({}, (None, None)),
+    ({'ano': 2024}, (date(2024, 1, 1), date(2025, 1, 1))),
+    ({'fecha_desde': '2024-03-10'}, (date(2024, 3, 10), None)),
+    # fecha_hasta es inclusiva: el rango termina el día siguiente
+    ({'fecha_hasta': '2024-03-31'}, (None, date(2024, 4, 1))),
+    ({'fecha_desde': date(2024, 3, 10), 'fecha_hasta': date(2024, 12, 31)}, (date(2024, 3, 10), date(2025, 1, 1))),
+    # Año y fechas juntos: la intersección de ambos
+    ({'ano': 2024, 'fecha_desde': '2023-06-01', 'fecha_hasta': '2024-06-30'}, (date(2024, 1, 1), date(2024, 7, 1))),
+    ({'ano': 2024, 'fecha_desde': '2024-02-01', 'fecha_hasta': '2025-06-30'}, (date(2024, 2, 1), date(2025, 1, 1))),
+])
+def test_rango_fechas_semiabierto(filtros, esperado):
+    assert reportes_clientes._rango_fechas(**filtros) == esperado
+
+
+def test_condiciones_rango():
+    rango = (date(2024, 1, 1), date(2025, 1, 1))
+    assert reportes_clientes._condiciones_rango("m.fecha", rango) == (
+        ["m.fecha >= %s", "m.fecha < %s"], [date(2024, 1, 1), date(2025, 1, 1)])
+    assert reportes_clientes._condiciones_rango("m.fecha", (None, date(2025, 1, 1))) == (
+        ["m.fecha < %s"], [date(2025, 1, 1)])
+    assert reportes_clientes._condiciones_rango("m.fecha", (None, None)) == ([], [])
+
+
+class _CursorRegistrado:
+    """Cursor que guarda cada consulta ejecutada (SQL y parámetros)"""
+
+    def __init__(self, cur, consultas):
+        self._cur = cur
+        self._consultas = consultas
+
+    def execute(self, query, params=None):
+        self._consultas.append((query, params))
+        return self._cur.execute(query, params)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cur, nombre)
+
+
+@pytest.fixture
+def consultas(conexion, monkeypatch):
+    """Registra el SQL que ejecutan los reportes durante el test
+
+    Depende de `conexion` para que esa conexión se abra antes de registrar.
+    """
+    registradas = []
+    conectar = reportes_clientes.conectar
+
+    def conectar_registrando():
+        conn, cur = conectar()
+        return conn, _CursorRegistrado(cur, registradas)
+
+    monkeypatch.setattr(reportes_clientes, 'conectar', conectar_registrando)
+    return registradas
+
+
+def _indices_del_plan(cur, query, params):
+    """Índices que usa el plan de la consulta, con su condición de índice (Index Cond)"""
+    cur.execute("SET LOCAL enable_seqscan = off")
+    cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    indices = {}
+    pendientes = [plan[0]['Plan']]
+    while pendientes:
+        nodo = pendientes.pop()
+        if 'Index Name' in nodo:
+            indices[nodo['Index Name']] = nodo.get('Index Cond', '')
+        pendientes.extend(nodo.get('Plans', []))
+    return indices
+
+
+FILTROS_FECHA = [
+    {'ano': 2024},
+    {'fecha_desde': '2024-03-10', 'fecha_hasta': '2024-09-20'},
+    {'fecha_desde': '2024-03-10'},
+    {'fecha_hasta': '2024-09-20'},
+]
+
+
+@pytest.mark.parametrize('filtros', FILTROS_FECHA)
+@pytest.mark.parametrize('funcion, requeridos', [
+    (reportes_clientes._receita_bruta_mensual_directa,
+     [({'idx_cuentas_a_recibir_fecha_recibo_o_emision'}, 'COALESCE(fecha_recibo, fecha_emision)')]),
+    (reportes_clientes._custos_despesas_mensual_directa,
+     [({'idx_cuentas_a_pagar_fecha_pago_o_emision'}, 'COALESCE(fecha_pago, fecha_emision)')]),
+    (reportes_clientes._flujo_caja_mensual_directo,
+     [({'idx_cuentas_a_recibir_fecha_recibo'}, 'fecha_recibo'), ({'idx_cuentas_a_pagar_fecha_pago'}, 'fecha_pago')]),
+    # La clave primaria (banco_id, fecha) también sirve para el rango
+    (reportes_clientes.obtener_evolucion_saldo_mensual.__wrapped__,
+     [({'idx_movimientos_bancarios_diarios_fecha', 'movimientos_bancarios_diarios_pkey'}, 'fecha')]),
+])
+def test_reportes_usan_los_indices_de_fecha(consultas, conexion, funcion, requeridos, filtros):
+    funcion(**filtros)
+    assert consultas
+    _, cur = conexion
+    usados = {}
+    for query, params in consultas:
+        usados.update(_indices_del_plan(cur, query, params))
+    for indices, expresion in requeridos:
+        # El rango se resuelve en el índice (Index Cond), no como filtro sobre las filas leídas
+        assert any(expresion in usados.get(indice, '') for indice in indices), usados
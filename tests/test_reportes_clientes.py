@@ -0,0 +1,90 @@
+"""
+Tests de las consultas de reportes de clientes
+
+Ejecutan el SQL contra la base de datos con todos los filtros activos, así un
+alias o una columna mal escritos fallan aquí y no en producción.
+"""
+from datetime import date
+
+import pytest
+
+import financiero
+import reportes_clientes
+
+FILTROS = {
+    'fecha_desde': date(2024, 1, 1),
+    'fecha_hasta': date(2024, 12, 31),
+    'tipo_filtro': 'FCON',
+}
+
+
+@pytest.mark.parametrize('estado', [None, 'pagado', 'pendiente', 'atrasado', 'adelantado', 'en día'])
+def test_cuentas_a_recibir_con_filtros(base_datos, estado):
+    filtros = dict(FILTROS, cliente_nombre='cliente', estado_pago_filtro=estado)
+    total = reportes_clientes.contar_reportes_cuentas_a_recibir(**filtros)
+    reportes = reportes_clientes.obtener_reportes_cuentas_a_recibir(**filtros, limite=10, offset=0)
+    assert total >= len(reportes)
+    assert all(r['tipo'] == 'CUENTA_A_RECIBIR' for r in reportes)
+
+
+def test_cuentas_a_recibir_sin_filtros(base_datos):
+    total = reportes_clientes.contar_reportes_cuentas_a_recibir()
+    reportes = reportes_clientes.obtener_reportes_cuentas_a_recibir(limite=5)
+    assert len(reportes) == min(total, 5)
+
+
+@pytest.mark.parametrize('estado', [None, 'pagado', 'pendiente', 'atrasado'])
+def test_cuentas_a_pagar_con_filtros(base_datos, estado):
+    filtros = dict(FILTROS, proveedor_nombre='proveedor', estado_pago_filtro=estado)
+    total = reportes_clientes.contar_reportes_cuentas_a_pagar(**filtros)
+    reportes = reportes_clientes.obtener_reportes_cuentas_a_pagar(**filtros, limite=10, offset=0)
+    assert total >= len(reportes)
+
+
+@pytest.fixture
+def proyecto_con_movimientos(base_datos):
+    """Proyecto propio con cobros y pagos en meses de uno y dos dígitos"""
+    conn, cur = reportes_clientes.conectar()
+    cur.execute("""
+        INSERT INTO proyectos (codigo, nombre)
+        SELECT COALESCE(MAX(codigo), 0) + 1, 'PROYECTO TEST FLUJO' FROM proyectos
+        RETURNING id
+    """)
+    proyecto_id = cur.fetchone()['id']
+    conn.commit()
+    try:
+        for fecha, monto in ((date(2024, 2, 15), 100), (date(2024, 10, 5), 200), (date(2024, 11, 20), 300)):
+            cur.execute("""
+                INSERT INTO cuentas_a_recibir (fecha_emision, valor, monto_abonado, fecha_recibo, proyecto_id)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (fecha, monto, monto, fecha, proyecto_id))
+        cur.execute("""
+            INSERT INTO cuentas_a_pagar (fecha_emision, valor, monto_abonado, fecha_pago, proyecto_id)
+            VALUES (%s, 50, 50, %s, %s)
+        """, (date(2024, 9, 10), date(2024, 9, 10), proyecto_id))
+        conn.commit()
+        # Como el worker que escribe: los reportes ven la versión nueva enseguida
+        financiero.olvidar_version_datos_financieros()
+        yield proyecto_id
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM cuentas_a_recibir WHERE proyecto_id = %s", (proyecto_id,))
+        cur.execute("DELETE FROM cuentas_a_pagar WHERE proyecto_id = %s", (proyecto_id,))
+        cur.execute("DELETE FROM proyectos WHERE id = %s", (proyecto_id,))
+        conn.commit()
+        cur.close()
+        conn.close()
+
+
+def test_flujo_caja_mensual_ordena_los_meses(proyecto_con_movimientos):
+    esperado = [
+        {'ano': 2024, 'mes': 2, 'entradas': 100.0, 'salidas': 0.0},
+        {'ano': 2024, 'mes': 9, 'entradas': 0.0, 'salidas': 50.0},
+        {'ano': 2024, 'mes': 10, 'entradas': 200.0, 'salidas': 0.0},
+        {'ano': 2024, 'mes': 11, 'entradas': 300.0, 'salidas': 0.0},
+    ]
+    # Meses completos: resumen mensual; fechas a mitad de mes: consulta directa a las cuentas
+    for fecha_desde in ('2024-01-01', '2024-01-15'):
+        assert reportes_clientes.obtener_flujo_caja_mensual(
+            proyecto_id=proyecto_con_movimientos, fecha_desde=fecha_desde, fecha_hasta='2024-12-31'
+        ) == esperado
@@ -0,0 +1,72 @@
+"""
+Tests de la validación en segundo plano de los CSV de cuentas a pagar
+
+El estado de la validación se guarda en disco, así la consulta de progreso
+puede llegar a cualquier worker de gunicorn y no solo al que la inició.
+"""
+import time
+
+import pytest
+
+import exportar_reportes
+import financiero
+from conftest import vista
+
+
+@pytest.fixture
+def directorio_estados(tmp_path, monkeypatch):
+    monkeypatch.setattr(exportar_reportes, 'EXPORTACIONES_DIR', str(tmp_path))
+    monkeypatch.setattr(exportar_reportes, 'EXPORTACIONES_ESTADOS_DIR', str(tmp_path / 'estados'))
+    return tmp_path
+
+
+def _esperar_fin(validacion_id, timeout=5):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        estado = exportar_reportes.leer_estado_exportacion(validacion_id)
+        if estado and estado['estado'] != 'procesando':
+            return estado
+        time.sleep(0.01)
+    raise AssertionError('La validación no terminó')
+
+
+def _consultar_estado(aplicacion, validacion_id):
+    with aplicacion.app.test_request_context():
+        respuesta = vista(aplicacion, 'cuentas_a_pagar_previsualizar_csv_estado')(validacion_id)
+    if isinstance(respuesta, tuple):
+        return respuesta[0].get_json(), respuesta[1]
+    return respuesta.get_json(), 200
+
+
+def test_estado_de_la_validacion_se_lee_desde_disco(aplicacion, directorio_estados, monkeypatch):
+    def validar(csv_content, progreso=None):
+        progreso(500, 1000)
+        progreso(1000, 1000)
+        return {'total_filas': 1000, 'filas_validas': 999, 'filas_invalidas': 1, 'errores': ['Fila 7: Proveedor vacío']}
+
+    monkeypatch.setattr(financiero, 'validar_cuentas_a_pagar_csv', validar)
+    validacion_id = aplicacion._iniciar_validacion_csv('csv')
+    assert _esperar_fin(validacion_id)['estado'] == 'terminado'
+
+    estado, status = _consultar_estado(aplicacion, validacion_id)
+    assert status == 200
+    assert estado == {
+        'estado': 'terminado', 'progreso': 100, 'filas_procesadas': 1000, 'total_filas': 1000,
+        'filas_validas': 999, 'filas_invalidas': 1, 'errores': ['Fila 7: Proveedor vacío'],
+    }
+
+
+def test_error_de_la_validacion_queda_en_el_estado(aplicacion, directorio_estados, monkeypatch):
+    def validar(csv_content, progreso=None):
+        raise ValueError('CSV ilegible')
+
+    monkeypatch.setattr(financiero, 'validar_cuentas_a_pagar_csv', validar)
+    validacion_id = aplicacion._iniciar_validacion_csv('csv')
+    estado = _esperar_fin(validacion_id)
+    assert estado['estado'] == 'error' and estado['error'] == 'CSV ilegible'
+
+
+def test_estado_desconocido_o_de_otro_tipo(aplicacion, directorio_estados):
+    assert _consultar_estado(aplicacion, 'abc123')[1] == 404
+    exportar_reportes.guardar_estado_exportacion('abc123', {'tipo': 'reporte', 'estado': 'terminado'})
+    assert _consultar_estado(aplicacion, 'abc123')[1] == 404
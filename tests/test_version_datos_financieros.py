@@ -0,0 +1,252 @@
+"""
+Tests de la versión de datos financieros y de la caché de reportes
+
+La versión vive en la base (tabla version_datos_financieros), así que una
+escritura confirmada por cualquier conexión, es decir por cualquier worker,
+debe invalidar los reportes guardados en la caché. Cada proceso reutiliza la
+versión leída durante VERSION_DATOS_TTL segundos, así los aciertos de la caché
+no consultan la base.
+
+Los triggers toman el bloqueo de la fila de versión antes que cualquier otro
+bloqueo de la sentencia; el código que bloquea filas con FOR UPDATE antes de
+escribir toma primero la versión para no invertir ese orden.
+"""
+import threading
+import time
+import uuid
+from datetime import date
+
+import pytest
+
+import financiero
+import reportes_clientes
+
+
+def _insertar_banco(confirmar):
+    conn, cur = financiero.conectar()
+    try:
+        cur.execute("INSERT INTO bancos (nombre) VALUES (%s) RETURNING id", (f"TEST {uuid.uuid4().hex}",))
+        banco_id = cur.fetchone()['id']
+        if confirmar:
+            conn.commit()
+        else:
+            conn.rollback()
+        return banco_id
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _eliminar_banco(banco_id):
+    conn, cur = financiero.conectar()
+    try:
+        cur.execute("DELETE FROM bancos WHERE id = %s", (banco_id,))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+@pytest.fixture
+def sin_ttl(monkeypatch):
+    """La versión se lee de la base en cada llamada, como en otro worker con el TTL vencido"""
+    monkeypatch.setattr(financiero, 'VERSION_DATOS_TTL', 0)
+
+
+@pytest.fixture
+def conexiones(monkeypatch):
+    """Cuenta las conexiones que abre financiero"""
+    abiertas = []
+    conectar = financiero.conectar
+
+    def conectar_contando():
+        abiertas.append(1)
+        return conectar()
+
+    monkeypatch.setattr(financiero, 'conectar', conectar_contando)
+    return abiertas
+
+
+def test_escritura_confirmada_incrementa_la_version(base_datos, sin_ttl):
+    antes = financiero.version_datos_financieros()
+    banco_id = _insertar_banco(confirmar=True)
+    try:
+        assert financiero.version_datos_financieros() > antes
+    finally:
+        _eliminar_banco(banco_id)
+
+
+def test_escritura_descartada_no_cambia_la_version(base_datos, sin_ttl):
+    antes = financiero.version_datos_financieros()
+    _insertar_banco(confirmar=False)
+    assert financiero.version_datos_financieros() == antes
+
+
+def test_version_se_reutiliza_durante_el_ttl(base_datos, conexiones, monkeypatch):
+    monkeypatch.setattr(financiero, 'VERSION_DATOS_TTL', 3600)
+    financiero.olvidar_version_datos_financieros()
+    antes = financiero.version_datos_financieros()
+    assert financiero.version_datos_financieros() == antes
+    assert len(conexiones) == 1
+
+    banco_id = _insertar_banco(confirmar=True)
+    try:
+        # Otro worker sigue con la versión leída hasta que venza el TTL...
+        assert financiero.version_datos_financieros() == antes
+        # ...y el que escribió la olvida y la vuelve a leer
+        financiero.olvidar_version_datos_financieros()
+        assert financiero.version_datos_financieros() > antes
+    finally:
+        _eliminar_banco(banco_id)
+
+
+def test_cache_de_reportes_se_invalida_con_escrituras_de_otra_conexion(base_datos, conexiones, monkeypatch):
+    monkeypatch.setattr(financiero, 'VERSION_DATOS_TTL', 3600)
+    financiero.olvidar_version_datos_financieros()
+    llamadas = []
+
+    @reportes_clientes._cachear_reporte
+    def reporte_de_prueba(ano=None):
+        llamadas.append(ano)
+        return {'ano': ano}
+
+    assert reporte_de_prueba(ano=2024) == {'ano': 2024}
+    conexiones.clear()
+    assert reporte_de_prueba(ano=2024) == {'ano': 2024}
+    assert len(llamadas) == 1
+    # Un acierto no consulta la base
+    assert conexiones == []
+
+    banco_id = _insertar_banco(confirmar=True)
+    try:
+        # Vencido el TTL, la versión nueva descarta el resultado guardado
+        monkeypatch.setattr(financiero, 'VERSION_DATOS_TTL', 0)
+        reporte_de_prueba(ano=2024)
+        assert len(llamadas) == 2
+    finally:
+        _eliminar_banco(banco_id)
+
+
+def test_escritura_web_olvida_la_version_del_worker(aplicacion, monkeypatch):
+    olvidadas = []
+    monkeypatch.setattr(financiero, 'olvidar_version_datos_financieros', lambda: olvidadas.append(1))
+    for metodo, esperadas in (('GET', 0), ('POST', 1)):
+        with aplicacion.app.test_request_context(method=metodo):
+            aplicacion._olvidar_version_datos_tras_escritura(aplicacion.app.response_class())
+        assert len(olvidadas) == esperadas
+
+
+@pytest.fixture
+def cuenta_a_pagar(base_datos):
+    conn, cur = financiero.conectar()
+    try:
+        cur.execute("""
+            INSERT INTO cuentas_a_pagar (fecha_emision, valor, monto_abonado, vencimiento)
+            VALUES (%s, 1000, 0, %s) RETURNING id
+        """, (date(2024, 3, 1), date(2024, 3, 31)))
+        cuenta_id = cur.fetchone()['id']
+        conn.commit()
+        yield cuenta_id
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM cuentas_a_pagar WHERE id = %s", (cuenta_id,))
+        conn.commit()
+        cur.close()
+        conn.close()
+
+
+class _CursorPausado:
+    """Cursor que se detiene después del SELECT ... FOR UPDATE hasta que se lo libere"""
+
+    def __init__(self, cur, bloqueadas, continuar):
+        self._cur = cur
+        self._bloqueadas = bloqueadas
+        self._continuar = continuar
+
+    def execute(self, query, params=None):
+        resultado = self._cur.execute(query, params)
+        if isinstance(query, str) and 'FOR UPDATE' in query:
+            self._bloqueadas.set()
+            self._continuar.wait(10)
+        return resultado
+
+    def __getattr__(self, nombre):
+        return getattr(self._cur, nombre)
+
+
+def _esperando_lock(cur, pid):
+    cur.execute("SELECT COUNT(*) AS n FROM pg_locks WHERE pid = %s AND NOT granted", (pid,))
+    return cur.fetchone()['n'] > 0
+
+
+def test_pagos_en_lote_y_pago_individual_concurrentes(cuenta_a_pagar, monkeypatch):
+    bloqueadas = threading.Event()
+    continuar = threading.Event()
+    conectar = financiero.conectar
+
+    def conectar_pausado():
+        conn, cur = conectar()
+        return conn, _CursorPausado(cur, bloqueadas, continuar)
+
+    errores = []
+    resultados = []
+
+    def pagar_en_lote():
+        try:
+            resultados.append(financiero.registrar_pagos_lote_cuentas_a_pagar(
+                [(cuenta_a_pagar, 300, '2024-03-10')]))
+        except Exception as e:
+            errores.append(e)
+
+    monkeypatch.setattr(financiero, 'conectar', conectar_pausado)
+    hilo_lote = threading.Thread(target=pagar_en_lote, daemon=True)
+    hilo_lote.start()
+    assert bloqueadas.wait(10), "el lote no llegó a bloquear las cuentas"
+    monkeypatch.setattr(financiero, 'conectar', conectar)
+
+    # Pago individual sobre la misma cuenta mientras el lote tiene sus filas bloqueadas
+    conn_b, cur_b = financiero.conectar()
+    conn_control, cur_control = financiero.conectar()
+    hilo_individual = None
+    try:
+        cur_b.execute("SELECT pg_backend_pid() AS pid")
+        pid_b = cur_b.fetchone()['pid']
+
+        def pagar_individual():
+            try:
+                cur_b.execute("""
+                    UPDATE cuentas_a_pagar SET monto_abonado = COALESCE(monto_abonado, 0) + 200
+                    WHERE id = %s
+                """, (cuenta_a_pagar,))
+                conn_b.commit()
+            except Exception as e:
+                conn_b.rollback()
+                errores.append(e)
+
+        hilo_individual = threading.Thread(target=pagar_individual, daemon=True)
+        hilo_individual.start()
+        limite = time.monotonic() + 10
+        while not _esperando_lock(cur_control, pid_b):
+            assert time.monotonic() < limite, "el pago individual no llegó a esperar el lock"
+            time.sleep(0.05)
+        conn_control.rollback()
+
+        # Con el orden invertido aquí PostgreSQL aborta una de las dos por deadlock
+        continuar.set()
+        hilo_lote.join(20)
+        hilo_individual.join(20)
+        assert not hilo_lote.is_alive() and not hilo_individual.is_alive()
+        assert not errores, errores
+
+        cur_control.execute("SELECT monto_abonado FROM cuentas_a_pagar WHERE id = %s", (cuenta_a_pagar,))
+        assert cur_control.fetchone()['monto_abonado'] == 500
+        assert resultados[0]['pagos_aplicados'] == 1
+    finally:
+        continuar.set()
+        hilo_lote.join(10)
+        if hilo_individual is not None:
+            hilo_individual.join(10)
+        conn_control.rollback()
+        for cur, conn in ((cur_b, conn_b), (cur_control, conn_control)):
+            cur.close()
+            conn.close()